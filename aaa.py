@@ -3,47 +3,254 @@
 import subprocess
 import sys
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
 
-from lang.runtime.program import Program
-from lang.runtime.simulator import Simulator
+from lang.runtime.image_file import ImageFileError, load_image, save_image
+from lang.runtime.image_vm import ImageVM
 
+# Only running saved images is imported up front. Other commands import the parser
+# and type checker when they run, so `aaa.py exec` starts quickly.
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.models.profile import Profile
+    from lang.runtime.backends import Backend
+    from lang.runtime.program import Program
 
-def run(file_path: str, verbose_flag: Optional[str] = None) -> None:
+# Options that take a path, which can also be passed as the next argument
+PATH_OPTIONS = ["--profile-in", "--profile-out"]
 
-    verbose = False
 
-    if verbose_flag:
-        if verbose_flag == "-v":
-            verbose = True
+def join_option_values(flags: List[str]) -> List[str]:
+    joined: List[str] = []
+
+    for flag in flags:
+        if joined and joined[-1] in PATH_OPTIONS:
+            joined[-1] += f"={flag}"
         else:
-            raise ArgParseError("Unexpected option for run.")
+            joined.append(flag)
 
-    program = Program(Path(file_path))
+    return joined
+
+
+def load_profile(path: str) -> "Profile":
+    from lang.models.profile import PROFILE_VERSION, Profile
+
+    try:
+        profile = Profile.parse_file(path)
+    except (OSError, ValueError):
+        raise ArgParseError(f"Could not load profile from {path}.")
+
+    if profile.version != PROFILE_VERSION:
+        raise ArgParseError(f"Profile {path} has unsupported version.")
+
+    return profile
+
+
+def parse_backend_flags(
+    command_name: str, flags: List[str]
+) -> Callable[..., "Backend"]:
+    from lang.runtime.backends import BACKENDS, DEFAULT_BACKEND
+
+    backend_name = DEFAULT_BACKEND
+    simulator_kwargs: Dict[str, Any] = {}
+    register_vm_kwargs: Dict[str, Any] = {}
+    monomorphize = False
+    paranoid = False
+    profile: Optional["Profile"] = None
+
+    for flag in join_option_values(flags):
+        if flag == "-v":
+            simulator_kwargs["verbose"] = True
+        elif flag == "--debug-tiers":
+            simulator_kwargs["debug_tiers"] = True
+        elif flag == "--memoize":
+            simulator_kwargs["memoize"] = True
+        elif flag.startswith("--hot-threshold="):
+            try:
+                hot_threshold = int(flag.removeprefix("--hot-threshold="))
+            except ValueError:
+                raise ArgParseError("Option --hot-threshold expects an integer.")
+            simulator_kwargs["hot_threshold"] = hot_threshold
+        elif flag == "--count-dispatches":
+            register_vm_kwargs["count_dispatches"] = True
+        elif flag == "--monomorphize":
+            monomorphize = True
+        elif flag == "--paranoid":
+            paranoid = True
+        elif flag.startswith("--profile-out="):
+            simulator_kwargs["profile_out"] = Path(flag.removeprefix("--profile-out="))
+        elif flag.startswith("--profile-in="):
+            profile = load_profile(flag.removeprefix("--profile-in="))
+        elif flag.startswith("--backend="):
+            backend_name = flag.removeprefix("--backend=")
+            if backend_name not in BACKENDS:
+                raise ArgParseError(f"Unknown backend {backend_name}.")
+        else:
+            raise ArgParseError(f"Unexpected option for {command_name}.")
+
+    backend = select_backend(
+        backend_name, simulator_kwargs, register_vm_kwargs, paranoid
+    )
+
+    def prepare(program: "Program") -> "Program":
+        # Applying a profile regenerates instructions, so it goes first
+        if profile is not None:
+            program.apply_profile(profile)
+        if monomorphize:
+            program.monomorphize()
+        return program
+
+    return lambda program: backend(prepare(program))
+
+
+def select_backend(
+    backend_name: str,
+    simulator_kwargs: Dict[str, Any],
+    register_vm_kwargs: Dict[str, Any],
+    paranoid: bool,
+) -> Callable[..., "Backend"]:
+    from lang.runtime.backends import BACKENDS, PARANOID_BACKENDS
+
+    backends = BACKENDS
+    if paranoid:
+        if backend_name not in PARANOID_BACKENDS:
+            raise ArgParseError(
+                "Option --paranoid is only supported by the simulator and register "
+                + "backends."
+            )
+        backends = PARANOID_BACKENDS
+
+    if simulator_kwargs:
+        if backend_name != "simulator":
+            raise ArgParseError(
+                "Options -v, --debug-tiers, --hot-threshold, --memoize and "
+                + "--profile-out are only supported by the simulator."
+            )
+        return lambda program: backends["simulator"](program, **simulator_kwargs)
+
+    if register_vm_kwargs:
+        if backend_name != "register":
+            raise ArgParseError(
+                "Option --count-dispatches is only supported by the register backend."
+            )
+        return lambda program: backends["register"](program, **register_vm_kwargs)
+
+    return backends[backend_name]
+
+
+def run(file_path: str, *flags: str) -> None:
+    from lang.runtime.program import Program
+
+    # Functions main doesn't reach aren't type checked, unless running strictly
+    strict = "--strict" in flags
+    fold_constant_calls = "--no-fold-calls" not in flags
+    backend = parse_backend_flags(
+        "run", [flag for flag in flags if flag not in ("--strict", "--no-fold-calls")]
+    )
+    program = Program(
+        Path(file_path), lazy=not strict, fold_constant_calls=fold_constant_calls
+    )
     program.exit_on_error()
-    simulator = Simulator(program, verbose)
-    simulator.run()
+    backend(program).run()
 
 
-def cmd(code: str, verbose_flag: Optional[str] = None) -> None:
+def cmd(code: str, *flags: str) -> None:
     code = "fn main {\n" + code + "\n}"
-    cmd_full(code, verbose_flag)
+    cmd_full(code, *flags)
 
 
-def cmd_full(code: str, verbose_flag: Optional[str] = None) -> None:
+def cmd_full(code: str, *flags: str) -> None:
+    from lang.runtime.program import Program
 
-    verbose = False
+    fold_constant_calls = "--no-fold-calls" not in flags
+    backend = parse_backend_flags(
+        "cmd", [flag for flag in flags if flag != "--no-fold-calls"]
+    )
+    program = Program.without_file(code, fold_constant_calls=fold_constant_calls)
+    program.exit_on_error()
+    backend(program).run()
+
+
+def transpile(file_path: str, *args: Any) -> None:
+    if args:
+        raise ArgParseError("transpile expects no flags or further arguments.")
+
+    from lang.runtime.program import Program
+    from lang.runtime.transpiler import Transpiler
+
+    program = Program(Path(file_path))
+    program.exit_on_error()
+    print(Transpiler(program).transpile(), end="")
+
+
+def disassemble_command(file_path: str, *args: Any) -> None:
+    if args:
+        raise ArgParseError("disassemble expects no flags or further arguments.")
+
+    from lang.linker import Linker, disassemble
+    from lang.runtime.program import Program
+
+    program = Program(Path(file_path))
+    program.exit_on_error()
+    print(disassemble(Linker(program).link()), end="")
 
-    if verbose_flag:
-        if verbose_flag == "-v":
-            verbose = True
-        else:
-            raise ArgParseError("Unexpected option for cmd.")
 
-    program = Program.without_file(code)
+def build_command(file_path: str, *args: str) -> None:
+    report = "--report" in args
+    args = tuple(arg for arg in args if arg != "--report")
+
+    if len(args) != 2 or args[0] != "-o":
+        raise ArgParseError("build expects -o OUTPUT_PATH and optionally --report.")
+
+    from lang.linker import Linker, assemble
+    from lang.runtime.image_file import ImageWriter
+    from lang.runtime.program import Program
+    from lang.tree_shaking import TreeShakingReport, find_reachable
+
+    program = Program(Path(file_path))
     program.exit_on_error()
-    simulator = Simulator(program, verbose)
-    simulator.run()
+    output_path = Path(args[1])
+    save_image(assemble(Linker(program).link()), output_path)
+
+    if report:
+        # Size of the image if it had all functions of the program
+        unshaken_image = assemble(Linker(program, tree_shake=False).link())
+        tree_shaking_report = TreeShakingReport(
+            program,
+            find_reachable(program),
+            output_path.stat().st_size,
+            len(ImageWriter(unshaken_image).write()),
+        )
+        print(tree_shaking_report, end="")
+
+
+def exec_command(image_path: str, *args: str) -> None:
+    if args:
+        raise ArgParseError("exec expects no flags or further arguments.")
+
+    try:
+        image = load_image(Path(image_path))
+    except (OSError, ImageFileError) as e:
+        print(f"Could not load image from {image_path}: {e}", file=sys.stderr)
+        exit(1)
+
+    ImageVM(image).run()
+
+
+def build_native_command(file_path: str, *args: str) -> None:
+    if len(args) != 2 or args[0] != "-o":
+        raise ArgParseError("build-native expects -o OUTPUT_PATH.")
+
+    from lang.runtime.native import NativeBuildError, build_native
+    from lang.runtime.program import Program
+
+    program = Program(Path(file_path))
+    program.exit_on_error()
+
+    try:
+        build_native(program, Path(args[1]))
+    except NativeBuildError as e:
+        print(e, file=sys.stderr)
+        exit(1)
 
 
 def runtests(*args: Any) -> None:
@@ -63,10 +270,15 @@ def runtests(*args: Any) -> None:
 
 
 COMMANDS: Dict[str, Callable[..., None]] = {
+    "build": build_command,
+    "build-native": build_native_command,
     "cmd": cmd,
     "cmd-full": cmd_full,
+    "disassemble": disassemble_command,
+    "exec": exec_command,
     "run": run,
     "runtests": runtests,
+    "transpile": transpile,
 }
 
 
@@ -75,13 +287,47 @@ class ArgParseError(Exception):
 
 
 def show_usage(argv: List[str], error_message: str) -> None:
+    from lang.runtime.backends import BACKENDS
+
     message = (
         f"Argument parsing failed: {error_message}\n\n"
         + "Available commands:\n"
-        + f"{argv[0]} cmd CODE <-v>\n"
-        + f"{argv[0]} cmd-full CODE <-v>\n"
-        + f"{argv[0]} run FILE_PATH <-v>\n"
+        + f"{argv[0]} build FILE_PATH -o OUTPUT_PATH [--report]\n"
+        + f"{argv[0]} build-native FILE_PATH -o OUTPUT_PATH\n"
+        + f"{argv[0]} cmd CODE <RUN_OPTIONS>\n"
+        + f"{argv[0]} cmd-full CODE <RUN_OPTIONS>\n"
+        + f"{argv[0]} disassemble FILE_PATH\n"
+        + f"{argv[0]} exec IMAGE_PATH\n"
+        + f"{argv[0]} run FILE_PATH [--strict] <RUN_OPTIONS>\n"
         + f"{argv[0]} runtests\n"
+        + f"{argv[0]} transpile FILE_PATH\n"
+        + "\n"
+        + "With --strict, run type checks all functions of all imported files and\n"
+        + "not only the ones main uses.\n"
+        + "\n"
+        + "Available RUN_OPTIONS:\n"
+        + "--backend=NAME       Run with backend "
+        + ", ".join(BACKENDS)
+        + "\n"
+        + "-v                   Print every executed instruction (simulator only)\n"
+        + "--debug-tiers        Print tier transitions (simulator only)\n"
+        + "--hot-threshold=N    Calls or loop iterations after which a function\n"
+        + "                     moves to a faster tier (simulator only)\n"
+        + "--memoize            Cache results of pure functions and print cache\n"
+        + "                     statistics (simulator only)\n"
+        + "--count-dispatches   Print how many instruction dispatches the register\n"
+        + "                     backend saves compared to the simulator\n"
+        + "--no-fold-calls      Don't run calls of pure functions with constant\n"
+        + "                     arguments when loading the program\n"
+        + "--monomorphize       Copy generic functions for every set of argument\n"
+        + "                     types they are called with\n"
+        + "--paranoid           Check at runtime what type checking guarantees, for\n"
+        + "                     debugging the type checker (simulator and register\n"
+        + "                     backends only)\n"
+        + "--profile-out PATH   Save call counts, branch and loop statistics as a\n"
+        + "                     profile (simulator only)\n"
+        + "--profile-in PATH    Inline, lay out branches and fuse instructions using\n"
+        + "                     a saved profile\n"
     )
 
     print(message, file=sys.stderr)
@@ -0,0 +1,194 @@
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from lang.loops import JUMP_INSTRUCTIONS
+from lang.models.instructions import (
+    CallFunction,
+    Instruction,
+    PushBool,
+    PushInt,
+    PushString,
+)
+from lang.models.parse import Function
+from lang.purity import FunctionKey, find_memoizable_functions
+from lang.runtime.simulator import Simulator
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# Calls that take more instructions than this to evaluate are left for runtime
+DEFAULT_EVALUATION_BUDGET = 100_000
+
+# Seconds all evaluated calls of a program may take together. Calls that are still
+# running when it runs out, and calls after that, are left for runtime.
+DEFAULT_TIME_BUDGET = 1.0
+
+# Calls that create an int or str of more bytes than this are left for runtime. This
+# also keeps the values a single instruction works on small.
+MAX_VALUE_SIZE = 4096
+
+CONSTANT_INSTRUCTIONS = (PushBool, PushInt, PushString)
+
+# Instruction with the offset of the original instruction it replaces
+OffsetInstruction = Tuple[int, Instruction]
+
+
+def push_constant(value: Any) -> Instruction:
+    if isinstance(value, bool):
+        return PushBool(value=value)
+    if isinstance(value, int):
+        return PushInt(value=value)
+
+    assert isinstance(value, str)
+    return PushString(value=value)
+
+
+class ConstantCallEvaluator:
+    # Replaces calls to pure functions with constant arguments by the values they
+    # return, such as `fn buffer_size return int { 64 1024 * }`. Calls are run by a
+    # simulator with an instruction budget, a time budget and a limit on the size of
+    # values. Calls that exceed them or fail are left alone, so they fail at runtime
+    # like they would without this.
+
+    def __init__(
+        self,
+        program: "Program",
+        budget: int = DEFAULT_EVALUATION_BUDGET,
+        time_budget: float = DEFAULT_TIME_BUDGET,
+    ) -> None:
+        self.program = program
+        self.budget = budget
+        self.deadline = time.monotonic() + time_budget
+
+        # Only functions with unboxed arguments and return values, so arguments and
+        # results can be pushed as constants.
+        self.evaluable = find_memoizable_functions(program)
+        self.results: Dict[
+            Tuple[FunctionKey, Tuple[Any, ...]], Optional[List[Any]]
+        ] = {}
+
+    def evaluate(self) -> None:
+        for file, file_instructions in self.program.function_instructions.items():
+            for func_name, instructions in file_instructions.items():
+                file_instructions[func_name] = self.evaluate_calls(instructions)
+
+    def evaluate_calls(self, instructions: List[Instruction]) -> List[Instruction]:
+        jump_targets: Set[int] = {
+            instruction.instruction_offset
+            for instruction in instructions
+            if isinstance(instruction, JUMP_INSTRUCTIONS)
+        }
+
+        # Results of evaluated calls can be arguments of later calls
+        evaluated: List[OffsetInstruction] = []
+        changed = False
+
+        for ip, instruction in enumerate(instructions):
+            if isinstance(instruction, CallFunction) and self.evaluate_call(
+                instruction, ip, evaluated, jump_targets
+            ):
+                changed = True
+                continue
+
+            evaluated.append((ip, instruction))
+
+        if not changed:
+            return instructions
+
+        return self.remap_jumps(evaluated)
+
+    def evaluate_call(
+        self,
+        instruction: CallFunction,
+        ip: int,
+        evaluated: List[OffsetInstruction],
+        jump_targets: Set[int],
+    ) -> bool:
+        # Returns whether the call and its arguments were replaced by its results
+        key = (instruction.file, instruction.func_name)
+        if key not in self.evaluable:
+            return False
+
+        function = self.program.get_identifier(*key)
+        assert isinstance(function, Function)
+        arg_count = len(function.arguments)
+
+        if arg_count > len(evaluated):
+            return False
+
+        arguments = evaluated[len(evaluated) - arg_count :]
+        if not all(
+            isinstance(argument, CONSTANT_INSTRUCTIONS) for _, argument in arguments
+        ):
+            return False
+
+        # Jumps can only go to the first instruction that is replaced
+        offset = arguments[0][0] if arguments else ip
+        if jump_targets & set(range(offset + 1, ip + 1)):
+            return False
+
+        values = tuple(
+            argument.value
+            for _, argument in arguments
+            if isinstance(argument, CONSTANT_INSTRUCTIONS)
+        )
+        results = self.call(key, values)
+        if results is None:
+            return False
+
+        del evaluated[len(evaluated) - arg_count :]
+        evaluated += [(offset, push_constant(result)) for result in results]
+        return True
+
+    def call(self, key: FunctionKey, arguments: Tuple[Any, ...]) -> Optional[List[Any]]:
+        # Returns None if the call can't be evaluated
+        if (key, arguments) in self.results:
+            return self.results[(key, arguments)]
+
+        time_left = self.deadline - time.monotonic()
+        if time_left <= 0:
+            return None
+
+        simulator = Simulator(
+            self.program,
+            instruction_budget=self.budget,
+            time_budget=time_left,
+            max_value_size=MAX_VALUE_SIZE,
+        )
+        simulator.stack += arguments
+
+        results: Optional[List[Any]]
+
+        try:
+            simulator.execute(*key)
+        except Exception:
+            # Whatever goes wrong, such as failing assertions, too deep recursion or
+            # exceeding a budget, should happen at runtime instead.
+            results = None
+        else:
+            results = simulator.stack
+
+        self.results[(key, arguments)] = results
+        return results
+
+    def remap_jumps(self, evaluated: List[OffsetInstruction]) -> List[Instruction]:
+        # Jumps go to the first instruction replacing their original target
+        offsets = [offset for offset, _ in evaluated]
+
+        return [
+            instruction.copy(
+                update={
+                    "instruction_offset": bisect_left(
+                        offsets, instruction.instruction_offset
+                    )
+                }
+            )
+            if isinstance(instruction, JUMP_INSTRUCTIONS)
+            else instruction
+            for _, instruction in evaluated
+        ]
+
+
+def evaluate_constant_calls(program: "Program") -> None:
+    ConstantCallEvaluator(program).evaluate()
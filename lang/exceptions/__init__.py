@@ -1,10 +1,11 @@
 from pathlib import Path
-from typing import Sequence
-
-from lark.lexer import Token
+from typing import TYPE_CHECKING, Sequence
 
 from lang.models.typing.var_type import VariableType
 
+if TYPE_CHECKING:  # pragma: nocover
+    from lark.lexer import Token
+
 
 class AaaException(Exception):
     ...
@@ -28,5 +29,5 @@ def format_typestack(
     return " ".join(repr(type_stack_item) for type_stack_item in type_stack)
 
 
-def error_location(file: Path, token: Token) -> str:
+def error_location(file: Path, token: "Token") -> str:
     return f"{file}:{token.line}:{token.column}"
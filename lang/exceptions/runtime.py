@@ -1,26 +1,84 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, List, Tuple
 
 from lang.exceptions import AaaRuntimeException
-from lang.models.runtime import CallStackItem
+from lang.models.typing.var import box
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.models.runtime import CallStackItem
+
+# Name, argument names and argument values of a call in a stack trace
+StackTraceItem = Tuple[str, List[str], List[Any]]
+
+
+def get_stack_trace(call_stack: List["CallStackItem"]) -> List[StackTraceItem]:
+    # Call stack items are reused, so their contents are copied
+    return [
+        (
+            str(call_stack_item.function_record.function.name),
+            [
+                argument.name
+                for argument in call_stack_item.function_record.function.arguments
+            ],
+            list(call_stack_item.argument_values),
+        )
+        for call_stack_item in call_stack
+    ]
 
 
 class AaaAssertionFailure(AaaRuntimeException):
-    def __init__(self, call_stack: List[CallStackItem]) -> None:
-        self.call_stack = call_stack
+    def __init__(self, stack_trace: List[StackTraceItem]) -> None:
+        self.stack_trace = stack_trace
 
     def __str__(self) -> str:
         msg = "Assertion failure, stacktrace:\n"
 
-        for call_stack_item in self.call_stack:
-            name = call_stack_item.function.name
+        for name, argument_names, argument_values in self.stack_trace:
+            # Arguments are listed last to first
+            arguments = reversed(list(zip(argument_names, argument_values)))
 
             args = ""
-            if call_stack_item.argument_values:
+            if argument_values:
                 args = ", arguments: " + ", ".join(
-                    f"{name}={value.__repr__()}"
-                    for name, value in call_stack_item.argument_values.items()
+                    f"{argument_name}={box(value).__repr__()}"
+                    for argument_name, value in arguments
                 )
 
             msg += f"- {name}{args}"
 
         return msg
+
+
+class CallStackOverflow(AaaRuntimeException):
+    def __init__(self, *, max_call_depth: int, function_name: str) -> None:
+        self.max_call_depth = max_call_depth
+        self.function_name = function_name
+
+    def __str__(self) -> str:
+        return (
+            f"Call stack overflow: calling {self.function_name} "
+            + f"exceeds the maximum call depth of {self.max_call_depth}."
+        )
+
+
+class InstructionBudgetExceeded(AaaRuntimeException):
+    def __init__(self, *, instruction_budget: int) -> None:
+        self.instruction_budget = instruction_budget
+
+    def __str__(self) -> str:
+        return f"Exceeded the budget of {self.instruction_budget} instructions."
+
+
+class TimeBudgetExceeded(AaaRuntimeException):
+    def __init__(self, *, time_budget: float) -> None:
+        self.time_budget = time_budget
+
+    def __str__(self) -> str:
+        return f"Exceeded the time budget of {self.time_budget:.3f} seconds."
+
+
+class ValueSizeLimitExceeded(AaaRuntimeException):
+    def __init__(self, *, max_value_size: int) -> None:
+        self.max_value_size = max_value_size
+
+    def __str__(self) -> str:
+        return f"Created a value larger than {self.max_value_size} bytes."
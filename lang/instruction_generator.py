@@ -1,6 +1,7 @@
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Type
 
+from lang.models import AaaModel
 from lang.models.instructions import (
     And,
     Assert,
@@ -27,8 +28,8 @@ from lang.models.instructions import (
     Over,
     Plus,
     Print,
+    PushArgument,
     PushBool,
-    PushFunctionArgument,
     PushInt,
     PushMap,
     PushString,
@@ -37,7 +38,6 @@ from lang.models.instructions import (
     Rot,
     SetStructField,
     StandardLibraryCall,
-    StandardLibraryCallKind,
     Swap,
 )
 from lang.models.parse import (
@@ -57,6 +57,7 @@ from lang.models.parse import (
 )
 from lang.models.program import ProgramImport
 from lang.models.typing.var_type import RootType, VariableType
+from lang.runtime.stdlib import STDLIB_FUNCTIONS
 
 if TYPE_CHECKING:  # pragma: nocover
     from lang.runtime.program import Program
@@ -86,117 +87,100 @@ OPERATOR_INSTRUCTIONS: Dict[str, Instruction] = {
     "swap": Swap(),
 }
 
-STDLIB_INSTRUCTIONS: Dict[str, StandardLibraryCallKind] = {
-    "chdir": StandardLibraryCallKind.SYSCALL_CHDIR,
-    "close": StandardLibraryCallKind.SYSCALL_CLOSE,
-    "environ": StandardLibraryCallKind.ENVIRON,
-    "execve": StandardLibraryCallKind.SYSCALL_EXECVE,
-    "exit": StandardLibraryCallKind.SYSCALL_EXIT,
-    "fork": StandardLibraryCallKind.SYSCALL_FORK,
-    "fsync": StandardLibraryCallKind.SYSCALL_FSYNC,
-    "getcwd": StandardLibraryCallKind.SYSCALL_GETCWD,
-    "getenv": StandardLibraryCallKind.GETENV,
-    "getpid": StandardLibraryCallKind.SYSCALL_GETPID,
-    "getppid": StandardLibraryCallKind.SYSCALL_GETPPID,
-    "map:clear": StandardLibraryCallKind.MAP_CLEAR,
-    "map:copy": StandardLibraryCallKind.MAP_COPY,
-    "map:drop": StandardLibraryCallKind.MAP_DROP,
-    "map:empty": StandardLibraryCallKind.MAP_EMPTY,
-    "map:get": StandardLibraryCallKind.MAP_GET,
-    "map:has_key": StandardLibraryCallKind.MAP_HAS_KEY,
-    "map:keys": StandardLibraryCallKind.MAP_KEYS,
-    "map:pop": StandardLibraryCallKind.MAP_POP,
-    "map:set": StandardLibraryCallKind.MAP_SET,
-    "map:size": StandardLibraryCallKind.MAP_SIZE,
-    "map:values": StandardLibraryCallKind.MAP_VALUES,
-    "open": StandardLibraryCallKind.SYSCALL_OPEN,
-    "read": StandardLibraryCallKind.SYSCALL_READ,
-    "setenv": StandardLibraryCallKind.SETENV,
-    "str:append": StandardLibraryCallKind.STR_APPEND,
-    "str:contains": StandardLibraryCallKind.STR_CONTAINS,
-    "str:equals": StandardLibraryCallKind.STR_EQUALS,
-    "str:find_after": StandardLibraryCallKind.STR_FIND_AFTER,
-    "str:find": StandardLibraryCallKind.STR_FIND,
-    "str:join": StandardLibraryCallKind.STR_JOIN,
-    "str:len": StandardLibraryCallKind.STR_LEN,
-    "str:lower": StandardLibraryCallKind.STR_LOWER,
-    "str:replace": StandardLibraryCallKind.STR_REPLACE,
-    "str:split": StandardLibraryCallKind.STR_SPLIT,
-    "str:strip": StandardLibraryCallKind.STR_STRIP,
-    "str:substr": StandardLibraryCallKind.STR_SUBSTR,
-    "str:to_bool": StandardLibraryCallKind.STR_TO_BOOL,
-    "str:to_int": StandardLibraryCallKind.STR_TO_INT,
-    "str:upper": StandardLibraryCallKind.STR_UPPER,
-    "time": StandardLibraryCallKind.SYSCALL_TIME,
-    "unsetenv": StandardLibraryCallKind.UNSETENV,
-    "vec:clear": StandardLibraryCallKind.VEC_CLEAR,
-    "vec:copy": StandardLibraryCallKind.VEC_COPY,
-    "vec:empty": StandardLibraryCallKind.VEC_EMPTY,
-    "vec:get": StandardLibraryCallKind.VEC_GET,
-    "vec:pop": StandardLibraryCallKind.VEC_POP,
-    "vec:push": StandardLibraryCallKind.VEC_PUSH,
-    "vec:set": StandardLibraryCallKind.VEC_SET,
-    "vec:size": StandardLibraryCallKind.VEC_SIZE,
-    "waitpid": StandardLibraryCallKind.SYSCALL_WAITPID,
-    "write": StandardLibraryCallKind.SYSCALL_WRITE,
-}
+
+# Labels stand for instruction offsets that may not be known yet
+Label = int
 
 
 class InstructionGenerator:
+    # Emits instructions into one buffer in a single pass over the function body.
+    # Jumps target labels, which get their offset when placed. Once everything is
+    # emitted, jumps are patched with the offsets of their labels.
+
     def __init__(self, file: Path, function: Function, program: "Program") -> None:
         self.function = function
         self.file = file
         self.program = program
 
-    def generate_instructions(self) -> List[Instruction]:
-        return self.instructions_for_function_body(self.function.body, 0)
-
-    def instructions_for_integer_literal(
-        self, integer_literal: IntegerLiteral
-    ) -> List[Instruction]:
-        return [PushInt(value=integer_literal.value)]
+        self.instructions: List[Instruction] = []
+        self.label_offsets: List[Optional[int]] = []
+
+        # Offsets of jumps in instructions, with their type and target
+        self.jumps: List[Tuple[int, Type[Jump | JumpIfNot], Label]] = []
+
+        # Items of function bodies are dispatched on their type, which is faster
+        # than checking it against each type in turn.
+        self.emit_funcs: Dict[Type[AaaModel], Callable[[Any], None]] = {
+            BooleanLiteral: self.emit_boolean_literal,
+            Branch: self.emit_branch,
+            FunctionBody: self.emit_function_body,
+            Identifier: self.emit_identifier,
+            IntegerLiteral: self.emit_integer_literal,
+            Loop: self.emit_loop,
+            MemberFunctionName: self.emit_member_function,
+            Operator: self.emit_operator,
+            VariableType: self.emit_variable_type,
+            StringLiteral: self.emit_string_literal,
+            StructFieldQuery: self.emit_struct_field_query,
+            StructFieldUpdate: self.emit_struct_field_update,
+        }
 
-    def instructions_for_string_literal(
-        self, string_literal: StringLiteral
-    ) -> List[Instruction]:
-        return [PushString(value=string_literal.value)]
+    def generate_instructions(self) -> List[Instruction]:
+        return self.generate_body_instructions(self.function.body)
 
-    def instructions_for_boolean_literal(
-        self, boolean_literal: BooleanLiteral
+    def generate_body_instructions(
+        self, function_body: FunctionBody
     ) -> List[Instruction]:
-        return [PushBool(value=boolean_literal.value)]
-
-    def instructions_for_operator(self, operator: Operator) -> List[Instruction]:
-        return [OPERATOR_INSTRUCTIONS[operator.value]]
-
-    def instructions_for_loop(self, loop: Loop, offset: int) -> List[Instruction]:
-        condition_instructions = self.instructions_for_function_body(
-            loop.condition, offset
-        )
-        body_offset = offset + 1 + len(condition_instructions) + 1
-
-        body_instructions = self.instructions_for_function_body(loop.body, body_offset)
-        beyond_loop_nop_offset = body_offset + len(body_instructions) + 1
-
-        loop_instructions: List[Instruction] = []
-
-        loop_instructions += [Nop()]
-        loop_instructions += condition_instructions
-        loop_instructions += [JumpIfNot(instruction_offset=beyond_loop_nop_offset)]
-        loop_instructions += body_instructions
-        loop_instructions += [Jump(instruction_offset=offset)]
-        loop_instructions += [Nop()]
-
-        return loop_instructions
-
-    def instructions_for_identfier(self, identifier: Identifier) -> List[Instruction]:
-        if identifier.name in STDLIB_INSTRUCTIONS:
-            stdlib_call = StandardLibraryCall(kind=STDLIB_INSTRUCTIONS[identifier.name])
-            return [stdlib_call]
-
-        for argument in self.function.arguments:
+        self.instructions = []
+        self.label_offsets = []
+        self.jumps = []
+
+        self.emit_function_body(function_body)
+        self.patch_jumps()
+        return self.instructions
+
+    def emit(self, instruction: Instruction) -> None:
+        self.instructions.append(instruction)
+
+    def new_label(self) -> Label:
+        self.label_offsets.append(None)
+        return len(self.label_offsets) - 1
+
+    def place_label(self, label: Label) -> None:
+        self.label_offsets[label] = len(self.instructions)
+
+    def emit_jump(self, jump_type: Type[Jump | JumpIfNot], label: Label) -> None:
+        self.jumps.append((len(self.instructions), jump_type, label))
+        self.emit(jump_type(instruction_offset=0))
+
+    def patch_jumps(self) -> None:
+        for offset, jump_type, label in self.jumps:
+            label_offset = self.label_offsets[label]
+            assert label_offset is not None
+            self.instructions[offset] = jump_type(instruction_offset=label_offset)
+
+    def emit_loop(self, loop: Loop) -> None:
+        start = self.new_label()
+        end = self.new_label()
+
+        self.place_label(start)
+        self.emit(Nop())
+        self.emit_function_body(loop.condition)
+        self.emit_jump(JumpIfNot, end)
+        self.emit_function_body(loop.body)
+        self.emit_jump(Jump, start)
+        self.place_label(end)
+        self.emit(Nop())
+
+    def emit_identifier(self, identifier: Identifier) -> None:
+        if identifier.name in STDLIB_FUNCTIONS:
+            self.emit(StandardLibraryCall(name=identifier.name))
+            return
+
+        for arg_index, argument in enumerate(self.function.arguments):
             if identifier.name == argument.name:
-                return [PushFunctionArgument(arg_name=argument.name)]
+                self.emit(PushArgument(arg_index=arg_index))
+                return
 
         identified = self.program.get_identifier(self.file, identifier.name)
         assert identified
@@ -211,116 +195,80 @@ class InstructionGenerator:
             source_file, original_name = self.program.get_function_source_and_name(
                 self.file, identifier.name
             )
-            return [CallFunction(func_name=original_name, file=source_file)]
+            self.emit(CallFunction(func_name=original_name, file=source_file))
         elif isinstance(identified, Struct):
-            return [PushStruct(type=identified)]
+            self.emit(PushStruct(type=identified))
         else:  # pragma: nocover
             assert False
 
-    def instructions_for_branch(self, branch: Branch, offset: int) -> List[Instruction]:
-        branch_instructions: List[Instruction] = []
+    def emit_branch(self, branch: Branch) -> None:
+        else_start = self.new_label()
+        end = self.new_label()
 
-        condition_instructions = self.instructions_for_function_body(
-            branch.condition, offset
-        )
+        self.emit_function_body(branch.condition)
+        self.emit_jump(JumpIfNot, else_start)
+        self.emit_function_body(branch.if_body)
+        self.emit_jump(Jump, end)
+        self.place_label(else_start)
+        self.emit(Nop())
+        self.emit_function_body(branch.else_body)
+        self.place_label(end)
+        self.emit(Nop())
 
-        if_offset = offset + 1 + len(condition_instructions)
-        if_instructions = self.instructions_for_function_body(branch.if_body, if_offset)
+    def emit_function_body(self, function_body: FunctionBody) -> None:
+        emit_funcs = self.emit_funcs
 
-        else_nop_offset = if_offset + len(if_instructions) + 1
-        else_offset = else_nop_offset + 1
-        else_instructions = self.instructions_for_function_body(
-            branch.else_body, else_offset
-        )
+        for child in function_body.items:
+            emit_funcs[type(child)](child)
 
-        branch_end_nop_offset = else_offset + len(else_instructions)
+    def emit_boolean_literal(self, boolean_literal: BooleanLiteral) -> None:
+        self.emit(PushBool(value=boolean_literal.value))
 
-        branch_instructions = condition_instructions
-        branch_instructions += [JumpIfNot(instruction_offset=else_nop_offset)]
-        branch_instructions += if_instructions
-        branch_instructions += [Jump(instruction_offset=branch_end_nop_offset)]
-        branch_instructions += [Nop()]
-        branch_instructions += else_instructions
-        branch_instructions += [Nop()]
-        return branch_instructions
+    def emit_integer_literal(self, integer_literal: IntegerLiteral) -> None:
+        self.emit(PushInt(value=integer_literal.value))
 
-    def instructions_for_function_body(
-        self, function_body: FunctionBody, offset: int
-    ) -> List[Instruction]:
-        instructions: List[Instruction] = []
+    def emit_string_literal(self, string_literal: StringLiteral) -> None:
+        self.emit(PushString(value=string_literal.value))
 
-        for child in function_body.items:
-            child_offset = offset + len(instructions)
-
-            if isinstance(child, BooleanLiteral):
-                instructions += self.instructions_for_boolean_literal(child)
-            elif isinstance(child, Branch):
-                instructions += self.instructions_for_branch(child, child_offset)
-            elif isinstance(child, FunctionBody):
-                instructions += self.instructions_for_function_body(child, child_offset)
-            elif isinstance(child, Identifier):
-                instructions += self.instructions_for_identfier(child)
-            elif isinstance(child, IntegerLiteral):
-                instructions += self.instructions_for_integer_literal(child)
-            elif isinstance(child, Loop):
-                instructions += self.instructions_for_loop(child, child_offset)
-            elif isinstance(child, MemberFunctionName):
-                instructions += self.instructions_for_member_function(
-                    child, child_offset
-                )
-            elif isinstance(child, Operator):
-                instructions += self.instructions_for_operator(child)
-            elif isinstance(child, VariableType):
-                instructions += self.instructions_for_variable_type(child)
-            elif isinstance(child, StringLiteral):
-                instructions += self.instructions_for_string_literal(child)
-            elif isinstance(child, StructFieldQuery):
-                instructions += self.instructions_for_struct_field_query(child)
-            elif isinstance(child, StructFieldUpdate):
-                instructions += self.instructions_for_struct_field_update(
-                    child, child_offset
-                )
-            else:  # pragma: nocover
-                assert False
+    def emit_operator(self, operator: Operator) -> None:
+        self.emit(OPERATOR_INSTRUCTIONS[operator.value])
 
-        return instructions
+    def emit_struct_field_query(self, field_query: StructFieldQuery) -> None:
+        self.emit(PushString(value=field_query.field_name.value))
+        self.emit(GetStructField())
 
-    def instructions_for_variable_type(
-        self, var_type: VariableType
-    ) -> List[Instruction]:
+    def emit_variable_type(self, var_type: VariableType) -> None:
         root_type = var_type.root_type
 
         if root_type == RootType.INTEGER:
-            return [PushInt(value=0)]
+            self.emit(PushInt(value=0))
 
         elif root_type == RootType.BOOL:
-            return [PushBool(value=False)]
+            self.emit(PushBool(value=False))
 
         elif root_type == RootType.STRING:
-            return [PushString(value="")]
+            self.emit(PushString(value=""))
 
         elif root_type == RootType.VECTOR:
-            return [PushVec(item_type=var_type.type_params[0])]
+            self.emit(PushVec(item_type=var_type.type_params[0]))
 
         elif root_type == RootType.MAPPING:
-            return [
+            self.emit(
                 PushMap(
                     key_type=var_type.type_params[0],
                     value_type=var_type.type_params[1],
                 )
-            ]
+            )
 
         else:  # pragma: nocover
             assert False
 
-    def instructions_for_member_function(
-        self, member_function_name: MemberFunctionName, offset: int
-    ) -> List[Instruction]:
+    def emit_member_function(self, member_function_name: MemberFunctionName) -> None:
         key = f"{member_function_name.type_name}:{member_function_name.func_name}"
 
-        if key in STDLIB_INSTRUCTIONS:
-            stdlib_call = StandardLibraryCall(kind=STDLIB_INSTRUCTIONS[key])
-            return [stdlib_call]
+        if key in STDLIB_FUNCTIONS:
+            self.emit(StandardLibraryCall(name=key))
+            return
 
         identified = self.program.identifiers[self.file][key]
 
@@ -328,20 +276,9 @@ class InstructionGenerator:
         source_file, original_name = self.program.get_function_source_and_name(
             self.file, key
         )
-        return [CallFunction(func_name=original_name, file=source_file)]
+        self.emit(CallFunction(func_name=original_name, file=source_file))
 
-    def instructions_for_struct_field_query(
-        self, field_query: StructFieldQuery
-    ) -> List[Instruction]:
-        return [PushString(value=field_query.field_name.value), GetStructField()]
-
-    def instructions_for_struct_field_update(
-        self, field_update: StructFieldUpdate, offset: int
-    ) -> List[Instruction]:
-        instructions: List[Instruction] = []
-        instructions += [PushString(value=field_update.field_name.value)]
-        instructions += self.instructions_for_function_body(
-            field_update.new_value_expr, offset + 1
-        )
-        instructions += [SetStructField()]
-        return instructions
+    def emit_struct_field_update(self, field_update: StructFieldUpdate) -> None:
+        self.emit(PushString(value=field_update.field_name.value))
+        self.emit_function_body(field_update.new_value_expr)
+        self.emit(SetStructField())
@@ -0,0 +1,205 @@
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Type
+
+from lang.loops import JUMP_INSTRUCTIONS
+from lang.models.code_image import CodeImage, FunctionTableEntry, Opcode, StructLayout
+from lang.models.image import CallAddress, LinkedImage, Return
+from lang.models.instructions import (
+    BINARY_OPERATORS,
+    ArgumentOperation,
+    Assert,
+    CallFunction,
+    ConstantOperation,
+    CountedLoop,
+    CountedLoopStep,
+    Divide,
+    Drop,
+    Dup,
+    GetStructField,
+    Instruction,
+    Jump,
+    JumpIfNot,
+    Modulo,
+    Nop,
+    Not,
+    Over,
+    Print,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    Rot,
+    SetStructField,
+    StandardLibraryCall,
+    Swap,
+)
+from lang.models.parse import Function
+from lang.purity import FunctionKey
+from lang.runtime.debug import format_str
+from lang.tree_shaking import find_all, find_reachable
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# Opcode of each instruction type, and the fields that become its operands
+LOWERED_INSTRUCTIONS: Dict[Type[Instruction], Tuple[Opcode, Tuple[str, ...]]] = {
+    ArgumentOperation: (Opcode.ARGUMENT_OPERATION, ("operator", "arg_index")),
+    Assert: (Opcode.ASSERT, ()),
+    CallAddress: (Opcode.CALL, ("function_index", "address", "return_address")),
+    ConstantOperation: (Opcode.CONSTANT_OPERATION, ("operator", "value")),
+    CountedLoop: (
+        Opcode.COUNTED_LOOP,
+        ("comparison", "bound", "bound_arg_index", "increment", "instruction_offset"),
+    ),
+    CountedLoopStep: (
+        Opcode.COUNTED_LOOP_STEP,
+        ("comparison", "bound", "bound_arg_index", "step", "instruction_offset"),
+    ),
+    Divide: (Opcode.DIVIDE, ()),
+    Drop: (Opcode.DROP, ()),
+    Dup: (Opcode.DUP, ()),
+    GetStructField: (Opcode.GET_STRUCT_FIELD, ()),
+    Jump: (Opcode.JUMP, ("instruction_offset",)),
+    JumpIfNot: (Opcode.JUMP_IF_NOT, ("instruction_offset",)),
+    Modulo: (Opcode.MODULO, ()),
+    Nop: (Opcode.NOP, ()),
+    Not: (Opcode.NOT, ()),
+    Over: (Opcode.OVER, ()),
+    Print: (Opcode.PRINT, ()),
+    PushArgument: (Opcode.PUSH_ARGUMENT, ("arg_index",)),
+    PushBool: (Opcode.PUSH, ("value",)),
+    PushInt: (Opcode.PUSH, ("value",)),
+    PushMap: (Opcode.PUSH_MAP, ("key_type", "value_type")),
+    PushString: (Opcode.PUSH, ("value",)),
+    PushVec: (Opcode.PUSH_VEC, ("item_type",)),
+    Return: (Opcode.RETURN, ()),
+    Rot: (Opcode.ROT, ()),
+    SetStructField: (Opcode.SET_STRUCT_FIELD, ()),
+    StandardLibraryCall: (Opcode.STANDARD_LIBRARY_CALL, ("name",)),
+    Swap: (Opcode.SWAP, ()),
+}
+
+
+class Linker:
+    # Lays out all functions reachable from main one after another in a single list of
+    # instructions. Main comes first, at address 0. Every function ends with a Return,
+    # so jumping to the end of a function returns from it. Jump offsets are made
+    # absolute and calls jump to the address of the called function. Without tree
+    # shaking all functions of the program are laid out, see lang.tree_shaking.
+
+    def __init__(self, program: "Program", tree_shake: bool = True) -> None:
+        self.program = program
+        self.tree_shake = tree_shake
+        self.function_indexes: Dict[FunctionKey, int] = {}
+
+    def link(self) -> LinkedImage:
+        if self.tree_shake:
+            function_keys = find_reachable(self.program).functions
+        else:
+            function_keys = find_all(self.program).functions
+
+        self.function_indexes = {key: index for index, key in enumerate(function_keys)}
+        function_instructions: List[List[Instruction]] = []
+        functions: List[FunctionTableEntry] = []
+        address = 0
+
+        for file, func_name in function_keys:
+            function = self.program.get_identifier(file, func_name)
+            assert isinstance(function, Function)
+
+            instructions = self.program.get_instructions(file, func_name)
+            functions.append(
+                FunctionTableEntry(
+                    function.identify(),
+                    str(file),
+                    address,
+                    [argument.name for argument in function.arguments],
+                )
+            )
+            function_instructions.append(instructions)
+            address += len(instructions) + 1
+
+        linked: List[Instruction] = []
+
+        for entry, instructions in zip(functions, function_instructions):
+            for instruction in instructions:
+                linked.append(
+                    self.relocate(instruction, entry.address, functions, len(linked))
+                )
+            linked.append(Return())
+
+        return LinkedImage(linked, functions)
+
+    def relocate(
+        self,
+        instruction: Instruction,
+        base: int,
+        functions: List[FunctionTableEntry],
+        address: int,
+    ) -> Instruction:
+        if isinstance(instruction, JUMP_INSTRUCTIONS):
+            return instruction.copy(
+                update={"instruction_offset": base + instruction.instruction_offset}
+            )
+
+        if isinstance(instruction, CallFunction):
+            function_index = self.function_indexes[
+                (instruction.file, instruction.func_name)
+            ]
+            return CallAddress(
+                function_index=function_index,
+                address=functions[function_index].address,
+                return_address=address + 1,
+            )
+
+        return instruction
+
+
+def assemble(image: LinkedImage) -> CodeImage:
+    # Lowers instructions to opcodes and operands, see lang.models.code_image
+    opcodes: List[Opcode] = []
+    operands: List[Tuple[Any, ...]] = []
+    struct_layouts: Dict[int, StructLayout] = {}
+
+    for instruction in image.instructions:
+        if isinstance(instruction, PushStruct):
+            # Structs can't be hashed, pushing the same one shares its layout
+            struct = instruction.type
+            if id(struct) not in struct_layouts:
+                struct_layouts[id(struct)] = StructLayout(struct.name, struct.fields)
+
+            opcodes.append(Opcode.PUSH_STRUCT)
+            operands.append((struct_layouts[id(struct)],))
+
+        elif type(instruction) in BINARY_OPERATORS:
+            opcodes.append(Opcode.BINARY_OPERATION)
+            operands.append((BINARY_OPERATORS[type(instruction)],))
+
+        else:
+            opcode, fields = LOWERED_INSTRUCTIONS[type(instruction)]
+            opcodes.append(opcode)
+            operands.append(tuple(getattr(instruction, field) for field in fields))
+
+    return CodeImage(opcodes, operands, image.functions)
+
+
+def disassemble(image: LinkedImage) -> str:
+    function_names = {entry.address: entry.name for entry in image.functions}
+    lines: List[str] = []
+
+    for address, instruction in enumerate(image.instructions):
+        if address in function_names:
+            if lines:
+                lines.append("")
+            lines.append(f"<{function_names[address]}>:")
+
+        # String constants may hold newlines, listings have one instruction per line
+        line = f"{address:>6}  {format_str(repr(instruction))}"
+        if isinstance(instruction, CallAddress):
+            line += f"  ; {image.functions[instruction.function_index].name}"
+
+        lines.append(line)
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,165 @@
+import operator
+from typing import Any, Callable, Dict, List, Optional, Set, Type
+
+from lang.models.instructions import (
+    CountedLoop,
+    CountedLoopStep,
+    Dup,
+    Instruction,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Jump,
+    JumpIfNot,
+    Minus,
+    Plus,
+    PushArgument,
+    PushInt,
+)
+
+# Comparisons a counting loop condition can use, by the name of their operator
+COMPARISON_OPERATORS: Dict[Type[Instruction], str] = {
+    IntGreaterEquals: ">=",
+    IntGreaterThan: ">",
+    IntLessEquals: "<=",
+    IntLessThan: "<",
+    IntNotEqual: "!=",
+}
+
+COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "!=": operator.ne,
+}
+
+# Sign of the constant a step instruction adds to the counter
+STEP_SIGNS: Dict[Type[Instruction], int] = {Minus: -1, Plus: 1}
+
+JUMP_INSTRUCTIONS = (CountedLoop, CountedLoopStep, Jump, JumpIfNot)
+
+
+def replace_instructions(
+    instructions: List[Instruction],
+    replacements: Dict[int, Instruction],
+    removed: Set[int],
+) -> List[Instruction]:
+    # Replaces and removes instructions, then updates jumps for the new offsets.
+    # Jumps never target removed instructions, those can map to anything.
+    new_offsets: List[int] = []
+    kept: List[Instruction] = []
+
+    for ip, instruction in enumerate(instructions):
+        new_offsets.append(len(kept))
+
+        if ip not in removed:
+            kept.append(replacements.get(ip, instruction))
+
+    new_offsets.append(len(kept))
+
+    return [
+        instruction.copy(
+            update={"instruction_offset": new_offsets[instruction.instruction_offset]}
+        )
+        if isinstance(instruction, JUMP_INSTRUCTIONS)
+        else instruction
+        for instruction in kept
+    ]
+
+
+class CountedLoopFuser:
+    # Recognizes counting loops like `while dup 10 < { ... 1 + }`, where the
+    # condition compares the counter on top of the stack to a constant or argument.
+    # The condition becomes one CountedLoop instruction. When the body ends with a
+    # constant step, that step and the jump back become one CountedLoopStep, which
+    # checks the condition itself. Otherwise a step at the start of the body is done
+    # by the CountedLoop. The counter stays on the stack, so a body that modifies it
+    # behaves the same.
+
+    def __init__(self, instructions: List[Instruction]) -> None:
+        self.instructions = instructions
+        self.jump_targets: Set[int] = {
+            instruction.instruction_offset
+            for instruction in instructions
+            if isinstance(instruction, JUMP_INSTRUCTIONS)
+        }
+
+        # Fused instructions replace the first instruction they were fused from,
+        # the other ones are removed.
+        self.replacements: Dict[int, Instruction] = {}
+        self.removed: Set[int] = set()
+
+    def fuse(self) -> List[Instruction]:
+        for ip, instruction in enumerate(self.instructions):
+            if isinstance(instruction, Jump) and instruction.instruction_offset < ip:
+                self.fuse_loop(instruction.instruction_offset, ip)
+
+        if not self.replacements:
+            return self.instructions
+
+        return replace_instructions(self.instructions, self.replacements, self.removed)
+
+    def get_step(self, ip: int) -> Optional[int]:
+        # Returns the constant added to the counter, if ip starts `N +` or `N -`
+        push, operation = self.instructions[ip : ip + 2]
+
+        if (
+            isinstance(push, PushInt)
+            and type(operation) in STEP_SIGNS
+            and ip + 1 not in self.jump_targets
+        ):
+            return push.value * STEP_SIGNS[type(operation)]
+        return None
+
+    def fuse_loop(self, header: int, back_edge: int) -> None:
+        if back_edge - header < 4:
+            return
+
+        dup, bound, comparison, exit_jump = self.instructions[header : header + 4]
+        body = header + 4
+
+        if not (
+            type(dup) is Dup
+            and isinstance(bound, (PushArgument, PushInt))
+            and type(comparison) in COMPARISON_OPERATORS
+            and isinstance(exit_jump, JumpIfNot)
+            and exit_jump.instruction_offset == back_edge + 1
+            and not self.jump_targets & {header + 1, header + 2, header + 3}
+        ):
+            return
+
+        condition: Dict[str, Any] = {
+            "comparison": COMPARISON_OPERATORS[type(comparison)],
+            "bound": bound.value if isinstance(bound, PushInt) else 0,
+            "bound_arg_index": (
+                bound.arg_index if isinstance(bound, PushArgument) else None
+            ),
+        }
+
+        increment = 0
+        tail = back_edge - 2
+        step = self.get_step(tail) if tail >= body else None
+
+        if step is not None and back_edge not in self.jump_targets:
+            self.replacements[tail] = CountedLoopStep(
+                step=step, instruction_offset=body, **condition
+            )
+            self.removed |= {tail + 1, back_edge}
+
+        elif body not in self.jump_targets and body + 1 < back_edge:
+            increment = self.get_step(body) or 0
+
+            if increment:
+                self.removed |= {body, body + 1}
+
+        self.replacements[header] = CountedLoop(
+            increment=increment, instruction_offset=back_edge + 1, **condition
+        )
+        self.removed |= {header + 1, header + 2, header + 3}
+
+
+def fuse_counted_loops(instructions: List[Instruction]) -> List[Instruction]:
+    return CountedLoopFuser(instructions).fuse()
@@ -0,0 +1,78 @@
+from enum import IntEnum, auto
+from typing import Any, Dict, List, Tuple
+
+from lang.models.typing.var_type import VariableType
+
+# A code image is a linked image lowered to opcodes and operands, which is what the
+# image VM runs and what `aaa.py build` saves. Nothing in it refers to the parse tree,
+# so running one doesn't need the parser or type checker.
+
+
+class Opcode(IntEnum):
+    # Saved images store these numbers, so new opcodes go last
+    PUSH = auto()
+    PUSH_ARGUMENT = auto()
+    CALL = auto()
+    RETURN = auto()
+    JUMP = auto()
+    JUMP_IF_NOT = auto()
+    COUNTED_LOOP = auto()
+    COUNTED_LOOP_STEP = auto()
+    BINARY_OPERATION = auto()
+    CONSTANT_OPERATION = auto()
+    ARGUMENT_OPERATION = auto()
+    DIVIDE = auto()
+    MODULO = auto()
+    NOT = auto()
+    DROP = auto()
+    DUP = auto()
+    SWAP = auto()
+    OVER = auto()
+    ROT = auto()
+    PRINT = auto()
+    NOP = auto()
+    ASSERT = auto()
+    PUSH_VEC = auto()
+    PUSH_MAP = auto()
+    PUSH_STRUCT = auto()
+    GET_STRUCT_FIELD = auto()
+    SET_STRUCT_FIELD = auto()
+    STANDARD_LIBRARY_CALL = auto()
+
+
+class FunctionTableEntry:
+    # Where a function starts in an image, and what error messages need to know
+    __slots__ = ("name", "file", "address", "argument_names")
+
+    def __init__(
+        self, name: str, file: str, address: int, argument_names: List[str]
+    ) -> None:
+        self.name = name
+        self.file = file
+        self.address = address
+        self.argument_names = argument_names
+
+
+class StructLayout:
+    # Operand of PUSH_STRUCT, the field types are used to get zero values
+    __slots__ = ("name", "fields")
+
+    def __init__(self, name: str, fields: Dict[str, VariableType]) -> None:
+        self.name = name
+        self.fields = fields
+
+
+class CodeImage:
+    # Operands of an instruction, in the order they're listed in lang.linker.assemble.
+    # The entry point is the function at index 0 of the function table.
+    __slots__ = ("opcodes", "operands", "functions")
+
+    def __init__(
+        self,
+        opcodes: List[Opcode],
+        operands: List[Tuple[Any, ...]],
+        functions: List[FunctionTableEntry],
+    ) -> None:
+        self.opcodes = opcodes
+        self.operands = operands
+        self.functions = functions
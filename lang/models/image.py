@@ -0,0 +1,33 @@
+from typing import List
+
+from lang.models.code_image import FunctionTableEntry
+from lang.models.instructions import Instruction
+
+# A linked image holds the instructions of all functions of a program in one flat
+# list, see lang.linker. Jumps in it use absolute addresses, calls jump to the first
+# instruction of a function and returns jump back to the address after the call.
+
+
+class CallAddress(Instruction):
+    # function_index is the index in the function table of the called function
+    function_index: int
+    address: int
+    return_address: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}({self.address})"
+
+
+class Return(Instruction):
+    ...
+
+
+class LinkedImage:
+    # The entry point is the function at index 0 of the function table
+    __slots__ = ("instructions", "functions")
+
+    def __init__(
+        self, instructions: List[Instruction], functions: List[FunctionTableEntry]
+    ) -> None:
+        self.instructions = instructions
+        self.functions = functions
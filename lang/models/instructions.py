@@ -1,66 +1,11 @@
-from enum import Enum
 from pathlib import Path
+from typing import Dict, Optional, Type
 
 from lang.models import AaaModel
 from lang.models.parse import Struct
 from lang.models.typing.var_type import VariableType
 
 
-class StandardLibraryCallKind(Enum):
-    ENVIRON = "ENVIRON"
-    GETENV = "GETENV"
-    MAP_CLEAR = "MAP_CLEAR"
-    MAP_COPY = "MAP_COPY"
-    MAP_DROP = "MAP_DROP"
-    MAP_EMPTY = "MAP_EMPTY"
-    MAP_GET = "MAP_GET"
-    MAP_HAS_KEY = "MAP_HAS_KEY"
-    MAP_KEYS = "MAP_KEYS"
-    MAP_POP = "MAP_POP"
-    MAP_SET = "MAP_SET"
-    MAP_SIZE = "MAP_SIZE"
-    MAP_VALUES = "MAP_VALUES"
-    SETENV = "SETENV"
-    STR_APPEND = "STR_APPEND"
-    STR_CONTAINS = "STR_CONTAINS"
-    STR_EQUALS = "STR_EQUALS"
-    STR_FIND = "STR_FIND"
-    STR_FIND_AFTER = "STR_FIND_AFTER"
-    STR_JOIN = "STR_JOIN"
-    STR_LEN = "STR_LEN"
-    STR_LOWER = "STR_LOWER"
-    STR_STRIP = "STR_STRIP"
-    STR_SPLIT = "STR_SPLIT"
-    STR_SUBSTR = "STR_SUBSTR"
-    STR_TO_BOOL = "STR_TO_BOOL"
-    STR_TO_INT = "STR_TO_INT"
-    STR_REPLACE = "STR_REPLACE"
-    STR_UPPER = "STR_UPPER"
-    SYSCALL_CHDIR = "SYSCALL_CHDIR"
-    SYSCALL_CLOSE = "SYSCALL_CLOSE"
-    SYSCALL_EXIT = "SYSCALL_EXIT"
-    SYSCALL_EXECVE = "SYSCALL_EXECVE"
-    SYSCALL_FORK = "SYSCALL_FORK"
-    SYSCALL_FSYNC = "SYSCALL_FSYNC"
-    SYSCALL_GETCWD = "SYSCALL_GETCWD"
-    SYSCALL_GETPID = "SYSCALL_GETPID"
-    SYSCALL_GETPPID = "SYSCALL_GETPPID"
-    SYSCALL_OPEN = "SYSCALL_OPEN"
-    SYSCALL_READ = "SYSCALL_READ"
-    SYSCALL_TIME = "SYSCALL_TIME"
-    SYSCALL_WRITE = "SYSCALL_WRITE"
-    SYSCALL_WAITPID = "SYSCALL_WAITPID"
-    UNSETENV = "UNSETENV"
-    VEC_CLEAR = "VEC_CLEAR"
-    VEC_COPY = "VEC_COPY"
-    VEC_EMPTY = "VEC_EMPTY"
-    VEC_GET = "VEC_GET"
-    VEC_POP = "VEC_POP"
-    VEC_PUSH = "VEC_PUSH"
-    VEC_SET = "VEC_SET"
-    VEC_SIZE = "VEC_SIZE"
-
-
 class Instruction(AaaModel):
     ...
 
@@ -175,8 +120,11 @@ class CallFunction(Instruction):
         return f"{type(self).__name__}('{self.func_name}')"
 
 
-class PushFunctionArgument(Instruction):
-    arg_name: str
+class PushArgument(Instruction):
+    arg_index: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}({self.arg_index})"
 
 
 class Jump(Instruction):
@@ -197,6 +145,66 @@ class Nop(Instruction):
     ...
 
 
+class CountedLoop(Instruction):
+    # Condition of a counting loop like `while dup 10 < {`, see lang.loops. Leaves the
+    # loop by jumping to instruction_offset, unless `counter comparison bound` holds
+    # for the counter on top of the stack. Otherwise increment is added to it. The
+    # bound is the argument at bound_arg_index, if that is set.
+    comparison: str
+    bound: int
+    bound_arg_index: Optional[int]
+    increment: int
+    instruction_offset: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        bound = (
+            self.bound if self.bound_arg_index is None else f"a{self.bound_arg_index}"
+        )
+        return (
+            f"{type(self).__name__}({self.comparison} {bound}, "
+            + f"+{self.increment}, exit {self.instruction_offset})"
+        )
+
+
+class CountedLoopStep(Instruction):
+    # End of a counting loop body like `1 + }`. Adds step to the counter on top of the
+    # stack, then jumps back to instruction_offset, the start of the body, if
+    # `counter comparison bound` holds.
+    comparison: str
+    bound: int
+    bound_arg_index: Optional[int]
+    step: int
+    instruction_offset: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        bound = (
+            self.bound if self.bound_arg_index is None else f"a{self.bound_arg_index}"
+        )
+        return (
+            f"{type(self).__name__}(+{self.step}, {self.comparison} {bound}, "
+            + f"body {self.instruction_offset})"
+        )
+
+
+class ConstantOperation(Instruction):
+    # Superinstruction for a PushInt followed by a binary operation, see
+    # lang.superinstructions. operator is the name of the builtin, such as "+".
+    operator: str
+    value: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}({self.operator} {self.value})"
+
+
+class ArgumentOperation(Instruction):
+    # Superinstruction for a PushArgument followed by a binary operation
+    operator: str
+    arg_index: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}({self.operator} a{self.arg_index})"
+
+
 class Assert(Instruction):
     ...
 
@@ -211,7 +219,10 @@ class PushMap(Instruction):
 
 
 class StandardLibraryCall(Instruction):
-    kind: StandardLibraryCallKind
+    name: str
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}('{self.name}')"
 
 
 class PushStruct(Instruction):
@@ -224,3 +235,19 @@ class GetStructField(Instruction):
 
 class SetStructField(Instruction):
     ...
+
+
+# Instructions that pop two values and push one, by the name of their builtin
+BINARY_OPERATORS: Dict[Type[Instruction], str] = {
+    And: "and",
+    Equals: "=",
+    IntGreaterEquals: ">=",
+    IntGreaterThan: ">",
+    IntLessEquals: "<=",
+    IntLessThan: "<",
+    IntNotEqual: "!=",
+    Minus: "-",
+    Multiply: "*",
+    Or: "or",
+    Plus: "+",
+}
@@ -0,0 +1,39 @@
+from typing import Dict, List
+
+from lang.models import AaaModel
+
+# Profiles are recorded by `aaa.py run --profile-out` and saved as JSON. Functions
+# are keyed by their name, prefixed with their file relative to the entry point if
+# it is another one. Branches and loops are numbered in the order they appear in
+# the function, so a profile still applies after small edits elsewhere.
+
+PROFILE_VERSION = 1
+
+
+class BranchProfile(AaaModel):
+    # Conditional jumps, including the condition of counted loops
+    taken: int
+    not_taken: int
+
+
+class LoopProfile(AaaModel):
+    # Jumps back to the start of a loop
+    entries: int
+    iterations: int
+
+
+class FunctionProfile(AaaModel):
+    calls: int
+    branches: List[BranchProfile]
+    loops: List[LoopProfile]
+
+
+class Profile(AaaModel):
+    version: int = PROFILE_VERSION
+    instruction_count: int
+
+    functions: Dict[str, FunctionProfile]
+
+    # How often pairs of instructions ran right after each other, by their names
+    # separated by a space, such as "PushInt Plus"
+    pairs: Dict[str, int]
@@ -0,0 +1,140 @@
+from pathlib import Path
+from typing import List
+
+from lang.models.instructions import Instruction
+from lang.models.parse import Struct
+from lang.models.typing.var_type import VariableType
+
+# Register instructions name the registers they read and write, instead of taking
+# their operands from the stack. Registers are indexes in the register file of a
+# function call, which holds arguments, constants and stack slots.
+
+
+class RegisterInstruction(Instruction):
+    ...
+
+
+class RegisterMove(RegisterInstruction):
+    dest: int
+    source: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}(r{self.dest} <- r{self.source})"
+
+
+class RegisterBinaryOperation(RegisterInstruction):
+    # operator is the name of the builtin function, such as "+" or "<="
+    operator: str
+    dest: int
+    lhs: int
+    rhs: int
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return (
+            f"{type(self).__name__}(r{self.dest} <- "
+            + f"r{self.lhs} {self.operator} r{self.rhs})"
+        )
+
+
+class RegisterCheckedDivision(RegisterInstruction):
+    # operator is "/" or "%", ok_dest is set to false when rhs is zero
+    operator: str
+    dest: int
+    ok_dest: int
+    lhs: int
+    rhs: int
+
+
+class RegisterNot(RegisterInstruction):
+    dest: int
+    source: int
+
+
+class RegisterPrint(RegisterInstruction):
+    source: int
+
+
+class RegisterAssert(RegisterInstruction):
+    source: int
+
+
+class RegisterNewVec(RegisterInstruction):
+    dest: int
+    item_type: VariableType
+
+
+class RegisterNewMap(RegisterInstruction):
+    dest: int
+    key_type: VariableType
+    value_type: VariableType
+
+
+class RegisterNewStruct(RegisterInstruction):
+    dest: int
+    type: Struct
+
+
+class RegisterGetStructField(RegisterInstruction):
+    dest: int
+    struct: int
+    field_name: int
+
+
+class RegisterSetStructField(RegisterInstruction):
+    struct: int
+    field_name: int
+    value: int
+
+
+class RegisterCallFunction(RegisterInstruction):
+    func_name: str
+    file: Path
+    arguments: List[int]
+
+    # Registers that receive the returned values, in stack order
+    results: List[int]
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}('{self.func_name}')"
+
+
+class RegisterStandardLibraryCall(RegisterInstruction):
+    name: str
+    arguments: List[int]
+    results: List[int]
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"{type(self).__name__}('{self.name}')"
+
+
+class RegisterJump(RegisterInstruction):
+    instruction_offset: int
+
+
+class RegisterJumpIfNot(RegisterInstruction):
+    condition: int
+    instruction_offset: int
+
+
+class RegisterCountedLoop(RegisterInstruction):
+    # Jumps to instruction_offset unless `counter operator bound` holds, otherwise
+    # increment is added to counter. See CountedLoop.
+    operator: str
+    counter: int
+    bound: int
+    increment: int
+    instruction_offset: int
+
+
+class RegisterCountedLoopStep(RegisterInstruction):
+    # Adds step to counter, then jumps to instruction_offset if
+    # `counter operator bound` holds. See CountedLoopStep.
+    operator: str
+    counter: int
+    bound: int
+    step: int
+    instruction_offset: int
+
+
+class RegisterNop(RegisterInstruction):
+    ...
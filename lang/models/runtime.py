@@ -1,13 +1,124 @@
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple
 
-from lang.models import AaaModel
-from lang.models.parse import Function
-from lang.models.typing.var import Variable
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.models.instructions import Instruction
+    from lang.models.parse import Function
 
+DEFAULT_MAX_CALL_DEPTH = 100_000
+DEFAULT_MEMO_SIZE = 1024
 
-class CallStackItem(AaaModel):
-    function: Function
-    source_file: Path
-    instruction_pointer: int
-    argument_values: Dict[str, Variable]
+# Runs one instruction, returns where to jump or None. Handlers are only called with
+# instructions of the type they are dispatched for, so they don't check it.
+Handler = Callable[[Any], Optional[int]]
+
+
+class FunctionRecord:
+    # Everything the simulator needs to call a function, resolved once per function.
+    __slots__ = (
+        "function",
+        "source_file",
+        "argument_count",
+        "opcodes",
+        "instructions",
+        "call_count",
+        "backward_jump_count",
+        "compiled_call",
+    )
+
+    def __init__(
+        self,
+        function: "Function",
+        source_file: Path,
+        opcodes: List[int],
+        instructions: List["Instruction"],
+    ) -> None:
+        self.function = function
+        self.source_file = source_file
+        self.argument_count = len(function.arguments)
+        self.opcodes = opcodes
+        self.instructions = instructions
+
+        # Used by the simulator to find hot functions and run them in a faster tier
+        self.call_count = 0
+        self.backward_jump_count = 0
+        self.compiled_call: Optional[Callable[[], None]] = None
+
+
+class CallStackItem:
+    # These are reused by the simulator, instead of creating one for every call.
+    __slots__ = ("function_record", "instruction_pointer", "argument_values")
+
+    def __init__(
+        self,
+        function_record: FunctionRecord,
+        instruction_pointer: int,
+        argument_values: List[Any],
+    ) -> None:
+        self.function_record = function_record
+        self.instruction_pointer = instruction_pointer
+
+        # Values of type int, bool and str are stored unboxed
+        self.argument_values = argument_values
+
+
+class RegisterFunctionRecord(FunctionRecord):
+    # A function translated to register instructions, see lang.runtime.register_vm
+    __slots__ = ("registers", "slot_base", "return_count", "stack_dispatch_counts")
+
+    def __init__(
+        self,
+        function: "Function",
+        source_file: Path,
+        opcodes: List[int],
+        instructions: List["Instruction"],
+        registers: List[Any],
+        slot_base: int,
+        stack_dispatch_counts: List[int],
+    ) -> None:
+        super().__init__(function, source_file, opcodes, instructions)
+
+        # Initial register file of a call, constants are already loaded
+        self.registers = registers
+
+        # Stack slot i is in register slot_base + i when the function returns
+        self.slot_base = slot_base
+        self.return_count = len(function.return_types)
+
+        # Number of stack instructions each register instruction replaces, the last
+        # one is for returning from the function
+        self.stack_dispatch_counts = stack_dispatch_counts
+
+
+class MemoCache:
+    # Bounded least recently used cache of the results of a pure function, keyed by
+    # its argument values. See lang.purity for which functions get one.
+    __slots__ = ("function", "max_size", "results", "hits", "misses", "evictions")
+
+    def __init__(self, function: "Function", max_size: int) -> None:
+        self.function = function
+        self.max_size = max_size
+        self.results: OrderedDict[Tuple[Any, ...], List[Any]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, arguments: Tuple[Any, ...]) -> Optional[List[Any]]:
+        try:
+            results = self.results[arguments]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.results.move_to_end(arguments)
+        self.hits += 1
+        return results
+
+    def put(self, arguments: Tuple[Any, ...], results: List[Any]) -> None:
+        self.results[arguments] = results
+
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,148 @@
+from typing import List, Optional
+
+from lang.models.instructions import Instruction
+
+# SSA form of a function, built from its instructions by lang.ssa. Stack slots
+# become values that are defined once, and the stack contents at the start of a
+# basic block become the parameters of that block.
+
+
+class Value:
+    __slots__ = ("number", "operation", "block", "replacement", "live")
+
+    def __init__(
+        self,
+        number: int,
+        operation: Optional["Operation"] = None,
+        block: Optional["Block"] = None,
+    ) -> None:
+        self.number = number
+
+        # Exactly one of these is set: values are results of an operation or
+        # parameters of a block.
+        self.operation = operation
+        self.block = block
+
+        # Set by optimization passes when this value always equals another one
+        self.replacement: Optional[Value] = None
+
+        # Set by dead value elimination
+        self.live = True
+
+    def resolve(self) -> "Value":
+        value = self
+        while value.replacement is not None:
+            value = value.replacement
+        return value
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"v{self.number}"
+
+
+class Operation:
+    __slots__ = ("instruction", "ip", "operands", "results", "removed")
+
+    def __init__(
+        self, instruction: Instruction, ip: int, operands: List[Value]
+    ) -> None:
+        self.instruction = instruction
+
+        # Offset of the instruction this operation was built from
+        self.ip = ip
+
+        self.operands = operands
+
+        # Values pushed by the instruction in stack order. Struct field instructions
+        # leave the struct on the stack, so their first result is their operand.
+        self.results: List[Value] = []
+
+        # Set when an optimization pass found the operation is not needed
+        self.removed = False
+
+    def __repr__(self) -> str:  # pragma: nocover
+        results = ", ".join(map(repr, self.results))
+        operands = ", ".join(repr(operand.resolve()) for operand in self.operands)
+        return f"{results} = {self.instruction!r}({operands})"
+
+
+class Terminator:
+    # Values on the stack when leaving a block, in stack order
+    arguments: List[Value]
+
+
+class Goto(Terminator):
+    def __init__(self, target: "Block", arguments: List[Value]) -> None:
+        self.target = target
+        self.arguments = arguments
+
+
+class GotoUnless(Terminator):
+    # Continues in the next block, unless the condition is false
+    def __init__(
+        self,
+        condition: Value,
+        target: "Block",
+        fallthrough: "Block",
+        arguments: List[Value],
+    ) -> None:
+        self.condition = condition
+        self.target = target
+        self.fallthrough = fallthrough
+        self.arguments = arguments
+
+
+class Return(Terminator):
+    def __init__(self, arguments: List[Value]) -> None:
+        self.arguments = arguments
+
+
+class Block:
+    __slots__ = (
+        "start",
+        "end",
+        "params",
+        "operations",
+        "terminator",
+        "predecessors",
+        "group",
+        "dominator",
+    )
+
+    def __init__(self, start: int, end: int) -> None:
+        # Offsets of the instructions in this block, the last one may be a jump
+        self.start = start
+        self.end = end
+
+        self.params: List[Value] = []
+        self.operations: List[Operation] = []
+        self.terminator: Terminator = Return([])
+        self.predecessors: List[Block] = []
+
+        # Blocks that are entered with the same stack, because they are both
+        # successors of a conditional jump. This list is shared by all of them.
+        self.group: List[Block] = [self]
+
+        # Immediate dominator, None for the entry block
+        self.dominator: Optional[Block] = None
+
+    def successors(self) -> List["Block"]:
+        terminator = self.terminator
+
+        if isinstance(terminator, Goto):
+            return [terminator.target]
+        if isinstance(terminator, GotoUnless):
+            return [terminator.fallthrough, terminator.target]
+        return []
+
+    def __repr__(self) -> str:  # pragma: nocover
+        return f"Block({self.start}..{self.end})"
+
+
+class SSAFunction:
+    def __init__(self, blocks: List[Block], value_count: int) -> None:
+        # Blocks in the order of the instructions, the first one is the entry
+        self.blocks = blocks
+        self.value_count = value_count
+
+    def operations(self) -> List[Operation]:
+        return [operation for block in self.blocks for operation in block.operations]
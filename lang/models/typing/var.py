@@ -1,13 +1,24 @@
-from typing import Any, Dict, List
+from array import array
+from copy import copy
+from typing import TYPE_CHECKING, Any, Dict, Iterable
 
 from lang.models import AaaModel
 from lang.models.typing.var_type import Bool, Int, RootType, Str, VariableType
 
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.models.parse import Struct
+
+UNBOXED_ROOT_TYPES = {RootType.BOOL, RootType.INTEGER, RootType.STRING}
+
 
 class Variable(AaaModel):
     type: VariableType
     value: Any
 
+    # Copies of vectors and maps share their value until either side changes it, see
+    # copy_var and owned_value.
+    shared: bool = False
+
     @classmethod
     def zero_value(cls, type: VariableType) -> "Variable":
         zero_val: Any
@@ -19,7 +30,7 @@ class Variable(AaaModel):
         elif type.root_type == RootType.STRING:
             zero_val = ""
         elif type.root_type == RootType.VECTOR:
-            zero_val = []
+            zero_val = vec_storage(type.type_params[0])
         elif type.root_type in [RootType.MAPPING, RootType.STRUCT]:
             zero_val = {}
         elif type.root_type == RootType.PLACEHOLDER:  # pragma: nocover
@@ -46,13 +57,14 @@ class Variable(AaaModel):
             return str(self.value).lower()
 
         elif root_type == RootType.VECTOR:
-            return "[" + ", ".join(repr(item) for item in self.value) + "]"
+            return "[" + ", ".join(repr(box(item)) for item in vec_items(self)) + "]"
 
         elif root_type == RootType.MAPPING:
             return (
                 "{"
                 + ", ".join(
-                    repr(key) + ": " + repr(value) for key, value in self.value.items()
+                    repr(box(key)) + ": " + repr(box(value))
+                    for key, value in self.value.items()
                 )
                 + "}"
             )
@@ -84,6 +96,9 @@ class Variable(AaaModel):
         if not isinstance(other, Variable):
             return False  # pragma: nocover
 
+        if self.root_type() == RootType.VECTOR:
+            return list(vec_items(self)) == list(vec_items(other))
+
         return self.value == other.value  # type: ignore
 
 
@@ -99,24 +114,141 @@ def bool_var(value: bool) -> Variable:
     return Variable(type=Bool, value=value)
 
 
-def vec_var(
-    item_type: VariableType,
-    value: List[Variable],
-) -> Variable:
+def box(value: Any) -> Variable:
+    # The stack holds int, bool and str values unboxed. Containers and structs stay
+    # Variables, they need their type for printing.
+    if isinstance(value, Variable):
+        return value
+    elif isinstance(value, bool):
+        return bool_var(value)
+    elif isinstance(value, int):
+        return int_var(value)
+    elif isinstance(value, str):
+        return str_var(value)
+    else:  # pragma: nocover
+        assert False
+
+
+def unbox(var: Variable) -> Any:
+    if var.type.root_type in UNBOXED_ROOT_TYPES:
+        return var.value
+
+    return var
+
+
+def vec_storage(item_type: VariableType, items: Iterable[Any] = ()) -> Any:
+    # Items of type int, bool and str are stored unboxed: ints in an array of 64 bit
+    # ints, bools in a bytearray and strings in a list. Ints that don't fit make the
+    # array a list, see lang.runtime.stdlib. Other items are Variables in a list.
+    # Vectors created in generic functions store unboxed items in a list too.
+    if item_type.root_type == RootType.INTEGER:
+        items = list(items)
+        try:
+            return array("q", items)
+        except OverflowError:
+            return items
+    elif item_type.root_type == RootType.BOOL:
+        return bytearray(items)
+
+    return list(items)
+
+
+def vec_items(vec: Variable) -> Iterable[Any]:
+    # Items of a vector as they are on the stack
+    if isinstance(vec.value, bytearray):
+        return map(bool, vec.value)
+
+    return vec.value  # type: ignore
+
+
+def vec_var(item_type: VariableType, value: Iterable[Any] = ()) -> Variable:
     return Variable(
         type=VariableType(root_type=RootType.VECTOR, type_params=[item_type]),
-        value=value,
+        value=vec_storage(item_type, value),
     )
 
 
 def map_var(
     key_type: VariableType,
     value_type: VariableType,
-    value: Dict[Variable, Variable],
+    value: Dict[Any, Any],
 ) -> Variable:
+    # Keys and values are stored as they are on the stack: int, bool and str unboxed,
+    # the VariableType keeps their types.
     return Variable(
         type=VariableType(
             name="map", root_type=RootType.MAPPING, type_params=[key_type, value_type]
         ),
         value=value,
     )
+
+
+def struct_var(name: str, value: Dict[str, Variable]) -> Variable:
+    return Variable(
+        type=VariableType(root_type=RootType.STRUCT, type_params=[], name=name),
+        value=value,
+    )
+
+
+def copy_var(var: Any) -> Any:
+    # Copies are values: changing a copy, or anything in it, doesn't change the
+    # original. Vectors and maps of int, bool or str share their value with the copy,
+    # which is copied once either side changes it. Other items are copied one level
+    # deep, which shares what is in them.
+    if not isinstance(var, Variable):
+        return var  # Unboxed vector item or map value
+
+    root_type = var.type.root_type
+
+    if root_type in (RootType.VECTOR, RootType.MAPPING):
+        # Arrays and bytearrays only hold unboxed items, see vec_storage
+        unboxed_items = var.type.type_params[-1].root_type in UNBOXED_ROOT_TYPES
+        unboxed_items |= not isinstance(var.value, (list, dict))
+
+        if unboxed_items:
+            var.shared = True
+            return Variable.construct(type=var.type, value=var.value, shared=True)
+        elif root_type == RootType.VECTOR:
+            value: Any = [copy_var(item) for item in var.value]
+        else:
+            value = {key: copy_var(item) for key, item in var.value.items()}
+
+        return Variable.construct(type=var.type, value=value, shared=False)
+
+    elif root_type == RootType.STRUCT:
+        struct_fields = {
+            field_name: copy_var(field) for field_name, field in var.value.items()
+        }
+        return struct_var(var.type.name, struct_fields)
+
+    # Boxed int, bool and str values are replaced but never changed
+    return var
+
+
+def owned_value(var: Variable) -> Any:
+    # Value of a vector or map that only this variable uses, so it can be changed
+    if var.shared:
+        var.value = copy(var.value)
+        var.shared = False
+
+    return var.value
+
+
+def clear_value(var: Variable) -> None:
+    # A shared value is left to the other copies instead of being copied first
+    if var.shared:
+        var.value = {} if isinstance(var.value, dict) else var.value[:0]
+        var.shared = False
+    elif isinstance(var.value, dict):
+        var.value.clear()
+    else:
+        del var.value[:]  # Arrays have no clear()
+
+
+def zero_struct_var(struct: "Struct") -> Variable:
+    struct_fields = {
+        field_name: Variable.zero_value(var_type)
+        for field_name, var_type in struct.fields.items()
+    }
+
+    return struct_var(struct.name, struct_fields)
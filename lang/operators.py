@@ -0,0 +1,19 @@
+import operator
+from typing import Any, Callable, Dict
+
+BINARY_OPERATIONS: Dict[str, Callable[[Any, Any], Any]] = {
+    "and": lambda x, y: x and y,
+    "=": operator.eq,
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "!=": operator.ne,
+    "-": operator.sub,
+    "*": operator.mul,
+    "or": lambda x, y: x or y,
+    "+": operator.add,
+}
+
+# Binary operators with an int result, the other ones result in a bool
+INT_OPERATORS = {"+", "-", "*"}
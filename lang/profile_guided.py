@@ -0,0 +1,242 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple
+
+from lang.constant_calls import evaluate_constant_calls
+from lang.instruction_generator import InstructionGenerator
+from lang.loops import JUMP_INSTRUCTIONS
+from lang.models.instructions import (
+    Assert,
+    CallFunction,
+    Instruction,
+    Jump,
+    JumpIfNot,
+)
+from lang.models.parse import Function
+from lang.models.profile import FunctionProfile, Profile
+from lang.purity import FunctionKey
+from lang.runtime.profiler import CONDITIONAL_JUMPS, get_function_key
+from lang.superinstructions import SUPERINSTRUCTION_PAIRS, fuse_superinstructions
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# Functions get inlined if they take at least this share of all calls
+HOT_CALL_SHARE = 0.01
+
+# Superinstructions are used for pairs that take at least this share of all
+# instructions that ran
+HOT_PAIR_SHARE = 0.01
+
+# Only functions with at most this many instructions get inlined
+MAX_INLINED_SIZE = 16
+
+# Inlined functions run straight through, see lang.ssa.inline_calls
+NOT_INLINED_INSTRUCTIONS = (Assert, CallFunction, Jump, JumpIfNot)
+
+# Offset in the original instructions, moved instructions keep theirs
+OffsetInstruction = Tuple[int, Instruction]
+
+# Offset of jumps added when moving instructions, nothing jumps to those
+NEW_OFFSET = -1
+
+
+class ProfileGuidedOptimizer:
+    # Uses a profile recorded by `aaa.py run --profile-out` to optimize the program:
+    # hot small functions are inlined, pairs of instructions that run often become
+    # superinstructions and else-branches that rarely run are moved out of the way.
+    # This regenerates instructions, so it runs before monomorphizing.
+
+    def __init__(self, program: "Program", profile: Profile) -> None:
+        self.program = program
+        self.profile = profile
+
+    def optimize(self) -> None:
+        inlined = self.get_inlined_functions()
+
+        if inlined:
+            for file, func_name, function in self.get_functions():
+                self.program.function_instructions[file][
+                    func_name
+                ] = self.program.generate_instructions(file, function, inlined)
+
+            if self.program.fold_constant_calls:
+                evaluate_constant_calls(self.program)
+
+        pairs = self.get_superinstruction_pairs()
+
+        for file, file_instructions in self.program.function_instructions.items():
+            for func_name, instructions in file_instructions.items():
+                instructions = fuse_superinstructions(instructions, pairs)
+                file_instructions[func_name] = self.layout_branches(
+                    file, func_name, instructions
+                )
+
+    def get_functions(self) -> Iterator[Tuple[Path, str, Function]]:
+        for file, file_instructions in self.program.function_instructions.items():
+            for func_name in file_instructions:
+                function = self.program.get_identifier(file, func_name)
+                assert isinstance(function, Function)
+                yield file, func_name, function
+
+    def get_function_profile(
+        self, file: Path, func_name: str
+    ) -> Optional[FunctionProfile]:
+        key = get_function_key(self.program, file, func_name)
+        return self.profile.functions.get(key)
+
+    def get_inlined_functions(self) -> Dict[FunctionKey, List[Instruction]]:
+        total_calls = sum(
+            function_profile.calls
+            for function_profile in self.profile.functions.values()
+        )
+        inlined: Dict[FunctionKey, List[Instruction]] = {}
+
+        for file, func_name, function in self.get_functions():
+            function_profile = self.get_function_profile(file, func_name)
+
+            if (
+                function_profile is None
+                or not function_profile.calls
+                or function_profile.calls < HOT_CALL_SHARE * total_calls
+            ):
+                continue
+
+            instructions = InstructionGenerator(
+                file, function, self.program
+            ).generate_instructions()
+
+            if len(instructions) <= MAX_INLINED_SIZE and not any(
+                isinstance(instruction, NOT_INLINED_INSTRUCTIONS)
+                for instruction in instructions
+            ):
+                inlined[(file, func_name)] = instructions
+
+        return inlined
+
+    def get_superinstruction_pairs(self) -> Set[str]:
+        return {
+            pair_name
+            for pair_name, count in self.profile.pairs.items()
+            if pair_name in SUPERINSTRUCTION_PAIRS
+            and count >= HOT_PAIR_SHARE * self.profile.instruction_count
+        }
+
+    def layout_branches(
+        self, file: Path, func_name: str, instructions: List[Instruction]
+    ) -> List[Instruction]:
+        function_profile = self.get_function_profile(file, func_name)
+        if function_profile is None:
+            return instructions
+
+        branches = [
+            ip
+            for ip, instruction in enumerate(instructions)
+            if isinstance(instruction, CONDITIONAL_JUMPS)
+        ]
+
+        # The function changed too much since the profile was recorded
+        if len(branches) != len(function_profile.branches):
+            return instructions
+
+        hot_branches = {
+            ip
+            for ip, branch in zip(branches, function_profile.branches)
+            if isinstance(instructions[ip], JumpIfNot)
+            and branch.not_taken > branch.taken
+        }
+
+        return move_cold_blocks(instructions, hot_branches)
+
+
+def get_jump_targets(
+    instructions: List[OffsetInstruction],
+) -> Iterator[Tuple[int, int]]:
+    # Yields offsets of jumps and their targets
+    for offset, instruction in instructions:
+        if isinstance(instruction, JUMP_INSTRUCTIONS):
+            yield offset, instruction.instruction_offset
+
+
+def move_cold_blocks(
+    instructions: List[Instruction], hot_branches: Set[int]
+) -> List[Instruction]:
+    # An if-else runs its if-branch without jumping, but then jumps over its
+    # else-branch. For if-branches that run more often, the else-branch is moved to
+    # the end of the function and jumps back when done, so the hot path falls
+    # through. The ip of hot_branches are those of the JumpIfNot of such branches.
+    end = len(instructions)
+    body: List[OffsetInstruction] = list(enumerate(instructions))
+    cold: List[OffsetInstruction] = []
+
+    # Targets of removed jumps at the end of if-branches, by their offset
+    removed_jumps: Dict[int, int] = {}
+
+    # Inner branches come later, moving them first keeps outer ones contiguous
+    for ip in sorted(hot_branches, reverse=True):
+        branch = instructions[ip]
+        assert isinstance(branch, JumpIfNot)
+
+        else_start = branch.instruction_offset
+        jump_over = instructions[else_start - 1]
+
+        if not (
+            isinstance(jump_over, Jump)
+            and ip < else_start - 1
+            and jump_over.instruction_offset > else_start
+        ):
+            continue
+
+        else_end = jump_over.instruction_offset
+        offsets = [offset for offset, _ in body] + [end]
+
+        if else_start not in offsets or else_end not in offsets:
+            continue
+
+        start = offsets.index(else_start)
+        stop = offsets.index(else_end)
+        else_block = body[start:stop]
+
+        if not else_block or body[start - 1][0] != else_start - 1:
+            continue
+
+        # Only the JumpIfNot can jump into the else-branch
+        else_offsets = {offset for offset, _ in else_block}
+        outside = body[: start - 1] + body[stop:] + cold
+        if any(
+            target in else_offsets and target != else_start
+            for _, target in get_jump_targets(outside)
+        ):
+            continue
+
+        cold += else_block
+        if not isinstance(else_block[-1][1], Jump):
+            cold.append((NEW_OFFSET, Jump(instruction_offset=else_end)))
+
+        removed_jumps[else_start - 1] = else_end
+        body = body[: start - 1] + body[stop:]
+
+    if not cold:
+        return instructions
+
+    if not body or not isinstance(body[-1][1], Jump):
+        body.append((NEW_OFFSET, Jump(instruction_offset=end)))
+
+    moved = body + cold
+    new_offsets = {offset: ip for ip, (offset, _) in enumerate(moved) if offset >= 0}
+    new_offsets[end] = len(moved)
+
+    def get_new_offset(offset: int) -> int:
+        while offset in removed_jumps:
+            offset = removed_jumps[offset]
+        return new_offsets[offset]
+
+    return [
+        instruction.copy(
+            update={
+                "instruction_offset": get_new_offset(instruction.instruction_offset)
+            }
+        )
+        if isinstance(instruction, JUMP_INSTRUCTIONS)
+        else instruction
+        for _, instruction in moved
+    ]
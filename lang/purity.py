@@ -0,0 +1,114 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+
+from lang.models.instructions import (
+    CallFunction,
+    Instruction,
+    Print,
+    SetStructField,
+    StandardLibraryCall,
+)
+from lang.models.parse import Function
+from lang.models.typing.var import UNBOXED_ROOT_TYPES
+from lang.runtime.stdlib import get_generic_name
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+FunctionKey = Tuple[Path, str]
+
+# Standard library functions without side effects other than modifying a container
+# they get as argument. All other ones are syscalls or access the environment.
+PURE_STDLIB_PREFIXES = ("map:", "str:", "vec:")
+
+MUTATING_STDLIB_FUNCTIONS = {
+    "map:clear",
+    "map:drop",
+    "map:pop",
+    "map:set",
+    "vec:clear",
+    "vec:pop",
+    "vec:push",
+    "vec:set",
+}
+
+
+def has_side_effects(function: Function, instructions: List[Instruction]) -> bool:
+    # Without arguments of other types, every container a function can modify was
+    # created by the function itself or returned by one of its callees.
+    mutates_arguments = any(
+        argument.type.root_type not in UNBOXED_ROOT_TYPES
+        for argument in function.arguments
+    )
+
+    for instruction in instructions:
+        if isinstance(instruction, Print):
+            return True
+
+        if isinstance(instruction, SetStructField) and mutates_arguments:
+            return True
+
+        if isinstance(instruction, StandardLibraryCall):
+            name = get_generic_name(instruction.name)
+
+            if not name.startswith(PURE_STDLIB_PREFIXES):
+                return True
+
+            if name in MUTATING_STDLIB_FUNCTIONS and mutates_arguments:
+                return True
+
+    return False
+
+
+def find_pure_functions(program: "Program") -> Set[FunctionKey]:
+    # A function is pure if it has no side effects and only calls pure functions.
+    # Starting from all functions, this removes impure ones until nothing changes,
+    # so (mutually) recursive functions can be pure.
+    functions: Dict[FunctionKey, Function] = {}
+    callees: Dict[FunctionKey, Set[FunctionKey]] = {}
+    pure: Set[FunctionKey] = set()
+
+    for file, file_instructions in program.function_instructions.items():
+        for func_name, instructions in file_instructions.items():
+            function = program.get_identifier(file, func_name)
+            assert isinstance(function, Function)
+
+            key = (file, func_name)
+            functions[key] = function
+            callees[key] = {
+                (instruction.file, instruction.func_name)
+                for instruction in instructions
+                if isinstance(instruction, CallFunction)
+            }
+
+            if not has_side_effects(function, instructions):
+                pure.add(key)
+
+    changed = True
+    while changed:
+        changed = False
+
+        for key in list(pure):
+            if not callees[key] <= pure:
+                pure.remove(key)
+                changed = True
+
+    return pure
+
+
+def find_memoizable_functions(program: "Program") -> Set[FunctionKey]:
+    # Results of pure functions can be cached, if their arguments can be hashed and
+    # their results can't be modified by the caller.
+    memoizable: Set[FunctionKey] = set()
+
+    for key in find_pure_functions(program):
+        function = program.get_identifier(*key)
+        assert isinstance(function, Function)
+
+        types = [argument.type for argument in function.arguments]
+        types += function.return_types
+
+        if all(var_type.root_type in UNBOXED_ROOT_TYPES for var_type in types):
+            memoizable.add(key)
+
+    return memoizable
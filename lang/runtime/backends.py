@@ -0,0 +1,47 @@
+from typing import Callable, Dict, Protocol
+
+from lang.linker import Linker, assemble
+from lang.models.runtime import DEFAULT_MAX_CALL_DEPTH
+from lang.runtime.closure_backend import ClosureBackend
+from lang.runtime.image_vm import ImageVM
+from lang.runtime.native import NativeBackend
+from lang.runtime.program import Program
+from lang.runtime.register_vm import ParanoidRegisterVM, RegisterVM
+from lang.runtime.simulator import ParanoidSimulator, Simulator
+from lang.runtime.transpiler import TranspilerBackend
+
+
+class Backend(Protocol):
+    def run(self, raise_: bool = False) -> None:
+        ...
+
+
+class ImageBackend:
+    # Links the program and runs the image, like `aaa.py build` followed by `exec`
+
+    def __init__(
+        self, program: Program, max_call_depth: int = DEFAULT_MAX_CALL_DEPTH
+    ) -> None:
+        self.image_vm = ImageVM(assemble(Linker(program).link()), max_call_depth)
+
+    def run(self, raise_: bool = False) -> None:
+        self.image_vm.run(raise_)
+
+
+# Maps names as used in `aaa.py run --backend=NAME` to backend constructors.
+BACKENDS: Dict[str, Callable[..., Backend]] = {
+    "simulator": Simulator,
+    "closure": ClosureBackend,
+    "image": ImageBackend,
+    "native": NativeBackend,
+    "register": RegisterVM,
+    "transpiler": TranspilerBackend,
+}
+
+# Backends that check what type checking guarantees, used by `--paranoid`
+PARANOID_BACKENDS: Dict[str, Callable[..., Backend]] = {
+    "simulator": ParanoidSimulator,
+    "register": ParanoidRegisterVM,
+}
+
+DEFAULT_BACKEND = "simulator"
@@ -0,0 +1,21 @@
+import sys
+
+from lang.exceptions import AaaRuntimeException
+
+
+class BaseBackend:
+    # Backends that run main in this process. Runtime errors are printed and end the
+    # process, with raise_ they're raised instead so tests can check them.
+
+    def run(self, raise_: bool = False) -> None:
+        try:
+            self.run_main()
+        except AaaRuntimeException as e:  # pragma: nocover
+            print(e, file=sys.stderr)
+            if raise_:
+                raise e
+            else:
+                exit(1)
+
+    def run_main(self) -> None:  # pragma: nocover
+        raise NotImplementedError
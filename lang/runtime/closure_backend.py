@@ -0,0 +1,753 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Type
+
+from lang.exceptions.runtime import (
+    AaaAssertionFailure,
+    CallStackOverflow,
+    get_stack_trace,
+)
+from lang.loops import COMPARISONS
+from lang.models.instructions import (
+    And,
+    ArgumentOperation,
+    Assert,
+    CallFunction,
+    ConstantOperation,
+    CountedLoop,
+    CountedLoopStep,
+    Divide,
+    Drop,
+    Dup,
+    Equals,
+    GetStructField,
+    Instruction,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Jump,
+    JumpIfNot,
+    Minus,
+    Modulo,
+    Multiply,
+    Nop,
+    Not,
+    Or,
+    Over,
+    Plus,
+    Print,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    Rot,
+    SetStructField,
+    StandardLibraryCall,
+    Swap,
+)
+from lang.models.parse import Function
+from lang.models.runtime import (
+    DEFAULT_MAX_CALL_DEPTH,
+    CallStackItem,
+    FunctionRecord,
+    MemoCache,
+)
+from lang.models.typing.var import (
+    box,
+    map_var,
+    unbox,
+    vec_var,
+    zero_struct_var,
+)
+from lang.operators import BINARY_OPERATIONS
+from lang.runtime.base_backend import BaseBackend
+from lang.runtime.stdlib import STDLIB_FUNCTIONS, get_arg_count
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# An Op executes one instruction and returns the Op to run next, or None when the
+# program is done. The real type is recursive, which mypy doesn't support.
+Op = Callable[[], Any]
+
+
+class CompiledFunction:
+    __slots__ = ("function_record", "ops", "entry")
+
+    def __init__(self, function_record: FunctionRecord) -> None:
+        self.function_record = function_record
+
+        # Set when compilation of the function finishes, ops are indexed like the
+        # instructions of the function.
+        self.ops: List[Op] = []
+        self.entry: Optional[Op] = None
+
+
+class ClosureBackend(BaseBackend):
+    # Compiles every instruction once into a closure with its operands bound.
+    # Each closure returns the next one to run, jump targets are resolved when
+    # compiling, so running a program doesn't need instruction pointers or dispatch.
+
+    def __init__(
+        self,
+        program: "Program",
+        max_call_depth: int = DEFAULT_MAX_CALL_DEPTH,
+        stack: Optional[List[Any]] = None,
+        call_stack: Optional[List[CallStackItem]] = None,
+        memo_caches: Optional[Dict[Tuple[Path, str], MemoCache]] = None,
+    ) -> None:
+        self.program = program
+        self.max_call_depth = max_call_depth
+
+        # Calls to functions with a cache check it first, see lang.purity
+        self.memo_caches = memo_caches or {}
+
+        # The simulator passes its own stacks, when it runs hot functions in this tier.
+        # Values of type int, bool and str are on the stack unboxed.
+        self.stack: List[Any] = [] if stack is None else stack
+        self.call_stack: List[CallStackItem] = [] if call_stack is None else call_stack
+        self.return_ops: List[Op] = []
+
+        self.compiled_functions: Dict[Tuple[Path, str], CompiledFunction] = {}
+
+        self.compile_funcs: Dict[Type[Instruction], Callable[[Instruction, Op], Op]] = {
+            And: self.compile_and,
+            ArgumentOperation: self.compile_argument_operation,
+            Assert: self.compile_assert,
+            CallFunction: self.compile_call_function,
+            ConstantOperation: self.compile_constant_operation,
+            Divide: self.compile_divide,
+            Drop: self.compile_drop,
+            Dup: self.compile_dup,
+            Equals: self.compile_equals,
+            GetStructField: self.compile_get_struct_field,
+            IntGreaterEquals: self.compile_int_greater_equals,
+            IntGreaterThan: self.compile_int_greater_than,
+            IntLessEquals: self.compile_int_less_equals,
+            IntLessThan: self.compile_int_less_than,
+            IntNotEqual: self.compile_int_not_equal,
+            Minus: self.compile_minus,
+            Modulo: self.compile_modulo,
+            Multiply: self.compile_multiply,
+            Not: self.compile_not,
+            Or: self.compile_or,
+            Over: self.compile_over,
+            Plus: self.compile_plus,
+            Print: self.compile_print,
+            PushArgument: self.compile_push_argument,
+            PushBool: self.compile_push_constant,
+            PushInt: self.compile_push_constant,
+            PushMap: self.compile_push_map,
+            PushString: self.compile_push_constant,
+            PushStruct: self.compile_push_struct,
+            PushVec: self.compile_push_vec,
+            Rot: self.compile_rot,
+            SetStructField: self.compile_set_struct_field,
+            StandardLibraryCall: self.compile_standard_library_call,
+            Swap: self.compile_swap,
+        }
+
+        self.op_return = self.compile_return()
+
+    def run_main(self) -> None:
+        self.execute(self.program.entry_point_file, "main")
+
+    def execute(self, file: Path, func_name: str) -> None:
+        self.get_caller(file, func_name)()
+
+    def run_ops(self, op: Optional[Op]) -> None:
+        while op is not None:
+            op = op()
+
+    def get_caller(self, file: Path, func_name: str) -> Callable[[], None]:
+        # Returns a function that calls an Aaa function and runs until it returns.
+        call_op = self.compile_call_function(
+            CallFunction(func_name=func_name, file=file), lambda: None
+        )
+
+        def call() -> None:
+            self.run_ops(call_op)
+
+        return call
+
+    def resume(self, file: Path, func_name: str, ip: int) -> None:
+        # Continues running the function on top of the call stack from instruction
+        # ip, until it returns. This lets the simulator switch tiers mid-function.
+        compiled_function = self.get_compiled_function(file, func_name)
+        self.return_ops.append(lambda: None)
+        self.run_ops(compiled_function.ops[ip])
+
+    def get_compiled_function(self, file: Path, func_name: str) -> CompiledFunction:
+        try:
+            return self.compiled_functions[(file, func_name)]
+        except KeyError:
+            pass
+
+        function = self.program.get_identifier(file, func_name)
+
+        # If this assertion breaks, then Aaa's type checking is broken
+        assert isinstance(function, Function)
+
+        instructions = self.program.get_instructions(file, func_name)
+        function_record = FunctionRecord(function, file, [], instructions)
+
+        # Register before compiling, so (mutually) recursive functions can find it.
+        compiled_function = CompiledFunction(function_record)
+        self.compiled_functions[(file, func_name)] = compiled_function
+
+        compiled_function.ops = self.compile_instructions(instructions)
+        compiled_function.entry = compiled_function.ops[0]
+        return compiled_function
+
+    def compile_instructions(self, instructions: List[Instruction]) -> List[Op]:
+        ops: List[Op] = [self.op_return] * (len(instructions) + 1)
+        jump_resolvers: List[Tuple[Callable[[Op], None], int]] = []
+
+        # Compile back to front, so the next Op is always known
+        for ip in reversed(range(len(instructions))):
+            instruction = instructions[ip]
+            next_op = ops[ip + 1]
+
+            if isinstance(instruction, Nop):
+                op = next_op
+            elif isinstance(instruction, Jump):
+                op, resolve = self.compile_jump()
+                jump_resolvers.append((resolve, instruction.instruction_offset))
+            elif isinstance(instruction, JumpIfNot):
+                op, resolve = self.compile_jump_if_not(next_op)
+                jump_resolvers.append((resolve, instruction.instruction_offset))
+            elif isinstance(instruction, CountedLoop):
+                op, resolve = self.compile_counted_loop(instruction, next_op)
+                jump_resolvers.append((resolve, instruction.instruction_offset))
+            elif isinstance(instruction, CountedLoopStep):
+                op, resolve = self.compile_counted_loop_step(instruction, next_op)
+                jump_resolvers.append((resolve, instruction.instruction_offset))
+            else:
+                op = self.compile_funcs[type(instruction)](instruction, next_op)
+
+            ops[ip] = op
+
+        for resolve, target in jump_resolvers:
+            resolve(ops[target])
+
+        return ops
+
+    def compile_return(self) -> Op:
+        call_stack = self.call_stack
+        return_ops = self.return_ops
+
+        def op() -> Optional[Op]:
+            call_stack.pop()
+            next_op: Op = return_ops.pop()
+            return next_op
+
+        return op
+
+    def compile_jump(self) -> Tuple[Op, Callable[[Op], None]]:
+        target: Optional[Op] = None
+
+        def op() -> Optional[Op]:
+            return target
+
+        def resolve(resolved_target: Op) -> None:
+            nonlocal target
+            target = resolved_target
+
+        return op, resolve
+
+    def compile_jump_if_not(self, next_op: Op) -> Tuple[Op, Callable[[Op], None]]:
+        pop = self.stack.pop
+        target: Optional[Op] = None
+
+        def op() -> Optional[Op]:
+            if pop():
+                return next_op
+            return target
+
+        def resolve(resolved_target: Op) -> None:
+            nonlocal target
+            target = resolved_target
+
+        return op, resolve
+
+    def compile_counted_loop(
+        self, instruction: CountedLoop, next_op: Op
+    ) -> Tuple[Op, Callable[[Op], None]]:
+        stack = self.stack
+        call_stack = self.call_stack
+        compare = COMPARISONS[instruction.comparison]
+        constant_bound = instruction.bound
+        bound_arg_index = instruction.bound_arg_index
+        increment = instruction.increment
+        exit_target: Optional[Op] = None
+
+        def op() -> Optional[Op]:
+            if bound_arg_index is None:
+                bound = constant_bound
+            else:
+                bound = call_stack[-1].argument_values[bound_arg_index]
+
+            if compare(stack[-1], bound):
+                stack[-1] += increment
+                return next_op
+            return exit_target
+
+        def resolve(resolved_target: Op) -> None:
+            nonlocal exit_target
+            exit_target = resolved_target
+
+        return op, resolve
+
+    def compile_counted_loop_step(
+        self, instruction: CountedLoopStep, next_op: Op
+    ) -> Tuple[Op, Callable[[Op], None]]:
+        stack = self.stack
+        call_stack = self.call_stack
+        compare = COMPARISONS[instruction.comparison]
+        constant_bound = instruction.bound
+        bound_arg_index = instruction.bound_arg_index
+        step = instruction.step
+        body_target: Optional[Op] = None
+
+        def op() -> Optional[Op]:
+            if bound_arg_index is None:
+                bound = constant_bound
+            else:
+                bound = call_stack[-1].argument_values[bound_arg_index]
+
+            stack[-1] += step
+            if compare(stack[-1], bound):
+                return body_target
+            return next_op
+
+        def resolve(resolved_target: Op) -> None:
+            nonlocal body_target
+            body_target = resolved_target
+
+        return op, resolve
+
+    def compile_call_function(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, CallFunction)
+        compiled_function = self.get_compiled_function(
+            instruction.file, instruction.func_name
+        )
+
+        function_record = compiled_function.function_record
+        argument_count = function_record.argument_count
+        max_call_depth = self.max_call_depth
+        stack = self.stack
+        call_stack = self.call_stack
+        return_ops = self.return_ops
+
+        def op() -> Optional[Op]:
+            if len(call_stack) >= max_call_depth:
+                raise CallStackOverflow(
+                    max_call_depth=max_call_depth,
+                    function_name=function_record.function.identify(),
+                )
+
+            args_offset = len(stack) - argument_count
+            argument_values = stack[args_offset:]
+            del stack[args_offset:]
+
+            call_stack.append(CallStackItem(function_record, 0, argument_values))
+            return_ops.append(next_op)
+            return compiled_function.entry
+
+        memo_cache = self.memo_caches.get((instruction.file, instruction.func_name))
+        if memo_cache is not None:
+            return self.compile_memoized_call(op, memo_cache, next_op)
+
+        return op
+
+    def compile_memoized_call(
+        self, call_op: Op, memo_cache: MemoCache, next_op: Op
+    ) -> Op:
+        argument_count = len(memo_cache.function.arguments)
+        return_count = len(memo_cache.function.return_types)
+        stack = self.stack
+        return_ops = self.return_ops
+
+        def op() -> Optional[Op]:
+            args_offset = len(stack) - argument_count
+            arguments = tuple(stack[args_offset:])
+            results = memo_cache.get(arguments)
+
+            if results is not None:
+                stack[args_offset:] = results
+                return next_op
+
+            def store_results() -> Optional[Op]:
+                memo_cache.put(arguments, stack[len(stack) - return_count :])
+                return next_op
+
+            entry: Op = call_op()
+
+            # Return to store_results instead of next_op
+            return_ops[-1] = store_results
+            return entry
+
+        return op
+
+    def compile_push_argument(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, PushArgument)
+        arg_index = instruction.arg_index
+        push = self.stack.append
+        call_stack = self.call_stack
+
+        def op() -> Optional[Op]:
+            push(call_stack[-1].argument_values[arg_index])
+            return next_op
+
+        return op
+
+    def compile_push_constant(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, (PushBool, PushInt, PushString))
+        value = instruction.value
+        push = self.stack.append
+
+        def op() -> Optional[Op]:
+            push(value)
+            return next_op
+
+        return op
+
+    def compile_constant_operation(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, ConstantOperation)
+        stack = self.stack
+        operation = BINARY_OPERATIONS[instruction.operator]
+        value = instruction.value
+
+        def op() -> Optional[Op]:
+            stack[-1] = operation(stack[-1], value)
+            return next_op
+
+        return op
+
+    def compile_argument_operation(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, ArgumentOperation)
+        stack = self.stack
+        call_stack = self.call_stack
+        operation = BINARY_OPERATIONS[instruction.operator]
+        arg_index = instruction.arg_index
+
+        def op() -> Optional[Op]:
+            stack[-1] = operation(stack[-1], call_stack[-1].argument_values[arg_index])
+            return next_op
+
+        return op
+
+    def compile_plus(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] += x
+            return next_op
+
+        return op
+
+    def compile_minus(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] -= x
+            return next_op
+
+        return op
+
+    def compile_multiply(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] *= x
+            return next_op
+
+        return op
+
+    def compile_divide(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+        push = stack.append
+
+        def op() -> Optional[Op]:
+            x = pop()
+
+            if x == 0:
+                stack[-1] = 0
+                push(False)
+            else:
+                stack[-1] //= x
+                push(True)
+
+            return next_op
+
+        return op
+
+    def compile_modulo(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+        push = stack.append
+
+        def op() -> Optional[Op]:
+            x = pop()
+
+            if x == 0:
+                stack[-1] = 0
+                push(False)
+            else:
+                stack[-1] %= x
+                push(True)
+
+            return next_op
+
+        return op
+
+    def compile_and(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] and x
+            return next_op
+
+        return op
+
+    def compile_or(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] or x
+            return next_op
+
+        return op
+
+    def compile_not(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+
+        def op() -> Optional[Op]:
+            stack[-1] = not stack[-1]
+            return next_op
+
+        return op
+
+    def compile_equals(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] == x
+            return next_op
+
+        return op
+
+    def compile_int_less_than(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] < x
+            return next_op
+
+        return op
+
+    def compile_int_less_equals(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] <= x
+            return next_op
+
+        return op
+
+    def compile_int_greater_than(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] > x
+            return next_op
+
+        return op
+
+    def compile_int_greater_equals(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] >= x
+            return next_op
+
+        return op
+
+    def compile_int_not_equal(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+            stack[-1] = stack[-1] != x
+            return next_op
+
+        return op
+
+    def compile_drop(self, instruction: Instruction, next_op: Op) -> Op:
+        pop = self.stack.pop
+
+        def op() -> Optional[Op]:
+            pop()
+            return next_op
+
+        return op
+
+    def compile_dup(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        push = stack.append
+
+        def op() -> Optional[Op]:
+            push(stack[-1])
+            return next_op
+
+        return op
+
+    def compile_swap(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+
+        def op() -> Optional[Op]:
+            stack[-2], stack[-1] = stack[-1], stack[-2]
+            return next_op
+
+        return op
+
+    def compile_over(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        push = stack.append
+
+        def op() -> Optional[Op]:
+            push(stack[-2])
+            return next_op
+
+        return op
+
+    def compile_rot(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+
+        def op() -> Optional[Op]:
+            stack[-3], stack[-2], stack[-1] = stack[-2], stack[-1], stack[-3]
+            return next_op
+
+        return op
+
+    def compile_print(self, instruction: Instruction, next_op: Op) -> Op:
+        pop = self.stack.pop
+
+        def op() -> Optional[Op]:
+            x = pop()
+
+            if isinstance(x, bool):
+                x = "true" if x else "false"
+
+            print(x, end="")
+            return next_op
+
+        return op
+
+    def compile_assert(self, instruction: Instruction, next_op: Op) -> Op:
+        pop = self.stack.pop
+        call_stack = self.call_stack
+
+        def op() -> Optional[Op]:
+            if not pop():
+                raise AaaAssertionFailure(get_stack_trace(call_stack))
+            return next_op
+
+        return op
+
+    def compile_push_map(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, PushMap)
+        key_type = instruction.key_type
+        value_type = instruction.value_type
+        push = self.stack.append
+
+        def op() -> Optional[Op]:
+            push(map_var(key_type=key_type, value_type=value_type, value={}))
+            return next_op
+
+        return op
+
+    def compile_push_vec(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, PushVec)
+        item_type = instruction.item_type
+        push = self.stack.append
+
+        def op() -> Optional[Op]:
+            push(vec_var(item_type=item_type, value=[]))
+            return next_op
+
+        return op
+
+    def compile_push_struct(self, instruction: Instruction, next_op: Op) -> Op:
+        assert isinstance(instruction, PushStruct)
+        struct = instruction.type
+        push = self.stack.append
+
+        def op() -> Optional[Op]:
+            push(zero_struct_var(struct))
+            return next_op
+
+        return op
+
+    def compile_get_struct_field(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+
+        def op() -> Optional[Op]:
+            field_name = stack[-1]
+            stack[-1] = unbox(stack[-2].value[field_name])
+            return next_op
+
+        return op
+
+    def compile_set_struct_field(self, instruction: Instruction, next_op: Op) -> Op:
+        stack = self.stack
+        pop = stack.pop
+
+        def op() -> Optional[Op]:
+            new_value = pop()
+            field_name = pop()
+            stack[-1].value[field_name] = box(new_value)
+            return next_op
+
+        return op
+
+    def compile_standard_library_call(
+        self, instruction: Instruction, next_op: Op
+    ) -> Op:
+        assert isinstance(instruction, StandardLibraryCall)
+        stdlib_func = STDLIB_FUNCTIONS[instruction.name]
+        arg_count = get_arg_count(stdlib_func)
+        stack = self.stack
+
+        def op() -> Optional[Op]:
+            args_offset = len(stack) - arg_count
+            stack[args_offset:] = stdlib_func(*stack[args_offset:])
+            return next_op
+
+        return op
@@ -1,5 +1,7 @@
-from typing import Optional
+from typing import Optional, Type
 
+from lang.models.instructions import Instruction
+from lang.models.runtime import Handler
 from lang.models.typing.var import Variable
 from lang.models.typing.var_type import RootType
 
@@ -23,10 +25,22 @@ def format_stack_item(var: Variable) -> str:  # pragma: nocover
         assert False
 
 
-def format_str(string: str, max_length: Optional[int] = None) -> str:  # pragma: nocover
-    string = string.replace("\n", "\\n")
+def format_str(string: str, max_length: Optional[int] = None) -> str:
+    # Escapes characters that would break up a line of output
+    for char, escaped in [("\n", "\\n"), ("\r", "\\r"), ("\t", "\\t")]:
+        string = string.replace(char, escaped)
 
     if max_length is not None and len(string) > max_length:
         string = string[: max_length - 1] + "…"
 
     return string
+
+
+def make_checked_handler(
+    instruction_type: Type[Instruction], handler: Handler
+) -> Handler:
+    def checked_handler(instruction: Instruction) -> Optional[int]:
+        assert isinstance(instruction, instruction_type)
+        return handler(instruction)
+
+    return checked_handler
@@ -0,0 +1,312 @@
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from lang.models.code_image import CodeImage, FunctionTableEntry, Opcode, StructLayout
+from lang.models.typing.var_type import RootType, VariableType
+
+# Images saved by `aaa.py build` start with this, followed by the version
+MAGIC = b"AAAB"
+IMAGE_VERSION = 1
+
+# How the operands of each opcode are saved: "i" is a number, "c" an index in the
+# constant pool, "t" an index in the type table and "l" one in the struct table.
+OPERAND_KINDS: Dict[Opcode, str] = {
+    Opcode.PUSH: "c",
+    Opcode.PUSH_ARGUMENT: "i",
+    Opcode.CALL: "iii",
+    Opcode.JUMP: "i",
+    Opcode.JUMP_IF_NOT: "i",
+    Opcode.COUNTED_LOOP: "cccci",
+    Opcode.COUNTED_LOOP_STEP: "cccci",
+    Opcode.BINARY_OPERATION: "c",
+    Opcode.CONSTANT_OPERATION: "cc",
+    Opcode.ARGUMENT_OPERATION: "ci",
+    Opcode.PUSH_VEC: "t",
+    Opcode.PUSH_MAP: "tt",
+    Opcode.PUSH_STRUCT: "l",
+    Opcode.STANDARD_LIBRARY_CALL: "c",
+}
+
+# Tags of constants in the constant pool
+CONSTANT_NONE = 0
+CONSTANT_FALSE = 1
+CONSTANT_TRUE = 2
+CONSTANT_INT = 3
+CONSTANT_STR = 4
+
+
+class ImageFileError(Exception):
+    ...
+
+
+class ImageWriter:
+    # Saves a code image. Constants, types and struct layouts are stored once in their
+    # own table, instructions and the function table refer to them by index.
+
+    def __init__(self, image: CodeImage) -> None:
+        self.image = image
+        self.constants: Dict[Tuple[type, Any], int] = {}
+        self.constant_data = bytearray()
+        self.types: Dict[Tuple[RootType, str, Tuple[int, ...]], int] = {}
+        self.type_data = bytearray()
+        self.struct_layouts: Dict[int, int] = {}
+        self.struct_data = bytearray()
+
+    def add_constant(self, value: Any) -> int:
+        key = (type(value), value)
+        if key in self.constants:
+            return self.constants[key]
+
+        if value is None:
+            self.constant_data += struct.pack("<B", CONSTANT_NONE)
+        elif isinstance(value, bool):
+            self.constant_data += struct.pack(
+                "<B", CONSTANT_TRUE if value else CONSTANT_FALSE
+            )
+        elif isinstance(value, int):
+            encoded = value.to_bytes(value.bit_length() // 8 + 1, "little", signed=True)
+            self.constant_data += struct.pack("<BI", CONSTANT_INT, len(encoded))
+            self.constant_data += encoded
+        else:
+            assert isinstance(value, str)
+            encoded = value.encode()
+            self.constant_data += struct.pack("<BI", CONSTANT_STR, len(encoded))
+            self.constant_data += encoded
+
+        self.constants[key] = len(self.constants)
+        return self.constants[key]
+
+    def add_type(self, var_type: VariableType) -> int:
+        # Type parameters come before the types that use them
+        type_params = tuple(self.add_type(param) for param in var_type.type_params)
+        key = (var_type.root_type, var_type.name, type_params)
+
+        if key not in self.types:
+            self.type_data += struct.pack(
+                "<BII",
+                var_type.root_type,
+                self.add_constant(var_type.name),
+                len(type_params),
+            )
+            self.type_data += struct.pack(f"<{len(type_params)}I", *type_params)
+            self.types[key] = len(self.types)
+
+        return self.types[key]
+
+    def add_struct_layout(self, struct_layout: StructLayout) -> int:
+        key = id(struct_layout)
+
+        if key not in self.struct_layouts:
+            field_data = bytearray()
+            for field_name, var_type in struct_layout.fields.items():
+                field_data += struct.pack(
+                    "<II", self.add_constant(field_name), self.add_type(var_type)
+                )
+
+            self.struct_data += struct.pack(
+                "<II", self.add_constant(struct_layout.name), len(struct_layout.fields)
+            )
+            self.struct_data += field_data
+            self.struct_layouts[key] = len(self.struct_layouts)
+
+        return self.struct_layouts[key]
+
+    def add_operand(self, kind: str, operand: Any) -> int:
+        if kind == "c":
+            return self.add_constant(operand)
+        elif kind == "t":
+            return self.add_type(operand)
+        elif kind == "l":
+            return self.add_struct_layout(operand)
+        return operand  # type: ignore
+
+    def write(self) -> bytes:
+        code_data = bytearray()
+        for opcode, operands in zip(self.image.opcodes, self.image.operands):
+            kinds = OPERAND_KINDS.get(opcode, "")
+            code_data += struct.pack(
+                f"<B{len(kinds)}I",
+                opcode,
+                *(
+                    self.add_operand(kind, operand)
+                    for kind, operand in zip(kinds, operands)
+                ),
+            )
+
+        function_data = bytearray()
+        for function in self.image.functions:
+            function_data += struct.pack(
+                "<IIII",
+                self.add_constant(function.name),
+                self.add_constant(function.file),
+                function.address,
+                len(function.argument_names),
+            )
+            function_data += struct.pack(
+                f"<{len(function.argument_names)}I",
+                *(self.add_constant(name) for name in function.argument_names),
+            )
+
+        sections = [
+            (len(self.constants), self.constant_data),
+            (len(self.types), self.type_data),
+            (len(self.struct_layouts), self.struct_data),
+            (len(self.image.functions), function_data),
+            (len(self.image.opcodes), code_data),
+        ]
+
+        data = bytearray(MAGIC + struct.pack("<H", IMAGE_VERSION))
+        for count, section_data in sections:
+            data += struct.pack("<I", count) + section_data
+
+        return bytes(data)
+
+
+class ImageReader:
+    # Loads a code image from the bytes of a saved one, in the order they were written
+
+    def __init__(self, data: Any) -> None:
+        self.data = data
+        self.offset = 0
+        self.constants: List[Any] = []
+        self.types: List[VariableType] = []
+        self.struct_layouts: List[StructLayout] = []
+
+    def read(self, format: str) -> Tuple[Any, ...]:
+        values = struct.unpack_from(format, self.data, self.offset)
+        self.offset += struct.calcsize(format)
+        return values
+
+    def read_count(self) -> int:
+        count: int = self.read("<I")[0]
+        return count
+
+    def read_bytes(self, length: int) -> bytes:
+        value = bytes(self.data[self.offset : self.offset + length])
+        if len(value) != length:
+            raise ImageFileError("Image is truncated.")
+
+        self.offset += length
+        return value
+
+    def read_constant(self) -> Any:
+        (tag,) = self.read("<B")
+
+        if tag == CONSTANT_NONE:
+            return None
+        elif tag in (CONSTANT_FALSE, CONSTANT_TRUE):
+            return tag == CONSTANT_TRUE
+
+        encoded = self.read_bytes(self.read_count())
+        if tag == CONSTANT_INT:
+            return int.from_bytes(encoded, "little", signed=True)
+        elif tag == CONSTANT_STR:
+            return encoded.decode()
+
+        raise ImageFileError(f"Image has unknown constant tag {tag}.")
+
+    def read_type(self) -> VariableType:
+        root_type, name, param_count = self.read("<BII")
+        params = self.read(f"<{param_count}I")
+
+        return VariableType(
+            root_type=RootType(root_type),
+            name=self.constants[name],
+            type_params=[self.types[param] for param in params],
+        )
+
+    def read_struct_layout(self) -> StructLayout:
+        name, field_count = self.read("<II")
+        fields: Dict[str, VariableType] = {}
+
+        for _ in range(field_count):
+            field_name, field_type = self.read("<II")
+            fields[self.constants[field_name]] = self.types[field_type]
+
+        return StructLayout(self.constants[name], fields)
+
+    def read_function(self) -> FunctionTableEntry:
+        name, file, address, argument_count = self.read("<IIII")
+        argument_names = self.read(f"<{argument_count}I")
+
+        return FunctionTableEntry(
+            self.constants[name],
+            self.constants[file],
+            address,
+            [self.constants[argument_name] for argument_name in argument_names],
+        )
+
+    def read_image(self) -> CodeImage:
+        magic, version = self.read(f"<{len(MAGIC)}sH")
+        if magic != MAGIC:
+            raise ImageFileError("File is not an Aaa image.")
+        if version != IMAGE_VERSION:
+            raise ImageFileError(f"Image has unsupported version {version}.")
+
+        self.constants = [self.read_constant() for _ in range(self.read_count())]
+
+        # Types refer to the types of their parameters, which are read before them
+        for _ in range(self.read_count()):
+            self.types.append(self.read_type())
+
+        self.struct_layouts = [
+            self.read_struct_layout() for _ in range(self.read_count())
+        ]
+        functions = [self.read_function() for _ in range(self.read_count())]
+
+        operand_formats = {
+            opcode: (kinds, f"<{len(kinds)}I")
+            for opcode in Opcode
+            for kinds in [OPERAND_KINDS.get(opcode, "")]
+        }
+        opcodes: List[Opcode] = []
+        operands: List[Tuple[Any, ...]] = []
+
+        for _ in range(self.read_count()):
+            (raw_opcode,) = self.read("<B")
+
+            try:
+                opcode = Opcode(raw_opcode)
+            except ValueError:
+                raise ImageFileError(f"Image has unknown opcode {raw_opcode}.")
+
+            kinds, operand_format = operand_formats[opcode]
+            opcodes.append(opcode)
+            operands.append(
+                tuple(
+                    self.get_operand(kind, value)
+                    for kind, value in zip(kinds, self.read(operand_format))
+                )
+            )
+
+        return CodeImage(opcodes, operands, functions)
+
+    def get_operand(self, kind: str, value: int) -> Any:
+        if kind == "c":
+            return self.constants[value]
+        elif kind == "t":
+            return self.types[value]
+        elif kind == "l":
+            return self.struct_layouts[value]
+        return value
+
+
+def save_image(image: CodeImage, path: Path) -> None:
+    path.write_bytes(ImageWriter(image).write())
+
+
+def load_image(path: Path) -> CodeImage:
+    # The file is mapped into memory and read once, from start to end
+    with open(path, "rb") as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files can't be mapped
+            raise ImageFileError("File is not an Aaa image.")
+
+    with data:
+        try:
+            return ImageReader(data).read_image()
+        except (struct.error, IndexError, ValueError):
+            raise ImageFileError("Image is truncated or corrupted.")
@@ -0,0 +1,308 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from lang.exceptions.runtime import AaaAssertionFailure, CallStackOverflow
+from lang.models.code_image import CodeImage, FunctionTableEntry, Opcode, StructLayout
+from lang.models.runtime import DEFAULT_MAX_CALL_DEPTH
+from lang.models.typing.var import (
+    Variable,
+    box,
+    map_var,
+    struct_var,
+    unbox,
+    vec_var,
+)
+from lang.models.typing.var_type import VariableType
+from lang.operators import BINARY_OPERATIONS
+from lang.runtime.base_backend import BaseBackend
+from lang.runtime.stdlib import STDLIB_FUNCTIONS, get_arg_count
+
+# This module doesn't import anything that needs the parser, so running a saved
+# image with `aaa.py exec` starts quickly. See lang.runtime.image_file.
+
+# Runs one instruction given its operands, returns where to jump or None
+ImageHandler = Callable[[Tuple[Any, ...]], Optional[int]]
+
+
+class CallFrame:
+    __slots__ = ("function", "argument_values")
+
+    def __init__(
+        self, function: FunctionTableEntry, argument_values: List[Any]
+    ) -> None:
+        self.function = function
+
+        # Values of type int, bool and str are stored unboxed
+        self.argument_values = argument_values
+
+
+class ImageVM(BaseBackend):
+    # Runs a code image, see lang.linker. All instructions are in one list, so the
+    # loop never switches between functions: calls and returns are jumps. Calls push
+    # their return address on a separate stack, which returns pop.
+
+    def __init__(
+        self, image: CodeImage, max_call_depth: int = DEFAULT_MAX_CALL_DEPTH
+    ) -> None:
+        self.image = image
+        self.max_call_depth = max_call_depth
+        self.stack: List[Any] = []
+        self.call_stack: List[CallFrame] = []
+        self.return_addresses: List[int] = []
+
+        self.instruction_funcs: Dict[Opcode, ImageHandler] = {
+            Opcode.ARGUMENT_OPERATION: self.instruction_argument_operation,
+            Opcode.ASSERT: self.instruction_assert,
+            Opcode.BINARY_OPERATION: self.instruction_binary_operation,
+            Opcode.CALL: self.instruction_call,
+            Opcode.CONSTANT_OPERATION: self.instruction_constant_operation,
+            Opcode.COUNTED_LOOP: self.instruction_counted_loop,
+            Opcode.COUNTED_LOOP_STEP: self.instruction_counted_loop_step,
+            Opcode.DIVIDE: self.instruction_divide,
+            Opcode.DROP: self.instruction_drop,
+            Opcode.DUP: self.instruction_dup,
+            Opcode.GET_STRUCT_FIELD: self.instruction_get_struct_field,
+            Opcode.JUMP: self.instruction_jump,
+            Opcode.JUMP_IF_NOT: self.instruction_jump_if_not,
+            Opcode.MODULO: self.instruction_modulo,
+            Opcode.NOP: self.instruction_nop,
+            Opcode.NOT: self.instruction_not,
+            Opcode.OVER: self.instruction_over,
+            Opcode.PRINT: self.instruction_print,
+            Opcode.PUSH: self.instruction_push,
+            Opcode.PUSH_ARGUMENT: self.instruction_push_argument,
+            Opcode.PUSH_MAP: self.instruction_push_map,
+            Opcode.PUSH_STRUCT: self.instruction_push_struct,
+            Opcode.PUSH_VEC: self.instruction_push_vec,
+            Opcode.RETURN: self.instruction_return,
+            Opcode.ROT: self.instruction_rot,
+            Opcode.SET_STRUCT_FIELD: self.instruction_set_struct_field,
+            Opcode.SWAP: self.instruction_swap,
+        }
+
+        # Binary operations and standard library functions get a handler for each
+        # operator or function, so they don't look it up every time they run.
+        self.binary_funcs: Dict[str, ImageHandler] = {
+            operator: self.make_binary_handler(operator)
+            for operator in BINARY_OPERATIONS
+        }
+        self.stdlib_funcs: Dict[str, ImageHandler] = {
+            name: self.make_stdlib_handler(name) for name in STDLIB_FUNCTIONS
+        }
+
+        self.handlers = [
+            self.get_handler(opcode, operands)
+            for opcode, operands in zip(image.opcodes, image.operands)
+        ]
+
+    def get_handler(self, opcode: Opcode, operands: Tuple[Any, ...]) -> ImageHandler:
+        if opcode == Opcode.BINARY_OPERATION:
+            return self.binary_funcs[operands[0]]
+        if opcode == Opcode.STANDARD_LIBRARY_CALL:
+            return self.stdlib_funcs[operands[0]]
+        return self.instruction_funcs[opcode]
+
+    def make_binary_handler(self, operator: str) -> ImageHandler:
+        operation = BINARY_OPERATIONS[operator]
+        stack = self.stack
+
+        def handler(operands: Tuple[Any, ...]) -> None:
+            x = stack.pop()
+            stack[-1] = operation(stack[-1], x)
+
+        return handler
+
+    def make_stdlib_handler(self, name: str) -> ImageHandler:
+        stdlib_func = STDLIB_FUNCTIONS[name]
+        arg_count = get_arg_count(stdlib_func)
+        stack = self.stack
+
+        def handler(operands: Tuple[Any, ...]) -> None:
+            args_offset = len(stack) - arg_count
+            stack[args_offset:] = stdlib_func(*stack[args_offset:])
+
+        return handler
+
+    def run_main(self) -> None:
+        # Returning from main jumps to the address after the last instruction
+        halt = len(self.image.opcodes)
+        main = self.image.functions[0]
+        self.call_stack.append(CallFrame(main, []))
+        self.return_addresses.append(halt)
+
+        handlers = self.handlers
+        operands = self.image.operands
+        ip = main.address
+
+        while ip != halt:
+            jump_target = handlers[ip](operands[ip])
+            ip = ip + 1 if jump_target is None else jump_target
+
+    def instruction_call(self, operands: Tuple[Any, ...]) -> int:
+        function_index, address, return_address = operands
+        function = self.image.functions[function_index]
+
+        if len(self.call_stack) >= self.max_call_depth:
+            raise CallStackOverflow(
+                max_call_depth=self.max_call_depth, function_name=function.name
+            )
+
+        stack = self.stack
+        args_offset = len(stack) - len(function.argument_names)
+        self.call_stack.append(CallFrame(function, stack[args_offset:]))
+        del stack[args_offset:]
+
+        self.return_addresses.append(return_address)
+        return address  # type: ignore
+
+    def instruction_return(self, operands: Tuple[Any, ...]) -> int:
+        self.call_stack.pop()
+        return self.return_addresses.pop()
+
+    def instruction_jump(self, operands: Tuple[Any, ...]) -> int:
+        return operands[0]  # type: ignore
+
+    def instruction_jump_if_not(self, operands: Tuple[Any, ...]) -> Optional[int]:
+        if self.stack.pop():
+            return None
+        return operands[0]  # type: ignore
+
+    def get_loop_bound(self, bound: int, bound_arg_index: Optional[int]) -> Any:
+        if bound_arg_index is None:
+            return bound
+
+        return self.call_stack[-1].argument_values[bound_arg_index]
+
+    def instruction_counted_loop(self, operands: Tuple[Any, ...]) -> Optional[int]:
+        comparison, bound, bound_arg_index, increment, exit_address = operands
+        stack = self.stack
+        compare = BINARY_OPERATIONS[comparison]
+
+        if not compare(stack[-1], self.get_loop_bound(bound, bound_arg_index)):
+            return exit_address  # type: ignore
+
+        stack[-1] += increment
+        return None
+
+    def instruction_counted_loop_step(self, operands: Tuple[Any, ...]) -> Optional[int]:
+        comparison, bound, bound_arg_index, step, body_address = operands
+        stack = self.stack
+        compare = BINARY_OPERATIONS[comparison]
+
+        stack[-1] += step
+        if not compare(stack[-1], self.get_loop_bound(bound, bound_arg_index)):
+            return None
+
+        return body_address  # type: ignore
+
+    def instruction_push(self, operands: Tuple[Any, ...]) -> None:
+        self.stack.append(operands[0])
+
+    def instruction_push_argument(self, operands: Tuple[Any, ...]) -> None:
+        self.stack.append(self.call_stack[-1].argument_values[operands[0]])
+
+    def instruction_binary_operation(self, operands: Tuple[Any, ...]) -> None:
+        # Only used when dispatching on opcode, see get_handler
+        self.binary_funcs[operands[0]](operands)
+
+    def instruction_constant_operation(self, operands: Tuple[Any, ...]) -> None:
+        operator, value = operands
+        stack = self.stack
+        stack[-1] = BINARY_OPERATIONS[operator](stack[-1], value)
+
+    def instruction_argument_operation(self, operands: Tuple[Any, ...]) -> None:
+        operator, arg_index = operands
+        stack = self.stack
+        argument = self.call_stack[-1].argument_values[arg_index]
+        stack[-1] = BINARY_OPERATIONS[operator](stack[-1], argument)
+
+    def instruction_divide(self, operands: Tuple[Any, ...]) -> None:
+        stack = self.stack
+        x = stack.pop()
+
+        if x == 0:
+            stack[-1:] = [0, False]
+        else:
+            stack[-1:] = [stack[-1] // x, True]
+
+    def instruction_modulo(self, operands: Tuple[Any, ...]) -> None:
+        stack = self.stack
+        x = stack.pop()
+
+        if x == 0:
+            stack[-1:] = [0, False]
+        else:
+            stack[-1:] = [stack[-1] % x, True]
+
+    def instruction_not(self, operands: Tuple[Any, ...]) -> None:
+        self.stack[-1] = not self.stack[-1]
+
+    def instruction_drop(self, operands: Tuple[Any, ...]) -> None:
+        self.stack.pop()
+
+    def instruction_dup(self, operands: Tuple[Any, ...]) -> None:
+        self.stack.append(self.stack[-1])
+
+    def instruction_swap(self, operands: Tuple[Any, ...]) -> None:
+        stack = self.stack
+        stack[-2], stack[-1] = stack[-1], stack[-2]
+
+    def instruction_over(self, operands: Tuple[Any, ...]) -> None:
+        self.stack.append(self.stack[-2])
+
+    def instruction_rot(self, operands: Tuple[Any, ...]) -> None:
+        stack = self.stack
+        stack.append(stack.pop(-3))
+
+    def instruction_print(self, operands: Tuple[Any, ...]) -> None:
+        x = self.stack.pop()
+
+        if isinstance(x, bool):
+            x = "true" if x else "false"
+
+        print(x, end="")
+
+    def instruction_nop(self, operands: Tuple[Any, ...]) -> None:
+        pass
+
+    def instruction_assert(self, operands: Tuple[Any, ...]) -> None:
+        if not self.stack.pop():
+            stack_trace = [
+                (
+                    frame.function.name,
+                    frame.function.argument_names,
+                    list(frame.argument_values),
+                )
+                for frame in self.call_stack
+            ]
+            raise AaaAssertionFailure(stack_trace)
+
+    def instruction_push_vec(self, operands: Tuple[Any, ...]) -> None:
+        item_type: VariableType = operands[0]
+        self.stack.append(vec_var(item_type=item_type, value=[]))
+
+    def instruction_push_map(self, operands: Tuple[Any, ...]) -> None:
+        key_type: VariableType
+        value_type: VariableType
+        key_type, value_type = operands
+        self.stack.append(map_var(key_type=key_type, value_type=value_type, value={}))
+
+    def instruction_push_struct(self, operands: Tuple[Any, ...]) -> None:
+        struct_layout: StructLayout = operands[0]
+        struct_fields = {
+            field_name: Variable.zero_value(var_type)
+            for field_name, var_type in struct_layout.fields.items()
+        }
+        self.stack.append(struct_var(struct_layout.name, struct_fields))
+
+    def instruction_get_struct_field(self, operands: Tuple[Any, ...]) -> None:
+        stack = self.stack
+        field_name = stack.pop()
+        struct_fields: Dict[str, Variable] = stack[-1].value
+        stack.append(unbox(struct_fields[field_name]))
+
+    def instruction_set_struct_field(self, operands: Tuple[Any, ...]) -> None:
+        stack = self.stack
+        new_value = stack.pop()
+        field_name = stack.pop()
+        struct_fields: Dict[str, Variable] = stack[-1].value
+        struct_fields[field_name] = box(new_value)
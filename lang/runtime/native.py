@@ -0,0 +1,652 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Optional, Tuple, Type
+
+from lang.exceptions import AaaRuntimeException
+from lang.models.instructions import (
+    And,
+    CallFunction,
+    Equals,
+    Instruction,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Minus,
+    Multiply,
+    Or,
+    Plus,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    StandardLibraryCall,
+)
+from lang.models.parse import Branch, Function, FunctionBody, Loop, Struct
+from lang.models.runtime import DEFAULT_MAX_CALL_DEPTH
+from lang.models.typing.var_type import RootType, VariableType
+from lang.runtime.program import Program
+from lang.runtime.stdlib import STDLIB_FUNCTIONS, get_arg_count
+from lang.runtime.transpiler import (
+    FunctionTranspiler,
+    Transpiler,
+    get_cache_dir,
+    python_name,
+)
+
+NATIVE_RUNTIME_DIR = Path(__file__).parent / "native_runtime"
+
+C_FLAGS = ["-O2", "-std=gnu11", "-pthread"]
+
+INT_OPERATORS: Dict[Type[Instruction], str] = {
+    Minus: "AAA_SUB",
+    Multiply: "AAA_MUL",
+    Plus: "AAA_ADD",
+}
+
+COMPARISON_OPERATORS: Dict[Type[Instruction], str] = {
+    Equals: "==",
+    IntGreaterEquals: ">=",
+    IntGreaterThan: ">",
+    IntLessEquals: "<=",
+    IntLessThan: "<",
+    IntNotEqual: "!=",
+}
+
+BOOL_OPERATORS: Dict[Type[Instruction], str] = {
+    And: "&&",
+    Or: "||",
+}
+
+C_KINDS: Dict[RootType, str] = {
+    RootType.BOOL: "AAA_BOOL",
+    RootType.INTEGER: "AAA_INT",
+    RootType.MAPPING: "AAA_MAP",
+    RootType.STRING: "AAA_STR",
+    RootType.STRUCT: "AAA_STRUCT",
+    RootType.VECTOR: "AAA_VEC",
+}
+
+# Native stack bytes per Aaa stack slot of a generated function and per call.
+SLOT_FRAME_SIZE = 32
+CALL_FRAME_SIZE = 256
+
+
+class NativeBuildError(Exception):
+    ...
+
+
+class NativeRuntimeError(AaaRuntimeException):
+    # Raised for errors reported by the runtime of a native executable.
+
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def c_string_literal(value: str) -> str:
+    literal = '"'
+
+    for byte in value.encode("utf-8"):
+        char = chr(byte)
+
+        if char.isascii() and char.isprintable() and char not in '"\\?':
+            literal += char
+        else:
+            # Octal escapes always have three digits, so next characters can't extend
+            # them like they would extend hexadecimal escapes.
+            literal += f"\\{byte:03o}"
+
+    return literal + '"'
+
+
+def find_c_compiler() -> Optional[str]:
+    return os.environ.get("CC") or shutil.which("cc")
+
+
+class NativeFunctionTranspiler(FunctionTranspiler):
+    # Aaa stack slots become elements of a local array s and arguments of array a.
+    # Every slot holding a str, vec, map or struct owns a reference to it.
+
+    def __init__(
+        self, transpiler: "NativeTranspiler", file: Path, function: Function
+    ) -> None:
+        super().__init__(transpiler, file, function)
+        self.native_transpiler = transpiler
+        self.max_depth = 0
+
+    def transpile(self, c_function_name: str) -> List[str]:
+        argument_count = len(self.function.arguments)
+        function_info = self.native_transpiler.function_infos[
+            (self.file, self.function.identify())
+        ]
+
+        self.lines.append(f"static void {c_function_name}(Value *io) {{")
+
+        if argument_count:
+            arguments = ", ".join(f"io[{i}]" for i in range(argument_count))
+            self.emit(f"Value a[{argument_count}] = {{{arguments}}};")
+            self.emit(f"aaa_enter(&{function_info}, a);")
+        else:
+            self.emit(f"aaa_enter(&{function_info}, NULL);")
+
+        slots_line = len(self.lines)
+        self.transpile_block(self.function.body)
+
+        assert self.depth == len(self.function.return_types)
+
+        for i in range(self.depth):
+            self.emit(f"io[{i}] = {self.slot(i)};")
+
+        for i in range(argument_count):
+            self.emit(f"aaa_decref(a[{i}]);")
+
+        self.emit("aaa_leave();")
+        self.lines.append("}")
+
+        if self.max_depth:
+            self.lines.insert(slots_line, f"    Value s[{self.max_depth}];")
+
+        return self.lines
+
+    def get_frame_size(self) -> int:
+        slot_count = self.max_depth + len(self.function.arguments)
+        return CALL_FRAME_SIZE + SLOT_FRAME_SIZE * slot_count
+
+    def slot(self, index: int) -> str:
+        self.max_depth = max(self.max_depth, index + 1)
+        return f"s[{index}]"
+
+    def push(self, value: str) -> None:
+        self.emit(f"{self.slot(self.depth)} = {value};")
+        self.depth += 1
+
+    def transpile_block(self, function_body: FunctionBody) -> None:
+        for item in function_body.items:
+            self.transpile_item(item)
+
+    def transpile_branch(self, branch: Branch) -> None:
+        self.transpile_item(branch.condition)
+        condition = self.top()
+        self.depth -= 1
+        depth = self.depth
+
+        self.emit(f"if ({condition}.as.b) {{")
+        self.transpile_nested_block(branch.if_body)
+
+        # The type checker guarantees both bodies leave the same stack size
+        if branch.else_body.items:
+            self.depth = depth
+            self.emit("} else {")
+            self.transpile_nested_block(branch.else_body)
+
+        self.emit("}")
+
+    def transpile_loop(self, loop: Loop) -> None:
+        self.emit("while (true) {")
+        self.indent += 1
+
+        self.transpile_item(loop.condition)
+        self.emit(f"if (!{self.top()}.as.b) {{")
+        self.emit("    break;")
+        self.emit("}")
+        self.depth -= 1
+
+        self.transpile_block(loop.body)
+        self.indent -= 1
+        self.emit("}")
+
+    def transpile_instruction(self, instruction: Instruction) -> None:
+        instruction_type = type(instruction)
+        lhs, rhs = self.top(1), self.top()
+
+        if instruction_type in INT_OPERATORS:
+            operator = INT_OPERATORS[instruction_type]
+            self.emit(f"{lhs}.as.i = {operator}({lhs}.as.i, {rhs}.as.i);")
+            self.depth -= 1
+        elif instruction_type in COMPARISON_OPERATORS:
+            operator = COMPARISON_OPERATORS[instruction_type]
+            self.emit(f"{lhs} = AAA_BOOL_VALUE({lhs}.as.i {operator} {rhs}.as.i);")
+            self.depth -= 1
+        elif instruction_type in BOOL_OPERATORS:
+            operator = BOOL_OPERATORS[instruction_type]
+            self.emit(f"{lhs}.as.b = {lhs}.as.b {operator} {rhs}.as.b;")
+            self.depth -= 1
+        else:
+            self.transpile_funcs[instruction_type](instruction)
+
+    def transpile_push_constant(self, instruction: Instruction) -> None:
+        if isinstance(instruction, PushBool):
+            self.push(f"AAA_BOOL_VALUE({'true' if instruction.value else 'false'})")
+        elif isinstance(instruction, PushInt):
+            self.push(f"AAA_INT_VALUE(INT64_C({instruction.value}))")
+        else:
+            assert isinstance(instruction, PushString)
+            string = self.native_transpiler.add_string(instruction.value)
+            self.push(f"AAA_OBJECT_VALUE(AAA_STR, &{string})")
+
+    def transpile_push_argument(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushArgument)
+        self.push(f"a[{instruction.arg_index}]")
+        self.emit(f"aaa_incref({self.top()});")
+
+    def transpile_push_vec(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushVec)
+        self.push("aaa_vec_new()")
+
+    def transpile_push_map(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushMap)
+        self.push("aaa_map_new()")
+
+    def transpile_push_struct(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushStruct)
+        struct_type = self.native_transpiler.add_struct_type(instruction.type)
+        self.push(f"aaa_struct_new(&{struct_type})")
+
+    def transpile_divide(self, instruction: Instruction) -> None:
+        self.transpile_checked_division("aaa_floor_div")
+
+    def transpile_modulo(self, instruction: Instruction) -> None:
+        self.transpile_checked_division("aaa_floor_mod")
+
+    def transpile_checked_division(self, c_function_name: str) -> None:
+        lhs, rhs = self.top(1), self.top()
+        self.emit(f"if ({rhs}.as.i) {{")
+        self.emit(f"    {lhs}.as.i = {c_function_name}({lhs}.as.i, {rhs}.as.i);")
+        self.emit(f"    {rhs} = AAA_BOOL_VALUE(true);")
+        self.emit("} else {")
+        self.emit(f"    {lhs}.as.i = 0;")
+        self.emit(f"    {rhs} = AAA_BOOL_VALUE(false);")
+        self.emit("}")
+
+    def transpile_not(self, instruction: Instruction) -> None:
+        self.emit(f"{self.top()}.as.b = !{self.top()}.as.b;")
+
+    def transpile_drop(self, instruction: Instruction) -> None:
+        self.emit(f"aaa_decref({self.top()});")
+        self.depth -= 1
+
+    def transpile_dup(self, instruction: Instruction) -> None:
+        self.push(self.top())
+        self.emit(f"aaa_incref({self.top()});")
+
+    def transpile_swap(self, instruction: Instruction) -> None:
+        x, y = self.top(1), self.top()
+        self.emit(f"{{ Value t = {x}; {x} = {y}; {y} = t; }}")
+
+    def transpile_over(self, instruction: Instruction) -> None:
+        self.push(self.top(1))
+        self.emit(f"aaa_incref({self.top()});")
+
+    def transpile_rot(self, instruction: Instruction) -> None:
+        x, y, z = self.top(2), self.top(1), self.top()
+        self.emit(f"{{ Value t = {x}; {x} = {y}; {y} = {z}; {z} = t; }}")
+
+    def transpile_print(self, instruction: Instruction) -> None:
+        self.emit(f"aaa_print({self.top()});")
+        self.depth -= 1
+
+    def transpile_assert(self, instruction: Instruction) -> None:
+        self.emit(f"if (!{self.top()}.as.b) {{")
+        self.emit("    aaa_assertion_failure();")
+        self.emit("}")
+        self.depth -= 1
+
+    def transpile_get_struct_field(self, instruction: Instruction) -> None:
+        struct, field_name = self.top(1), self.top()
+        self.emit(f"{field_name} = aaa_struct_get({struct}, {field_name});")
+
+    def transpile_set_struct_field(self, instruction: Instruction) -> None:
+        struct, field_name, value = self.top(2), self.top(1), self.top()
+        self.emit(f"aaa_struct_set({struct}, {field_name}, {value});")
+        self.depth -= 2
+
+    def transpile_io_call(
+        self, c_function_name: str, argument_count: int, return_count: int
+    ) -> None:
+        # Callees read arguments from io and write returned values over them
+        self.depth -= argument_count
+        io_slots = max(argument_count, return_count)
+        self.slot(self.depth + io_slots - 1)
+
+        self.emit(f"{c_function_name}(&{self.slot(self.depth)});")
+        self.depth += return_count
+
+    def transpile_call_function(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, CallFunction)
+        function = self.transpiler.program.get_identifier(
+            instruction.file, instruction.func_name
+        )
+        assert isinstance(function, Function)
+
+        self.transpile_io_call(
+            self.transpiler.function_names[(instruction.file, instruction.func_name)],
+            len(function.arguments),
+            len(function.return_types),
+        )
+
+    def transpile_standard_library_call(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, StandardLibraryCall)
+        stdlib_func = STDLIB_FUNCTIONS[instruction.name]
+        builtin = self.transpiler.program._builtins.functions[instruction.name]
+
+        self.transpile_io_call(
+            python_name("aaa_stdlib", instruction.name),
+            get_arg_count(stdlib_func),
+            len(builtin.return_types),
+        )
+
+
+class NativeTranspiler(Transpiler):
+    # Translates a program to C, which is compiled against the runtime in
+    # native_runtime/ by the system C compiler.
+
+    def __init__(
+        self, program: Program, max_call_depth: int = DEFAULT_MAX_CALL_DEPTH
+    ) -> None:
+        super().__init__(program)
+        self.max_call_depth = max_call_depth
+
+        # Maps Aaa function identity to the name of its static AaaFunctionInfo.
+        self.function_infos: Dict[Tuple[Path, str], str] = {}
+
+        # String literals, each is a static AaaStr named string_{index}
+        self.strings: Dict[str, str] = {}
+
+        # Struct types, nested struct fields get a type without fields named after
+        # their struct, just like Variable.zero_value() creates them.
+        self.struct_types: List[Tuple[str, Dict[str, VariableType]]] = []
+        self.struct_type_names: Dict[int, str] = {}
+        self.empty_struct_type_names: Dict[str, str] = {}
+
+    def add_string(self, value: str) -> str:
+        if value not in self.strings:
+            self.strings[value] = f"string_{len(self.strings)}"
+
+        return self.strings[value]
+
+    def add_struct_type(self, struct: Struct) -> str:
+        if id(struct) not in self.struct_type_names:
+            self.struct_type_names[id(struct)] = self.new_struct_type(
+                struct.name, struct.fields
+            )
+
+        return self.struct_type_names[id(struct)]
+
+    def add_empty_struct_type(self, name: str) -> str:
+        if name not in self.empty_struct_type_names:
+            self.empty_struct_type_names[name] = self.new_struct_type(name, {})
+
+        return self.empty_struct_type_names[name]
+
+    def new_struct_type(self, name: str, fields: Dict[str, VariableType]) -> str:
+        self.struct_types.append((name, fields))
+        return f"struct_type_{len(self.struct_types) - 1}"
+
+    def transpile_function_info(self, index: int, function: Function) -> List[str]:
+        argument_names = "NULL"
+        lines: List[str] = []
+
+        if function.arguments:
+            argument_names = f"argument_names_{index}"
+            names = ", ".join(
+                c_string_literal(argument.name) for argument in function.arguments
+            )
+            lines.append(f"static const char *const {argument_names}[] = {{{names}}};")
+
+        lines.append(
+            f"static const AaaFunctionInfo function_info_{index} = "
+            + f"{{{c_string_literal(function.identify())}, {len(function.arguments)}, "
+            + f"{argument_names}}};"
+        )
+        return lines
+
+    def transpile_struct_types(self) -> List[str]:
+        lines: List[str] = []
+
+        # Nested struct types are added while iterating
+        index = 0
+        while index < len(self.struct_types):
+            name, fields = self.struct_types[index]
+            field_names = field_kinds = field_struct_types = "NULL"
+
+            if fields:
+                field_names = f"struct_field_names_{index}"
+                field_kinds = f"struct_field_kinds_{index}"
+                field_struct_types = f"struct_field_types_{index}"
+
+                names: List[str] = []
+                kinds: List[str] = []
+                struct_types: List[str] = []
+
+                for field_name, field_type in fields.items():
+                    names.append(c_string_literal(field_name))
+                    kinds.append(C_KINDS[field_type.root_type])
+
+                    if field_type.root_type == RootType.STRUCT:
+                        nested = self.add_empty_struct_type(field_type.name)
+                        struct_types.append(f"&{nested}")
+                    else:
+                        struct_types.append("NULL")
+
+                lines += [
+                    f"static const char *const {field_names}[] = "
+                    + f"{{{', '.join(names)}}};",
+                    f"static const AaaKind {field_kinds}[] = {{{', '.join(kinds)}}};",
+                    f"static const AaaStructType *const {field_struct_types}[] = "
+                    + f"{{{', '.join(struct_types)}}};",
+                ]
+
+            lines.append(
+                f"static const AaaStructType struct_type_{index} = "
+                + f"{{{c_string_literal(name)}, {len(fields)}, {field_names}, "
+                + f"{field_kinds}, {field_struct_types}}};"
+            )
+            index += 1
+
+        declarations = [
+            f"static const AaaStructType struct_type_{index};"
+            for index in range(len(self.struct_types))
+        ]
+        return declarations + lines
+
+    def transpile(self) -> str:
+        functions = self.get_functions()
+
+        for index, (file, function) in enumerate(functions):
+            func_name = function.identify()
+            self.function_names[(file, func_name)] = python_name(
+                f"fn{index}", func_name
+            )
+            self.function_infos[(file, func_name)] = f"function_info_{index}"
+
+        function_lines: List[str] = []
+        frame_size = CALL_FRAME_SIZE
+
+        for file, function in functions:
+            c_function_name = self.function_names[(file, function.identify())]
+            function_transpiler = NativeFunctionTranspiler(self, file, function)
+
+            function_lines += [
+                "",
+                f"// {file}: {function.identify()}",
+            ]
+            function_lines += function_transpiler.transpile(c_function_name)
+            frame_size = max(frame_size, function_transpiler.get_frame_size())
+
+        lines = [
+            f"// Transpiled from {self.program.entry_point_file}",
+            "",
+            '#include "aaa.h"',
+            "",
+        ]
+
+        for index, (file, function) in enumerate(functions):
+            c_function_name = self.function_names[(file, function.identify())]
+            lines.append(f"static void {c_function_name}(Value *io);")
+            lines += self.transpile_function_info(index, function)
+
+        lines.append("")
+
+        for value, string in self.strings.items():
+            lines.append(
+                f"static AaaStr {string} = AAA_STR_LITERAL({c_string_literal(value)});"
+            )
+
+        lines += self.transpile_struct_types()
+        lines += function_lines
+
+        main = self.function_names[(self.program.entry_point_file, "main")]
+        lines += [
+            "",
+            "void aaa_main(void) {",
+            f"    {main}(NULL);",
+            "}",
+            "",
+            "int main(void) {",
+            f"    return aaa_run({self.max_call_depth}, {frame_size});",
+            "}",
+        ]
+
+        return "\n".join(lines) + "\n"
+
+
+def compile_c(
+    c_compiler: str, arguments: List[str], output: Path, source: Optional[str] = None
+) -> None:
+    command = [c_compiler, *C_FLAGS, "-I", str(NATIVE_RUNTIME_DIR), *arguments]
+    command += ["-o", str(output)]
+
+    proc = subprocess.run(command, input=source, capture_output=True, text=True)
+
+    if proc.returncode != 0:
+        raise NativeBuildError(f"Command {' '.join(command)} failed:\n{proc.stderr}")
+
+
+class NativeBuilder:
+    # Compiles the runtime once per process, programs are linked against it.
+
+    runtime_objects: Dict[str, Path] = {}
+    runtime_dir: Optional[TemporaryDirectory[str]] = None
+
+    def __init__(self, c_compiler: Optional[str] = None) -> None:
+        c_compiler = c_compiler or find_c_compiler()
+
+        if not c_compiler:
+            raise NativeBuildError("No C compiler found, set the CC variable.")
+
+        self.c_compiler = c_compiler
+
+    def get_runtime_object(self) -> Path:
+        cls = type(self)
+
+        if self.c_compiler not in cls.runtime_objects:
+            if not cls.runtime_dir:
+                cls.runtime_dir = TemporaryDirectory(prefix="aaa_native_")
+
+            runtime_object = (
+                Path(cls.runtime_dir.name) / f"aaa{len(cls.runtime_objects)}.o"
+            )
+            compile_c(
+                self.c_compiler,
+                ["-c", str(NATIVE_RUNTIME_DIR / "aaa.c")],
+                runtime_object,
+            )
+            cls.runtime_objects[self.c_compiler] = runtime_object
+
+        return cls.runtime_objects[self.c_compiler]
+
+    def build(self, source: str, output: Path) -> None:
+        arguments = ["-x", "c", "-", "-x", "none", str(self.get_runtime_object())]
+        compile_c(self.c_compiler, arguments, output, source)
+
+
+def build_native(
+    program: Program,
+    output: Path,
+    max_call_depth: int = DEFAULT_MAX_CALL_DEPTH,
+) -> None:
+    source = NativeTranspiler(program, max_call_depth).transpile()
+    NativeBuilder().build(source, output)
+
+
+class NativeBackend:
+    # Runs a program by compiling it to a native executable, which is cached like
+    # transpiled code, see get_cache_dir.
+
+    def __init__(
+        self, program: Program, max_call_depth: int = DEFAULT_MAX_CALL_DEPTH
+    ) -> None:
+        self.program = program
+        self.max_call_depth = max_call_depth
+
+    def run(self, raise_: bool = False) -> None:
+        try:
+            self.execute(raise_)
+        except AaaRuntimeException as e:
+            # Without raise_ the executable writes errors to our stderr itself.
+            print(e, file=sys.stderr)
+            raise e
+
+    def get_executable(self) -> Path:
+        source = NativeTranspiler(self.program, self.max_call_depth).transpile()
+        entry_point_file = self.program.entry_point_file
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+        executable = (
+            get_cache_dir(entry_point_file)
+            / f"{entry_point_file.stem}.{source_hash}.native"
+        )
+
+        if not executable.exists():
+            executable.parent.mkdir(parents=True, exist_ok=True)
+            NativeBuilder().build(source, executable)
+
+        return executable
+
+    def execute(self, raise_: bool) -> None:
+        command = [str(self.get_executable())]
+
+        # Output goes straight to our stdout, unless it was redirected in Python.
+        try:
+            stdout = sys.stdout.fileno()
+        except (AttributeError, OSError, ValueError):
+            capture_stdout = True
+        else:
+            capture_stdout = False
+
+        sys.stdout.flush()
+
+        proc = subprocess.run(
+            command,
+            stdout=subprocess.PIPE if capture_stdout else stdout,
+            stderr=subprocess.PIPE if raise_ else None,
+            env=dict(os.environ),
+        )
+
+        if capture_stdout:
+            sys.stdout.write(proc.stdout.decode("utf-8"))
+
+        if proc.returncode == 0:
+            return
+
+        stderr = proc.stderr.decode("utf-8") if raise_ else ""
+
+        if stderr:
+            raise NativeRuntimeError(stderr.removesuffix("\n"))
+
+        if raise_:
+            raise SystemExit(proc.returncode)
+
+        exit(proc.returncode)
@@ -0,0 +1,1118 @@
+#include "aaa.h"
+
+#include <errno.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <stdarg.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <time.h>
+#include <unistd.h>
+
+extern char **environ;
+
+AaaFrame *aaa_call_stack = NULL;
+size_t aaa_call_depth = 0;
+size_t aaa_max_call_depth = 0;
+
+// Native stack for the standard library and libc, on top of generated functions
+#define AAA_STACK_MARGIN (16 * 1024 * 1024)
+
+static void aaa_runtime_error(const char *format, ...) {
+    va_list args;
+
+    fflush(stdout);
+    fprintf(stderr, "Runtime error: ");
+    va_start(args, format);
+    vfprintf(stderr, format, args);
+    va_end(args);
+    fprintf(stderr, "\n");
+    exit(1);
+}
+
+static void *aaa_malloc(size_t size) {
+    void *memory = malloc(size);
+    if (!memory && size) {
+        aaa_runtime_error("out of memory");
+    }
+    return memory;
+}
+
+static void *aaa_realloc(void *memory, size_t size) {
+    memory = realloc(memory, size);
+    if (!memory && size) {
+        aaa_runtime_error("out of memory");
+    }
+    return memory;
+}
+
+// Strings
+
+static Value aaa_str_new(const char *data, size_t length) {
+    AaaStr *string = aaa_malloc(sizeof(AaaStr) + length + 1);
+    char *copy = (char *)(string + 1);
+
+    memcpy(copy, data, length);
+    copy[length] = '\0';
+
+    string->header.refcount = 1;
+    string->length = length;
+    string->data = copy;
+    return AAA_OBJECT_VALUE(AAA_STR, string);
+}
+
+static Value aaa_str_from_c_string(const char *data) {
+    return aaa_str_new(data, strlen(data));
+}
+
+static AaaStr *aaa_str(Value value) { return (AaaStr *)value.as.o; }
+
+static bool aaa_str_eq(const AaaStr *x, const AaaStr *y) {
+    return x->length == y->length && memcmp(x->data, y->data, x->length) == 0;
+}
+
+// Returns offset of search in string at or after start, or -1.
+static int64_t aaa_str_find_from(const AaaStr *string, const AaaStr *search,
+                                 size_t start) {
+    if (start > string->length || search->length > string->length - start) {
+        return -1;
+    }
+
+    for (size_t i = start; i + search->length <= string->length; i++) {
+        if (memcmp(string->data + i, search->data, search->length) == 0) {
+            return (int64_t)i;
+        }
+    }
+
+    return -1;
+}
+
+typedef struct {
+    char *data;
+    size_t length;
+    size_t capacity;
+} AaaBuffer;
+
+static void aaa_buffer_append(AaaBuffer *buffer, const char *data, size_t length) {
+    if (buffer->length + length > buffer->capacity) {
+        buffer->capacity = 2 * (buffer->length + length) + 16;
+        buffer->data = aaa_realloc(buffer->data, buffer->capacity);
+    }
+    memcpy(buffer->data + buffer->length, data, length);
+    buffer->length += length;
+}
+
+static Value aaa_buffer_to_str(AaaBuffer *buffer) {
+    Value string = aaa_str_new(buffer->data ? buffer->data : "", buffer->length);
+    free(buffer->data);
+    return string;
+}
+
+// Vectors
+
+Value aaa_vec_new(void) {
+    AaaVec *vec = aaa_malloc(sizeof(AaaVec));
+    vec->header.refcount = 1;
+    vec->size = 0;
+    vec->capacity = 0;
+    vec->items = NULL;
+    return AAA_OBJECT_VALUE(AAA_VEC, vec);
+}
+
+static AaaVec *aaa_vec(Value value) { return (AaaVec *)value.as.o; }
+
+static void aaa_vec_append(AaaVec *vec, Value item) {
+    if (vec->size == vec->capacity) {
+        vec->capacity = vec->capacity ? 2 * vec->capacity : 8;
+        vec->items = aaa_realloc(vec->items, vec->capacity * sizeof(Value));
+    }
+    vec->items[vec->size++] = item;
+}
+
+// Negative offsets count from the end, like Python list indexes.
+static size_t aaa_vec_offset(const AaaVec *vec, int64_t offset) {
+    int64_t size = (int64_t)vec->size;
+
+    if (offset < -size || offset >= size) {
+        aaa_runtime_error("vector offset %lld out of range", (long long)offset);
+    }
+
+    return (size_t)(offset < 0 ? offset + size : offset);
+}
+
+// Maps
+
+Value aaa_map_new(void) {
+    AaaMap *map = aaa_malloc(sizeof(AaaMap));
+    map->header.refcount = 1;
+    map->size = 0;
+    map->entry_count = 0;
+    map->entry_capacity = 0;
+    map->entries = NULL;
+    map->index_capacity = 0;
+    map->index = NULL;
+    return AAA_OBJECT_VALUE(AAA_MAP, map);
+}
+
+static AaaMap *aaa_map(Value value) { return (AaaMap *)value.as.o; }
+
+#define AAA_INDEX_EMPTY (-1)
+#define AAA_INDEX_DELETED (-2)
+
+static uint64_t aaa_hash(Value value) {
+    uint64_t hash;
+
+    switch (value.kind) {
+    case AAA_INT:
+    case AAA_BOOL:
+        hash = value.kind == AAA_INT ? (uint64_t)value.as.i : (uint64_t)value.as.b;
+        hash = (hash ^ (hash >> 30)) * 0xbf58476d1ce4e5b9ULL;
+        hash = (hash ^ (hash >> 27)) * 0x94d049bb133111ebULL;
+        return hash ^ (hash >> 31);
+    case AAA_STR:
+        hash = 0xcbf29ce484222325ULL;
+        for (size_t i = 0; i < aaa_str(value)->length; i++) {
+            hash ^= (unsigned char)aaa_str(value)->data[i];
+            hash *= 0x100000001b3ULL;
+        }
+        return hash;
+    default:
+        aaa_runtime_error("unhashable map key");
+        return 0;
+    }
+}
+
+static bool aaa_keys_equal(Value x, Value y) {
+    if (x.kind == AAA_STR && y.kind == AAA_STR) {
+        return aaa_str_eq(aaa_str(x), aaa_str(y));
+    }
+    if (x.kind == AAA_STR || y.kind == AAA_STR) {
+        return false;
+    }
+
+    int64_t x_int = x.kind == AAA_INT ? x.as.i : x.as.b;
+    int64_t y_int = y.kind == AAA_INT ? y.as.i : y.as.b;
+    return x_int == y_int;
+}
+
+// Returns the slot in the index for key, which is empty if key is not found.
+static size_t aaa_map_lookup(const AaaMap *map, Value key, uint64_t hash) {
+    size_t mask = map->index_capacity - 1;
+    size_t slot = hash & mask;
+    size_t first_deleted = SIZE_MAX;
+
+    while (true) {
+        int64_t entry_offset = map->index[slot];
+
+        if (entry_offset == AAA_INDEX_EMPTY) {
+            return first_deleted != SIZE_MAX ? first_deleted : slot;
+        }
+
+        if (entry_offset == AAA_INDEX_DELETED) {
+            if (first_deleted == SIZE_MAX) {
+                first_deleted = slot;
+            }
+        } else {
+            const AaaMapEntry *entry = &map->entries[entry_offset];
+            if (entry->hash == hash && aaa_keys_equal(entry->key, key)) {
+                return slot;
+            }
+        }
+
+        slot = (slot + 1) & mask;
+    }
+}
+
+static AaaMapEntry *aaa_map_find(const AaaMap *map, Value key) {
+    if (!map->size) {
+        return NULL;
+    }
+
+    size_t slot = aaa_map_lookup(map, key, aaa_hash(key));
+    int64_t entry_offset = map->index[slot];
+
+    if (entry_offset < 0) {
+        return NULL;
+    }
+    return &map->entries[entry_offset];
+}
+
+// Rebuilds the index, dropping entries of removed keys.
+static void aaa_map_resize(AaaMap *map, size_t entry_capacity) {
+    size_t entry_count = 0;
+
+    for (size_t i = 0; i < map->entry_count; i++) {
+        if (map->entries[i].used) {
+            map->entries[entry_count++] = map->entries[i];
+        }
+    }
+
+    map->entry_count = entry_count;
+    map->entry_capacity = entry_capacity;
+    map->entries = aaa_realloc(map->entries, entry_capacity * sizeof(AaaMapEntry));
+
+    map->index_capacity = 2 * entry_capacity;
+    free(map->index);
+    map->index = aaa_malloc(map->index_capacity * sizeof(int64_t));
+
+    for (size_t i = 0; i < map->index_capacity; i++) {
+        map->index[i] = AAA_INDEX_EMPTY;
+    }
+
+    for (size_t i = 0; i < map->entry_count; i++) {
+        size_t slot = aaa_map_lookup(map, map->entries[i].key, map->entries[i].hash);
+        map->index[slot] = (int64_t)i;
+    }
+}
+
+// Takes ownership of key and value.
+static void aaa_map_set(AaaMap *map, Value key, Value value) {
+    AaaMapEntry *entry = aaa_map_find(map, key);
+
+    if (entry) {
+        // Like Python dicts, the key that was inserted first is kept.
+        aaa_decref(key);
+        aaa_decref(entry->value);
+        entry->value = value;
+        return;
+    }
+
+    if (map->entry_count == map->entry_capacity) {
+        size_t capacity = 2 * map->size + 8;
+        aaa_map_resize(map, capacity);
+    }
+
+    uint64_t hash = aaa_hash(key);
+    size_t slot = aaa_map_lookup(map, key, hash);
+
+    map->entries[map->entry_count] = (AaaMapEntry){key, value, hash, true};
+    map->index[slot] = (int64_t)map->entry_count;
+    map->entry_count++;
+    map->size++;
+}
+
+// Returns the value of key and removes it, the caller gets its reference.
+static Value aaa_map_remove(AaaMap *map, Value key) {
+    AaaMapEntry *entry = aaa_map_find(map, key);
+
+    if (!entry) {
+        aaa_runtime_error("key not found in map");
+    }
+
+    size_t slot = aaa_map_lookup(map, key, entry->hash);
+    map->index[slot] = AAA_INDEX_DELETED;
+
+    aaa_decref(entry->key);
+    entry->used = false;
+    map->size--;
+    return entry->value;
+}
+
+static void aaa_map_clear(AaaMap *map) {
+    for (size_t i = 0; i < map->entry_count; i++) {
+        if (map->entries[i].used) {
+            aaa_decref(map->entries[i].key);
+            aaa_decref(map->entries[i].value);
+        }
+    }
+
+    for (size_t i = 0; i < map->index_capacity; i++) {
+        map->index[i] = AAA_INDEX_EMPTY;
+    }
+
+    map->size = 0;
+    map->entry_count = 0;
+}
+
+// Structs
+
+static Value aaa_zero_value(AaaKind kind, const AaaStructType *struct_type) {
+    switch (kind) {
+    case AAA_INT:
+        return AAA_INT_VALUE(0);
+    case AAA_BOOL:
+        return AAA_BOOL_VALUE(false);
+    case AAA_STR:
+        return aaa_str_new("", 0);
+    case AAA_VEC:
+        return aaa_vec_new();
+    case AAA_MAP:
+        return aaa_map_new();
+    default:
+        return aaa_struct_new(struct_type);
+    }
+}
+
+Value aaa_struct_new(const AaaStructType *type) {
+    AaaStruct *structure =
+        aaa_malloc(sizeof(AaaStruct) + type->field_count * sizeof(Value));
+
+    structure->header.refcount = 1;
+    structure->type = type;
+
+    for (size_t i = 0; i < type->field_count; i++) {
+        structure->fields[i] =
+            aaa_zero_value(type->field_kinds[i], type->field_struct_types[i]);
+    }
+
+    return AAA_OBJECT_VALUE(AAA_STRUCT, structure);
+}
+
+static AaaStruct *aaa_struct(Value value) { return (AaaStruct *)value.as.o; }
+
+static size_t aaa_struct_field(const AaaStruct *structure, Value field_name) {
+    const AaaStr *name = aaa_str(field_name);
+
+    for (size_t i = 0; i < structure->type->field_count; i++) {
+        const char *field_name = structure->type->field_names[i];
+        if (strlen(field_name) == name->length &&
+            memcmp(field_name, name->data, name->length) == 0) {
+            return i;
+        }
+    }
+
+    aaa_runtime_error("struct %s has no field %s", structure->type->name, name->data);
+    return 0;
+}
+
+Value aaa_struct_get(Value structure, Value field_name) {
+    size_t field = aaa_struct_field(aaa_struct(structure), field_name);
+    Value value = aaa_struct(structure)->fields[field];
+
+    aaa_decref(field_name);
+    aaa_incref(value);
+    return value;
+}
+
+void aaa_struct_set(Value structure, Value field_name, Value value) {
+    size_t field = aaa_struct_field(aaa_struct(structure), field_name);
+
+    aaa_decref(field_name);
+    aaa_decref(aaa_struct(structure)->fields[field]);
+    aaa_struct(structure)->fields[field] = value;
+}
+
+void aaa_free_object(Value value) {
+    switch (value.kind) {
+    case AAA_VEC:
+        for (size_t i = 0; i < aaa_vec(value)->size; i++) {
+            aaa_decref(aaa_vec(value)->items[i]);
+        }
+        free(aaa_vec(value)->items);
+        break;
+    case AAA_MAP:
+        aaa_map_clear(aaa_map(value));
+        free(aaa_map(value)->entries);
+        free(aaa_map(value)->index);
+        break;
+    case AAA_STRUCT:
+        for (size_t i = 0; i < aaa_struct(value)->type->field_count; i++) {
+            aaa_decref(aaa_struct(value)->fields[i]);
+        }
+        break;
+    default:
+        break;
+    }
+
+    free(value.as.o);
+}
+
+// Copies containers and structs recursively, like Python's deepcopy.
+static Value aaa_deep_copy(Value value) {
+    Value copy;
+
+    switch (value.kind) {
+    case AAA_VEC:
+        copy = aaa_vec_new();
+        for (size_t i = 0; i < aaa_vec(value)->size; i++) {
+            aaa_vec_append(aaa_vec(copy), aaa_deep_copy(aaa_vec(value)->items[i]));
+        }
+        return copy;
+    case AAA_MAP:
+        copy = aaa_map_new();
+        for (size_t i = 0; i < aaa_map(value)->entry_count; i++) {
+            AaaMapEntry *entry = &aaa_map(value)->entries[i];
+            if (entry->used) {
+                aaa_map_set(aaa_map(copy), aaa_deep_copy(entry->key),
+                            aaa_deep_copy(entry->value));
+            }
+        }
+        return copy;
+    case AAA_STRUCT: {
+        const AaaStructType *type = aaa_struct(value)->type;
+        AaaStruct *structure =
+            aaa_malloc(sizeof(AaaStruct) + type->field_count * sizeof(Value));
+
+        structure->header.refcount = 1;
+        structure->type = type;
+        for (size_t i = 0; i < type->field_count; i++) {
+            structure->fields[i] = aaa_deep_copy(aaa_struct(value)->fields[i]);
+        }
+        return AAA_OBJECT_VALUE(AAA_STRUCT, structure);
+    }
+    default:
+        // Strings are immutable, so they can be shared.
+        aaa_incref(value);
+        return value;
+    }
+}
+
+// Printing, this follows Variable.__str__() and Variable.__repr__()
+
+static void aaa_write_repr(FILE *file, Value value);
+
+static void aaa_write_str(FILE *file, Value value) {
+    switch (value.kind) {
+    case AAA_INT:
+        fprintf(file, "%lld", (long long)value.as.i);
+        break;
+    case AAA_BOOL:
+        fputs(value.as.b ? "true" : "false", file);
+        break;
+    case AAA_STR:
+        fwrite(aaa_str(value)->data, 1, aaa_str(value)->length, file);
+        break;
+    case AAA_VEC:
+        fputc('[', file);
+        for (size_t i = 0; i < aaa_vec(value)->size; i++) {
+            if (i) {
+                fputs(", ", file);
+            }
+            aaa_write_repr(file, aaa_vec(value)->items[i]);
+        }
+        fputc(']', file);
+        break;
+    case AAA_MAP: {
+        bool first = true;
+
+        fputc('{', file);
+        for (size_t i = 0; i < aaa_map(value)->entry_count; i++) {
+            AaaMapEntry *entry = &aaa_map(value)->entries[i];
+            if (!entry->used) {
+                continue;
+            }
+            if (!first) {
+                fputs(", ", file);
+            }
+            first = false;
+            aaa_write_repr(file, entry->key);
+            fputs(": ", file);
+            aaa_write_repr(file, entry->value);
+        }
+        fputc('}', file);
+        break;
+    }
+    case AAA_STRUCT: {
+        const AaaStructType *type = aaa_struct(value)->type;
+
+        fprintf(file, "<struct %s>{", type->name);
+        for (size_t i = 0; i < type->field_count; i++) {
+            if (i) {
+                fputs(", ", file);
+            }
+            fprintf(file, "'%s': ", type->field_names[i]);
+            aaa_write_repr(file, aaa_struct(value)->fields[i]);
+        }
+        fputc('}', file);
+        break;
+    }
+    }
+}
+
+static void aaa_write_repr(FILE *file, Value value) {
+    if (value.kind == AAA_STR) {
+        fputc('"', file);
+        aaa_write_str(file, value);
+        fputc('"', file);
+    } else {
+        aaa_write_str(file, value);
+    }
+}
+
+void aaa_print(Value value) {
+    aaa_write_str(stdout, value);
+    aaa_decref(value);
+}
+
+// Call stack
+
+void aaa_call_stack_overflow(const AaaFunctionInfo *function) {
+    fflush(stdout);
+    fprintf(stderr,
+            "Call stack overflow: calling %s exceeds the maximum call depth of %zu.\n",
+            function->name, aaa_max_call_depth);
+    exit(1);
+}
+
+void aaa_assertion_failure(void) {
+    fflush(stdout);
+    fprintf(stderr, "Assertion failure, stacktrace:\n");
+
+    for (size_t i = 0; i < aaa_call_depth; i++) {
+        const AaaFrame *frame = &aaa_call_stack[i];
+        const AaaFunctionInfo *function = frame->function;
+
+        fprintf(stderr, "- %s", function->name);
+
+        // Arguments are listed last to first
+        for (size_t arg = function->argument_count; arg > 0; arg--) {
+            fputs(arg == function->argument_count ? ", arguments: " : ", ", stderr);
+            fprintf(stderr, "%s=", function->argument_names[arg - 1]);
+            aaa_write_repr(stderr, frame->arguments[arg - 1]);
+        }
+    }
+
+    fprintf(stderr, "\n");
+    exit(1);
+}
+
+static void *aaa_run_main(void *unused) {
+    (void)unused;
+    aaa_main();
+    fflush(stdout);
+    return NULL;
+}
+
+int aaa_run(size_t max_call_depth, size_t frame_size) {
+    aaa_max_call_depth = max_call_depth;
+    aaa_call_stack = aaa_malloc(max_call_depth * sizeof(AaaFrame));
+
+    // Deep recursion doesn't fit in the default stack of the main thread. Pages of
+    // the stack that are never touched don't take any memory.
+    pthread_attr_t attributes;
+    pthread_t thread;
+
+    pthread_attr_init(&attributes);
+    pthread_attr_setstacksize(&attributes,
+                              max_call_depth * frame_size + AAA_STACK_MARGIN);
+
+    if (pthread_create(&thread, &attributes, aaa_run_main, NULL) != 0) {
+        aaa_runtime_error("could not start main thread");
+    }
+
+    pthread_join(thread, NULL);
+    return 0;
+}
+
+// Standard library: vectors
+
+AAA_STDLIB(vec_push) { aaa_vec_append(aaa_vec(io[0]), io[1]); }
+
+AAA_STDLIB(vec_pop) {
+    AaaVec *vec = aaa_vec(io[0]);
+
+    if (!vec->size) {
+        aaa_runtime_error("pop from empty vector");
+    }
+    io[1] = vec->items[--vec->size];
+}
+
+AAA_STDLIB(vec_get) {
+    AaaVec *vec = aaa_vec(io[0]);
+    Value item = vec->items[aaa_vec_offset(vec, io[1].as.i)];
+
+    aaa_incref(item);
+    io[1] = item;
+}
+
+AAA_STDLIB(vec_set) {
+    AaaVec *vec = aaa_vec(io[0]);
+    size_t offset = aaa_vec_offset(vec, io[1].as.i);
+
+    aaa_decref(vec->items[offset]);
+    vec->items[offset] = io[2];
+}
+
+AAA_STDLIB(vec_size) { io[1] = AAA_INT_VALUE((int64_t)aaa_vec(io[0])->size); }
+
+AAA_STDLIB(vec_empty) { io[1] = AAA_BOOL_VALUE(aaa_vec(io[0])->size == 0); }
+
+AAA_STDLIB(vec_clear) {
+    AaaVec *vec = aaa_vec(io[0]);
+
+    for (size_t i = 0; i < vec->size; i++) {
+        aaa_decref(vec->items[i]);
+    }
+    vec->size = 0;
+}
+
+AAA_STDLIB(vec_copy) { io[1] = aaa_deep_copy(io[0]); }
+
+// Standard library: maps
+
+AAA_STDLIB(map_get) {
+    AaaMapEntry *entry = aaa_map_find(aaa_map(io[0]), io[1]);
+
+    if (!entry) {
+        aaa_runtime_error("key not found in map");
+    }
+
+    aaa_decref(io[1]);
+    aaa_incref(entry->value);
+    io[1] = entry->value;
+}
+
+AAA_STDLIB(map_set) { aaa_map_set(aaa_map(io[0]), io[1], io[2]); }
+
+AAA_STDLIB(map_has_key) {
+    bool has_key = aaa_map_find(aaa_map(io[0]), io[1]) != NULL;
+
+    aaa_decref(io[1]);
+    io[1] = AAA_BOOL_VALUE(has_key);
+}
+
+AAA_STDLIB(map_size) { io[1] = AAA_INT_VALUE((int64_t)aaa_map(io[0])->size); }
+
+AAA_STDLIB(map_empty) { io[1] = AAA_BOOL_VALUE(aaa_map(io[0])->size == 0); }
+
+AAA_STDLIB(map_pop) {
+    Value value = aaa_map_remove(aaa_map(io[0]), io[1]);
+
+    aaa_decref(io[1]);
+    io[1] = value;
+}
+
+AAA_STDLIB(map_drop) {
+    aaa_decref(aaa_map_remove(aaa_map(io[0]), io[1]));
+    aaa_decref(io[1]);
+}
+
+AAA_STDLIB(map_clear) { aaa_map_clear(aaa_map(io[0])); }
+
+AAA_STDLIB(map_copy) { io[1] = aaa_deep_copy(io[0]); }
+
+AAA_STDLIB(map_keys) {
+    (void)io;
+    aaa_runtime_error("map:keys is not implemented");
+}
+
+AAA_STDLIB(map_values) {
+    (void)io;
+    aaa_runtime_error("map:values is not implemented");
+}
+
+// Standard library: environment and syscalls
+
+AAA_STDLIB(environ) {
+    Value map = aaa_map_new();
+
+    for (char **env_var = environ; *env_var; env_var++) {
+        const char *separator = strchr(*env_var, '=');
+        if (!separator) {
+            continue;
+        }
+
+        Value name = aaa_str_new(*env_var, (size_t)(separator - *env_var));
+        aaa_map_set(aaa_map(map), name, aaa_str_from_c_string(separator + 1));
+    }
+
+    io[0] = map;
+}
+
+AAA_STDLIB(getenv) {
+    const char *value = getenv(aaa_str(io[0])->data);
+
+    aaa_decref(io[0]);
+
+    if (value) {
+        io[0] = aaa_str_from_c_string(value);
+        io[1] = AAA_BOOL_VALUE(true);
+    } else {
+        io[0] = aaa_str_new("", 0);
+        io[1] = AAA_BOOL_VALUE(false);
+    }
+}
+
+AAA_STDLIB(setenv) {
+    setenv(aaa_str(io[0])->data, aaa_str(io[1])->data, 1);
+    aaa_decref(io[0]);
+    aaa_decref(io[1]);
+}
+
+AAA_STDLIB(unsetenv) {
+    unsetenv(aaa_str(io[0])->data);
+    aaa_decref(io[0]);
+}
+
+AAA_STDLIB(exit) {
+    fflush(stdout);
+    exit((int)io[0].as.i);
+}
+
+AAA_STDLIB(getcwd) {
+    char *cwd = getcwd(NULL, 0);
+
+    if (!cwd) {
+        aaa_runtime_error("getcwd failed: %s", strerror(errno));
+    }
+
+    io[0] = aaa_str_from_c_string(cwd);
+    free(cwd);
+}
+
+AAA_STDLIB(chdir) {
+    bool ok = chdir(aaa_str(io[0])->data) == 0;
+
+    aaa_decref(io[0]);
+    io[0] = AAA_BOOL_VALUE(ok);
+}
+
+AAA_STDLIB(read) {
+    int64_t n = io[1].as.i;
+    char *data = aaa_malloc(n > 0 ? (size_t)n : 1);
+    ssize_t read_count = n >= 0 ? read((int)io[0].as.i, data, (size_t)n) : -1;
+
+    if (read_count < 0) {
+        io[0] = aaa_str_new("", 0);
+        io[1] = AAA_BOOL_VALUE(false);
+    } else {
+        io[0] = aaa_str_new(data, (size_t)read_count);
+        io[1] = AAA_BOOL_VALUE(true);
+    }
+
+    free(data);
+}
+
+AAA_STDLIB(write) {
+    fflush(stdout);
+    ssize_t written = write((int)io[0].as.i, aaa_str(io[1])->data, aaa_str(io[1])->length);
+
+    aaa_decref(io[1]);
+
+    if (written < 0) {
+        io[0] = AAA_INT_VALUE(0);
+        io[1] = AAA_BOOL_VALUE(false);
+    } else {
+        io[0] = AAA_INT_VALUE((int64_t)written);
+        io[1] = AAA_BOOL_VALUE(true);
+    }
+}
+
+AAA_STDLIB(open) {
+    int fd = open(aaa_str(io[0])->data, (int)io[1].as.i, (mode_t)io[2].as.i);
+
+    aaa_decref(io[0]);
+    io[0] = AAA_INT_VALUE(fd < 0 ? 0 : fd);
+    io[1] = AAA_BOOL_VALUE(fd >= 0);
+}
+
+AAA_STDLIB(close) { io[0] = AAA_BOOL_VALUE(close((int)io[0].as.i) == 0); }
+
+AAA_STDLIB(fsync) { io[0] = AAA_BOOL_VALUE(fsync((int)io[0].as.i) == 0); }
+
+AAA_STDLIB(time) { io[0] = AAA_INT_VALUE((int64_t)time(NULL)); }
+
+AAA_STDLIB(getpid) { io[0] = AAA_INT_VALUE((int64_t)getpid()); }
+
+AAA_STDLIB(getppid) { io[0] = AAA_INT_VALUE((int64_t)getppid()); }
+
+AAA_STDLIB(fork) {
+    fflush(stdout);
+    io[0] = AAA_INT_VALUE((int64_t)fork());
+}
+
+AAA_STDLIB(waitpid) {
+    int status;
+    pid_t pid = waitpid((pid_t)io[0].as.i, &status, (int)io[1].as.i);
+
+    if (pid < 0) {
+        io[0] = AAA_INT_VALUE(0);
+        io[1] = AAA_BOOL_VALUE(false);
+        return;
+    }
+
+    // Same as os.waitstatus_to_exitcode() in Python
+    int64_t exit_code = WIFSIGNALED(status) ? -WTERMSIG(status) : WEXITSTATUS(status);
+    io[0] = AAA_INT_VALUE(exit_code);
+    io[1] = AAA_BOOL_VALUE(true);
+}
+
+AAA_STDLIB(execve) {
+    AaaVec *argv_vec = aaa_vec(io[1]);
+    AaaMap *env_map = aaa_map(io[2]);
+    char **argv = aaa_malloc((argv_vec->size + 1) * sizeof(char *));
+    char **envp = aaa_malloc((env_map->size + 1) * sizeof(char *));
+    size_t env_count = 0;
+
+    for (size_t i = 0; i < argv_vec->size; i++) {
+        argv[i] = (char *)aaa_str(argv_vec->items[i])->data;
+    }
+    argv[argv_vec->size] = NULL;
+
+    for (size_t i = 0; i < env_map->entry_count; i++) {
+        AaaMapEntry *entry = &env_map->entries[i];
+        if (!entry->used) {
+            continue;
+        }
+
+        AaaStr *name = aaa_str(entry->key);
+        AaaStr *value = aaa_str(entry->value);
+        char *env_var = aaa_malloc(name->length + value->length + 2);
+
+        sprintf(env_var, "%s=%s", name->data, value->data);
+        envp[env_count++] = env_var;
+    }
+    envp[env_count] = NULL;
+
+    fflush(stdout);
+    execve(aaa_str(io[0])->data, argv, envp);
+    aaa_runtime_error("execve failed: %s", strerror(errno));
+}
+
+// Standard library: strings
+
+AAA_STDLIB(str_append) {
+    AaaStr *string = aaa_str(io[0]);
+    AaaStr *other = aaa_str(io[1]);
+    AaaBuffer buffer = {NULL, 0, 0};
+
+    aaa_buffer_append(&buffer, string->data, string->length);
+    aaa_buffer_append(&buffer, other->data, other->length);
+
+    aaa_decref(io[1]);
+    io[1] = aaa_buffer_to_str(&buffer);
+}
+
+AAA_STDLIB(str_contains) {
+    bool contains = aaa_str_find_from(aaa_str(io[0]), aaa_str(io[1]), 0) >= 0;
+
+    aaa_decref(io[1]);
+    io[1] = AAA_BOOL_VALUE(contains);
+}
+
+AAA_STDLIB(str_equals) {
+    bool equals = aaa_str_eq(aaa_str(io[0]), aaa_str(io[1]));
+
+    aaa_decref(io[1]);
+    io[1] = AAA_BOOL_VALUE(equals);
+}
+
+AAA_STDLIB(str_join) {
+    AaaStr *separator = aaa_str(io[0]);
+    AaaVec *parts = aaa_vec(io[1]);
+    AaaBuffer buffer = {NULL, 0, 0};
+
+    for (size_t i = 0; i < parts->size; i++) {
+        if (i) {
+            aaa_buffer_append(&buffer, separator->data, separator->length);
+        }
+        aaa_buffer_append(&buffer, aaa_str(parts->items[i])->data,
+                          aaa_str(parts->items[i])->length);
+    }
+
+    aaa_decref(io[1]);
+    io[1] = aaa_buffer_to_str(&buffer);
+}
+
+AAA_STDLIB(str_len) { io[1] = AAA_INT_VALUE((int64_t)aaa_str(io[0])->length); }
+
+static Value aaa_str_map_chars(const AaaStr *string, int (*convert)(int)) {
+    Value converted = aaa_str_new(string->data, string->length);
+    char *data = (char *)aaa_str(converted)->data;
+
+    for (size_t i = 0; i < string->length; i++) {
+        unsigned char c = (unsigned char)data[i];
+        if (c < 128) {
+            data[i] = (char)convert(c);
+        }
+    }
+
+    return converted;
+}
+
+static int aaa_to_lower(int c) { return c >= 'A' && c <= 'Z' ? c + 32 : c; }
+
+static int aaa_to_upper(int c) { return c >= 'a' && c <= 'z' ? c - 32 : c; }
+
+AAA_STDLIB(str_lower) { io[1] = aaa_str_map_chars(aaa_str(io[0]), aaa_to_lower); }
+
+AAA_STDLIB(str_upper) { io[1] = aaa_str_map_chars(aaa_str(io[0]), aaa_to_upper); }
+
+AAA_STDLIB(str_replace) {
+    AaaStr *string = aaa_str(io[0]);
+    AaaStr *search = aaa_str(io[1]);
+    AaaStr *replacement = aaa_str(io[2]);
+    AaaBuffer buffer = {NULL, 0, 0};
+
+    if (!search->length) {
+        // Like Python, insert the replacement around every character.
+        for (size_t i = 0; i < string->length; i++) {
+            aaa_buffer_append(&buffer, replacement->data, replacement->length);
+            aaa_buffer_append(&buffer, string->data + i, 1);
+        }
+        aaa_buffer_append(&buffer, replacement->data, replacement->length);
+    } else {
+        size_t offset = 0;
+        int64_t found;
+
+        while ((found = aaa_str_find_from(string, search, offset)) >= 0) {
+            aaa_buffer_append(&buffer, string->data + offset, (size_t)found - offset);
+            aaa_buffer_append(&buffer, replacement->data, replacement->length);
+            offset = (size_t)found + search->length;
+        }
+        aaa_buffer_append(&buffer, string->data + offset, string->length - offset);
+    }
+
+    aaa_decref(io[1]);
+    aaa_decref(io[2]);
+    io[1] = aaa_buffer_to_str(&buffer);
+}
+
+AAA_STDLIB(str_split) {
+    AaaStr *string = aaa_str(io[0]);
+    AaaStr *separator = aaa_str(io[1]);
+    Value parts = aaa_vec_new();
+    size_t offset = 0;
+    int64_t found;
+
+    if (!separator->length) {
+        aaa_runtime_error("empty separator");
+    }
+
+    while ((found = aaa_str_find_from(string, separator, offset)) >= 0) {
+        aaa_vec_append(aaa_vec(parts),
+                       aaa_str_new(string->data + offset, (size_t)found - offset));
+        offset = (size_t)found + separator->length;
+    }
+    aaa_vec_append(aaa_vec(parts),
+                   aaa_str_new(string->data + offset, string->length - offset));
+
+    aaa_decref(io[1]);
+    io[1] = parts;
+}
+
+// Python's str.strip() also strips the ASCII separator characters 0x1c - 0x1f
+static bool aaa_is_space(char c) {
+    return c == ' ' || (c >= '\t' && c <= '\r') || (c >= 0x1c && c <= 0x1f);
+}
+
+AAA_STDLIB(str_strip) {
+    AaaStr *string = aaa_str(io[0]);
+    size_t start = 0;
+    size_t end = string->length;
+
+    while (start < end && aaa_is_space(string->data[start])) {
+        start++;
+    }
+    while (end > start && aaa_is_space(string->data[end - 1])) {
+        end--;
+    }
+
+    Value stripped = aaa_str_new(string->data + start, end - start);
+    aaa_decref(io[0]);
+    io[0] = stripped;
+}
+
+static void aaa_find_result(Value *io, int64_t found) {
+    io[1] = AAA_INT_VALUE(found < 0 ? 0 : found);
+    io[2] = AAA_BOOL_VALUE(found >= 0);
+}
+
+AAA_STDLIB(str_find) {
+    int64_t found = aaa_str_find_from(aaa_str(io[0]), aaa_str(io[1]), 0);
+
+    aaa_decref(io[1]);
+    aaa_find_result(io, found);
+}
+
+AAA_STDLIB(str_find_after) {
+    int64_t length = (int64_t)aaa_str(io[0])->length;
+    int64_t offset = io[2].as.i;
+    int64_t found = -1;
+
+    // Negative offsets count from the end, like in Python
+    if (offset < 0) {
+        offset = offset + length < 0 ? 0 : offset + length;
+    }
+
+    if (offset <= length) {
+        found = aaa_str_find_from(aaa_str(io[0]), aaa_str(io[1]), (size_t)offset);
+    }
+
+    aaa_decref(io[1]);
+    aaa_find_result(io, found);
+}
+
+AAA_STDLIB(str_substr) {
+    AaaStr *string = aaa_str(io[0]);
+    int64_t length = (int64_t)string->length;
+    int64_t start = io[1].as.i;
+    int64_t end = io[2].as.i;
+
+    if (start < 0 || end < 0 || start > length || end > length || end < start) {
+        io[1] = aaa_str_new("", 0);
+        io[2] = AAA_BOOL_VALUE(false);
+        return;
+    }
+
+    io[1] = aaa_str_new(string->data + start, (size_t)(end - start));
+    io[2] = AAA_BOOL_VALUE(true);
+}
+
+AAA_STDLIB(str_to_bool) {
+    AaaStr *string = aaa_str(io[0]);
+    bool is_true = string->length == 4 && memcmp(string->data, "true", 4) == 0;
+    bool is_false = string->length == 5 && memcmp(string->data, "false", 5) == 0;
+
+    io[1] = AAA_BOOL_VALUE(is_true);
+    io[2] = AAA_BOOL_VALUE(is_true || is_false);
+}
+
+// Accepts what Python's int() accepts for ASCII input: surrounding whitespace,
+// a sign and digits with single underscores between them.
+AAA_STDLIB(str_to_int) {
+    AaaStr *string = aaa_str(io[0]);
+    const char *data = string->data;
+    size_t start = 0;
+    size_t end = string->length;
+    bool negative = false;
+    bool ok = true;
+    uint64_t value = 0;
+
+    while (start < end && aaa_is_space(data[start])) {
+        start++;
+    }
+    while (end > start && aaa_is_space(data[end - 1])) {
+        end--;
+    }
+
+    if (start < end && (data[start] == '+' || data[start] == '-')) {
+        negative = data[start] == '-';
+        start++;
+    }
+
+    if (start == end || data[start] == '_' || data[end - 1] == '_') {
+        ok = false;
+    }
+
+    for (size_t i = start; ok && i < end; i++) {
+        if (data[i] == '_' && data[i - 1] != '_') {
+            continue;
+        }
+        if (data[i] < '0' || data[i] > '9') {
+            ok = false;
+            break;
+        }
+
+        uint64_t digit = (uint64_t)(data[i] - '0');
+        if (value > (UINT64_C(1) << 63) / 10 ||
+            value * 10 + digit > (UINT64_C(1) << 63) - (negative ? 0 : 1)) {
+            ok = false;
+            break;
+        }
+        value = value * 10 + digit;
+    }
+
+    if (!ok) {
+        io[1] = AAA_INT_VALUE(0);
+        io[2] = AAA_BOOL_VALUE(false);
+        return;
+    }
+
+    io[1] = AAA_INT_VALUE(negative ? (int64_t)(0 - value) : (int64_t)value);
+    io[2] = AAA_BOOL_VALUE(true);
+}
@@ -0,0 +1,244 @@
+// Runtime for Aaa programs compiled to C by `aaa.py build-native`.
+//
+// Values of type int and bool are stored unboxed in a Value. Strings, vectors,
+// maps and structs are refcounted heap objects. Every Value stored on the stack
+// of a generated function owns one reference.
+
+#ifndef AAA_H
+#define AAA_H
+
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+typedef enum {
+    AAA_INT,
+    AAA_BOOL,
+    AAA_STR,
+    AAA_VEC,
+    AAA_MAP,
+    AAA_STRUCT,
+} AaaKind;
+
+// Objects with this refcount are never freed, such as string literals.
+#define AAA_STATIC_REFCOUNT (-1)
+
+typedef struct {
+    int64_t refcount;
+} AaaObject;
+
+typedef struct {
+    AaaKind kind;
+    union {
+        int64_t i;
+        bool b;
+        AaaObject *o;
+    } as;
+} Value;
+
+typedef struct {
+    AaaObject header;
+    size_t length;
+    const char *data;
+} AaaStr;
+
+typedef struct {
+    AaaObject header;
+    size_t size;
+    size_t capacity;
+    Value *items;
+} AaaVec;
+
+typedef struct {
+    Value key;
+    Value value;
+    uint64_t hash;
+    bool used;
+} AaaMapEntry;
+
+// Maps keep insertion order, like Python dicts.
+typedef struct {
+    AaaObject header;
+    size_t size;
+    size_t entry_count;
+    size_t entry_capacity;
+    AaaMapEntry *entries;
+    size_t index_capacity;
+    int64_t *index;
+} AaaMap;
+
+typedef struct AaaStructType AaaStructType;
+
+struct AaaStructType {
+    const char *name;
+    size_t field_count;
+    const char *const *field_names;
+    const AaaKind *field_kinds;
+
+    // Type of fields of kind AAA_STRUCT, NULL for other fields
+    const AaaStructType *const *field_struct_types;
+};
+
+typedef struct {
+    AaaObject header;
+    const AaaStructType *type;
+    Value fields[];
+} AaaStruct;
+
+typedef struct {
+    const char *name;
+    size_t argument_count;
+    const char *const *argument_names;
+} AaaFunctionInfo;
+
+#define AAA_INT_VALUE(value) ((Value){.kind = AAA_INT, .as.i = (value)})
+#define AAA_BOOL_VALUE(value) ((Value){.kind = AAA_BOOL, .as.b = (value)})
+#define AAA_OBJECT_VALUE(object_kind, object) \
+    ((Value){.kind = (object_kind), .as.o = (AaaObject *)(object)})
+
+#define AAA_STR_LITERAL(literal) \
+    {{AAA_STATIC_REFCOUNT}, sizeof(literal) - 1, literal}
+
+// Integers wrap around instead of growing like they do in Python.
+#define AAA_ADD(x, y) ((int64_t)((uint64_t)(x) + (uint64_t)(y)))
+#define AAA_SUB(x, y) ((int64_t)((uint64_t)(x) - (uint64_t)(y)))
+#define AAA_MUL(x, y) ((int64_t)((uint64_t)(x) * (uint64_t)(y)))
+
+void aaa_free_object(Value value);
+
+static inline void aaa_incref(Value value) {
+    if (value.kind >= AAA_STR && value.as.o->refcount != AAA_STATIC_REFCOUNT) {
+        value.as.o->refcount++;
+    }
+}
+
+static inline void aaa_decref(Value value) {
+    if (value.kind >= AAA_STR && value.as.o->refcount != AAA_STATIC_REFCOUNT) {
+        if (--value.as.o->refcount == 0) {
+            aaa_free_object(value);
+        }
+    }
+}
+
+// Division and modulo round towards negative infinity, like in Python.
+static inline int64_t aaa_floor_div(int64_t x, int64_t y) {
+    if (y == -1) {
+        return AAA_SUB(0, x);
+    }
+
+    int64_t quotient = x / y;
+    if ((x % y != 0) && ((x < 0) != (y < 0))) {
+        quotient--;
+    }
+    return quotient;
+}
+
+static inline int64_t aaa_floor_mod(int64_t x, int64_t y) {
+    if (y == -1) {
+        return 0;
+    }
+
+    int64_t remainder = x % y;
+    if (remainder != 0 && ((remainder < 0) != (y < 0))) {
+        remainder += y;
+    }
+    return remainder;
+}
+
+// The call stack is kept for stack traces and to limit the call depth.
+typedef struct {
+    const AaaFunctionInfo *function;
+    const Value *arguments;
+} AaaFrame;
+
+extern AaaFrame *aaa_call_stack;
+extern size_t aaa_call_depth;
+extern size_t aaa_max_call_depth;
+
+void aaa_call_stack_overflow(const AaaFunctionInfo *function);
+
+static inline void aaa_enter(const AaaFunctionInfo *function, const Value *arguments) {
+    if (aaa_call_depth >= aaa_max_call_depth) {
+        aaa_call_stack_overflow(function);
+    }
+    aaa_call_stack[aaa_call_depth].function = function;
+    aaa_call_stack[aaa_call_depth].arguments = arguments;
+    aaa_call_depth++;
+}
+
+static inline void aaa_leave(void) { aaa_call_depth--; }
+
+void aaa_assertion_failure(void);
+void aaa_print(Value value);
+
+Value aaa_vec_new(void);
+Value aaa_map_new(void);
+Value aaa_struct_new(const AaaStructType *type);
+Value aaa_struct_get(Value structure, Value field_name);
+void aaa_struct_set(Value structure, Value field_name, Value value);
+
+// Implemented by the generated code, calls the main function.
+void aaa_main(void);
+
+// Runs aaa_main() with a stack that fits the maximum call depth, frame_size is the
+// largest native stack frame of a generated function.
+int aaa_run(size_t max_call_depth, size_t frame_size);
+
+// Standard library functions take their arguments from the start of io and write
+// the values they return there, in stack order.
+#define AAA_STDLIB(name) void aaa_stdlib_##name(Value *io)
+
+AAA_STDLIB(vec_push);
+AAA_STDLIB(vec_pop);
+AAA_STDLIB(vec_get);
+AAA_STDLIB(vec_set);
+AAA_STDLIB(vec_size);
+AAA_STDLIB(vec_empty);
+AAA_STDLIB(vec_clear);
+AAA_STDLIB(vec_copy);
+AAA_STDLIB(map_get);
+AAA_STDLIB(map_set);
+AAA_STDLIB(map_has_key);
+AAA_STDLIB(map_size);
+AAA_STDLIB(map_empty);
+AAA_STDLIB(map_pop);
+AAA_STDLIB(map_drop);
+AAA_STDLIB(map_clear);
+AAA_STDLIB(map_copy);
+AAA_STDLIB(map_keys);
+AAA_STDLIB(map_values);
+AAA_STDLIB(environ);
+AAA_STDLIB(getenv);
+AAA_STDLIB(setenv);
+AAA_STDLIB(unsetenv);
+AAA_STDLIB(exit);
+AAA_STDLIB(getcwd);
+AAA_STDLIB(chdir);
+AAA_STDLIB(read);
+AAA_STDLIB(write);
+AAA_STDLIB(open);
+AAA_STDLIB(close);
+AAA_STDLIB(fsync);
+AAA_STDLIB(time);
+AAA_STDLIB(getpid);
+AAA_STDLIB(getppid);
+AAA_STDLIB(fork);
+AAA_STDLIB(waitpid);
+AAA_STDLIB(execve);
+AAA_STDLIB(str_append);
+AAA_STDLIB(str_contains);
+AAA_STDLIB(str_equals);
+AAA_STDLIB(str_join);
+AAA_STDLIB(str_len);
+AAA_STDLIB(str_lower);
+AAA_STDLIB(str_upper);
+AAA_STDLIB(str_replace);
+AAA_STDLIB(str_split);
+AAA_STDLIB(str_strip);
+AAA_STDLIB(str_find);
+AAA_STDLIB(str_find_after);
+AAA_STDLIB(str_substr);
+AAA_STDLIB(str_to_bool);
+AAA_STDLIB(str_to_int);
+
+#endif
@@ -0,0 +1,170 @@
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from lang.loops import JUMP_INSTRUCTIONS
+from lang.models.instructions import (
+    CallFunction,
+    CountedLoop,
+    CountedLoopStep,
+    Instruction,
+    Jump,
+    JumpIfNot,
+)
+from lang.models.profile import (
+    BranchProfile,
+    FunctionProfile,
+    LoopProfile,
+    Profile,
+)
+from lang.models.runtime import Handler
+from lang.purity import FunctionKey
+from lang.superinstructions import get_pair_name
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# Branches in a profile are numbered by the order of these in their function
+CONDITIONAL_JUMPS = (CountedLoop, CountedLoopStep, JumpIfNot)
+
+
+def get_function_key(program: "Program", file: Path, func_name: str) -> str:
+    # Profiles identify functions by name, so they still apply after edits
+    if file == program.entry_point_file:
+        return func_name
+
+    try:
+        relative_file = file.relative_to(program.entry_point_file.parent)
+    except ValueError:
+        relative_file = file
+
+    return f"{relative_file}:{func_name}"
+
+
+class InstructionCounts:
+    # How often each instruction of a function ran, and how often it jumped
+    __slots__ = ("instructions", "counts", "taken")
+
+    def __init__(self, instructions: List[Instruction]) -> None:
+        self.instructions = instructions
+        self.counts = [0] * len(instructions)
+        self.taken = [0] * len(instructions)
+
+
+class Profiler:
+    # Records a profile while the simulator runs. Every instruction of a profiled
+    # function gets its own counting handler, which wraps the regular one.
+
+    def __init__(self, program: "Program") -> None:
+        self.program = program
+        self.function_counts: Dict[FunctionKey, InstructionCounts] = {}
+
+    def get_counting_handlers(
+        self,
+        file: Path,
+        func_name: str,
+        instructions: List[Instruction],
+        handlers: List[Handler],
+    ) -> List[Handler]:
+        function_counts = InstructionCounts(instructions)
+        self.function_counts[(file, func_name)] = function_counts
+
+        return [
+            self.make_counting_handler(handler, function_counts, ip)
+            for ip, handler in enumerate(handlers)
+        ]
+
+    def make_counting_handler(
+        self, handler: Handler, function_counts: InstructionCounts, ip: int
+    ) -> Handler:
+        counts = function_counts.counts
+        taken = function_counts.taken
+
+        def counting_handler(instruction: Instruction) -> Optional[int]:
+            counts[ip] += 1
+            jump_target = handler(instruction)
+
+            if jump_target is not None:
+                taken[ip] += 1
+            return jump_target
+
+        return counting_handler
+
+    def get_profile(self) -> Profile:
+        calls: Dict[FunctionKey, int] = Counter()
+        calls[(self.program.entry_point_file, "main")] = 1
+        pairs: Dict[str, int] = Counter()
+
+        for function_counts in self.function_counts.values():
+            instructions = function_counts.instructions
+            counts = function_counts.counts
+
+            jump_targets = {
+                instruction.instruction_offset
+                for instruction in instructions
+                if isinstance(instruction, JUMP_INSTRUCTIONS)
+            }
+
+            for ip, instruction in enumerate(instructions):
+                if isinstance(instruction, CallFunction):
+                    calls[(instruction.file, instruction.func_name)] += counts[ip]
+                    continue
+
+                # Pairs that always run in sequence, see lang.superinstructions
+                if (
+                    ip + 1 < len(instructions)
+                    and ip + 1 not in jump_targets
+                    and not isinstance(instruction, JUMP_INSTRUCTIONS)
+                    and counts[ip]
+                ):
+                    pair_name = get_pair_name(instruction, instructions[ip + 1])
+                    pairs[pair_name] += counts[ip]
+
+        functions = {
+            get_function_key(self.program, file, func_name): self.get_function_profile(
+                function_counts, calls[(file, func_name)]
+            )
+            for (file, func_name), function_counts in self.function_counts.items()
+        }
+
+        return Profile(
+            instruction_count=sum(
+                sum(function_counts.counts)
+                for function_counts in self.function_counts.values()
+            ),
+            functions=functions,
+            pairs=dict(sorted(pairs.items())),
+        )
+
+    def get_function_profile(
+        self, function_counts: InstructionCounts, calls: int
+    ) -> FunctionProfile:
+        instructions = function_counts.instructions
+        counts = function_counts.counts
+        taken = function_counts.taken
+
+        branches: List[BranchProfile] = []
+        loops: List[LoopProfile] = []
+
+        for ip, instruction in enumerate(instructions):
+            if isinstance(instruction, CONDITIONAL_JUMPS):
+                branches.append(
+                    BranchProfile(taken=taken[ip], not_taken=counts[ip] - taken[ip])
+                )
+
+            # Loops are entered every time their condition runs, except after jumping
+            # back to it. A CountedLoopStep jumps back past the condition to the
+            # body, and runs at the end of every iteration.
+            if isinstance(instruction, CountedLoopStep):
+                header = instruction.instruction_offset - 1
+                loops.append(LoopProfile(entries=counts[header], iterations=counts[ip]))
+
+            elif isinstance(instruction, Jump) and instruction.instruction_offset < ip:
+                header = instruction.instruction_offset
+                loops.append(
+                    LoopProfile(
+                        entries=counts[header] - taken[ip], iterations=taken[ip]
+                    )
+                )
+
+        return FunctionProfile(calls=calls, branches=branches, loops=loops)
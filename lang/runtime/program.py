@@ -7,6 +7,7 @@ from typing import Dict, List, Optional, Set, Tuple, Union
 
 from lark.exceptions import UnexpectedInput, VisitError
 
+from lang.constant_calls import evaluate_constant_calls
 from lang.exceptions import AaaLoadException
 from lang.exceptions.import_ import (
     AbsoluteImportError,
@@ -21,7 +22,8 @@ from lang.exceptions.misc import (
 )
 from lang.exceptions.naming import CollidingIdentifier, UnknownArgumentType
 from lang.instruction_generator import InstructionGenerator
-from lang.models.instructions import Instruction
+from lang.loops import fuse_counted_loops
+from lang.models.instructions import CallFunction, Instruction
 from lang.models.parse import (
     Function,
     MemberFunctionName,
@@ -29,11 +31,15 @@ from lang.models.parse import (
     ParsedFile,
     Struct,
 )
+from lang.models.profile import Profile
 from lang.models.program import Builtins, ProgramImport
 from lang.models.typing.signature import Signature
 from lang.parse.parser import aaa_builtins_parser, aaa_source_parser
 from lang.parse.transformer import AaaTransformer
+from lang.profile_guided import ProfileGuidedOptimizer
 from lang.runtime.debug import format_str
+from lang.specializer import Monomorphizer, Specializer
+from lang.ssa import optimize_instructions
 from lang.type_checker import TypeChecker
 
 # Identifiable are things identified uniquely by a filepath and name
@@ -41,8 +47,16 @@ Identifiable = Function | ProgramImport | Struct
 
 
 class Program:
-    def __init__(self, file: Path) -> None:
+    # A lazy program only checks signatures of all functions when loading files. Bodies
+    # of functions are type checked and get instructions once main reaches them, so
+    # unused functions of imported files cost no more than parsing them.
+
+    def __init__(
+        self, file: Path, lazy: bool = False, fold_constant_calls: bool = True
+    ) -> None:
         self.entry_point_file = file.resolve()
+        self.lazy = lazy
+        self.fold_constant_calls = fold_constant_calls
         self.identifiers: Dict[Path, Dict[str, Identifiable]] = {}
         self.function_instructions: Dict[Path, Dict[str, List[Instruction]]] = {}
         self.function_signatures: Dict[Path, Dict[str, Signature]] = {}
@@ -59,12 +73,22 @@ class Program:
 
         self.file_load_errors = self._load_file(self.entry_point_file)
 
+        if self.lazy and not self.file_load_errors:
+            self.file_load_errors = self._load_reachable_functions()
+
+        if fold_constant_calls and not self.file_load_errors:
+            evaluate_constant_calls(self)
+
     @classmethod
-    def without_file(cls, code: str) -> "Program":
+    def without_file(
+        cls, code: str, lazy: bool = False, fold_constant_calls: bool = True
+    ) -> "Program":
         with NamedTemporaryFile(delete=False) as file:
             saved_file = Path(file.name)
             saved_file.write_text(code)
-            return cls(file=saved_file)
+            return cls(
+                file=saved_file, lazy=lazy, fold_constant_calls=fold_constant_calls
+            )
 
     def _load_builtins(self) -> Tuple[Builtins, List[AaaLoadException]]:
         builtins = Builtins(path="", functions={})
@@ -140,9 +164,12 @@ class Program:
             self.file_load_stack.pop()
             return load_file_exceptions
 
-        self.function_instructions[file] = self._generate_file_instructions(
-            file, parsed_file
-        )
+        if self.lazy:
+            self.function_instructions[file] = {}
+        else:
+            self.function_instructions[file] = self._generate_file_instructions(
+                file, parsed_file
+            )
         self.file_load_stack.pop()
         return []
 
@@ -192,11 +219,42 @@ class Program:
     ) -> Dict[str, List[Instruction]]:
         file_instructions: Dict[str, List[Instruction]] = {}
         for function in parsed_file.functions:
-            file_instructions[str(function.name)] = InstructionGenerator(
-                file, function, self
-            ).generate_instructions()
+            file_instructions[str(function.name)] = self.generate_instructions(
+                file, function
+            )
         return file_instructions
 
+    def generate_instructions(
+        self,
+        file: Path,
+        function: Function,
+        inlined: Optional[Dict[Tuple[Path, str], List[Instruction]]] = None,
+    ) -> List[Instruction]:
+        instructions = InstructionGenerator(
+            file, function, self
+        ).generate_instructions()
+        return self._optimize_instructions(file, function, instructions, inlined)
+
+    def _optimize_instructions(
+        self,
+        file: Path,
+        function: Function,
+        instructions: List[Instruction],
+        inlined: Optional[Dict[Tuple[Path, str], List[Instruction]]] = None,
+    ) -> List[Instruction]:
+        instructions = optimize_instructions(self, instructions, inlined)
+        instructions = Specializer(self, file, function, instructions).specialize()
+        return fuse_counted_loops(instructions)
+
+    def monomorphize(self) -> "Program":
+        # Optional, because it can create many copies of generic functions
+        Monomorphizer(self).monomorphize()
+        return self
+
+    def apply_profile(self, profile: Profile) -> "Program":
+        ProfileGuidedOptimizer(self, profile).optimize()
+        return self
+
     def _type_check_file(
         self, file: Path, parsed_file: ParsedFile
     ) -> List[AaaLoadException]:
@@ -213,10 +271,50 @@ class Program:
                 exceptions.append(MainFunctionNotFound(file))
 
         for function in parsed_file.functions:
+            type_checker = TypeChecker(file, function, self)
+
+            try:
+                if self.lazy:
+                    type_checker.check_signature()
+                else:
+                    type_checker.check()
+            except AaaLoadException as e:
+                exceptions.append(e)
+
+        return exceptions
+
+    def _load_reachable_functions(self) -> List[AaaLoadException]:
+        # Type checks functions main calls, directly or not, and generates their
+        # instructions. Calls are found before optimizations, which may remove them
+        # while the transpilers still see them in the parse tree.
+        exceptions: List[AaaLoadException] = []
+        function_keys = [(self.entry_point_file, "main")]
+        found: Set[Tuple[Path, str]] = set(function_keys)
+
+        for file, func_name in function_keys:
+            function = self.get_identifier(file, func_name)
+            assert isinstance(function, Function)
+
             try:
                 TypeChecker(file, function, self).check()
             except AaaLoadException as e:
                 exceptions.append(e)
+                continue
+
+            instructions = InstructionGenerator(
+                file, function, self
+            ).generate_instructions()
+
+            for instruction in instructions:
+                if isinstance(instruction, CallFunction):
+                    key = (instruction.file, instruction.func_name)
+                    if key not in found:
+                        found.add(key)
+                        function_keys.append(key)
+
+            self.function_instructions[file][func_name] = self._optimize_instructions(
+                file, function, instructions
+            )
 
         return exceptions
 
@@ -0,0 +1,883 @@
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from lang.exceptions.runtime import (
+    AaaAssertionFailure,
+    CallStackOverflow,
+    get_stack_trace,
+)
+from lang.loops import JUMP_INSTRUCTIONS
+from lang.models.instructions import (
+    BINARY_OPERATORS,
+    ArgumentOperation,
+    Assert,
+    CallFunction,
+    ConstantOperation,
+    CountedLoop,
+    CountedLoopStep,
+    Divide,
+    Drop,
+    Dup,
+    GetStructField,
+    Instruction,
+    Jump,
+    JumpIfNot,
+    Modulo,
+    Nop,
+    Not,
+    Over,
+    Print,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    Rot,
+    SetStructField,
+    StandardLibraryCall,
+    Swap,
+)
+from lang.models.parse import Function
+from lang.models.register_instructions import (
+    RegisterAssert,
+    RegisterBinaryOperation,
+    RegisterCallFunction,
+    RegisterCheckedDivision,
+    RegisterCountedLoop,
+    RegisterCountedLoopStep,
+    RegisterGetStructField,
+    RegisterInstruction,
+    RegisterJump,
+    RegisterJumpIfNot,
+    RegisterMove,
+    RegisterNewMap,
+    RegisterNewStruct,
+    RegisterNewVec,
+    RegisterNop,
+    RegisterNot,
+    RegisterPrint,
+    RegisterSetStructField,
+    RegisterStandardLibraryCall,
+)
+from lang.models.runtime import (
+    DEFAULT_MAX_CALL_DEPTH,
+    CallStackItem,
+    Handler,
+    RegisterFunctionRecord,
+)
+from lang.models.typing.var import (
+    Variable,
+    box,
+    map_var,
+    unbox,
+    vec_var,
+    zero_struct_var,
+)
+from lang.operators import BINARY_OPERATIONS
+from lang.runtime.base_backend import BaseBackend
+from lang.runtime.debug import make_checked_handler
+from lang.runtime.program import Program
+from lang.runtime.stdlib import (
+    STDLIB_FUNCTIONS,
+    StandardLibraryFunction,
+    get_arg_count,
+    get_generic_name,
+)
+
+REGISTER_JUMP_INSTRUCTIONS = (
+    RegisterCountedLoop,
+    RegisterCountedLoopStep,
+    RegisterJump,
+    RegisterJumpIfNot,
+)
+
+
+class RegisterTranslator:
+    # Translates the stack instructions of a function to register instructions.
+    # The type checker guarantees the stack size is known at every instruction, so
+    # the register holding each stack slot is tracked while translating. Pushing
+    # arguments and constants and stack shuffling only change which registers the
+    # stack slots refer to, so they don't become register instructions.
+    #
+    # The register file of a call holds arguments, then constants, then stack slots.
+    # At jumps and jump targets stack slot i is in register slot_base + i.
+
+    def __init__(self, program: Program, file: Path, function: Function) -> None:
+        self.program = program
+        self.file = file
+        self.function = function
+        self.instructions = program.get_instructions(file, function.identify())
+        self.argument_count = len(function.arguments)
+
+        self.constants: List[Any] = []
+        self.constant_registers: Dict[Tuple[type, Any], int] = {}
+
+        for instruction in self.instructions:
+            if isinstance(instruction, (PushBool, PushInt, PushString)):
+                self.add_constant(instruction.value)
+            elif isinstance(instruction, (CountedLoop, CountedLoopStep)):
+                if instruction.bound_arg_index is None:
+                    self.add_constant(instruction.bound)
+            elif isinstance(instruction, ConstantOperation):
+                self.add_constant(instruction.value)
+
+        self.slot_base = self.argument_count + len(self.constants)
+        self.register_count = self.slot_base
+
+        self.code: List[RegisterInstruction] = []
+        self.stack_dispatch_counts: List[int] = []
+
+        # Stack instructions that didn't become a register instruction since the
+        # start of the current basic block
+        self.pending_dispatch_count = 0
+        self.block_start = 0
+
+    def add_constant(self, value: Any) -> None:
+        key = (type(value), value)
+        if key not in self.constant_registers:
+            self.constant_registers[key] = self.argument_count + len(self.constants)
+            self.constants.append(value)
+
+    def slot(self, index: int) -> int:
+        return self.slot_base + index
+
+    def free_register(self, live: Set[int]) -> int:
+        register = self.slot_base
+        while register in live:
+            register += 1
+
+        self.register_count = max(self.register_count, register + 1)
+        return register
+
+    def allocate(self, stack: List[int], index: int, live: Set[int]) -> int:
+        # Prefer the register of the stack slot, so fewer moves are needed at jumps
+        live = live | set(stack)
+
+        if self.slot(index) not in live:
+            self.register_count = max(self.register_count, self.slot(index) + 1)
+            return self.slot(index)
+
+        return self.free_register(live)
+
+    def emit(self, instruction: RegisterInstruction, stack_dispatch_count: int) -> None:
+        self.code.append(instruction)
+        self.stack_dispatch_counts.append(stack_dispatch_count)
+
+    def end_block(self) -> None:
+        # Every instruction in a basic block runs as often as the block does, so
+        # stack instructions that were translated away are counted on its first one.
+        if self.pending_dispatch_count:
+            if len(self.code) > self.block_start:
+                self.stack_dispatch_counts[
+                    self.block_start
+                ] += self.pending_dispatch_count
+            else:
+                self.emit(RegisterNop(), self.pending_dispatch_count)
+
+        self.pending_dispatch_count = 0
+        self.block_start = len(self.code)
+
+    def canonicalize(
+        self, stack: List[int], keep: Optional[int] = None
+    ) -> Optional[int]:
+        # Moves stack slot i to register slot_base + i for all i. Register keep is not
+        # overwritten, it is moved elsewhere first if needed. Returns where it is.
+        moves = {
+            self.slot(index): register
+            for index, register in enumerate(stack)
+            if register != self.slot(index)
+        }
+        self.register_count = max(self.register_count, self.slot(len(stack)))
+
+        def live() -> Set[int]:
+            registers = set(stack) | set(moves) | set(moves.values())
+            if keep is not None:
+                registers.add(keep)
+            return registers
+
+        if keep in moves:
+            moved_keep = self.free_register(live())
+            self.emit(RegisterMove(dest=moved_keep, source=keep), 0)
+            keep = moved_keep
+
+        while moves:
+            sources = set(moves.values())
+
+            for dest, source in moves.items():
+                if dest not in sources:
+                    self.emit(RegisterMove(dest=dest, source=source), 0)
+                    del moves[dest]
+                    break
+            else:
+                # All remaining moves form cycles, break one with a free register
+                dest = next(iter(moves))
+                temporary = self.free_register(live())
+                self.emit(RegisterMove(dest=temporary, source=dest), 0)
+                moves = {
+                    move_dest: temporary if move_source == dest else move_source
+                    for move_dest, move_source in moves.items()
+                }
+
+        stack[:] = [self.slot(index) for index in range(len(stack))]
+        return keep
+
+    def translate(self) -> RegisterFunctionRecord:
+        jump_targets = {
+            instruction.instruction_offset
+            for instruction in self.instructions
+            if isinstance(instruction, JUMP_INSTRUCTIONS)
+        }
+
+        # Stack size at jump targets, which is the same for every jump to it
+        target_stack_sizes: Dict[int, int] = {}
+
+        # Maps offsets of jump targets in stack instructions to register instructions
+        target_offsets: Dict[int, int] = {}
+
+        stack: List[int] = []
+        reachable = True
+
+        for ip, instruction in enumerate(self.instructions):
+            if ip in jump_targets:
+                if reachable:
+                    self.canonicalize(stack)
+                    target_stack_sizes[ip] = len(stack)
+                else:
+                    stack = [self.slot(i) for i in range(target_stack_sizes[ip])]
+
+                self.end_block()
+                target_offsets[ip] = len(self.code)
+                reachable = True
+
+            if isinstance(instruction, Jump):
+                self.canonicalize(stack)
+                target_stack_sizes[instruction.instruction_offset] = len(stack)
+                self.emit(
+                    RegisterJump(instruction_offset=instruction.instruction_offset), 1
+                )
+                self.end_block()
+                reachable = False
+
+            elif isinstance(instruction, JumpIfNot):
+                condition = self.canonicalize(stack[:-1], keep=stack[-1])
+                assert condition is not None
+                stack = [self.slot(i) for i in range(len(stack) - 1)]
+                target_stack_sizes[instruction.instruction_offset] = len(stack)
+                self.emit(
+                    RegisterJumpIfNot(
+                        condition=condition,
+                        instruction_offset=instruction.instruction_offset,
+                    ),
+                    1,
+                )
+                self.end_block()
+
+            elif isinstance(instruction, (CountedLoop, CountedLoopStep)):
+                self.canonicalize(stack)
+                target_stack_sizes[instruction.instruction_offset] = len(stack)
+                self.emit(self.translate_counted_loop(instruction, stack), 1)
+                self.end_block()
+
+            elif reachable:
+                self.translate_instruction(instruction, stack)
+
+        if reachable:
+            self.canonicalize(stack)
+
+        # Stack instructions at the end of an empty last block run on return, the
+        # last count is for returning so this doesn't need a RegisterNop.
+        return_dispatch_count = 0
+        if len(self.code) == self.block_start:
+            return_dispatch_count = self.pending_dispatch_count
+            self.pending_dispatch_count = 0
+
+        self.end_block()
+        self.stack_dispatch_counts.append(return_dispatch_count)
+        target_offsets[len(self.instructions)] = len(self.code)
+
+        for register_instruction in self.code:
+            if isinstance(register_instruction, REGISTER_JUMP_INSTRUCTIONS):
+                register_instruction.instruction_offset = target_offsets[
+                    register_instruction.instruction_offset
+                ]
+
+        registers: List[Any] = [None] * self.register_count
+        registers[self.argument_count : self.slot_base] = self.constants
+
+        return RegisterFunctionRecord(
+            self.function,
+            self.file,
+            [],
+            list(self.code),
+            registers,
+            self.slot_base,
+            self.stack_dispatch_counts,
+        )
+
+    def translate_counted_loop(
+        self, instruction: CountedLoop | CountedLoopStep, stack: List[int]
+    ) -> RegisterInstruction:
+        # The counter is on top of the canonicalized stack
+        if instruction.bound_arg_index is None:
+            bound = self.constant_registers[(int, instruction.bound)]
+        else:
+            bound = instruction.bound_arg_index
+
+        if isinstance(instruction, CountedLoop):
+            return RegisterCountedLoop(
+                operator=instruction.comparison,
+                counter=stack[-1],
+                bound=bound,
+                increment=instruction.increment,
+                instruction_offset=instruction.instruction_offset,
+            )
+
+        return RegisterCountedLoopStep(
+            operator=instruction.comparison,
+            counter=stack[-1],
+            bound=bound,
+            step=instruction.step,
+            instruction_offset=instruction.instruction_offset,
+        )
+
+    def translate_instruction(self, instruction: Instruction, stack: List[int]) -> None:
+        instruction_type = type(instruction)
+
+        if isinstance(instruction, (PushBool, PushInt, PushString)):
+            key = (type(instruction.value), instruction.value)
+            stack.append(self.constant_registers[key])
+        elif isinstance(instruction, PushArgument):
+            stack.append(instruction.arg_index)
+        elif instruction_type == Dup:
+            stack.append(stack[-1])
+        elif instruction_type == Over:
+            stack.append(stack[-2])
+        elif instruction_type == Swap:
+            stack[-2:] = [stack[-1], stack[-2]]
+        elif instruction_type == Rot:
+            stack[-3:] = [stack[-2], stack[-1], stack[-3]]
+        elif instruction_type == Drop:
+            stack.pop()
+        elif instruction_type != Nop:
+            self.translate_operation(instruction, stack)
+            return
+
+        self.pending_dispatch_count += 1
+
+    def translate_operation(self, instruction: Instruction, stack: List[int]) -> None:
+        instruction_type = type(instruction)
+        register_instruction: RegisterInstruction
+
+        if instruction_type in BINARY_OPERATORS:
+            rhs = stack.pop()
+            lhs = stack.pop()
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterBinaryOperation(
+                operator=BINARY_OPERATORS[instruction_type],
+                dest=dest,
+                lhs=lhs,
+                rhs=rhs,
+            )
+            stack.append(dest)
+
+        elif isinstance(instruction, (ArgumentOperation, ConstantOperation)):
+            if isinstance(instruction, ConstantOperation):
+                rhs = self.constant_registers[(int, instruction.value)]
+            else:
+                rhs = instruction.arg_index
+
+            lhs = stack.pop()
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterBinaryOperation(
+                operator=instruction.operator, dest=dest, lhs=lhs, rhs=rhs
+            )
+            stack.append(dest)
+
+        elif instruction_type in (Divide, Modulo):
+            rhs = stack.pop()
+            lhs = stack.pop()
+            dest = self.allocate(stack, len(stack), set())
+            ok_dest = self.allocate(stack, len(stack) + 1, {dest})
+            register_instruction = RegisterCheckedDivision(
+                operator="/" if instruction_type == Divide else "%",
+                dest=dest,
+                ok_dest=ok_dest,
+                lhs=lhs,
+                rhs=rhs,
+            )
+            stack += [dest, ok_dest]
+
+        elif instruction_type == Not:
+            source = stack.pop()
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterNot(dest=dest, source=source)
+            stack.append(dest)
+
+        elif instruction_type == Print:
+            register_instruction = RegisterPrint(source=stack.pop())
+
+        elif instruction_type == Assert:
+            register_instruction = RegisterAssert(source=stack.pop())
+
+        elif isinstance(instruction, PushVec):
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterNewVec(
+                dest=dest, item_type=instruction.item_type
+            )
+            stack.append(dest)
+
+        elif isinstance(instruction, PushMap):
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterNewMap(
+                dest=dest,
+                key_type=instruction.key_type,
+                value_type=instruction.value_type,
+            )
+            stack.append(dest)
+
+        elif isinstance(instruction, PushStruct):
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterNewStruct(dest=dest, type=instruction.type)
+            stack.append(dest)
+
+        elif instruction_type == GetStructField:
+            field_name = stack.pop()
+            dest = self.allocate(stack, len(stack), set())
+            register_instruction = RegisterGetStructField(
+                dest=dest, struct=stack[-1], field_name=field_name
+            )
+            stack.append(dest)
+
+        elif instruction_type == SetStructField:
+            value = stack.pop()
+            field_name = stack.pop()
+            register_instruction = RegisterSetStructField(
+                struct=stack[-1], field_name=field_name, value=value
+            )
+
+        elif isinstance(instruction, CallFunction):
+            function = self.program.get_identifier(
+                instruction.file, instruction.func_name
+            )
+            assert isinstance(function, Function)
+            arguments = self.pop_arguments(stack, len(function.arguments))
+            results = self.allocate_results(stack, len(function.return_types))
+            register_instruction = RegisterCallFunction(
+                func_name=instruction.func_name,
+                file=instruction.file,
+                arguments=arguments,
+                results=results,
+            )
+
+        elif isinstance(instruction, StandardLibraryCall):
+            arguments = self.pop_arguments(
+                stack, get_arg_count(STDLIB_FUNCTIONS[instruction.name])
+            )
+            builtin = self.program._builtins.functions[
+                get_generic_name(instruction.name)
+            ]
+            results = self.allocate_results(stack, len(builtin.return_types))
+            register_instruction = RegisterStandardLibraryCall(
+                name=instruction.name, arguments=arguments, results=results
+            )
+
+        else:  # pragma: nocover
+            assert False
+
+        self.emit(register_instruction, 1)
+
+    def pop_arguments(self, stack: List[int], argument_count: int) -> List[int]:
+        arguments = stack[len(stack) - argument_count :]
+        del stack[len(stack) - argument_count :]
+        return arguments
+
+    def allocate_results(self, stack: List[int], result_count: int) -> List[int]:
+        results: List[int] = []
+
+        for _ in range(result_count):
+            results.append(self.allocate(stack, len(stack), set()))
+            stack.append(results[-1])
+
+        return results
+
+
+class RegisterVM(BaseBackend):
+    # Runs programs translated to register instructions, the interpreter loop works
+    # like the one of the Simulator.
+
+    def __init__(
+        self,
+        program: Program,
+        max_call_depth: int = DEFAULT_MAX_CALL_DEPTH,
+        count_dispatches: bool = False,
+    ) -> None:
+        self.program = program
+        self.max_call_depth = max_call_depth
+        self.call_stack: List[CallStackItem] = []
+
+        # Register file of the function that is running
+        self.registers: List[Any] = []
+
+        # Compare how many instructions the Simulator would dispatch
+        self.count_dispatches = count_dispatches
+        self.stack_dispatch_count = 0
+        self.register_dispatch_count = 0
+
+        self.instruction_funcs: Dict[Type[RegisterInstruction], Handler] = {
+            RegisterAssert: self.instruction_assert,
+            RegisterCallFunction: self.instruction_call_function,
+            RegisterCheckedDivision: self.instruction_checked_division,
+            RegisterCountedLoop: self.instruction_counted_loop,
+            RegisterCountedLoopStep: self.instruction_counted_loop_step,
+            RegisterGetStructField: self.instruction_get_struct_field,
+            RegisterJump: self.instruction_jump,
+            RegisterJumpIfNot: self.instruction_jump_if_not,
+            RegisterMove: self.instruction_move,
+            RegisterNewMap: self.instruction_new_map,
+            RegisterNewStruct: self.instruction_new_struct,
+            RegisterNewVec: self.instruction_new_vec,
+            RegisterNop: self.instruction_nop,
+            RegisterNot: self.instruction_not,
+            RegisterPrint: self.instruction_print,
+            RegisterSetStructField: self.instruction_set_struct_field,
+        }
+
+        # Binary operations and standard library functions get their own opcode,
+        # so each of them is one dispatch.
+        self.dispatch_table: List[Handler] = []
+        self.opcodes: Dict[Type[Instruction], int] = {}
+        self.binary_opcodes: Dict[str, int] = {}
+        self.stdlib_opcodes: Dict[str, int] = {}
+
+        for instruction_type, instruction_func in self.instruction_funcs.items():
+            self.opcodes[instruction_type] = len(self.dispatch_table)
+            self.dispatch_table.append(
+                self.make_handler(instruction_type, instruction_func)
+            )
+
+        for operator_name, operation in BINARY_OPERATIONS.items():
+            self.binary_opcodes[operator_name] = len(self.dispatch_table)
+            self.dispatch_table.append(
+                self.make_handler(
+                    RegisterBinaryOperation, self.make_binary_handler(operation)
+                )
+            )
+
+        for name, stdlib_func in STDLIB_FUNCTIONS.items():
+            self.stdlib_opcodes[name] = len(self.dispatch_table)
+            self.dispatch_table.append(
+                self.make_handler(
+                    RegisterStandardLibraryCall, self.make_stdlib_handler(stdlib_func)
+                )
+            )
+
+        self.function_records: Dict[Tuple[Path, str], RegisterFunctionRecord] = {}
+
+        # Call stack items that were popped, so they can be reused
+        self.free_call_stack_items: List[CallStackItem] = []
+
+    def get_opcode(self, instruction: Instruction) -> int:
+        if isinstance(instruction, RegisterBinaryOperation):
+            return self.binary_opcodes[instruction.operator]
+
+        if isinstance(instruction, RegisterStandardLibraryCall):
+            return self.stdlib_opcodes[instruction.name]
+
+        return self.opcodes[type(instruction)]
+
+    def get_function_record(self, file: Path, func_name: str) -> RegisterFunctionRecord:
+        try:
+            return self.function_records[(file, func_name)]
+        except KeyError:
+            pass
+
+        function = self.program.get_identifier(file, func_name)
+
+        # If this assertion breaks, then Aaa's type checking is broken
+        assert isinstance(function, Function)
+
+        function_record = RegisterTranslator(self.program, file, function).translate()
+        function_record.opcodes = [
+            self.get_opcode(instruction) for instruction in function_record.instructions
+        ]
+
+        self.function_records[(file, func_name)] = function_record
+        return function_record
+
+    def make_handler(
+        self, instruction_type: Type[Instruction], handler: Handler
+    ) -> Handler:
+        # Handlers run unchecked, ParanoidRegisterVM overrides this to check them.
+        return handler
+
+    def make_binary_handler(self, operation: Callable[[Any, Any], Any]) -> Handler:
+        def handler(instruction: RegisterBinaryOperation) -> None:
+            registers = self.registers
+            registers[instruction.dest] = operation(
+                registers[instruction.lhs], registers[instruction.rhs]
+            )
+
+        return handler
+
+    def make_stdlib_handler(self, stdlib_func: StandardLibraryFunction) -> Handler:
+        def handler(instruction: RegisterStandardLibraryCall) -> None:
+            registers = self.registers
+            returned = stdlib_func(
+                *[registers[argument] for argument in instruction.arguments]
+            )
+
+            for result, value in zip(instruction.results, returned):
+                registers[result] = value
+
+        return handler
+
+    def run_main(self) -> None:
+        self.execute(self.program.entry_point_file, "main")
+
+        if self.count_dispatches:
+            self.print_dispatch_counts()
+
+    def print_dispatch_counts(self) -> None:
+        eliminated = self.stack_dispatch_count - self.register_dispatch_count
+        percentage = 100 * eliminated / max(self.stack_dispatch_count, 1)
+
+        print(
+            f"DISPATCH | {self.stack_dispatch_count} stack instructions ran as "
+            + f"{self.register_dispatch_count} register instructions, "
+            + f"{eliminated} dispatches ({percentage:.1f}%) eliminated",
+            file=sys.stderr,
+        )
+
+    def push_call_stack_item(
+        self, function_record: RegisterFunctionRecord, arguments: List[int]
+    ) -> None:
+        if len(self.call_stack) >= self.max_call_depth:
+            raise CallStackOverflow(
+                max_call_depth=self.max_call_depth,
+                function_name=function_record.function.identify(),
+            )
+
+        # Arguments are the first registers, so they double as argument_values.
+        caller_registers = self.registers
+        registers = function_record.registers.copy()
+
+        for index, argument in enumerate(arguments):
+            registers[index] = caller_registers[argument]
+
+        if self.free_call_stack_items:
+            call_stack_item = self.free_call_stack_items.pop()
+            call_stack_item.function_record = function_record
+            call_stack_item.instruction_pointer = 0
+            call_stack_item.argument_values = registers
+        else:
+            call_stack_item = CallStackItem(function_record, 0, registers)
+
+        self.call_stack.append(call_stack_item)
+        self.registers = registers
+
+    def execute(self, file: Path, func_name: str) -> None:
+        call_stack = self.call_stack
+        depth = len(call_stack)
+
+        free_call_stack_items = self.free_call_stack_items
+
+        self.push_call_stack_item(self.get_function_record(file, func_name), [])
+        call_stack_item = call_stack[-1]
+        function_record = call_stack_item.function_record
+        assert isinstance(function_record, RegisterFunctionRecord)
+        opcodes = function_record.opcodes
+        instructions = function_record.instructions
+        stack_dispatch_counts = function_record.stack_dispatch_counts
+
+        dispatch_table = self.dispatch_table
+        instruction_count = len(opcodes)
+        count_dispatches = self.count_dispatches
+        ip = 0
+
+        while True:
+            while ip < instruction_count:
+                if count_dispatches:
+                    self.register_dispatch_count += 1
+                    self.stack_dispatch_count += stack_dispatch_counts[ip]
+
+                jump_target = dispatch_table[opcodes[ip]](instructions[ip])
+
+                if jump_target is None:
+                    ip += 1
+                    continue
+
+                if call_stack[-1] is not call_stack_item:
+                    # A function was called, jump_target is its first instruction.
+                    call_stack_item.instruction_pointer = ip + 1
+                    call_stack_item = call_stack[-1]
+                    function_record = call_stack_item.function_record
+                    assert isinstance(function_record, RegisterFunctionRecord)
+                    opcodes = function_record.opcodes
+                    instructions = function_record.instructions
+                    stack_dispatch_counts = function_record.stack_dispatch_counts
+                    instruction_count = len(opcodes)
+
+                ip = jump_target
+
+            # We hit the end of the function, returned values are in the registers of
+            # the first stack slots.
+            if count_dispatches:
+                self.stack_dispatch_count += stack_dispatch_counts[ip]
+
+            free_call_stack_items.append(call_stack.pop())
+
+            if len(call_stack) == depth:
+                break
+
+            callee_registers = call_stack_item.argument_values
+            slot_base = function_record.slot_base
+
+            call_stack_item = call_stack[-1]
+            function_record = call_stack_item.function_record
+            assert isinstance(function_record, RegisterFunctionRecord)
+            opcodes = function_record.opcodes
+            instructions = function_record.instructions
+            stack_dispatch_counts = function_record.stack_dispatch_counts
+            instruction_count = len(opcodes)
+            ip = call_stack_item.instruction_pointer
+
+            registers = call_stack_item.argument_values
+            call = instructions[ip - 1]
+            assert isinstance(call, RegisterCallFunction)
+
+            for offset, result in enumerate(call.results):
+                registers[result] = callee_registers[slot_base + offset]
+
+            self.registers = registers
+
+    def instruction_move(self, instruction: RegisterMove) -> None:
+        registers = self.registers
+        registers[instruction.dest] = registers[instruction.source]
+
+    def instruction_checked_division(
+        self, instruction: RegisterCheckedDivision
+    ) -> None:
+        registers = self.registers
+        lhs = registers[instruction.lhs]
+        rhs = registers[instruction.rhs]
+
+        if rhs == 0:
+            registers[instruction.dest] = 0
+            registers[instruction.ok_dest] = False
+        elif instruction.operator == "/":
+            registers[instruction.dest] = lhs // rhs
+            registers[instruction.ok_dest] = True
+        else:
+            registers[instruction.dest] = lhs % rhs
+            registers[instruction.ok_dest] = True
+
+    def instruction_not(self, instruction: RegisterNot) -> None:
+        registers = self.registers
+        registers[instruction.dest] = not registers[instruction.source]
+
+    def instruction_print(self, instruction: RegisterPrint) -> None:
+        x = self.registers[instruction.source]
+
+        if isinstance(x, bool):
+            x = "true" if x else "false"
+
+        print(x, end="")
+
+    def instruction_assert(self, instruction: RegisterAssert) -> None:
+        if not self.registers[instruction.source]:
+            # Frames hold all registers, the arguments are the first ones
+            stack_trace = [
+                (name, argument_names, argument_values[: len(argument_names)])
+                for name, argument_names, argument_values in get_stack_trace(
+                    self.call_stack
+                )
+            ]
+            raise AaaAssertionFailure(stack_trace)
+
+    def instruction_nop(self, instruction: Instruction) -> None:
+        pass
+
+    def instruction_jump(self, instruction: RegisterJump) -> Optional[int]:
+        return instruction.instruction_offset
+
+    def instruction_jump_if_not(self, instruction: RegisterJumpIfNot) -> Optional[int]:
+
+        if self.registers[instruction.condition]:
+            return None
+
+        return instruction.instruction_offset
+
+    def instruction_counted_loop(
+        self, instruction: RegisterCountedLoop
+    ) -> Optional[int]:
+        registers = self.registers
+        counter = registers[instruction.counter]
+
+        if BINARY_OPERATIONS[instruction.operator](
+            counter, registers[instruction.bound]
+        ):
+            registers[instruction.counter] = counter + instruction.increment
+            return None
+
+        return instruction.instruction_offset
+
+    def instruction_counted_loop_step(
+        self, instruction: RegisterCountedLoopStep
+    ) -> Optional[int]:
+        registers = self.registers
+        counter = registers[instruction.counter] + instruction.step
+        registers[instruction.counter] = counter
+
+        if BINARY_OPERATIONS[instruction.operator](
+            counter, registers[instruction.bound]
+        ):
+            return instruction.instruction_offset
+
+        return None
+
+    def instruction_new_vec(self, instruction: RegisterNewVec) -> None:
+        self.registers[instruction.dest] = vec_var(
+            item_type=instruction.item_type, value=[]
+        )
+
+    def instruction_new_map(self, instruction: RegisterNewMap) -> None:
+        self.registers[instruction.dest] = map_var(
+            key_type=instruction.key_type, value_type=instruction.value_type, value={}
+        )
+
+    def instruction_new_struct(self, instruction: RegisterNewStruct) -> None:
+        self.registers[instruction.dest] = zero_struct_var(instruction.type)
+
+    def instruction_get_struct_field(self, instruction: RegisterGetStructField) -> None:
+        registers = self.registers
+        struct_fields: Dict[str, Variable] = registers[instruction.struct].value
+        registers[instruction.dest] = unbox(
+            struct_fields[registers[instruction.field_name]]
+        )
+
+    def instruction_set_struct_field(self, instruction: RegisterSetStructField) -> None:
+        registers = self.registers
+        struct_fields: Dict[str, Variable] = registers[instruction.struct].value
+        struct_fields[registers[instruction.field_name]] = box(
+            registers[instruction.value]
+        )
+
+    def instruction_call_function(self, instruction: RegisterCallFunction) -> int:
+        function_record = self.get_function_record(
+            instruction.file, instruction.func_name
+        )
+
+        self.push_call_stack_item(function_record, instruction.arguments)
+        return 0
+
+
+class ParanoidRegisterVM(RegisterVM):
+    # Checks instruction types while running, see ParanoidSimulator
+
+    def make_handler(
+        self, instruction_type: Type[Instruction], handler: Handler
+    ) -> Handler:
+        return make_checked_handler(instruction_type, handler)
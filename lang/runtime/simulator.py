@@ -1,16 +1,25 @@
-import os
 import sys
 import time
-from copy import deepcopy
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Type
-
-from lang.exceptions import AaaRuntimeException
-from lang.exceptions.runtime import AaaAssertionFailure
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type
+
+from lang.exceptions.runtime import (
+    AaaAssertionFailure,
+    CallStackOverflow,
+    InstructionBudgetExceeded,
+    TimeBudgetExceeded,
+    ValueSizeLimitExceeded,
+    get_stack_trace,
+)
+from lang.loops import COMPARISONS
 from lang.models.instructions import (
     And,
+    ArgumentOperation,
     Assert,
     CallFunction,
+    ConstantOperation,
+    CountedLoop,
+    CountedLoopStep,
     Divide,
     Drop,
     Dup,
@@ -33,8 +42,8 @@ from lang.models.instructions import (
     Over,
     Plus,
     Print,
+    PushArgument,
     PushBool,
-    PushFunctionArgument,
     PushInt,
     PushMap,
     PushString,
@@ -43,37 +52,112 @@ from lang.models.instructions import (
     Rot,
     SetStructField,
     StandardLibraryCall,
-    StandardLibraryCallKind,
     Swap,
 )
 from lang.models.parse import Function
-from lang.models.runtime import CallStackItem
+from lang.models.runtime import (
+    DEFAULT_MAX_CALL_DEPTH,
+    DEFAULT_MEMO_SIZE,
+    CallStackItem,
+    FunctionRecord,
+    Handler,
+    MemoCache,
+)
 from lang.models.typing.var import (
     Variable,
-    bool_var,
-    int_var,
+    box,
     map_var,
-    str_var,
+    unbox,
     vec_var,
+    zero_struct_var,
+)
+from lang.operators import BINARY_OPERATIONS
+from lang.purity import find_memoizable_functions
+from lang.runtime.base_backend import BaseBackend
+from lang.runtime.closure_backend import ClosureBackend
+from lang.runtime.debug import format_str, make_checked_handler
+from lang.runtime.profiler import Profiler
+from lang.runtime.stdlib import (
+    STDLIB_FUNCTIONS,
+    StandardLibraryFunction,
+    get_arg_count,
 )
-from lang.models.typing.var_type import RootType, Str, VariableType
-from lang.runtime.debug import format_str
-from lang.runtime.program import Program
-
 
-class Simulator:
-    def __init__(self, program: Program, verbose: bool = False) -> None:
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# Functions that are called this often, or loop this often in one call, are hot.
+DEFAULT_HOT_THRESHOLD = 1000
+
+# With a time budget, the clock is read once per this many instructions
+TIME_BUDGET_CHECK_INTERVAL = 1024
+
+
+def get_value_size(value: Any) -> int:
+    # Approximate size in bytes of unboxed ints and strings, containers count as 0
+    if isinstance(value, int):
+        return (value.bit_length() + 7) // 8
+    elif isinstance(value, str):
+        return len(value)
+    return 0
+
+
+class Simulator(BaseBackend):
+    def __init__(
+        self,
+        program: "Program",
+        verbose: bool = False,
+        max_call_depth: int = DEFAULT_MAX_CALL_DEPTH,
+        hot_threshold: Optional[int] = DEFAULT_HOT_THRESHOLD,
+        debug_tiers: bool = False,
+        memoize: bool = False,
+        memo_size: int = DEFAULT_MEMO_SIZE,
+        instruction_budget: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        max_value_size: Optional[int] = None,
+        profile_out: Optional[Path] = None,
+    ) -> None:
         self.program = program
-        self.stack: List[Variable] = []
+        # Values of type int, bool and str are on the stack unboxed.
+        self.stack: List[Any] = []
         self.call_stack: List[CallStackItem] = []
         self.verbose = verbose
-
-        self.instruction_funcs: Dict[
-            Type[Instruction], Callable[[Instruction], int]
-        ] = {
+        self.max_call_depth = max_call_depth
+
+        # Hot functions are compiled to the closure tier, which runs them from then on.
+        # The debug output of verbose mode, the instruction budget and profiling need
+        # every instruction to be simulated.
+        self.hot_threshold = hot_threshold
+        if verbose or instruction_budget is not None or profile_out is not None:
+            self.hot_threshold = None
+        self.debug_tiers = debug_tiers
+        self.closure_backend: Optional[ClosureBackend] = None
+
+        # With memoization, pure functions get a result cache. Calls to them run in
+        # the closure tier, which checks the cache.
+        self.memoize = memoize
+        self.memo_caches: Dict[Tuple[Path, str], MemoCache] = {}
+
+        # Profiles are saved when the program finishes, see lang.profile_guided
+        self.profile_out = profile_out
+        self.profiler: Optional[Profiler] = None
+        if profile_out is not None:
+            self.profiler = Profiler(program)
+
+        if memoize:
+            for file, func_name in sorted(find_memoizable_functions(program)):
+                function = program.get_identifier(file, func_name)
+                assert isinstance(function, Function)
+                self.memo_caches[(file, func_name)] = MemoCache(function, memo_size)
+
+        self.instruction_funcs: Dict[Type[Instruction], Handler] = {
             And: self.instruction_and,
+            ArgumentOperation: self.instruction_argument_operation,
             Assert: self.instruction_assert,
             CallFunction: self.instruction_call_function,
+            ConstantOperation: self.instruction_constant_operation,
+            CountedLoop: self.instruction_counted_loop,
+            CountedLoopStep: self.instruction_counted_loop_step,
             Divide: self.instruction_divide,
             Drop: self.instruction_drop,
             Dup: self.instruction_dup,
@@ -95,7 +179,7 @@ class Simulator:
             Plus: self.instruction_plus,
             Print: self.instruction_print,
             PushBool: self.instruction_push_bool,
-            PushFunctionArgument: self.instruction_push_function_argument,
+            PushArgument: self.instruction_push_argument,
             PushInt: self.instruction_push_int,
             PushMap: self.instruction_map_push,
             PushString: self.instruction_push_string,
@@ -103,118 +187,207 @@ class Simulator:
             PushVec: self.instruction_push_vec,
             Rot: self.instruction_rot,
             Swap: self.instruction_swap,
-            StandardLibraryCall: self.instruction_stdandard_library_call,
+            StandardLibraryCall: self.instruction_standard_library_call,
             GetStructField: self.instruction_get_struct_field,
             SetStructField: self.instruction_set_struct_field,
         }
 
-        self.stdlib_funcs: Dict[StandardLibraryCallKind, Callable[[], int]] = {
-            StandardLibraryCallKind.ENVIRON: self.instruction_environ,
-            StandardLibraryCallKind.GETENV: self.instruction_getenv,
-            StandardLibraryCallKind.MAP_CLEAR: self.instruction_map_clear,
-            StandardLibraryCallKind.MAP_COPY: self.instruction_map_copy,
-            StandardLibraryCallKind.MAP_DROP: self.instruction_map_drop,
-            StandardLibraryCallKind.MAP_EMPTY: self.instruction_map_empty,
-            StandardLibraryCallKind.MAP_GET: self.instruction_map_get,
-            StandardLibraryCallKind.MAP_HAS_KEY: self.instruction_map_has_key,
-            StandardLibraryCallKind.MAP_KEYS: self.instruction_map_keys,
-            StandardLibraryCallKind.MAP_POP: self.instruction_map_pop,
-            StandardLibraryCallKind.MAP_SET: self.instruction_map_set,
-            StandardLibraryCallKind.MAP_SIZE: self.instruction_map_size,
-            StandardLibraryCallKind.MAP_VALUES: self.instruction_map_values,
-            StandardLibraryCallKind.SETENV: self.instruction_setenv,
-            StandardLibraryCallKind.STR_APPEND: self.instruction_str_append,
-            StandardLibraryCallKind.STR_CONTAINS: self.instruction_str_contains,
-            StandardLibraryCallKind.STR_EQUALS: self.instruction_str_equals,
-            StandardLibraryCallKind.STR_FIND: self.instruction_str_find,
-            StandardLibraryCallKind.STR_FIND_AFTER: self.instruction_str_find_after,
-            StandardLibraryCallKind.STR_JOIN: self.instruction_str_join,
-            StandardLibraryCallKind.STR_LEN: self.instruction_str_len,
-            StandardLibraryCallKind.STR_LOWER: self.instruction_str_lower,
-            StandardLibraryCallKind.STR_REPLACE: self.instruction_str_replace,
-            StandardLibraryCallKind.STR_SPLIT: self.instruction_str_split,
-            StandardLibraryCallKind.STR_STRIP: self.instruction_str_strip,
-            StandardLibraryCallKind.STR_SUBSTR: self.instruction_str_substr,
-            StandardLibraryCallKind.STR_TO_BOOL: self.instruction_str_to_bool,
-            StandardLibraryCallKind.STR_TO_INT: self.instruction_str_to_int,
-            StandardLibraryCallKind.STR_UPPER: self.instruction_str_upper,
-            StandardLibraryCallKind.SYSCALL_CHDIR: self.instruction_syscall_chdir,
-            StandardLibraryCallKind.SYSCALL_CLOSE: self.instruction_syscall_close,
-            StandardLibraryCallKind.SYSCALL_EXECVE: self.instruction_syscall_execve,
-            StandardLibraryCallKind.SYSCALL_EXIT: self.instruction_syscall_exit,
-            StandardLibraryCallKind.SYSCALL_FORK: self.instruction_syscall_fork,
-            StandardLibraryCallKind.SYSCALL_FSYNC: self.instruction_syscall_fsync,
-            StandardLibraryCallKind.SYSCALL_GETCWD: self.instruction_syscall_getcwd,
-            StandardLibraryCallKind.SYSCALL_GETPID: self.instruction_getpid,
-            StandardLibraryCallKind.SYSCALL_GETPPID: self.instruction_getppid,
-            StandardLibraryCallKind.SYSCALL_OPEN: self.instruction_open,
-            StandardLibraryCallKind.SYSCALL_READ: self.instruction_syscall_read,
-            StandardLibraryCallKind.SYSCALL_TIME: self.instruction_syscall_time,
-            StandardLibraryCallKind.SYSCALL_WAITPID: self.instruction_waitpid,
-            StandardLibraryCallKind.SYSCALL_WRITE: self.instruction_write,
-            StandardLibraryCallKind.UNSETENV: self.instruction_unsetenv,
-            StandardLibraryCallKind.VEC_CLEAR: self.instruction_vec_clear,
-            StandardLibraryCallKind.VEC_COPY: self.instruction_vec_copy,
-            StandardLibraryCallKind.VEC_EMPTY: self.instruction_vec_empty,
-            StandardLibraryCallKind.VEC_GET: self.instruction_vec_get,
-            StandardLibraryCallKind.VEC_POP: self.instruction_vec_pop,
-            StandardLibraryCallKind.VEC_PUSH: self.instruction_vec_push,
-            StandardLibraryCallKind.VEC_SET: self.instruction_vec_set,
-            StandardLibraryCallKind.VEC_SIZE: self.instruction_vec_size,
-        }
+        # Every instruction type gets an opcode, which indexes the dispatch table.
+        # Each standard library function gets its own opcode as well, so calling one
+        # takes a single dispatch like any other instruction.
+        self.dispatch_table: List[Handler] = []
+        self.opcodes: Dict[Type[Instruction], int] = {}
+        self.stdlib_opcodes: Dict[str, int] = {}
+
+        for instruction_type, instruction_func in self.instruction_funcs.items():
+            self.opcodes[instruction_type] = len(self.dispatch_table)
+            self.dispatch_table.append(
+                self.make_handler(instruction_type, instruction_func)
+            )
 
-    def top(self) -> Variable:
+        for name, stdlib_func in STDLIB_FUNCTIONS.items():
+            self.stdlib_opcodes[name] = len(self.dispatch_table)
+            self.dispatch_table.append(
+                self.make_handler(
+                    StandardLibraryCall, self.make_stdlib_handler(stdlib_func)
+                )
+            )
+
+        # Jumps back to the start of a loop count loop iterations, if tiering is on.
+        self.backward_jump_opcode = self.opcodes[Jump]
+        if self.hot_threshold is not None:
+            self.backward_jump_opcode = len(self.dispatch_table)
+            self.dispatch_table.append(
+                self.make_handler(Jump, self.instruction_backward_jump)
+            )
+
+        # Running more instructions than the budget allows raises, which makes
+        # running untrusted code at compile time safe. See lang.constant_calls. With a
+        # budget, running longer than the time budget or pushing an int or str larger
+        # than max_value_size bytes raises too.
+        self.instruction_budget = instruction_budget
+        self.instructions_left = 0
+        self.time_budget = time_budget
+        self.deadline: Optional[float] = None
+        if time_budget is not None:
+            self.deadline = time.monotonic() + time_budget
+        self.max_value_size = max_value_size
+        if instruction_budget is not None:
+            self.instructions_left = instruction_budget
+            self.dispatch_table = [
+                self.make_budgeted_handler(handler) for handler in self.dispatch_table
+            ]
+
+        self.function_records: Dict[Tuple[Path, str], FunctionRecord] = {}
+
+        # Call stack items that were popped, so they can be reused
+        self.free_call_stack_items: List[CallStackItem] = []
+
+    def top(self) -> Any:
         return self.stack[-1]
 
-    def push_var(self, item: Variable) -> None:
+    def push_var(self, item: Any) -> None:
         self.stack.append(item)
 
     def push_int(self, item: int) -> None:
-        self.push_var(int_var(item))
+        self.stack.append(item)
 
     def push_str(self, item: str) -> None:
-        self.push_var(str_var(item))
+        self.stack.append(item)
 
     def push_bool(self, item: bool) -> None:
-        self.push_var(bool_var(item))
+        self.stack.append(item)
 
-    def pop_var(self) -> Variable:
+    def pop_var(self) -> Any:
         return self.stack.pop()
 
     def pop_int(self) -> int:
-        popped = self.stack.pop().value
-        assert isinstance(popped, int)
-        return popped
+        # The type checker guarantees the type, so it's not checked here.
+        return self.stack.pop()  # type: ignore
 
     def pop_str(self) -> str:
-        popped = self.stack.pop().value
-        assert isinstance(popped, str)
-        return popped
+        return self.stack.pop()  # type: ignore
 
     def pop_bool(self) -> bool:
-        popped = self.stack.pop().value
-        assert isinstance(popped, bool)
-        return popped
+        return self.stack.pop()  # type: ignore
+
+    def get_opcode(self, instruction: Instruction) -> int:
+        if isinstance(instruction, StandardLibraryCall):
+            return self.stdlib_opcodes[instruction.name]
 
-    def get_function_argument(self, arg_name: str) -> Variable:
-        return self.call_stack[-1].argument_values[arg_name]
+        return self.opcodes[type(instruction)]
 
-    def get_instruction_pointer(self) -> int:
-        return self.call_stack[-1].instruction_pointer
+    def get_function_record(self, file: Path, func_name: str) -> FunctionRecord:
+        try:
+            return self.function_records[(file, func_name)]
+        except KeyError:
+            pass
+
+        function = self.program.get_identifier(file, func_name)
 
-    def set_instruction_pointer(self, offset: int) -> None:
-        self.call_stack[-1].instruction_pointer = offset
+        # If this assertion breaks, then Aaa's type checking is broken
+        assert isinstance(function, Function)
 
-    def print_debug_info(self) -> None:  # pragma: nocover
-        if not self.verbose:
-            return
+        instructions = self.program.get_instructions(file, func_name)
+        opcodes = [self.get_opcode(instruction) for instruction in instructions]
 
-        ip = self.get_instruction_pointer()
-        call_stack_item = self.call_stack[-1]
-        func_name = call_stack_item.function.identify()
-        instructions = self.program.get_instructions(
-            file=call_stack_item.source_file, name=func_name
+        for ip, instruction in enumerate(instructions):
+            if isinstance(instruction, Jump) and instruction.instruction_offset < ip:
+                opcodes[ip] = self.backward_jump_opcode
+
+        if self.profiler is not None:
+            opcodes = self.get_profiling_opcodes(file, func_name, instructions, opcodes)
+
+        function_record = FunctionRecord(function, file, opcodes, instructions)
+        self.function_records[(file, func_name)] = function_record
+
+        if (file, func_name) in self.memo_caches:
+            function_record.compiled_call = self.get_closure_backend().get_caller(
+                file, func_name
+            )
+
+        return function_record
+
+    def get_profiling_opcodes(
+        self,
+        file: Path,
+        func_name: str,
+        instructions: List[Instruction],
+        opcodes: List[int],
+    ) -> List[int]:
+        # Every instruction gets its own opcode, dispatching to a counting handler
+        assert self.profiler is not None
+        handlers = self.profiler.get_counting_handlers(
+            file,
+            func_name,
+            instructions,
+            [self.dispatch_table[opcode] for opcode in opcodes],
+        )
+
+        profiling_opcodes = list(
+            range(len(self.dispatch_table), len(self.dispatch_table) + len(handlers))
         )
+        self.dispatch_table += handlers
+        return profiling_opcodes
+
+    def make_handler(
+        self, instruction_type: Type[Instruction], handler: Handler
+    ) -> Handler:
+        # Type checking guarantees the types of instructions and stack items, so
+        # handlers run unchecked. ParanoidSimulator overrides this to check them.
+        return handler
+
+    def make_stdlib_handler(self, stdlib_func: StandardLibraryFunction) -> Handler:
+        arg_count = get_arg_count(stdlib_func)
+        stack = self.stack
+
+        def handler(instruction: Instruction) -> None:
+            args_offset = len(stack) - arg_count
+            stack[args_offset:] = stdlib_func(*stack[args_offset:])
+
+        return handler
+
+    def make_budgeted_handler(self, handler: Handler) -> Handler:
+        def budgeted_handler(instruction: Instruction) -> Optional[int]:
+            if not self.instructions_left:
+                assert self.instruction_budget is not None
+                raise InstructionBudgetExceeded(
+                    instruction_budget=self.instruction_budget
+                )
+
+            self.instructions_left -= 1
+
+            # Reading the clock for every instruction would be slow
+            if (
+                self.deadline is not None
+                and not self.instructions_left % TIME_BUDGET_CHECK_INTERVAL
+                and time.monotonic() > self.deadline
+            ):
+                assert self.time_budget is not None
+                raise TimeBudgetExceeded(time_budget=self.time_budget)
+
+            next_ip = handler(instruction)
+
+            # Values instructions create end up on top of the stack
+            if (
+                self.max_value_size is not None
+                and self.stack
+                and get_value_size(self.stack[-1]) > self.max_value_size
+            ):
+                raise ValueSizeLimitExceeded(max_value_size=self.max_value_size)
+
+            return next_ip
+
+        return budgeted_handler
+
+    def get_function_argument(self, arg_index: int) -> Any:
+        return self.call_stack[-1].argument_values[arg_index]
+
+    def print_debug_info(
+        self, call_stack_item: CallStackItem, ip: int
+    ) -> None:  # pragma: nocover
+        func_name = call_stack_item.function_record.function.identify()
+        instructions = call_stack_item.function_record.instructions
 
         try:
             instruction = instructions[ip].__repr__()
@@ -226,7 +399,7 @@ class Simulator:
         instruction = format_str(instruction, max_length=30)
         func_name = format_str(func_name, max_length=15)
 
-        stack_str = " ".join(repr(item) for item in self.stack)
+        stack_str = " ".join(repr(box(item)) for item in self.stack)
         stack_str = format_str(stack_str, max_length=60)
 
         print(
@@ -234,84 +407,155 @@ class Simulator:
             file=sys.stderr,
         )
 
-    def run(self, raise_: bool = False) -> None:
+    def run_main(self) -> None:
         if self.verbose:  # pragma: nocover
             self.program.print_all_instructions()
 
-        try:
-            self.call_function(self.program.entry_point_file, "main")
-        except AaaRuntimeException as e:  # pragma: nocover
-            print(e, file=sys.stderr)
-            if raise_:  # This is for testing. TODO find better solution
-                raise e
-            else:
-                exit(1)
-
-    def call_function(self, file: Path, func_name: str) -> None:
-        function = self.program.get_identifier(file, func_name)
+        self.execute(self.program.entry_point_file, "main")
 
-        # If this assertion breaks, then Aaa's type checking is broken
-        assert isinstance(function, Function)
+        if self.memoize:
+            self.print_memo_stats()
+
+        if self.profiler is not None:
+            assert self.profile_out is not None
+            profile = self.profiler.get_profile()
+            self.profile_out.write_text(profile.json(indent=2) + "\n")
+
+    def print_memo_stats(self) -> None:
+        for memo_cache in self.memo_caches.values():
+            if not memo_cache.hits and not memo_cache.misses:
+                continue
+
+            print(
+                f"MEMO | {memo_cache.function.identify()}: {memo_cache.hits} hits, "
+                + f"{memo_cache.misses} misses, {memo_cache.evictions} evictions",
+                file=sys.stderr,
+            )
+
+    def get_closure_backend(self) -> ClosureBackend:
+        if not self.closure_backend:
+            self.closure_backend = ClosureBackend(
+                self.program,
+                max_call_depth=self.max_call_depth,
+                stack=self.stack,
+                call_stack=self.call_stack,
+                memo_caches=self.memo_caches,
+            )
 
-        argument_values: Dict[str, Variable] = {}
+        return self.closure_backend
 
-        for argument in reversed(function.arguments):
-            argument_values[argument.name] = self.pop_var()
+    def promote(self, function_record: FunctionRecord, reason: str) -> None:
+        file = function_record.source_file
+        func_name = function_record.function.identify()
 
-        self.call_stack.append(
-            CallStackItem(
-                function=function,
-                source_file=file,
-                instruction_pointer=0,
-                argument_values=argument_values,
+        if self.debug_tiers:
+            print(
+                f"TIER | {func_name} moves to the closure tier {reason}",
+                file=sys.stderr,
             )
+
+        function_record.compiled_call = self.get_closure_backend().get_caller(
+            file, func_name
         )
 
-        instructions = self.program.get_instructions(file, str(function.name))
+    def push_call_stack_item(self, function_record: FunctionRecord) -> None:
+        if len(self.call_stack) >= self.max_call_depth:
+            raise CallStackOverflow(
+                max_call_depth=self.max_call_depth,
+                function_name=function_record.function.identify(),
+            )
+
+        stack = self.stack
+        args_offset = len(stack) - function_record.argument_count
+        argument_values = stack[args_offset:]
+        del stack[args_offset:]
+
+        if self.free_call_stack_items:
+            call_stack_item = self.free_call_stack_items.pop()
+            call_stack_item.function_record = function_record
+            call_stack_item.instruction_pointer = 0
+            call_stack_item.argument_values = argument_values
+        else:
+            call_stack_item = CallStackItem(function_record, 0, argument_values)
+
+        self.call_stack.append(call_stack_item)
+
+    def execute(self, file: Path, func_name: str) -> None:
+        # Aaa function calls don't recurse in Python: a call pushes a call stack item
+        # and continues this loop in the called function, returning pops it again.
+        # While a function runs, its instruction_pointer holds the return address.
+        call_stack = self.call_stack
+        depth = len(call_stack)
+
+        free_call_stack_items = self.free_call_stack_items
+
+        self.push_call_stack_item(self.get_function_record(file, func_name))
+        call_stack_item = call_stack[-1]
+        opcodes = call_stack_item.function_record.opcodes
+        instructions = call_stack_item.function_record.instructions
+
+        # Keep everything the loop touches in local variables, looking up attributes
+        # is relatively slow. Handlers return None unless they jump.
+        dispatch_table = self.dispatch_table
+        instruction_count = len(opcodes)
+        verbose = self.verbose
+        ip = 0
 
         while True:
-            instruction_pointer = self.get_instruction_pointer()
+            while ip < instruction_count:
+                jump_target = dispatch_table[opcodes[ip]](instructions[ip])
 
-            try:
-                instruction = instructions[instruction_pointer]
-            except IndexError:
-                # We hit the end of the function
-                break
+                if verbose:  # pragma: nocover
+                    self.print_debug_info(call_stack_item, ip)
+
+                if jump_target is None:
+                    ip += 1
+                    continue
+
+                if call_stack[-1] is not call_stack_item:
+                    # A function was called, jump_target is its first instruction.
+                    call_stack_item.instruction_pointer = ip + 1
+                    call_stack_item = call_stack[-1]
+                    opcodes = call_stack_item.function_record.opcodes
+                    instructions = call_stack_item.function_record.instructions
+                    instruction_count = len(opcodes)
+
+                ip = jump_target
+
+            # We hit the end of the function
+            free_call_stack_items.append(call_stack.pop())
 
-            # Excecute the instruction and get value for next instruction pointer
-            next_instruction = self.instruction_funcs[type(instruction)](instruction)
-            self.print_debug_info()
-            self.set_instruction_pointer(next_instruction)
+            if len(call_stack) == depth:
+                break
 
-        self.call_stack.pop()
+            call_stack_item = call_stack[-1]
+            opcodes = call_stack_item.function_record.opcodes
+            instructions = call_stack_item.function_record.instructions
+            instruction_count = len(opcodes)
+            ip = call_stack_item.instruction_pointer
 
-    def instruction_push_int(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushInt)
-        self.push_var(int_var(instruction.value))
-        return self.get_instruction_pointer() + 1
+    def instruction_push_int(self, instruction: PushInt) -> None:
+        self.push_int(instruction.value)
 
-    def instruction_plus(self, instruction: Instruction) -> int:
+    def instruction_plus(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
 
         self.push_int(y + x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_minus(self, instruction: Instruction) -> int:
+    def instruction_minus(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
 
         self.push_int(y - x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_multiply(self, instruction: Instruction) -> int:
+    def instruction_multiply(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
 
         self.push_int(x * y)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_divide(self, instruction: Instruction) -> int:
+    def instruction_divide(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
 
@@ -322,9 +566,7 @@ class Simulator:
             self.push_int(y // x)
             self.push_bool(True)
 
-        return self.get_instruction_pointer() + 1
-
-    def instruction_modulo(self, instruction: Instruction) -> int:
+    def instruction_modulo(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
 
@@ -335,671 +577,262 @@ class Simulator:
             self.push_int(y % x)
             self.push_bool(True)
 
-        return self.get_instruction_pointer() + 1
-
-    def instruction_push_bool(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushBool)
+    def instruction_push_bool(self, instruction: PushBool) -> None:
         self.push_bool(instruction.value)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_and(self, instruction: Instruction) -> int:
+    def instruction_constant_operation(self, instruction: ConstantOperation) -> None:
+        stack = self.stack
+        operation = BINARY_OPERATIONS[instruction.operator]
+        stack[-1] = operation(stack[-1], instruction.value)
+
+    def instruction_argument_operation(self, instruction: ArgumentOperation) -> None:
+        stack = self.stack
+        operation = BINARY_OPERATIONS[instruction.operator]
+        stack[-1] = operation(
+            stack[-1], self.get_function_argument(instruction.arg_index)
+        )
+
+    def instruction_and(self, instruction: Instruction) -> None:
         x = self.pop_bool()
         y = self.pop_bool()
 
         self.push_bool(x and y)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_or(self, instruction: Instruction) -> int:
+    def instruction_or(self, instruction: Instruction) -> None:
         x = self.pop_bool()
         y = self.pop_bool()
         self.push_bool(x or y)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_not(self, instruction: Instruction) -> int:
+    def instruction_not(self, instruction: Instruction) -> None:
         x = self.pop_bool()
         self.push_bool(not x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_equals(self, instruction: Instruction) -> int:
+    def instruction_equals(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
         self.push_bool(x == y)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_int_less_than(self, instruction: Instruction) -> int:
+    def instruction_int_less_than(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
         self.push_bool(y < x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_int_less_equals(self, instruction: Instruction) -> int:
+    def instruction_int_less_equals(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
         self.push_bool(y <= x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_int_greater_than(self, instruction: Instruction) -> int:
+    def instruction_int_greater_than(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
         self.push_bool(y > x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_int_greater_equals(self, instruction: Instruction) -> int:
+    def instruction_int_greater_equals(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
         self.push_bool(y >= x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_int_not_equal(self, instruction: Instruction) -> int:
+    def instruction_int_not_equal(self, instruction: Instruction) -> None:
         x = self.pop_int()
         y = self.pop_int()
         self.push_bool(y != x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_drop(self, instruction: Instruction) -> int:
+    def instruction_drop(self, instruction: Instruction) -> None:
         self.pop_var()
-        return self.get_instruction_pointer() + 1
 
-    def instruction_dup(self, instruction: Instruction) -> int:
+    def instruction_dup(self, instruction: Instruction) -> None:
         x = self.top()
         self.push_var(x)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_swap(self, instruction: Instruction) -> int:
+    def instruction_swap(self, instruction: Instruction) -> None:
         x = self.pop_var()
         y = self.pop_var()
         self.push_var(x)
         self.push_var(y)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_over(self, instruction: Instruction) -> int:
+    def instruction_over(self, instruction: Instruction) -> None:
         x = self.pop_var()
         y = self.top()
         self.push_var(x)
         self.push_var(y)
-        return self.get_instruction_pointer() + 1
 
-    def instruction_rot(self, instruction: Instruction) -> int:
+    def instruction_rot(self, instruction: Instruction) -> None:
         x = self.pop_var()
         y = self.pop_var()
         z = self.pop_var()
         self.push_var(y)
         self.push_var(x)
         self.push_var(z)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_print(self, instruction: Instruction) -> int:
-        x_var = self.pop_var()
-        print(x_var, end="")
-        return self.get_instruction_pointer() + 1
-
-    def instruction_push_string(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushString)
-        self.push_str(instruction.value)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_call_function(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, CallFunction)
-        self.call_function(instruction.file, instruction.func_name)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_push_function_argument(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushFunctionArgument)
-
-        arg_value = self.get_function_argument(instruction.arg_name)
-        self.push_var(arg_value)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_jump_if_not(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, JumpIfNot)
-
-        x = self.pop_bool()
-        if x:
-            return self.get_instruction_pointer() + 1
-        else:
-            return instruction.instruction_offset
-
-    def instruction_jump(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, Jump)
-        return instruction.instruction_offset
-
-    def instruction_nop(self, instruction: Instruction) -> int:
-        return self.get_instruction_pointer() + 1
-
-    def instruction_assert(self, instruction: Instruction) -> int:
-        x = self.pop_bool()
 
-        if not x:
-            call_stack_copy = deepcopy(self.call_stack)
-            raise AaaAssertionFailure(call_stack_copy)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_map_push(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushMap)
-        map_var = Variable(
-            type=VariableType(
-                root_type=RootType.MAPPING,
-                type_params=[instruction.key_type, instruction.value_type],
-            ),
-            value={},
-        )
-        self.push_var(map_var)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_push_vec(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushVec)
-        map_var = Variable(
-            type=VariableType(
-                root_type=RootType.VECTOR, type_params=[instruction.item_type]
-            ),
-            value=[],
-        )
-        self.push_var(map_var)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_vec_push(self) -> int:
+    def instruction_print(self, instruction: Instruction) -> None:
         x = self.pop_var()
-        vec: List[Variable] = self.top().value
-
-        vec.append(x)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_vec_pop(self) -> int:
-        vec: List[Variable] = self.top().value
-
-        x = vec.pop()
-        self.push_var(x)
 
-        return self.get_instruction_pointer() + 1
+        if isinstance(x, bool):
+            x = "true" if x else "false"
 
-    def instruction_vec_get(self) -> int:
-        x = self.pop_int()
-        vec: List[Variable] = self.top().value
-
-        self.push_var(vec[x])
-        return self.get_instruction_pointer() + 1
-
-    def instruction_vec_set(self) -> int:
-        x: Any = self.pop_var()
-        index = self.pop_int()
-        vec: List[Variable] = self.top().value
-
-        vec[index] = x
-        return self.get_instruction_pointer() + 1
+        print(x, end="")
 
-    def instruction_vec_size(self) -> int:
-        vec: List[Variable] = self.top().value
-
-        self.push_int(len(vec))
-        return self.get_instruction_pointer() + 1
+    def instruction_push_string(self, instruction: PushString) -> None:
+        self.push_str(instruction.value)
 
-    def instruction_vec_empty(self) -> int:
-        vec: List[Variable] = self.top().value
+    def instruction_call_function(self, instruction: CallFunction) -> Optional[int]:
+        function_record = self.get_function_record(
+            instruction.file, instruction.func_name
+        )
 
-        self.push_bool(not bool(vec))
-        return self.get_instruction_pointer() + 1
+        if not function_record.compiled_call:
+            function_record.call_count += 1
 
-    def instruction_vec_clear(self) -> int:
-        vec: List[Variable] = self.top().value
+            if function_record.call_count != self.hot_threshold:
+                self.push_call_stack_item(function_record)
+                return 0
 
-        vec.clear()
-        return self.get_instruction_pointer() + 1
+            self.promote(function_record, f"after {self.hot_threshold} calls")
+            assert function_record.compiled_call
 
-    def instruction_vec_copy(self) -> int:
-        vec_var = self.top()
-        copied = deepcopy(vec_var)
-        self.push_var(copied)
-        return self.get_instruction_pointer() + 1
+        function_record.compiled_call()
+        return None
 
-    def instruction_map_get(self) -> int:
-        key = self.pop_var()
-        map: Dict[Variable, Variable] = self.top().value
+    def instruction_push_argument(self, instruction: PushArgument) -> None:
 
-        self.push_var(map[key])
-        return self.get_instruction_pointer() + 1
+        arg_value = self.get_function_argument(instruction.arg_index)
+        self.push_var(arg_value)
 
-    def instruction_map_set(self) -> int:
-        value = self.pop_var()
-        key = self.pop_var()
-        map: Dict[Variable, Variable] = self.top().value
+    def instruction_jump_if_not(self, instruction: JumpIfNot) -> Optional[int]:
 
-        map[key] = value
-        return self.get_instruction_pointer() + 1
+        x = self.pop_bool()
+        if x:
+            return None
 
-    def instruction_map_has_key(self) -> int:
-        key = self.pop_var()
-        map: Dict[Variable, Variable] = self.top().value
+        return instruction.instruction_offset
 
-        self.push_bool(key in map)
-        return self.get_instruction_pointer() + 1
+    def instruction_jump(self, instruction: Jump) -> Optional[int]:
+        return instruction.instruction_offset
 
-    def instruction_map_size(self) -> int:
-        map: Dict[Variable, Variable] = self.top().value
+    def instruction_backward_jump(self, instruction: Jump) -> Optional[int]:
+        return self.jump_backward(instruction.instruction_offset)
 
-        self.push_int(len(map))
-        return self.get_instruction_pointer() + 1
+    def jump_backward(self, target: int) -> int:
+        call_stack_item = self.call_stack[-1]
+        function_record = call_stack_item.function_record
+        function_record.backward_jump_count += 1
 
-    def instruction_map_empty(self) -> int:
-        map: Dict[Variable, Variable] = self.top().value
+        if function_record.backward_jump_count != self.hot_threshold:
+            return target
 
-        self.push_bool(not bool(map))
-        return self.get_instruction_pointer() + 1
+        if not function_record.compiled_call:
+            self.promote(function_record, f"after {self.hot_threshold} loop iterations")
 
-    def instruction_map_pop(self) -> int:
-        key = self.pop_var()
-        map: Dict[Variable, Variable] = self.top().value
+        # Finish the running call in the closure tier as well. That pops the call stack
+        # item, the simulator expects to do that itself when the function ends.
+        self.get_closure_backend().resume(
+            function_record.source_file,
+            function_record.function.identify(),
+            target,
+        )
+        self.call_stack.append(call_stack_item)
+        return len(function_record.instructions)
 
-        self.push_var(map.pop(key))
-        return self.get_instruction_pointer() + 1
+    def get_loop_bound(self, instruction: CountedLoop | CountedLoopStep) -> Any:
+        if instruction.bound_arg_index is None:
+            return instruction.bound
 
-    def instruction_map_drop(self) -> int:
-        key = self.pop_var()
-        map: Dict[Variable, Variable] = self.top().value
+        return self.get_function_argument(instruction.bound_arg_index)
 
-        del map[key]
-        return self.get_instruction_pointer() + 1
+    def instruction_counted_loop(self, instruction: CountedLoop) -> Optional[int]:
+        stack = self.stack
+        compare = COMPARISONS[instruction.comparison]
 
-    def instruction_map_clear(self) -> int:
-        map: Dict[Variable, Variable] = self.top().value
+        if not compare(stack[-1], self.get_loop_bound(instruction)):
+            return instruction.instruction_offset
 
-        map.clear()
-        return self.get_instruction_pointer() + 1
+        stack[-1] += instruction.increment
+        return None
 
-    def instruction_map_copy(self) -> int:
-        map_var = self.top()
-        copied = deepcopy(map_var)
-        self.push_var(copied)
-        return self.get_instruction_pointer() + 1
+    def instruction_counted_loop_step(
+        self, instruction: CountedLoopStep
+    ) -> Optional[int]:
+        stack = self.stack
+        compare = COMPARISONS[instruction.comparison]
 
-    def instruction_map_keys(self) -> int:  # pragma: nocover
-        raise NotImplementedError
+        stack[-1] += instruction.step
+        if not compare(stack[-1], self.get_loop_bound(instruction)):
+            return None
 
-    def instruction_map_values(self) -> int:  # pragma: nocover
-        raise NotImplementedError
+        if self.hot_threshold is None:
+            return instruction.instruction_offset
 
-    def instruction_push_struct(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, PushStruct)
+        return self.jump_backward(instruction.instruction_offset)
 
-        struct_fields: Dict[str, Variable] = {}
+    def instruction_nop(self, instruction: Instruction) -> None:
+        pass
 
-        # TODO move code to create zero value of struct out
-        for field_name, var_type in instruction.type.fields.items():
-            struct_fields[field_name] = Variable.zero_value(var_type)
+    def instruction_assert(self, instruction: Instruction) -> None:
+        x = self.pop_bool()
 
-        struct_var = Variable(
-            type=VariableType(
-                root_type=RootType.STRUCT,
-                type_params=[],
-                name=instruction.type.name,
-            ),
-            value=struct_fields,
+        if not x:
+            raise AaaAssertionFailure(get_stack_trace(self.call_stack))
+
+    def instruction_map_push(self, instruction: PushMap) -> None:
+        self.push_var(
+            map_var(
+                key_type=instruction.key_type,
+                value_type=instruction.value_type,
+                value={},
+            )
         )
-        self.push_var(struct_var)
 
-        return self.get_instruction_pointer() + 1
+    def instruction_push_vec(self, instruction: PushVec) -> None:
+        self.push_var(vec_var(item_type=instruction.item_type, value=[]))
+
+    def instruction_push_struct(self, instruction: PushStruct) -> None:
+        self.push_var(zero_struct_var(instruction.type))
 
-    def instruction_get_struct_field(self, instruction: Instruction) -> int:
+    def instruction_get_struct_field(self, instruction: Instruction) -> None:
         field_name = self.pop_str()
         struct_fields: Dict[str, Variable] = self.top().value
-        self.push_var(struct_fields[field_name])
+        self.push_var(unbox(struct_fields[field_name]))
 
-        return self.get_instruction_pointer() + 1
+    def instruction_set_struct_field(self, instruction: SetStructField) -> None:
 
-    def instruction_set_struct_field(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, SetStructField)
-
-        new_value: Variable = self.pop_var()
+        new_value: Any = self.pop_var()
         field_name: str = self.pop_str()
         struct_fields: Dict[str, Variable] = self.top().value
-        struct_fields[field_name] = new_value
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_stdandard_library_call(self, instruction: Instruction) -> int:
-        assert isinstance(instruction, StandardLibraryCall)
-        return self.stdlib_funcs[instruction.kind]()
-
-    def instruction_syscall_exit(self) -> int:
-        x = self.pop_int()
-        exit(x)
-
-    def instruction_syscall_getcwd(self) -> int:
-        self.push_str(os.getcwd())
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_syscall_read(self) -> int:
-        n = self.pop_int()
-        fd = self.pop_int()
-
-        try:
-            read_data = os.read(fd, n).decode("utf-8")
-        except OSError:
-            self.push_str("")
-            self.push_bool(False)
-        else:
-            self.push_str(read_data)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
+        struct_fields[field_name] = box(new_value)
 
-    def instruction_syscall_time(self) -> int:
-        unix_timestamp = int(time.time())
-        self.push_int(unix_timestamp)
+    def instruction_standard_library_call(
+        self, instruction: StandardLibraryCall
+    ) -> Optional[int]:
+        # Linking gives standard library calls their own opcode, so this is only
+        # used when dispatching on instruction type.
+        opcode = self.stdlib_opcodes[instruction.name]
+        return self.dispatch_table[opcode](instruction)
 
-        return self.get_instruction_pointer() + 1
-
-    def instruction_environ(self) -> int:
-        value = {
-            str_var(env_var_name): str_var(env_var_value)
-            for env_var_name, env_var_value in os.environ.items()
-        }
 
-        env_vars_map = map_var(key_type=Str, value_type=Str, value=value)
+class ParanoidSimulator(Simulator):
+    # Checks everything type checking guarantees while running, which helps finding
+    # bugs in the type checker. Use `aaa.py run --paranoid` to run with this.
+    # Functions don't move to the closure tier, which doesn't check anything.
 
-        self.push_var(env_vars_map)
-        return self.get_instruction_pointer() + 1
+    def __init__(self, program: "Program", **kwargs: Any) -> None:
+        super().__init__(program, **{**kwargs, "hot_threshold": None})
 
-    def instruction_getenv(self) -> int:
-        env_var_name: str = self.pop_var().value
+    def make_handler(
+        self, instruction_type: Type[Instruction], handler: Handler
+    ) -> Handler:
+        return make_checked_handler(instruction_type, handler)
 
-        try:
-            env_var_value = os.environ[env_var_name]
-        except KeyError:
-            self.push_str("")
-            self.push_bool(False)
-        else:
-            self.push_str(env_var_value)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_setenv(self) -> int:
-        env_var_value = self.pop_str()
-        env_var_name = self.pop_str()
-
-        os.environ[env_var_name] = env_var_value
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_unsetenv(self) -> int:
-        env_var_name = self.pop_str()
-
-        try:
-            del os.environ[env_var_name]
-        except KeyError:
-            pass
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_syscall_chdir(self) -> int:
-        dir_name = self.pop_str()
-
-        try:
-            os.chdir(dir_name)
-        except OSError:
-            self.push_var(bool_var(False))
-        else:
-            self.push_var(bool_var(True))
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_getpid(self) -> int:
-        pid = os.getpid()
-        self.push_int(pid)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_getppid(self) -> int:
-        ppid = os.getppid()
-        self.push_int(ppid)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_open(self) -> int:
-        mode = self.pop_int()
-        flags = self.pop_int()
-        path = self.pop_str()
-
-        try:
-            fd = os.open(path=path, flags=flags, mode=mode)
-        except Exception:
-            self.push_int(0)
-            self.push_bool(False)
-        else:
-            self.push_int(fd)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_syscall_close(self) -> int:
-        fd = self.pop_int()
-
-        try:
-            os.close(fd)
-        except Exception:
-            self.push_bool(False)
-        else:
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_write(self) -> int:
-        data = self.pop_str()
-        fd = self.pop_int()
-
-        try:
-            written = os.write(fd, bytes(data, encoding="utf-8"))
-        except Exception:
-            self.push_int(0)
-            self.push_bool(False)
-        else:
-            self.push_int(written)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_syscall_execve(self) -> int:
-        stack_env: Dict[Variable, Variable] = self.pop_var().value
-        stack_argv: List[Variable] = self.pop_var().value
-        path: str = self.pop_var().value
-
-        env: Dict[str, str] = {
-            key.value: value.value for (key, value) in stack_env.items()
-        }
-        argv: List[str] = [item.value for item in stack_argv]
-
-        os.execve(path, argv, env)
-        return self.get_instruction_pointer() + 1
-
-    def instruction_syscall_fork(self) -> int:
-        pid = os.fork()
-        self.push_int(pid)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_waitpid(self) -> int:
-        options = self.pop_int()
-        pid = self.pop_int()
-
-        try:
-            _, wait_status = os.waitpid(pid, options)
-            exit_code = os.waitstatus_to_exitcode(wait_status)
-        except OSError:
-            self.push_int(0)
-            self.push_bool(False)
-        else:
-            self.push_int(exit_code)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_strip(self) -> int:
-        string = self.pop_str()
-        self.push_str(string.strip())
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_split(self) -> int:
-        separator = self.pop_str()
-        string: str = self.top().value
-
-        split = string.split(separator)
-
-        split_var = vec_var(
-            item_type=Str, value=[str_var(split_item) for split_item in split]
-        )
-
-        self.push_var(split_var)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_syscall_fsync(self) -> int:
-        fd = self.pop_int()
-
-        try:
-            os.fsync(fd)
-        except OSError:
-            self.push_bool(False)
-        else:
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_substr(self) -> int:
-        end = self.pop_int()
-        start = self.pop_int()
-        string: str = self.top().value
-
-        if (
-            start < 0
-            or end < 0
-            or start > len(string)
-            or end > len(string)
-            or end < start
-        ):
-            self.push_str("")
-            self.push_bool(False)
-        else:
-            self.push_str(string[start:end])
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_len(self) -> int:
-        string: str = self.top().value
-        self.push_int(len(string))
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_upper(self) -> int:
-        string: str = self.top().value
-        self.push_str(string.upper())
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_lower(self) -> int:
-        string: str = self.top().value
-        self.push_str(string.lower())
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_find(self) -> int:
-        search = self.pop_str()
-        string: str = self.top().value
-
-        index = string.find(search)
-
-        if index == -1:
-            self.push_int(0)
-            self.push_bool(False)
-        else:
-            self.push_int(index)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_find_after(self) -> int:
-        offset = self.pop_int()
-        search = self.pop_str()
-        string: str = self.top().value
-
-        index = string.find(search, offset)
-
-        if index == -1:
-            self.push_int(0)
-            self.push_bool(False)
-        else:
-            self.push_int(index)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_to_int(self) -> int:
-        string: str = self.top().value
-
-        try:
-            integer = int(string)
-        except ValueError:
-            self.push_int(0)
-            self.push_bool(False)
-        else:
-            self.push_int(integer)
-            self.push_bool(True)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_join(self) -> int:
-        parts: List[Variable] = self.pop_var().value
-        string: str = self.top().value
-
-        joined = string.join(part.value for part in parts)
-
-        self.push_str(joined)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_equals(self) -> int:
-        other = self.pop_str()
-        string: str = self.top().value
-
-        self.push_bool(string == other)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_contains(self) -> int:
-        other = self.pop_str()
-        string: str = self.top().value
-
-        self.push_bool(other in string)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_to_bool(self) -> int:
-        string: str = self.top().value
-
-        if string in ["true", "false"]:
-            self.push_bool(string == "true")
-            self.push_bool(True)
-        else:
-            self.push_bool(False)
-            self.push_bool(False)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_replace(self) -> int:
-        replacement = self.pop_str()
-        search = self.pop_str()
-        string: str = self.top().value
-
-        replaced = string.replace(search, replacement)
-        self.push_str(replaced)
-
-        return self.get_instruction_pointer() + 1
-
-    def instruction_str_append(self) -> int:
-        suffix = self.pop_str()
-        string: str = self.top().value
+    def pop_int(self) -> int:
+        x = self.stack.pop()
+        assert isinstance(x, int) and not isinstance(x, bool)
+        return x
 
-        appeneded = string + suffix
-        self.push_str(appeneded)
+    def pop_str(self) -> str:
+        x = self.stack.pop()
+        assert isinstance(x, str)
+        return x
 
-        return self.get_instruction_pointer() + 1
+    def pop_bool(self) -> bool:
+        x = self.stack.pop()
+        assert isinstance(x, bool)
+        return x
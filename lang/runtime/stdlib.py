@@ -0,0 +1,491 @@
+import os
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+from lang.models.typing.var import (
+    Variable,
+    clear_value,
+    copy_var,
+    map_var,
+    owned_value,
+    vec_var,
+)
+from lang.models.typing.var_type import RootType, Str
+
+# Every standard library function takes the arguments of its builtins.aaa signature
+# from the stack and returns the values it pushes back, in stack order.
+# Values of type int, bool and str are passed unboxed, containers are Variables.
+StandardLibraryFunction = Callable[..., Tuple[Any, ...]]
+
+_StandardLibraryFunctionT = TypeVar(
+    "_StandardLibraryFunctionT", bound=StandardLibraryFunction
+)
+
+# Maps names as used in Aaa source code to their implementation.
+# This is the only place where standard library functions are registered.
+STDLIB_FUNCTIONS: Dict[str, StandardLibraryFunction] = {}
+
+
+def stdlib_function(
+    name: str,
+) -> Callable[[_StandardLibraryFunctionT], _StandardLibraryFunctionT]:
+    def register(func: _StandardLibraryFunctionT) -> _StandardLibraryFunctionT:
+        assert name not in STDLIB_FUNCTIONS
+        STDLIB_FUNCTIONS[name] = func
+        return func
+
+    return register
+
+
+def get_arg_count(func: StandardLibraryFunction) -> int:
+    return func.__code__.co_argcount
+
+
+# Maps names of specialized vec functions to the name of the generic function they
+# replace. They are registered for every boxing kind of the item type, so they don't
+# have to find out how items are stored at runtime. Maps store keys and values the
+# same way whatever their types, so map functions aren't specialized. Their names
+# can't be written in Aaa source code, see lang.specializer for how they're used.
+SPECIALIZED_STDLIB_FUNCTIONS: Dict[str, str] = {}
+
+# How container functions store values of each type: int, bool and str values are
+# stored unboxed, values of other types are a Variable.
+BOXING_KINDS: Dict[RootType, str] = {
+    RootType.BOOL: "bool",
+    RootType.INTEGER: "int",
+    RootType.STRING: "str",
+    RootType.VECTOR: "var",
+    RootType.MAPPING: "var",
+    RootType.STRUCT: "var",
+}
+
+
+def get_specialized_name(name: str, kinds: Sequence[str]) -> str:
+    return f"{name}[{','.join(kinds)}]"
+
+
+def get_generic_name(name: str) -> str:
+    return SPECIALIZED_STDLIB_FUNCTIONS.get(name, name)
+
+
+def specialized_stdlib_function(
+    name: str, kinds: Sequence[str]
+) -> Callable[[_StandardLibraryFunctionT], _StandardLibraryFunctionT]:
+    specialized_name = get_specialized_name(name, kinds)
+    SPECIALIZED_STDLIB_FUNCTIONS[specialized_name] = name
+    return stdlib_function(specialized_name)
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def append_item(vec: Variable, item: Any) -> None:
+    items = owned_value(vec)
+
+    try:
+        items.append(item)
+    except OverflowError:  # The int doesn't fit in the array, see vec_storage
+        vec.value = items = list(items)
+        items.append(item)
+
+
+def set_item(vec: Variable, offset: int, item: Any) -> None:
+    items = owned_value(vec)
+
+    try:
+        items[offset] = item
+    except OverflowError:
+        vec.value = items = list(items)
+        items[offset] = item
+
+
+def get_item(vec: Variable, item: Any) -> Any:
+    # Bools are stored as ints in a bytearray
+    if isinstance(vec.value, bytearray):
+        return bool(item)
+    return item
+
+
+@stdlib_function("vec:push")
+def vec_push(vec: Variable, item: Any) -> Tuple[Variable]:
+    append_item(vec, item)
+    return (vec,)
+
+
+@stdlib_function("vec:pop")
+def vec_pop(vec: Variable) -> Tuple[Variable, Any]:
+    return vec, get_item(vec, owned_value(vec).pop())
+
+
+@stdlib_function("vec:get")
+def vec_get(vec: Variable, offset: int) -> Tuple[Variable, Any]:
+    return vec, get_item(vec, vec.value[offset])
+
+
+@stdlib_function("vec:set")
+def vec_set(vec: Variable, offset: int, item: Any) -> Tuple[Variable]:
+    set_item(vec, offset, item)
+    return (vec,)
+
+
+@stdlib_function("vec:size")
+def vec_size(vec: Variable) -> Tuple[Variable, int]:
+    return vec, len(vec.value)
+
+
+@stdlib_function("vec:empty")
+def vec_empty(vec: Variable) -> Tuple[Variable, bool]:
+    return vec, not vec.value
+
+
+@stdlib_function("vec:clear")
+def vec_clear(vec: Variable) -> Tuple[Variable]:
+    clear_value(vec)
+    return (vec,)
+
+
+@stdlib_function("vec:copy")
+def vec_copy(vec: Variable) -> Tuple[Variable, Variable]:
+    return vec, copy_var(vec)
+
+
+@stdlib_function("map:get")
+def map_get(map: Variable, key: Any) -> Tuple[Variable, Any]:
+    return map, map.value[key]
+
+
+@stdlib_function("map:set")
+def map_set(map: Variable, key: Any, value: Any) -> Tuple[Variable]:
+    owned_value(map)[key] = value
+    return (map,)
+
+
+@stdlib_function("map:has_key")
+def map_has_key(map: Variable, key: Any) -> Tuple[Variable, bool]:
+    return map, key in map.value
+
+
+@stdlib_function("map:size")
+def map_size(map: Variable) -> Tuple[Variable, int]:
+    return map, len(map.value)
+
+
+@stdlib_function("map:empty")
+def map_empty(map: Variable) -> Tuple[Variable, bool]:
+    return map, not map.value
+
+
+@stdlib_function("map:pop")
+def map_pop(map: Variable, key: Any) -> Tuple[Variable, Any]:
+    return map, owned_value(map).pop(key)
+
+
+@stdlib_function("map:drop")
+def map_drop(map: Variable, key: Any) -> Tuple[Variable]:
+    del owned_value(map)[key]
+    return (map,)
+
+
+@stdlib_function("map:clear")
+def map_clear(map: Variable) -> Tuple[Variable]:
+    clear_value(map)
+    return (map,)
+
+
+@stdlib_function("map:copy")
+def map_copy(map: Variable) -> Tuple[Variable, Variable]:
+    return map, copy_var(map)
+
+
+@stdlib_function("map:keys")
+def map_keys(map: Variable) -> Tuple[Variable]:  # pragma: nocover
+    raise NotImplementedError
+
+
+@stdlib_function("map:values")
+def map_values(map: Variable) -> Tuple[Variable]:  # pragma: nocover
+    raise NotImplementedError
+
+
+def _register_specialized_vec_functions(item_kind: str) -> None:
+    # Vectors store items unboxed, see vec_storage. Only bools need converting back,
+    # only ints can overflow the array they're stored in.
+    kinds = [item_kind]
+    unbox_item: Callable[[Any], Any] = bool if item_kind == "bool" else _identity
+
+    if item_kind == "int":
+
+        @specialized_stdlib_function("vec:push", kinds)
+        def vec_push(vec: Variable, item: Any) -> Tuple[Variable]:
+            append_item(vec, item)
+            return (vec,)
+
+        @specialized_stdlib_function("vec:set", kinds)
+        def vec_set(vec: Variable, offset: int, item: Any) -> Tuple[Variable]:
+            set_item(vec, offset, item)
+            return (vec,)
+
+    else:
+
+        @specialized_stdlib_function("vec:push", kinds)
+        def vec_push(vec: Variable, item: Any) -> Tuple[Variable]:
+            owned_value(vec).append(item)
+            return (vec,)
+
+        @specialized_stdlib_function("vec:set", kinds)
+        def vec_set(vec: Variable, offset: int, item: Any) -> Tuple[Variable]:
+            owned_value(vec)[offset] = item
+            return (vec,)
+
+    @specialized_stdlib_function("vec:pop", kinds)
+    def vec_pop(vec: Variable) -> Tuple[Variable, Any]:
+        return vec, unbox_item(owned_value(vec).pop())
+
+    @specialized_stdlib_function("vec:get", kinds)
+    def vec_get(vec: Variable, offset: int) -> Tuple[Variable, Any]:
+        return vec, unbox_item(vec.value[offset])
+
+
+for _kind in sorted(set(BOXING_KINDS.values())):
+    _register_specialized_vec_functions(_kind)
+
+
+@stdlib_function("environ")
+def environ() -> Tuple[Variable]:
+    return (map_var(key_type=Str, value_type=Str, value=dict(os.environ)),)
+
+
+@stdlib_function("getenv")
+def getenv(name: str) -> Tuple[str, bool]:
+    try:
+        env_var_value = os.environ[name]
+    except KeyError:
+        return "", False
+
+    return env_var_value, True
+
+
+@stdlib_function("setenv")
+def setenv(name: str, value: str) -> Tuple[()]:
+    os.environ[name] = value
+    return ()
+
+
+@stdlib_function("unsetenv")
+def unsetenv(name: str) -> Tuple[()]:
+    try:
+        del os.environ[name]
+    except KeyError:
+        pass
+
+    return ()
+
+
+@stdlib_function("exit")
+def syscall_exit(code: int) -> Tuple[()]:
+    exit(code)
+
+
+@stdlib_function("getcwd")
+def syscall_getcwd() -> Tuple[str]:
+    return (os.getcwd(),)
+
+
+@stdlib_function("chdir")
+def syscall_chdir(dir_name: str) -> Tuple[bool]:
+    try:
+        os.chdir(dir_name)
+    except OSError:
+        return (False,)
+
+    return (True,)
+
+
+@stdlib_function("read")
+def syscall_read(fd: int, n: int) -> Tuple[str, bool]:
+    try:
+        read_data = os.read(fd, n).decode("utf-8")
+    except OSError:
+        return "", False
+
+    return read_data, True
+
+
+@stdlib_function("write")
+def syscall_write(fd: int, data: str) -> Tuple[int, bool]:
+    try:
+        written = os.write(fd, bytes(data, encoding="utf-8"))
+    except Exception:
+        return 0, False
+
+    return written, True
+
+
+@stdlib_function("open")
+def syscall_open(path: str, flags: int, mode: int) -> Tuple[int, bool]:
+    try:
+        fd = os.open(path=path, flags=flags, mode=mode)
+    except Exception:
+        return 0, False
+
+    return fd, True
+
+
+@stdlib_function("close")
+def syscall_close(fd: int) -> Tuple[bool]:
+    try:
+        os.close(fd)
+    except Exception:
+        return (False,)
+
+    return (True,)
+
+
+@stdlib_function("fsync")
+def syscall_fsync(fd: int) -> Tuple[bool]:
+    try:
+        os.fsync(fd)
+    except OSError:
+        return (False,)
+
+    return (True,)
+
+
+@stdlib_function("time")
+def syscall_time() -> Tuple[int]:
+    return (int(time.time()),)
+
+
+@stdlib_function("getpid")
+def syscall_getpid() -> Tuple[int]:
+    return (os.getpid(),)
+
+
+@stdlib_function("getppid")
+def syscall_getppid() -> Tuple[int]:
+    return (os.getppid(),)
+
+
+@stdlib_function("fork")
+def syscall_fork() -> Tuple[int]:
+    return (os.fork(),)
+
+
+@stdlib_function("waitpid")
+def syscall_waitpid(pid: int, options: int) -> Tuple[int, bool]:
+    try:
+        _, wait_status = os.waitpid(pid, options)
+        exit_code = os.waitstatus_to_exitcode(wait_status)
+    except OSError:
+        return 0, False
+
+    return exit_code, True
+
+
+@stdlib_function("execve")
+def syscall_execve(path: str, argv: Variable, env: Variable) -> Tuple[()]:
+    env_dict: Dict[str, str] = env.value
+    argv_list: List[str] = list(argv.value)
+
+    os.execve(path, argv_list, env_dict)
+    return ()
+
+
+@stdlib_function("str:append")
+def str_append(string: str, other: str) -> Tuple[str, str]:
+    return string, string + other
+
+
+@stdlib_function("str:contains")
+def str_contains(string: str, other: str) -> Tuple[str, bool]:
+    return string, other in string
+
+
+@stdlib_function("str:equals")
+def str_equals(string: str, other: str) -> Tuple[str, bool]:
+    return string, string == other
+
+
+@stdlib_function("str:join")
+def str_join(string: str, parts: Variable) -> Tuple[str, str]:
+    return string, string.join(parts.value)
+
+
+@stdlib_function("str:len")
+def str_len(string: str) -> Tuple[str, int]:
+    return string, len(string)
+
+
+@stdlib_function("str:lower")
+def str_lower(string: str) -> Tuple[str, str]:
+    return string, string.lower()
+
+
+@stdlib_function("str:upper")
+def str_upper(string: str) -> Tuple[str, str]:
+    return string, string.upper()
+
+
+@stdlib_function("str:replace")
+def str_replace(string: str, search: str, replacement: str) -> Tuple[str, str]:
+    return string, string.replace(search, replacement)
+
+
+@stdlib_function("str:split")
+def str_split(string: str, separator: str) -> Tuple[str, Variable]:
+    split = string.split(separator)
+    return string, vec_var(item_type=Str, value=split)
+
+
+@stdlib_function("str:strip")
+def str_strip(string: str) -> Tuple[str]:
+    return (string.strip(),)
+
+
+@stdlib_function("str:find")
+def str_find(string: str, search: str) -> Tuple[str, int, bool]:
+    index = string.find(search)
+
+    if index == -1:
+        return string, 0, False
+
+    return string, index, True
+
+
+@stdlib_function("str:find_after")
+def str_find_after(string: str, search: str, offset: int) -> Tuple[str, int, bool]:
+    index = string.find(search, offset)
+
+    if index == -1:
+        return string, 0, False
+
+    return string, index, True
+
+
+@stdlib_function("str:substr")
+def str_substr(string: str, start: int, end: int) -> Tuple[str, str, bool]:
+    length = len(string)
+
+    if start < 0 or end < 0 or start > length or end > length or end < start:
+        return string, "", False
+
+    return string, string[start:end], True
+
+
+@stdlib_function("str:to_bool")
+def str_to_bool(string: str) -> Tuple[str, bool, bool]:
+    if string in ["true", "false"]:
+        return string, string == "true", True
+
+    return string, False, False
+
+
+@stdlib_function("str:to_int")
+def str_to_int(string: str) -> Tuple[str, int, bool]:
+    try:
+        integer = int(string)
+    except ValueError:
+        return string, 0, False
+
+    return string, integer, True
@@ -0,0 +1,604 @@
+import hashlib
+import marshal
+import os
+import re
+import sys
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from lang.exceptions.runtime import (
+    AaaAssertionFailure,
+    CallStackOverflow,
+    get_stack_trace,
+)
+from lang.instruction_generator import InstructionGenerator
+from lang.models import FunctionBodyItem
+from lang.models.instructions import (
+    And,
+    Assert,
+    CallFunction,
+    Divide,
+    Drop,
+    Dup,
+    Equals,
+    GetStructField,
+    Instruction,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Minus,
+    Modulo,
+    Multiply,
+    Nop,
+    Not,
+    Or,
+    Over,
+    Plus,
+    Print,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    Rot,
+    SetStructField,
+    StandardLibraryCall,
+    Swap,
+)
+from lang.models.parse import (
+    Branch,
+    Function,
+    FunctionBody,
+    Loop,
+    StructFieldUpdate,
+)
+from lang.models.runtime import (
+    DEFAULT_MAX_CALL_DEPTH,
+    CallStackItem,
+    FunctionRecord,
+)
+from lang.models.typing.var import (
+    box,
+    map_var,
+    unbox,
+    vec_var,
+    zero_struct_var,
+)
+from lang.runtime.base_backend import BaseBackend
+from lang.runtime.program import Program
+from lang.runtime.stdlib import STDLIB_FUNCTIONS, get_arg_count
+from lang.tree_shaking import get_reachable_functions
+
+CACHE_DIR_NAME = "__aaacache__"
+
+# Python frames that may be on top of the deepest Aaa function call,
+# such as those of standard library functions.
+RECURSION_LIMIT_MARGIN = 100
+
+# Before Python 3.11 every Python call also recurses in C, and recursing as deep as
+# the default maximum call depth crashes the interpreter instead of raising
+# RecursionError. There, the call depth of transpiled code is capped to this.
+MAX_PYTHON_CALL_DEPTH: Optional[int] = None
+if sys.version_info < (3, 11):  # pragma: nocover
+    MAX_PYTHON_CALL_DEPTH = 10_000
+
+
+def get_cache_dir(entry_point_file: Path) -> Path:
+    # Compiled code is cached next to the entry point file, unless AAA_CACHE_DIR is set
+    if "AAA_CACHE_DIR" in os.environ:
+        return Path(os.environ["AAA_CACHE_DIR"])
+    return entry_point_file.parent / CACHE_DIR_NAME
+
+
+BINARY_OPERATORS: Dict[Type[Instruction], str] = {
+    And: "and",
+    Equals: "==",
+    IntGreaterEquals: ">=",
+    IntGreaterThan: ">",
+    IntLessEquals: "<=",
+    IntLessThan: "<",
+    IntNotEqual: "!=",
+    Minus: "-",
+    Multiply: "*",
+    Or: "or",
+    Plus: "+",
+}
+
+
+def python_name(prefix: str, name: str) -> str:
+    return prefix + "_" + re.sub(r"\W", "_", name)
+
+
+def print_value(value: Any) -> None:
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+
+    print(value, end="")
+
+
+class FunctionTranspiler:
+    # Aaa stack slots become Python locals named s0, s1, ... and arguments a0, a1, ...
+    # The type checker guarantees the stack size is known at every point in a
+    # function, so every instruction maps to a statement on fixed locals.
+
+    def __init__(
+        self, transpiler: "Transpiler", file: Path, function: Function
+    ) -> None:
+        self.transpiler = transpiler
+        self.file = file
+        self.function = function
+        self.instruction_generator = InstructionGenerator(
+            file, function, transpiler.program
+        )
+
+        self.lines: List[str] = []
+        self.indent = 1
+        self.depth = 0
+
+        self.transpile_funcs: Dict[Type[Instruction], Callable[[Instruction], None]] = {
+            Assert: self.transpile_assert,
+            CallFunction: self.transpile_call_function,
+            Divide: self.transpile_divide,
+            Drop: self.transpile_drop,
+            Dup: self.transpile_dup,
+            GetStructField: self.transpile_get_struct_field,
+            Modulo: self.transpile_modulo,
+            Nop: self.transpile_nop,
+            Not: self.transpile_not,
+            Over: self.transpile_over,
+            Print: self.transpile_print,
+            PushArgument: self.transpile_push_argument,
+            PushBool: self.transpile_push_constant,
+            PushInt: self.transpile_push_constant,
+            PushMap: self.transpile_push_map,
+            PushString: self.transpile_push_constant,
+            PushStruct: self.transpile_push_struct,
+            PushVec: self.transpile_push_vec,
+            Rot: self.transpile_rot,
+            SetStructField: self.transpile_set_struct_field,
+            StandardLibraryCall: self.transpile_standard_library_call,
+            Swap: self.transpile_swap,
+        }
+
+    def transpile(self, python_function_name: str) -> List[str]:
+        arguments = ", ".join(f"a{i}" for i in range(len(self.function.arguments)))
+
+        self.lines.append(f"def {python_function_name}({arguments}):")
+        self.transpile_block(self.function.body)
+
+        assert self.depth == len(self.function.return_types)
+
+        if self.depth:
+            self.emit("return " + ", ".join(self.slot(i) for i in range(self.depth)))
+
+        return self.lines
+
+    def slot(self, index: int) -> str:
+        return f"s{index}"
+
+    def top(self, offset: int = 0) -> str:
+        return self.slot(self.depth - 1 - offset)
+
+    def emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
+
+    def transpile_block(self, function_body: FunctionBody) -> None:
+        line_count = len(self.lines)
+
+        for item in function_body.items:
+            self.transpile_item(item)
+
+        if len(self.lines) == line_count:
+            self.emit("pass")
+
+    def transpile_item(self, item: FunctionBodyItem | FunctionBody) -> None:
+        if isinstance(item, Branch):
+            self.transpile_branch(item)
+        elif isinstance(item, Loop):
+            self.transpile_loop(item)
+        elif isinstance(item, FunctionBody):
+            for child in item.items:
+                self.transpile_item(child)
+        elif isinstance(item, StructFieldUpdate):
+            self.transpile_struct_field_update(item)
+        else:
+            # Anything without control flow is translated via its instructions
+            instructions = self.instruction_generator.generate_body_instructions(
+                FunctionBody(items=[item])
+            )
+
+            for instruction in instructions:
+                self.transpile_instruction(instruction)
+
+    def transpile_nested_block(self, function_body: FunctionBody) -> None:
+        self.indent += 1
+        self.transpile_block(function_body)
+        self.indent -= 1
+
+    def transpile_branch(self, branch: Branch) -> None:
+        self.transpile_item(branch.condition)
+        condition = self.top()
+        self.depth -= 1
+        depth = self.depth
+
+        self.emit(f"if {condition}:")
+        self.transpile_nested_block(branch.if_body)
+
+        # The type checker guarantees both bodies leave the same stack size
+        if branch.else_body.items:
+            self.depth = depth
+            self.emit("else:")
+            self.transpile_nested_block(branch.else_body)
+
+    def transpile_loop(self, loop: Loop) -> None:
+        self.emit("while True:")
+        self.indent += 1
+
+        self.transpile_item(loop.condition)
+        self.emit(f"if not {self.top()}:")
+        self.emit("    break")
+        self.depth -= 1
+
+        self.transpile_block(loop.body)
+        self.indent -= 1
+
+    def transpile_struct_field_update(self, field_update: StructFieldUpdate) -> None:
+        self.transpile_instruction(PushString(value=field_update.field_name.value))
+        self.transpile_item(field_update.new_value_expr)
+        self.transpile_instruction(SetStructField())
+
+    def transpile_instruction(self, instruction: Instruction) -> None:
+        instruction_type = type(instruction)
+
+        if instruction_type in BINARY_OPERATORS:
+            operator = BINARY_OPERATORS[instruction_type]
+            lhs, rhs = self.top(1), self.top()
+            self.emit(f"{lhs} = {lhs} {operator} {rhs}")
+            self.depth -= 1
+        else:
+            self.transpile_funcs[instruction_type](instruction)
+
+    def transpile_push_constant(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, (PushBool, PushInt, PushString))
+        self.emit(f"{self.slot(self.depth)} = {instruction.value!r}")
+        self.depth += 1
+
+    def transpile_push_argument(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushArgument)
+        self.emit(f"{self.slot(self.depth)} = a{instruction.arg_index}")
+        self.depth += 1
+
+    def transpile_push_vec(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushVec)
+        item_type = self.transpiler.add_constant(instruction.item_type)
+        self.emit(f"{self.slot(self.depth)} = vec_var(item_type={item_type}, value=[])")
+        self.depth += 1
+
+    def transpile_push_map(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushMap)
+        key_type = self.transpiler.add_constant(instruction.key_type)
+        value_type = self.transpiler.add_constant(instruction.value_type)
+        self.emit(
+            f"{self.slot(self.depth)} = "
+            + f"map_var(key_type={key_type}, value_type={value_type}, value={{}})"
+        )
+        self.depth += 1
+
+    def transpile_push_struct(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, PushStruct)
+        struct = self.transpiler.add_constant(instruction.type)
+        self.emit(f"{self.slot(self.depth)} = zero_struct_var({struct})")
+        self.depth += 1
+
+    def transpile_divide(self, instruction: Instruction) -> None:
+        lhs, rhs = self.top(1), self.top()
+        self.emit(f"{lhs}, {rhs} = ({lhs} // {rhs}, True) if {rhs} else (0, False)")
+
+    def transpile_modulo(self, instruction: Instruction) -> None:
+        lhs, rhs = self.top(1), self.top()
+        self.emit(f"{lhs}, {rhs} = ({lhs} % {rhs}, True) if {rhs} else (0, False)")
+
+    def transpile_not(self, instruction: Instruction) -> None:
+        self.emit(f"{self.top()} = not {self.top()}")
+
+    def transpile_nop(self, instruction: Instruction) -> None:
+        pass
+
+    def transpile_drop(self, instruction: Instruction) -> None:
+        self.depth -= 1
+
+    def transpile_dup(self, instruction: Instruction) -> None:
+        self.emit(f"{self.slot(self.depth)} = {self.top()}")
+        self.depth += 1
+
+    def transpile_swap(self, instruction: Instruction) -> None:
+        x, y = self.top(1), self.top()
+        self.emit(f"{x}, {y} = {y}, {x}")
+
+    def transpile_over(self, instruction: Instruction) -> None:
+        self.emit(f"{self.slot(self.depth)} = {self.top(1)}")
+        self.depth += 1
+
+    def transpile_rot(self, instruction: Instruction) -> None:
+        x, y, z = self.top(2), self.top(1), self.top()
+        self.emit(f"{x}, {y}, {z} = {y}, {z}, {x}")
+
+    def transpile_print(self, instruction: Instruction) -> None:
+        self.emit(f"print_value({self.top()})")
+        self.depth -= 1
+
+    def transpile_assert(self, instruction: Instruction) -> None:
+        self.emit(f"if not {self.top()}:")
+        self.emit("    assertion_failure()")
+        self.depth -= 1
+
+    def transpile_get_struct_field(self, instruction: Instruction) -> None:
+        struct, field_name = self.top(1), self.top()
+        self.emit(f"{field_name} = unbox({struct}.value[{field_name}])")
+
+    def transpile_set_struct_field(self, instruction: Instruction) -> None:
+        struct, field_name, value = self.top(2), self.top(1), self.top()
+        self.emit(f"{struct}.value[{field_name}] = box({value})")
+        self.depth -= 2
+
+    def transpile_call(
+        self,
+        python_function_name: str,
+        argument_count: int,
+        return_count: int,
+        returns_tuple: bool,
+    ) -> None:
+        self.depth -= argument_count
+        arguments = ", ".join(self.slot(self.depth + i) for i in range(argument_count))
+        call = f"{python_function_name}({arguments})"
+
+        returned = ", ".join(self.slot(self.depth + i) for i in range(return_count))
+
+        if return_count == 0:
+            self.emit(call)
+        elif returns_tuple:
+            self.emit(f"{returned}, = {call}")
+        else:
+            self.emit(f"{returned} = {call}")
+
+        self.depth += return_count
+
+    def transpile_call_function(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, CallFunction)
+        function = self.transpiler.program.get_identifier(
+            instruction.file, instruction.func_name
+        )
+        assert isinstance(function, Function)
+
+        python_function_name = self.transpiler.function_names[
+            (instruction.file, instruction.func_name)
+        ]
+
+        # Generated functions return multiple values as tuple, a single one as is.
+        return_count = len(function.return_types)
+        self.transpile_call(
+            python_function_name,
+            len(function.arguments),
+            return_count,
+            return_count > 1,
+        )
+
+    def transpile_standard_library_call(self, instruction: Instruction) -> None:
+        assert isinstance(instruction, StandardLibraryCall)
+        stdlib_func = STDLIB_FUNCTIONS[instruction.name]
+        builtin = self.transpiler.program._builtins.functions[instruction.name]
+
+        # Standard library functions always return a tuple
+        self.transpile_call(
+            python_name("stdlib", instruction.name),
+            get_arg_count(stdlib_func),
+            len(builtin.return_types),
+            True,
+        )
+
+
+class Transpiler:
+    def __init__(self, program: Program) -> None:
+        self.program = program
+
+        # Maps Aaa function identity to the name of the generated Python function.
+        self.function_names: Dict[Tuple[Path, str], str] = {}
+
+        # Values the generated code uses which can't be written as literal.
+        self.constants: List[Any] = []
+
+    def add_constant(self, value: Any) -> str:
+        for index, constant in enumerate(self.constants):
+            if constant is value:
+                break
+        else:
+            index = len(self.constants)
+            self.constants.append(value)
+
+        return f"const_{index}"
+
+    def get_functions(self) -> List[Tuple[Path, Function]]:
+        # Functions main never calls aren't transpiled, nor cached
+        return get_reachable_functions(self.program)
+
+    def transpile(self) -> str:
+        functions = self.get_functions()
+
+        for index, (file, function) in enumerate(functions):
+            func_name = function.identify()
+            self.function_names[(file, func_name)] = python_name(
+                f"fn{index}", func_name
+            )
+
+        lines = [
+            f"# Transpiled from {self.program.entry_point_file}",
+        ]
+
+        for file, function in functions:
+            python_function_name = self.function_names[(file, function.identify())]
+            lines += [
+                "",
+                "",
+                f"# {file}: {function.identify()}",
+            ]
+            lines += FunctionTranspiler(self, file, function).transpile(
+                python_function_name
+            )
+
+        return "\n".join(lines) + "\n"
+
+    def get_namespace(self) -> Dict[str, Any]:
+        namespace: Dict[str, Any] = {
+            "box": box,
+            "map_var": map_var,
+            "print_value": print_value,
+            "unbox": unbox,
+            "vec_var": vec_var,
+            "zero_struct_var": zero_struct_var,
+        }
+
+        for name, stdlib_func in STDLIB_FUNCTIONS.items():
+            namespace[python_name("stdlib", name)] = stdlib_func
+
+        for index, constant in enumerate(self.constants):
+            namespace[f"const_{index}"] = constant
+
+        return namespace
+
+
+class TranspilerBackend(BaseBackend):
+    # Runs a program by transpiling it to Python, so CPython runs it natively.
+    # Compiled code is cached, see get_cache_dir.
+
+    def __init__(
+        self, program: Program, max_call_depth: int = DEFAULT_MAX_CALL_DEPTH
+    ) -> None:
+        self.program = program
+        self.max_call_depth = max_call_depth
+        if MAX_PYTHON_CALL_DEPTH is not None:
+            self.max_call_depth = min(max_call_depth, MAX_PYTHON_CALL_DEPTH)
+
+        # Maps code of generated functions to the Aaa function they implement
+        self.function_records: Dict[CodeType, FunctionRecord] = {}
+
+    def get_cache_file(self, source: str) -> Path:
+        entry_point_file = self.program.entry_point_file
+        source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+        cache_tag = sys.implementation.cache_tag
+
+        return (
+            get_cache_dir(entry_point_file)
+            / f"{entry_point_file.stem}.{source_hash}.{cache_tag}.bin"
+        )
+
+    def get_code(self, source: str) -> CodeType:
+        cache_file = self.get_cache_file(source)
+
+        try:
+            code = marshal.loads(cache_file.read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        else:
+            assert isinstance(code, CodeType)
+            return code
+
+        code = compile(source, f"<transpiled {self.program.entry_point_file}>", "exec")
+
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_bytes(marshal.dumps(code))
+        except OSError:
+            pass
+
+        return code
+
+    def run_main(self) -> None:
+        transpiler = Transpiler(self.program)
+        source = transpiler.transpile()
+
+        namespace = transpiler.get_namespace()
+        namespace["assertion_failure"] = self.assertion_failure
+        exec(self.get_code(source), namespace)
+
+        for (
+            file,
+            func_name,
+        ), python_function_name in transpiler.function_names.items():
+            function = self.program.get_identifier(file, func_name)
+            assert isinstance(function, Function)
+
+            code = namespace[python_function_name].__code__
+            self.function_records[code] = FunctionRecord(
+                function, file, [], self.program.get_instructions(file, func_name)
+            )
+
+        main = namespace[
+            transpiler.function_names[(self.program.entry_point_file, "main")]
+        ]
+
+        # Aaa function calls are Python function calls, so Python's recursion limit
+        # is what limits the call depth.
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(
+            self.get_python_depth() + self.max_call_depth + RECURSION_LIMIT_MARGIN
+        )
+
+        try:
+            main()
+        except RecursionError as e:
+            raise self.call_stack_overflow(e)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+    def get_python_depth(self) -> int:
+        depth = 0
+        frame: Optional[FrameType] = sys._getframe()
+
+        while frame:
+            depth += 1
+            frame = frame.f_back
+
+        return depth
+
+    def get_call_stack(self, frame: Optional[FrameType]) -> List[CallStackItem]:
+        call_stack: List[CallStackItem] = []
+
+        while frame:
+            function_record = self.function_records.get(frame.f_code)
+
+            if function_record:
+                argument_values = [
+                    frame.f_locals[f"a{i}"]
+                    for i in range(function_record.argument_count)
+                ]
+                call_stack.append(CallStackItem(function_record, 0, argument_values))
+
+            frame = frame.f_back
+
+        call_stack.reverse()
+        return call_stack
+
+    def assertion_failure(self) -> None:
+        raise AaaAssertionFailure(
+            get_stack_trace(self.get_call_stack(sys._getframe(1)))
+        )
+
+    def call_stack_overflow(self, e: RecursionError) -> CallStackOverflow:
+        traceback = e.__traceback__
+        function: Optional[Function] = None
+
+        while traceback:
+            function_record = self.function_records.get(traceback.tb_frame.f_code)
+            if function_record:
+                function = function_record.function
+            traceback = traceback.tb_next
+
+        assert function
+        return CallStackOverflow(
+            max_call_depth=self.max_call_depth, function_name=function.identify()
+        )
@@ -0,0 +1,354 @@
+from copy import copy
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from lang.models.instructions import (
+    And,
+    ArgumentOperation,
+    Assert,
+    CallFunction,
+    ConstantOperation,
+    CountedLoop,
+    CountedLoopStep,
+    Divide,
+    Equals,
+    GetStructField,
+    Instruction,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Jump,
+    JumpIfNot,
+    Minus,
+    Modulo,
+    Multiply,
+    Not,
+    Or,
+    Plus,
+    Print,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    SetStructField,
+    StandardLibraryCall,
+)
+from lang.models.parse import Function, Struct
+from lang.models.typing.signature import Signature
+from lang.models.typing.var_type import Bool, Int, RootType, Str, VariableType
+from lang.operators import INT_OPERATORS
+from lang.runtime.stdlib import (
+    BOXING_KINDS,
+    SPECIALIZED_STDLIB_FUNCTIONS,
+    STDLIB_FUNCTIONS,
+    get_arg_count,
+    get_generic_name,
+    get_specialized_name,
+)
+from lang.ssa import shuffle
+from lang.type_checker import TypeChecker
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+# Types of the values on the stack, None when they are not known
+StackTypes = List[Optional[VariableType]]
+
+INT_RESULT_INSTRUCTIONS = (Minus, Multiply, Plus)
+
+BOOL_RESULT_INSTRUCTIONS = (
+    And,
+    Equals,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Or,
+)
+
+SPECIALIZABLE_STDLIB_FUNCTIONS = set(SPECIALIZED_STDLIB_FUNCTIONS.values())
+
+
+def is_generic(var_type: VariableType) -> bool:
+    return var_type.is_placeholder() or any(
+        is_generic(type_param) for type_param in var_type.type_params
+    )
+
+
+class Specializer:
+    # Finds the types on the stack before every instruction of a function, like the
+    # type checker does for its body. With those, calls to generic standard library
+    # vec functions are replaced by versions for the item type of the vec.
+
+    def __init__(
+        self,
+        program: "Program",
+        file: Path,
+        function: Function,
+        instructions: List[Instruction],
+    ) -> None:
+        self.program = program
+        self.file = file
+        self.function = function
+        self.instructions = instructions
+        self.type_checker = TypeChecker(file, function, program)
+
+    def specialize(self) -> List[Instruction]:
+        specialized: List[Instruction] = []
+
+        for instruction, stack in zip(self.instructions, self.get_stack_types()):
+            if stack is not None and isinstance(instruction, StandardLibraryCall):
+                instruction = self.specialize_standard_library_call(instruction, stack)
+
+            specialized.append(instruction)
+
+        return specialized
+
+    def specialize_standard_library_call(
+        self, instruction: StandardLibraryCall, stack: StackTypes
+    ) -> Instruction:
+        if instruction.name not in SPECIALIZABLE_STDLIB_FUNCTIONS:
+            return instruction
+
+        # The vec is always the first argument
+        vec_type = stack[-get_arg_count(STDLIB_FUNCTIONS[instruction.name])]
+        if vec_type is None or is_generic(vec_type):
+            return instruction
+
+        kinds = [BOXING_KINDS[vec_type.type_params[0].root_type]]
+        return StandardLibraryCall(name=get_specialized_name(instruction.name, kinds))
+
+    def get_stack_types(self) -> List[Optional[StackTypes]]:
+        # Stack types before every instruction, None for unreachable instructions.
+        # The type checker guarantees they are the same for every path to an
+        # instruction, so every instruction is visited once.
+        stack_types: List[Optional[StackTypes]] = [None] * len(self.instructions)
+        worklist: List[Tuple[int, StackTypes]] = [(0, [])]
+
+        while worklist:
+            ip, stack = worklist.pop()
+
+            while ip < len(self.instructions) and stack_types[ip] is None:
+                stack_types[ip] = stack
+                instruction = self.instructions[ip]
+
+                if isinstance(instruction, Jump):
+                    ip = instruction.instruction_offset
+                    continue
+
+                stack = copy(stack)
+                self.apply(ip, stack)
+
+                if isinstance(instruction, (CountedLoop, CountedLoopStep, JumpIfNot)):
+                    worklist.append((instruction.instruction_offset, stack))
+
+                ip += 1
+
+        return stack_types
+
+    def apply(self, ip: int, stack: StackTypes) -> None:
+        instruction = self.instructions[ip]
+
+        if isinstance(instruction, PushInt):
+            stack.append(Int)
+        elif isinstance(instruction, PushBool):
+            stack.append(Bool)
+        elif isinstance(instruction, PushString):
+            stack.append(Str)
+        elif isinstance(instruction, PushArgument):
+            stack.append(self.function.arguments[instruction.arg_index].type)
+        elif isinstance(instruction, PushVec):
+            stack.append(
+                VariableType(
+                    root_type=RootType.VECTOR, type_params=[instruction.item_type]
+                )
+            )
+        elif isinstance(instruction, PushMap):
+            stack.append(
+                VariableType(
+                    name="map",
+                    root_type=RootType.MAPPING,
+                    type_params=[instruction.key_type, instruction.value_type],
+                )
+            )
+        elif isinstance(instruction, PushStruct):
+            stack.append(
+                VariableType(
+                    root_type=RootType.STRUCT,
+                    type_params=[],
+                    name=instruction.type.name,
+                )
+            )
+        elif isinstance(instruction, INT_RESULT_INSTRUCTIONS):
+            stack[-2:] = [Int]
+        elif isinstance(instruction, BOOL_RESULT_INSTRUCTIONS):
+            stack[-2:] = [Bool]
+        elif isinstance(instruction, Not):
+            stack[-1:] = [Bool]
+        elif isinstance(instruction, (ArgumentOperation, ConstantOperation)):
+            stack[-1:] = [Int if instruction.operator in INT_OPERATORS else Bool]
+        elif isinstance(instruction, (Divide, Modulo)):
+            stack[-2:] = [Int, Bool]
+        elif isinstance(instruction, (Assert, JumpIfNot, Print)):
+            stack.pop()
+        elif isinstance(instruction, GetStructField):
+            stack[-1:] = [self.get_struct_field_type(ip, stack[-2])]
+        elif isinstance(instruction, SetStructField):
+            del stack[-2:]
+        elif isinstance(instruction, CallFunction):
+            function = self.program.get_identifier(
+                instruction.file, instruction.func_name
+            )
+            assert isinstance(function, Function)
+            signature = self.program.get_signature(instruction.file, function)
+            self.apply_signature(stack, signature)
+        elif isinstance(instruction, StandardLibraryCall):
+            self.apply_signature(stack, self.get_builtin_signature(instruction))
+        else:
+            shuffle(instruction, stack, copy=lambda var_type: var_type)
+
+    def get_builtin_signature(self, instruction: StandardLibraryCall) -> Signature:
+        builtin = self.program._builtins.functions[get_generic_name(instruction.name)]
+        return self.program.get_builtin_signature(builtin)
+
+    def apply_signature(self, stack: StackTypes, signature: Signature) -> None:
+        arg_count = len(signature.arg_types)
+        arg_types = [
+            arg_type
+            for arg_type in stack[len(stack) - arg_count :]
+            if arg_type is not None
+        ]
+        del stack[len(stack) - arg_count :]
+
+        if len(arg_types) != arg_count:
+            stack += [None] * len(signature.return_types)
+            return
+
+        stack += self.type_checker._check_and_apply_signature(
+            arg_types, signature, self.function
+        )
+
+    def get_struct_field_type(
+        self, ip: int, struct_type: Optional[VariableType]
+    ) -> Optional[VariableType]:
+        # Field names are pushed right before the field is read
+        field_name = self.instructions[ip - 1]
+
+        if struct_type is None or not isinstance(field_name, PushString):
+            return None
+
+        struct = self.program.get_identifier(self.file, struct_type.name)
+        if not isinstance(struct, Struct):
+            return None
+
+        return struct.fields.get(field_name.value)
+
+
+class Monomorphizer:
+    # Clones generic functions for every set of concrete argument types they are
+    # called with. The clones are specialized like any other function, so vec calls
+    # on their placeholder-typed vecs use the specialized versions too.
+
+    def __init__(self, program: "Program") -> None:
+        self.program = program
+
+    def monomorphize(self) -> None:
+        worklist = [
+            (file, func_name)
+            for file, file_instructions in self.program.function_instructions.items()
+            for func_name in file_instructions
+        ]
+
+        while worklist:
+            file, func_name = worklist.pop()
+            worklist += self.monomorphize_calls(file, func_name)
+
+    def monomorphize_calls(self, file: Path, func_name: str) -> List[Tuple[Path, str]]:
+        # Returns the clones that were created
+        function = self.program.get_identifier(file, func_name)
+        assert isinstance(function, Function)
+
+        instructions = self.program.get_instructions(file, func_name)
+        stack_types = Specializer(
+            self.program, file, function, instructions
+        ).get_stack_types()
+
+        clones: List[Tuple[Path, str]] = []
+        monomorphized: List[Instruction] = []
+
+        for instruction, stack in zip(instructions, stack_types):
+            if stack is not None and isinstance(instruction, CallFunction):
+                clone_name = self.get_clone_name(instruction, stack)
+
+                if clone_name is not None:
+                    if (
+                        clone_name
+                        not in self.program.function_instructions[instruction.file]
+                    ):
+                        self.create_clone(instruction, stack, clone_name)
+                        clones.append((instruction.file, clone_name))
+
+                    instruction = CallFunction(
+                        func_name=clone_name, file=instruction.file
+                    )
+
+            monomorphized.append(instruction)
+
+        self.program.function_instructions[file][func_name] = monomorphized
+        return clones
+
+    def get_called_function(self, instruction: CallFunction) -> Function:
+        function = self.program.get_identifier(instruction.file, instruction.func_name)
+        assert isinstance(function, Function)
+        return function
+
+    def get_clone_name(
+        self, instruction: CallFunction, stack: StackTypes
+    ) -> Optional[str]:
+        function = self.get_called_function(instruction)
+        signature = self.program.get_signature(instruction.file, function)
+
+        if not any(is_generic(arg_type) for arg_type in signature.arg_types):
+            return None
+
+        arg_types = stack[len(stack) - len(signature.arg_types) :]
+        if any(arg_type is None or is_generic(arg_type) for arg_type in arg_types):
+            return None
+
+        formatted_types = ", ".join(repr(arg_type) for arg_type in arg_types)
+        return f"{function.identify()}[{formatted_types}]"
+
+    def create_clone(
+        self, instruction: CallFunction, stack: StackTypes, clone_name: str
+    ) -> None:
+        file = instruction.file
+        function = self.get_called_function(instruction)
+        signature = self.program.get_signature(file, function)
+
+        arg_types = stack[len(stack) - len(signature.arg_types) :]
+        return_types = copy(arg_types)
+        Specializer(self.program, file, function, []).apply_signature(
+            return_types, signature
+        )
+
+        clone = function.copy(
+            update={
+                "name": clone_name,
+                "arguments": [
+                    argument.copy(update={"type": arg_type})
+                    for argument, arg_type in zip(function.arguments, arg_types)
+                ],
+                "return_types": return_types,
+            }
+        )
+
+        self.program.identifiers[file][clone_name] = clone
+        self.program.function_instructions[file][
+            clone_name
+        ] = self.program.generate_instructions(file, clone)
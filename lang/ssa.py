@@ -0,0 +1,932 @@
+from collections import deque
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from lang.models.instructions import (
+    And,
+    CallFunction,
+    Divide,
+    Drop,
+    Dup,
+    Equals,
+    GetStructField,
+    Instruction,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Jump,
+    JumpIfNot,
+    Minus,
+    Modulo,
+    Multiply,
+    Nop,
+    Not,
+    Or,
+    Over,
+    Plus,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushMap,
+    PushString,
+    PushStruct,
+    PushVec,
+    Rot,
+    SetStructField,
+    StandardLibraryCall,
+    Swap,
+)
+from lang.models.parse import Function
+from lang.models.ssa import (
+    Block,
+    Goto,
+    GotoUnless,
+    Operation,
+    Return,
+    SSAFunction,
+    Value,
+)
+from lang.runtime.stdlib import STDLIB_FUNCTIONS, get_arg_count, get_generic_name
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+T = TypeVar("T")
+
+FunctionKey = Tuple[Path, str]
+
+
+class EnterInlined(Instruction):
+    # Marks the start of the body of an inlined function, which gets the values on
+    # top of the stack as arguments. Only used while optimizing, see inline_calls.
+    argument_count: int
+
+
+class PushInlinedArgument(Instruction):
+    # Replaces PushArgument in inlined function bodies
+    arg_index: int
+
+
+class LeaveInlined(Instruction):
+    # Marks the end of the body of an inlined function, its arguments are removed
+    # from below the values it returns.
+    ...
+
+
+INLINING_MARKERS = (EnterInlined, LeaveInlined)
+
+SHUFFLE_INSTRUCTIONS = (Drop, Dup, Nop, Over, Rot, Swap)
+
+# Instructions that always give the same results for the same operands
+PURE_INSTRUCTIONS = (
+    And,
+    Divide,
+    Equals,
+    IntGreaterEquals,
+    IntGreaterThan,
+    IntLessEquals,
+    IntLessThan,
+    IntNotEqual,
+    Minus,
+    Modulo,
+    Multiply,
+    Not,
+    Or,
+    Plus,
+    PushArgument,
+    PushBool,
+    PushInt,
+    PushString,
+)
+
+COMMUTATIVE_INSTRUCTIONS = (And, Equals, IntNotEqual, Multiply, Or, Plus)
+
+# Instructions without side effects, that can go when their results are unused
+REMOVABLE_INSTRUCTIONS = PURE_INSTRUCTIONS + (
+    GetStructField,
+    PushMap,
+    PushStruct,
+    PushVec,
+)
+
+# Values pushed by these are not kept on the stack, but pushed again where needed
+REMATERIALIZABLE_INSTRUCTIONS = (PushArgument, PushBool, PushInt, PushString)
+
+# Upper bound of stack states tried when looking for stack shuffles
+SHUFFLE_SEARCH_LIMIT = 5_000
+
+DROP = Drop()
+DUP = Dup()
+OVER = Over()
+ROT = Rot()
+SWAP = Swap()
+
+
+def shuffle(instruction: Instruction, stack: List[T], copy: Callable[[T], T]) -> None:
+    instruction_type = type(instruction)
+
+    if instruction_type == Drop:
+        stack.pop()
+    elif instruction_type == Dup:
+        stack.append(copy(stack[-1]))
+    elif instruction_type == Over:
+        stack.append(copy(stack[-2]))
+    elif instruction_type == Swap:
+        stack[-2:] = [stack[-1], stack[-2]]
+    elif instruction_type == Rot:
+        stack[-3:] = [stack[-2], stack[-1], stack[-3]]
+
+
+INLINED_INSTRUCTIONS = (EnterInlined, LeaveInlined, PushInlinedArgument)
+
+# Offset in the stack where the arguments of an inlined function start, and those
+InlinedFrame = Tuple[int, List[T]]
+
+
+def apply_inlined(
+    instruction: Instruction,
+    stack: List[T],
+    frames: List[InlinedFrame[T]],
+    copy: Callable[[T], T],
+) -> None:
+    # Arguments stay on the stack below the inlined body, which can't reach them
+    if isinstance(instruction, EnterInlined):
+        base = len(stack) - instruction.argument_count
+        frames.append((base, stack[base:]))
+    elif isinstance(instruction, PushInlinedArgument):
+        stack.append(copy(frames[-1][1][instruction.arg_index]))
+    else:
+        base, arguments = frames.pop()
+        del stack[base : base + len(arguments)]
+
+
+def inline_calls(
+    program: "Program",
+    instructions: List[Instruction],
+    inlined: Dict[FunctionKey, List[Instruction]],
+) -> List[Instruction]:
+    # Replaces calls to functions in inlined by their instructions. Those must not
+    # jump or call functions.
+    expanded: List[Instruction] = []
+    new_offsets: List[int] = []
+
+    for instruction in instructions:
+        new_offsets.append(len(expanded))
+
+        if not (
+            isinstance(instruction, CallFunction)
+            and (instruction.file, instruction.func_name) in inlined
+        ):
+            expanded.append(instruction)
+            continue
+
+        function = program.get_identifier(instruction.file, instruction.func_name)
+        assert isinstance(function, Function)
+        expanded.append(EnterInlined(argument_count=len(function.arguments)))
+
+        for callee_instruction in inlined[(instruction.file, instruction.func_name)]:
+            if isinstance(callee_instruction, PushArgument):
+                callee_instruction = PushInlinedArgument(
+                    arg_index=callee_instruction.arg_index
+                )
+            expanded.append(callee_instruction)
+
+        expanded.append(LeaveInlined())
+
+    new_offsets.append(len(expanded))
+
+    return [
+        instruction.copy(
+            update={"instruction_offset": new_offsets[instruction.instruction_offset]}
+        )
+        if isinstance(instruction, (Jump, JumpIfNot))
+        else instruction
+        for instruction in expanded
+    ]
+
+
+def is_rematerializable(value: Value) -> bool:
+    return value.operation is not None and isinstance(
+        value.operation.instruction, REMATERIALIZABLE_INSTRUCTIONS
+    )
+
+
+def get_kept_params(block: Block) -> List[int]:
+    # Returns indexes of the parameters that are on the stack when entering a block,
+    # the others are not used or can be pushed again where they are used.
+    return [
+        index
+        for index in range(len(block.params))
+        if any(
+            member.params[index].resolve().live
+            and not is_rematerializable(member.params[index].resolve())
+            for member in block.group
+        )
+    ]
+
+
+class SSABuilder:
+    def __init__(self, program: "Program", instructions: List[Instruction]) -> None:
+        self.program = program
+        self.instructions = instructions
+        self.value_count = 0
+        self.blocks: Dict[int, Block] = {}
+
+    def new_value(
+        self, operation: Optional[Operation] = None, block: Optional[Block] = None
+    ) -> Value:
+        self.value_count += 1
+        return Value(self.value_count, operation=operation, block=block)
+
+    def build(self) -> SSAFunction:
+        instruction_count = len(self.instructions)
+        block_starts = {0}
+
+        for ip, instruction in enumerate(self.instructions):
+            if isinstance(instruction, (Jump, JumpIfNot)):
+                block_starts.add(instruction.instruction_offset)
+                block_starts.add(ip + 1)
+
+        starts = sorted(start for start in block_starts if start < instruction_count)
+        ends = starts[1:] + [instruction_count]
+
+        for start, end in zip(starts, ends):
+            self.blocks[start] = Block(start, end)
+
+        # Blocks get parameters for the stack they are entered with, so they are
+        # built once a predecessor is built. Unreachable blocks are left out.
+        entry = self.blocks[0] if self.blocks else Block(0, 0)
+        reachable: Set[Block] = {entry}
+        worklist = [entry]
+
+        while worklist:
+            block = worklist.pop()
+            self.build_block(block)
+
+            for successor in block.successors():
+                successor.predecessors.append(block)
+
+                if successor not in reachable:
+                    reachable.add(successor)
+                    worklist.append(successor)
+
+        blocks = [block for block in self.blocks.values() if block in reachable]
+        ssa = SSAFunction(blocks or [entry], self.value_count)
+        self.group_blocks(ssa)
+        return ssa
+
+    def enter_block(self, block: Block, stack: List[Value]) -> None:
+        if block.predecessors or block.params:
+            # If this assertion breaks, then Aaa's type checking is broken
+            assert len(block.params) == len(stack)
+            return
+
+        block.params = [self.new_value(block=block) for _ in stack]
+
+    def build_block(self, block: Block) -> None:
+        stack = list(block.params)
+        frames: List[InlinedFrame[Value]] = []
+
+        for ip in range(block.start, block.end):
+            instruction = self.instructions[ip]
+
+            if isinstance(instruction, INLINED_INSTRUCTIONS):
+                apply_inlined(instruction, stack, frames, lambda value: value)
+                continue
+
+            if isinstance(instruction, Jump):
+                target = self.blocks[instruction.instruction_offset]
+                self.enter_block(target, stack)
+                block.terminator = Goto(target, stack)
+                return
+
+            if isinstance(instruction, JumpIfNot):
+                condition = stack.pop()
+                target = self.blocks[instruction.instruction_offset]
+                fallthrough = self.blocks[ip + 1]
+                self.enter_block(target, stack)
+                self.enter_block(fallthrough, stack)
+                block.terminator = GotoUnless(condition, target, fallthrough, stack)
+                return
+
+            if isinstance(instruction, SHUFFLE_INSTRUCTIONS):
+                shuffle(instruction, stack, lambda value: value)
+            else:
+                block.operations.append(self.build_operation(ip, stack))
+
+        if block.end in self.blocks:
+            target = self.blocks[block.end]
+            self.enter_block(target, stack)
+            block.terminator = Goto(target, stack)
+        else:
+            block.terminator = Return(stack)
+
+    def build_operation(self, ip: int, stack: List[Value]) -> Operation:
+        instruction = self.instructions[ip]
+        argument_count, result_count = self.get_stack_effect(instruction)
+
+        operands = stack[len(stack) - argument_count :]
+        del stack[len(stack) - argument_count :]
+
+        operation = Operation(instruction, ip, operands)
+
+        if isinstance(instruction, (GetStructField, SetStructField)):
+            operation.results.append(operands[0])
+
+        while len(operation.results) < result_count:
+            operation.results.append(self.new_value(operation=operation))
+
+        stack += operation.results
+        return operation
+
+    def get_stack_effect(self, instruction: Instruction) -> Tuple[int, int]:
+        if isinstance(instruction, CallFunction):
+            function = self.program.get_identifier(
+                instruction.file, instruction.func_name
+            )
+            assert isinstance(function, Function)
+            return len(function.arguments), len(function.return_types)
+
+        if isinstance(instruction, StandardLibraryCall):
+            builtin = self.program._builtins.functions[
+                get_generic_name(instruction.name)
+            ]
+            argument_count = get_arg_count(STDLIB_FUNCTIONS[instruction.name])
+            return argument_count, len(builtin.return_types)
+
+        if isinstance(instruction, (Divide, Modulo)):
+            return 2, 2
+
+        if isinstance(instruction, Not):
+            return 1, 1
+
+        if isinstance(instruction, PURE_INSTRUCTIONS):
+            if isinstance(instruction, REMATERIALIZABLE_INSTRUCTIONS):
+                return 0, 1
+            return 2, 1
+
+        if isinstance(instruction, (PushMap, PushStruct, PushVec)):
+            return 0, 1
+
+        if isinstance(instruction, GetStructField):
+            return 2, 2
+
+        if isinstance(instruction, SetStructField):
+            return 3, 1
+
+        # Print and Assert
+        return 1, 0
+
+    def group_blocks(self, ssa: SSAFunction) -> None:
+        # Both successors of a conditional jump are entered with the same stack, so
+        # they must agree on which parameters are kept on the stack.
+        for block in ssa.blocks:
+            terminator = block.terminator
+
+            if isinstance(terminator, GotoUnless):
+                group = terminator.fallthrough.group
+                other_group = terminator.target.group
+
+                if group is not other_group:
+                    group += other_group
+                    for member in other_group:
+                        member.group = group
+
+
+def propagate_copies(ssa: SSAFunction) -> None:
+    # A block parameter that gets the same value from every predecessor is that
+    # value, like a phi function that only copies.
+    changed = True
+
+    while changed:
+        changed = False
+
+        for block in ssa.blocks:
+            for index, param in enumerate(block.params):
+                if param.replacement is not None:
+                    continue
+
+                incoming = {
+                    predecessor.terminator.arguments[index].resolve()
+                    for predecessor in block.predecessors
+                }
+                incoming.discard(param)
+
+                if len(incoming) == 1:
+                    param.replacement = incoming.pop()
+                    changed = True
+
+
+def compute_dominators(ssa: SSAFunction) -> None:
+    # See "A Simple, Fast Dominance Algorithm" by Cooper, Harvey and Kennedy
+    entry = ssa.blocks[0]
+    postorder: List[Block] = []
+    visited = {entry}
+    stack = [(entry, iter(entry.successors()))]
+
+    while stack:
+        block, successors = stack[-1]
+        for successor in successors:
+            if successor not in visited:
+                visited.add(successor)
+                stack.append((successor, iter(successor.successors())))
+                break
+        else:
+            postorder.append(block)
+            stack.pop()
+
+    order = {block: index for index, block in enumerate(postorder)}
+    dominators: Dict[Block, Block] = {entry: entry}
+
+    def intersect(lhs: Block, rhs: Block) -> Block:
+        while lhs is not rhs:
+            while order[lhs] < order[rhs]:
+                lhs = dominators[lhs]
+            while order[rhs] < order[lhs]:
+                rhs = dominators[rhs]
+        return lhs
+
+    changed = True
+    while changed:
+        changed = False
+
+        for block in reversed(postorder[:-1]):
+            processed = [pred for pred in block.predecessors if pred in dominators]
+            dominator = processed[0]
+
+            for predecessor in processed[1:]:
+                dominator = intersect(predecessor, dominator)
+
+            if dominators.get(block) is not dominator:
+                dominators[block] = dominator
+                changed = True
+
+    for block in ssa.blocks:
+        block.dominator = dominators[block] if block is not entry else None
+
+
+def operation_key(operation: Operation) -> Tuple[Any, ...]:
+    instruction = operation.instruction
+    operands = [operand.resolve().number for operand in operation.operands]
+
+    if isinstance(instruction, COMMUTATIVE_INSTRUCTIONS):
+        operands.sort()
+
+    return (
+        type(instruction),
+        getattr(instruction, "value", None),
+        getattr(instruction, "arg_index", None),
+        tuple(operands),
+    )
+
+
+def eliminate_common_subexpressions(ssa: SSAFunction, keep: Set[int]) -> None:
+    # Pure operations are replaced by an equal one in a dominating block. This
+    # leaves operations built from instructions with offsets in keep alone.
+    compute_dominators(ssa)
+
+    children: Dict[Block, List[Block]] = {block: [] for block in ssa.blocks}
+    for block in ssa.blocks:
+        if block.dominator is not None:
+            children[block.dominator].append(block)
+
+    worklist: List[Tuple[Block, Dict[Tuple[Any, ...], Operation]]] = [
+        (ssa.blocks[0], {})
+    ]
+
+    while worklist:
+        block, dominating = worklist.pop()
+        available = dict(dominating)
+
+        for operation in block.operations:
+            if not isinstance(operation.instruction, PURE_INSTRUCTIONS):
+                continue
+
+            if operation.ip in keep:
+                continue
+
+            key = operation_key(operation)
+            equal_operation = available.get(key)
+
+            if equal_operation is None:
+                available[key] = operation
+                continue
+
+            for result, equal_result in zip(operation.results, equal_operation.results):
+                result.replacement = equal_result
+
+            operation.removed = True
+
+        for child in children[block]:
+            worklist.append((child, available))
+
+
+def get_used_values(ssa: SSAFunction) -> List[Value]:
+    # Returns values used by something with side effects, a jump or a return
+    used: List[Value] = []
+
+    for block in ssa.blocks:
+        for operation in block.operations:
+            if not operation.removed and not isinstance(
+                operation.instruction, REMOVABLE_INSTRUCTIONS
+            ):
+                used += operation.operands
+
+        terminator = block.terminator
+        if isinstance(terminator, GotoUnless):
+            used.append(terminator.condition)
+        elif isinstance(terminator, Return):
+            used += terminator.arguments
+
+    return used
+
+
+def mark_live_values(ssa: SSAFunction) -> None:
+    worklist: List[Value] = []
+
+    def mark(value: Value) -> None:
+        value = value.resolve()
+        if not value.live:
+            value.live = True
+            worklist.append(value)
+
+    for value in get_used_values(ssa):
+        mark(value)
+
+    while worklist:
+        while worklist:
+            value = worklist.pop()
+
+            if value.operation is not None:
+                for operand in value.operation.operands:
+                    mark(operand)
+                continue
+
+            assert value.block is not None
+            index = value.block.params.index(value)
+
+            for predecessor in value.block.predecessors:
+                mark(predecessor.terminator.arguments[index])
+
+        # Blocks entered with the same stack keep the same parameters, so all their
+        # predecessors need the values of those.
+        for block in ssa.blocks:
+            for index in get_kept_params(block):
+                for predecessor in block.predecessors:
+                    mark(predecessor.terminator.arguments[index])
+
+
+def eliminate_dead_values(ssa: SSAFunction) -> None:
+    # Values are live when they are used, directly or through other values.
+    operations = ssa.operations()
+
+    for block in ssa.blocks:
+        for param in block.params:
+            param.live = False
+
+    for operation in operations:
+        for result in operation.results:
+            if result.operation is operation:
+                result.live = False
+
+    mark_live_values(ssa)
+
+    for operation in operations:
+        if isinstance(operation.instruction, REMOVABLE_INSTRUCTIONS) and not any(
+            result.live for result in operation.results if result.operation is operation
+        ):
+            operation.removed = True
+
+
+class LoweringError(Exception):
+    def __init__(self, missing: Optional[Value]) -> None:
+        # Value that was needed, but wasn't on the stack any more
+        self.missing = missing
+
+
+def find_shuffles(current: List[Value], target: List[Value]) -> List[Instruction]:
+    # Finds the shortest sequence of stack instructions that turns the current
+    # stack into the target stack.
+    if current == target:
+        return []
+
+    common = 0
+    while common < min(len(current), len(target)) and current[common] is target[common]:
+        common += 1
+
+    # Values below the top three can't be reached, but they may be copied
+    for start in range(common, max(common - 3, 0) - 1, -1):
+        shuffles = search_shuffles(tuple(current[start:]), tuple(target[start:]))
+        if shuffles is not None:
+            return shuffles
+
+    missing = [
+        value
+        for value in target
+        if value not in current and not is_rematerializable(value)
+    ]
+    raise LoweringError(missing[0] if missing else None)
+
+
+def search_shuffles(
+    current: Tuple[Value, ...], target: Tuple[Value, ...]
+) -> Optional[List[Instruction]]:
+    pushable: List[Value] = []
+    for value in target:
+        if is_rematerializable(value) and value not in pushable:
+            pushable.append(value)
+
+    max_length = max(len(current), len(target)) + 1
+    previous: Dict[
+        Tuple[Value, ...], Optional[Tuple[Tuple[Value, ...], Instruction]]
+    ] = {current: None}
+    queue: Deque[Tuple[Value, ...]] = deque([current])
+
+    while queue:
+        state = queue.popleft()
+
+        if state == target:
+            shuffles: List[Instruction] = []
+            step = previous[state]
+            while step is not None:
+                state, instruction = step
+                shuffles.append(instruction)
+                step = previous[state]
+            return shuffles[::-1]
+
+        moves: List[Tuple[Instruction, Tuple[Value, ...]]] = []
+
+        if len(state) >= 1:
+            moves += [(DROP, state[:-1]), (DUP, state + state[-1:])]
+        if len(state) >= 2:
+            moves += [
+                (SWAP, state[:-2] + (state[-1], state[-2])),
+                (OVER, state + (state[-2],)),
+            ]
+        if len(state) >= 3:
+            moves.append((ROT, state[:-3] + (state[-2], state[-1], state[-3])))
+
+        for value in pushable:
+            assert value.operation is not None
+            moves.append((value.operation.instruction, state + (value,)))
+
+        for instruction, next_state in moves:
+            if len(next_state) > max_length or next_state in previous:
+                continue
+
+            previous[next_state] = (state, instruction)
+            queue.append(next_state)
+
+        if len(previous) > SHUFFLE_SEARCH_LIMIT:
+            break
+
+    return None
+
+
+class Entry:
+    # A value on the stack while lowering a block. Dup and over copy values into
+    # new entries, so every entry is used at most once.
+    __slots__ = ("value", "used", "copies", "needed")
+
+    def __init__(self, value: Value) -> None:
+        self.value = value
+        self.used = False
+        self.copies: List[Tuple[int, Entry]] = []
+        self.needed = False
+
+    def is_needed_after(self, time: int) -> bool:
+        return self.used or any(
+            copy_time > time and copy.needed for copy_time, copy in self.copies
+        )
+
+
+class StackLowering:
+    # Turns SSA back into stack instructions, following the original instructions.
+    # Operations that were removed are skipped, values of constants and arguments are
+    # pushed where they are used and everything else is kept on the stack in the
+    # original order. Stack instructions in between are searched for.
+
+    def __init__(self, ssa: SSAFunction, instructions: List[Instruction]) -> None:
+        self.ssa = ssa
+        self.instructions = instructions
+        self.code: List[Instruction] = []
+        self.block_offsets: Dict[Block, int] = {}
+        self.jumps: List[Tuple[Jump | JumpIfNot, Block]] = []
+
+        self.kept_params = {block: get_kept_params(block) for block in ssa.blocks}
+
+    def lower(self) -> List[Instruction]:
+        for index, block in enumerate(self.ssa.blocks):
+            self.block_offsets[block] = len(self.code)
+            next_block = (
+                self.ssa.blocks[index + 1] if index + 1 < len(self.ssa.blocks) else None
+            )
+            self.lower_block(block, next_block)
+
+        for jump, target in self.jumps:
+            jump.instruction_offset = self.block_offsets[target]
+
+        return self.code
+
+    def reconcile(self, stack: List[Value], target: List[Value]) -> None:
+        self.code += find_shuffles(stack, target)
+        stack[:] = target
+
+    def lower_block(self, block: Block, next_block: Optional[Block]) -> None:
+        entries = [Entry(param.resolve()) for param in block.params]
+        all_entries = list(entries)
+        stack = list(entries)
+        steps: List[Tuple[Operation, List[Entry], List[Entry]]] = []
+        operations = iter(block.operations)
+
+        def copy(entry: Entry) -> Entry:
+            copied = Entry(entry.value)
+            entry.copies.append((len(steps), copied))
+            all_entries.append(copied)
+            return copied
+
+        frames: List[InlinedFrame[Entry]] = []
+
+        for ip in range(block.start, block.end):
+            instruction = self.instructions[ip]
+
+            if isinstance(instruction, (Jump, JumpIfNot)):
+                break
+
+            if isinstance(instruction, INLINED_INSTRUCTIONS):
+                apply_inlined(instruction, stack, frames, copy)
+                continue
+
+            if isinstance(instruction, SHUFFLE_INSTRUCTIONS):
+                shuffle(instruction, stack, copy)
+                continue
+
+            operation = next(operations)
+            operand_count = len(operation.operands)
+            below = stack[: len(stack) - operand_count]
+
+            if not operation.removed:
+                for entry in stack[len(below) :]:
+                    entry.used = True
+
+            results = [Entry(result.resolve()) for result in operation.results]
+            all_entries += results
+            steps.append((operation, list(stack), results))
+            stack = below + results
+
+        terminator = block.terminator
+        exit_stack = stack
+
+        if isinstance(terminator, GotoUnless):
+            condition = stack[-1]
+            exit_stack = stack[:-1]
+            condition.used = True
+
+        if isinstance(terminator, Return):
+            exits = exit_stack
+        else:
+            assert isinstance(terminator, (Goto, GotoUnless))
+            exits = [exit_stack[index] for index in self.kept_params[terminator.target]]
+
+        for entry in exits:
+            entry.used = True
+
+        for entry in reversed(all_entries):
+            entry.needed = entry.is_needed_after(-1)
+
+        kept_entries = [entries[index] for index in self.kept_params[block]]
+        current = [entry.value for entry in kept_entries]
+        on_stack = set(kept_entries)
+
+        for time, (operation, before, results) in enumerate(steps):
+            if operation.removed or isinstance(
+                operation.instruction, REMATERIALIZABLE_INSTRUCTIONS
+            ):
+                continue
+
+            operand_count = len(operation.operands)
+            below = before[: len(before) - operand_count]
+            operands = [entry.value for entry in before[len(below) :]]
+
+            # Constants and arguments that are still on the stack are kept there
+            kept = [
+                entry
+                for entry in below
+                if entry.is_needed_after(time)
+                and (entry in on_stack or not is_rematerializable(entry.value))
+            ]
+
+            try:
+                self.reconcile(current, [entry.value for entry in kept] + operands)
+            except LoweringError:
+                # Values that are not needed any more may be out of reach, those
+                # stay until they can be dropped.
+                kept = [
+                    entry
+                    for entry in below
+                    if entry in on_stack
+                    or (
+                        entry.is_needed_after(time)
+                        and not is_rematerializable(entry.value)
+                    )
+                ]
+                self.reconcile(current, [entry.value for entry in kept] + operands)
+
+            self.code.append(operation.instruction)
+            current = [entry.value for entry in kept + results]
+            on_stack = set(kept + results)
+
+        target = [entry.value for entry in exits]
+
+        if isinstance(terminator, GotoUnless):
+            self.reconcile(current, target + [condition.value])
+            jump_if_not = JumpIfNot(instruction_offset=-1)
+            self.code.append(jump_if_not)
+            self.jumps.append((jump_if_not, terminator.target))
+            return
+
+        self.reconcile(current, target)
+
+        if isinstance(terminator, Goto) and terminator.target is not next_block:
+            jump = Jump(instruction_offset=-1)
+            self.code.append(jump)
+            self.jumps.append((jump, terminator.target))
+
+
+def optimize_instructions(
+    program: "Program",
+    instructions: List[Instruction],
+    inlined: Optional[Dict[FunctionKey, List[Instruction]]] = None,
+) -> List[Instruction]:
+    # Builds SSA, runs copy propagation, common subexpression elimination and dead
+    # value elimination on it and turns it back into instructions. Calls to
+    # functions in inlined are replaced by their body first, if that works out.
+    if inlined:
+        optimized = optimize_ssa(program, inline_calls(program, instructions, inlined))
+        if optimized is not None:
+            return optimized
+
+    optimized = optimize_ssa(program, instructions)
+    if optimized is None:
+        return instructions
+
+    return optimized
+
+
+def optimize_ssa(
+    program: "Program", instructions: List[Instruction]
+) -> Optional[List[Instruction]]:
+    # Returns None if optimizing does not result in fewer instructions
+    keep: Set[int] = set()
+
+    while True:
+        ssa = SSABuilder(program, instructions).build()
+        propagate_copies(ssa)
+        eliminate_common_subexpressions(ssa, keep)
+        propagate_copies(ssa)
+        eliminate_dead_values(ssa)
+
+        try:
+            optimized = StackLowering(ssa, instructions).lower()
+            break
+        except LoweringError as e:
+            # The replaced value may not be on the stack any more where the removed
+            # operation was, so keep those operations and try again.
+            replaced = {
+                operation.ip
+                for operation in ssa.operations()
+                if operation.removed
+                and any(
+                    result.replacement is not None and result.resolve() is e.missing
+                    for result in operation.results
+                )
+            }
+
+            if not replaced:
+                return None
+
+            keep |= replaced
+
+    if len(optimized) > len(
+        [
+            instruction
+            for instruction in instructions
+            if not isinstance(instruction, (Nop,) + INLINING_MARKERS)
+        ]
+    ):
+        return None
+
+    return optimized
@@ -0,0 +1,75 @@
+from typing import Dict, List, Optional, Set
+
+from lang.loops import JUMP_INSTRUCTIONS, replace_instructions
+from lang.models.instructions import (
+    BINARY_OPERATORS,
+    ArgumentOperation,
+    ConstantOperation,
+    Instruction,
+    PushArgument,
+    PushInt,
+)
+
+# Pairs of instructions that can become one superinstruction, named like in profiles
+SUPERINSTRUCTION_PAIRS = {
+    f"{first.__name__} {second.__name__}"
+    for first in (PushArgument, PushInt)
+    for second in BINARY_OPERATORS
+}
+
+
+def get_pair_name(first: Instruction, second: Instruction) -> str:
+    return f"{type(first).__name__} {type(second).__name__}"
+
+
+def get_superinstruction(
+    first: Instruction, second: Instruction
+) -> Optional[Instruction]:
+    operator = BINARY_OPERATORS.get(type(second))
+
+    if operator is None:
+        return None
+
+    if isinstance(first, PushInt):
+        return ConstantOperation(operator=operator, value=first.value)
+
+    if isinstance(first, PushArgument):
+        return ArgumentOperation(operator=operator, arg_index=first.arg_index)
+
+    return None
+
+
+def fuse_superinstructions(
+    instructions: List[Instruction], pairs: Set[str]
+) -> List[Instruction]:
+    # Replaces pairs with the given names by one superinstruction, so running them
+    # takes one dispatch. Profiles tell which pairs run often, see lang.profile_guided.
+    jump_targets = {
+        instruction.instruction_offset
+        for instruction in instructions
+        if isinstance(instruction, JUMP_INSTRUCTIONS)
+    }
+
+    replacements: Dict[int, Instruction] = {}
+    removed: Set[int] = set()
+    ip = 0
+
+    while ip < len(instructions) - 1:
+        first, second = instructions[ip : ip + 2]
+        superinstruction = None
+
+        if ip + 1 not in jump_targets and get_pair_name(first, second) in pairs:
+            superinstruction = get_superinstruction(first, second)
+
+        if superinstruction is None:
+            ip += 1
+            continue
+
+        replacements[ip] = superinstruction
+        removed.add(ip + 1)
+        ip += 2
+
+    if not replacements:
+        return instructions
+
+    return replace_instructions(instructions, replacements, removed)
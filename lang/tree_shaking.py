@@ -0,0 +1,156 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+
+from lang.instruction_generator import InstructionGenerator
+from lang.models.instructions import CallFunction, Instruction, PushStruct
+from lang.models.parse import Function, Struct
+from lang.purity import FunctionKey
+
+if TYPE_CHECKING:  # pragma: nocover
+    from lang.runtime.program import Program
+
+StructKey = Tuple[Path, str]
+
+
+class Reachability:
+    # Functions are in the order they're first found from main, main comes first
+    __slots__ = ("functions", "structs")
+
+    def __init__(self, functions: List[FunctionKey], structs: List[StructKey]) -> None:
+        self.functions = functions
+        self.structs = structs
+
+
+def get_struct_keys(program: "Program") -> Dict[int, StructKey]:
+    # Structs can't be hashed and instructions hold a shallow copy of them, so they're
+    # found by the identity of their token, which the copy shares.
+    struct_keys: Dict[int, StructKey] = {}
+
+    for file, file_identifiers in program.identifiers.items():
+        for name, identifier in file_identifiers.items():
+            if isinstance(identifier, Struct):
+                struct_keys[id(identifier.token)] = (file, name)
+
+    return struct_keys
+
+
+def get_source_instructions(
+    program: "Program", file: Path, func_name: str
+) -> List[Instruction]:
+    # Instructions before optimizations, which may have removed calls
+    function = program.get_identifier(file, func_name)
+    assert isinstance(function, Function)
+    return InstructionGenerator(file, function, program).generate_instructions()
+
+
+def find_reachable(program: "Program", from_source: bool = False) -> Reachability:
+    # Follows calls and pushed structs from main. Only what this finds ends up in
+    # linked images and transpiled code, helpers imported but never used don't.
+    # Transpilers work on the parse tree, so they need what it calls, see
+    # get_source_instructions.
+    struct_keys = get_struct_keys(program)
+    functions: List[FunctionKey] = [(program.entry_point_file, "main")]
+    found_functions: Set[FunctionKey] = set(functions)
+    structs: List[StructKey] = []
+    found_structs: Set[StructKey] = set()
+
+    # The list of functions grows while going through it
+    index = 0
+    while index < len(functions):
+        file, func_name = functions[index]
+        index += 1
+
+        if from_source:
+            instructions = get_source_instructions(program, file, func_name)
+        else:
+            instructions = program.get_instructions(file, func_name)
+
+        for instruction in instructions:
+            if isinstance(instruction, CallFunction):
+                function_key = (instruction.file, instruction.func_name)
+                if function_key not in found_functions:
+                    found_functions.add(function_key)
+                    functions.append(function_key)
+
+            elif isinstance(instruction, PushStruct):
+                struct_key = struct_keys[id(instruction.type.token)]
+                if struct_key not in found_structs:
+                    found_structs.add(struct_key)
+                    structs.append(struct_key)
+
+    return Reachability(functions, structs)
+
+
+def find_all(program: "Program") -> Reachability:
+    # Everything in the program, for comparing with what find_reachable keeps
+    functions: List[FunctionKey] = [(program.entry_point_file, "main")]
+
+    for file, file_instructions in program.function_instructions.items():
+        for func_name in file_instructions:
+            if (file, func_name) != functions[0]:
+                functions.append((file, func_name))
+
+    structs = list(get_struct_keys(program).values())
+    return Reachability(functions, structs)
+
+
+def get_reachable_functions(program: "Program") -> List[Tuple[Path, Function]]:
+    functions: List[Tuple[Path, Function]] = []
+
+    for file, func_name in find_reachable(program, from_source=True).functions:
+        function = program.get_identifier(file, func_name)
+        assert isinstance(function, Function)
+        functions.append((file, function))
+
+    return functions
+
+
+class TreeShakingReport:
+    __slots__ = (
+        "removed_functions",
+        "removed_structs",
+        "function_count",
+        "struct_count",
+        "size",
+        "unshaken_size",
+    )
+
+    def __init__(
+        self,
+        program: "Program",
+        reachable: Reachability,
+        size: int,
+        unshaken_size: int,
+    ) -> None:
+        everything = find_all(program)
+        reachable_functions = set(reachable.functions)
+        reachable_structs = set(reachable.structs)
+
+        self.removed_functions = [
+            key for key in everything.functions if key not in reachable_functions
+        ]
+        self.removed_structs = [
+            key for key in everything.structs if key not in reachable_structs
+        ]
+        self.function_count = len(everything.functions)
+        self.struct_count = len(everything.structs)
+        self.size = size
+        self.unshaken_size = unshaken_size
+
+    def __str__(self) -> str:
+        lines = [
+            f"Removed {len(self.removed_functions)} of {self.function_count} "
+            + f"functions and {len(self.removed_structs)} of {self.struct_count} "
+            + f"structs, saving {self.unshaken_size - self.size} of "
+            + f"{self.unshaken_size} bytes."
+        ]
+
+        for kind, removed in [
+            ("functions", self.removed_functions),
+            ("structs", self.removed_structs),
+        ]:
+            if removed:
+                lines.append(f"Removed {kind}:")
+                lines += [f"  {file}: {name}" for file, name in sorted(removed)]
+
+        return "\n".join(lines) + "\n"
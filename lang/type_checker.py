@@ -60,8 +60,8 @@ class TypeChecker:
         self.file = file
 
     def check(self) -> None:
-        self._check_argument_types()
-        computed_return_types = self._check_function(self.function, [])
+        self.check_signature()
+        computed_return_types = self._check_function_body(self.function.body, [])
         expected_return_types = self.program.get_signature(
             self.file, self.function
         ).return_types
@@ -75,6 +75,12 @@ class TypeChecker:
                 computed_return_types=computed_return_types,
             )
 
+    def check_signature(self) -> None:
+        # Checks everything but the function body, see Program for lazy loading
+        self._check_argument_types()
+        self._check_function_signature(self.function)
+        self.program.get_signature(self.file, self.function)
+
     def _check_argument_types(self) -> None:
 
         known_identifiers = self.program.identifiers[self.file]
@@ -402,9 +408,7 @@ class TypeChecker:
             type_stack, signature, member_function_name
         )
 
-    def _check_function(
-        self, function: Function, type_stack: List[VariableType]
-    ) -> List[VariableType]:
+    def _check_function_signature(self, function: Function) -> None:
         if function.name == "main":
             if not all(
                 [
@@ -464,8 +468,6 @@ class TypeChecker:
                         found=preceding_arg,
                     )
 
-        return self._check_function_body(function.body, type_stack)
-
     def _get_struct_field_type(
         self, node: StructFieldQuery | StructFieldUpdate, struct: Struct
     ) -> VariableType:
@@ -6,8 +6,11 @@ from tempfile import TemporaryDirectory
 from typing import Dict, List, Tuple, Type
 
 from lang.exceptions import AaaException, AaaRuntimeException
+from lang.runtime.backends import BACKENDS, DEFAULT_BACKEND
 from lang.runtime.program import Program
-from lang.runtime.simulator import Simulator
+
+# Name of the backend used to run code, tests override this for every backend.
+BACKEND = DEFAULT_BACKEND
 
 
 def check_aaa_main(
@@ -47,7 +50,7 @@ def check_aaa_full_source_multi_file(
             with redirect_stdout(StringIO()) as stdout:
                 with redirect_stderr(StringIO()) as stderr:
                     try:
-                        Simulator(program).run(raise_=True)
+                        BACKENDS[BACKEND](program).run(raise_=True)
                     except AaaRuntimeException as e:
                         exceptions = [e]
 
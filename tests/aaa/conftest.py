@@ -0,0 +1,28 @@
+from typing import Generator
+from unittest.mock import patch
+
+import pytest
+from pytest import FixtureRequest
+
+import tests.aaa
+from lang.runtime.backends import BACKENDS
+from lang.runtime.native import find_c_compiler
+
+# Backends that don't call functions in lang.runtime.stdlib, so patching those has
+# no effect on them. They also report runtime errors in their own way.
+NATIVE_BACKENDS = {"native"}
+
+
+@pytest.fixture(autouse=True, params=list(BACKENDS))
+def backend(request: FixtureRequest) -> Generator[str, None, None]:
+    backend_name: str = request.param
+
+    if backend_name in NATIVE_BACKENDS:
+        if request.node.get_closest_marker("python_runtime_only"):
+            pytest.skip("test relies on the Python runtime")
+
+        if not find_c_compiler():  # pragma: nocover
+            pytest.skip("no C compiler found")
+
+    with patch.object(tests.aaa, "BACKEND", backend_name):
+        yield backend_name
@@ -71,9 +71,12 @@ EXPECTED_EXAMPLE_OUTPUT = {
     ],
 )
 def test_examples(
-    example_file_path: Path, expected_output: str, capfd: CaptureFixture[str]
+    example_file_path: Path,
+    expected_output: str,
+    capfd: CaptureFixture[str],
+    backend: str,
 ) -> None:
-    main(["./aaa.py", "run", str(example_file_path)])
+    main(["./aaa.py", "run", str(example_file_path), f"--backend={backend}"])
 
     stdout, _ = capfd.readouterr()
     assert str(stdout) == expected_output
@@ -1,7 +1,10 @@
+from contextlib import redirect_stderr
+from io import StringIO
 from typing import Dict, Type
 
 import pytest
 
+from lang.exceptions import AaaRuntimeException
 from lang.exceptions.import_ import (
     AbsoluteImportError,
     CyclicImportError,
@@ -29,6 +32,8 @@ from lang.exceptions.typing import (
     StructUpdateStackError,
     StructUpdateTypeError,
 )
+from lang.runtime.backends import BACKENDS
+from lang.runtime.program import Program
 from tests.aaa import check_aaa_full_source, check_aaa_full_source_multi_file
 
 
@@ -569,3 +574,34 @@ def test_colliding_identifier(
     print(repr(exception_message))
     print()
     assert exception_message == expected_exception_message
+
+
+def test_assertion_failure_stack_trace(backend: str) -> None:
+    program = Program.without_file(
+        'fn main { 3 "x" check }\n'
+        + "fn check args a as int, b as str { a 4 = assert }\n"
+    )
+    assert not program.file_load_errors
+
+    with redirect_stderr(StringIO()) as stderr:
+        with pytest.raises(AaaRuntimeException) as e:
+            BACKENDS[backend](program).run(raise_=True)
+
+    expected = (
+        "Assertion failure, stacktrace:\n" + '- main- check, arguments: b="x", a=3'
+    )
+    assert str(e.value) == expected
+    assert stderr.getvalue().startswith(expected)
+
+
+@pytest.mark.python_runtime_only
+def test_runtime_error_exits(backend: str) -> None:
+    program = Program.without_file("fn main { false assert }")
+    assert not program.file_load_errors
+
+    with redirect_stderr(StringIO()) as stderr:
+        with pytest.raises(SystemExit) as e:
+            BACKENDS[backend](program).run()
+
+    assert e.value.code == 1
+    assert stderr.getvalue().startswith("Assertion failure, stacktrace:\n- main")
@@ -1,8 +1,13 @@
+from contextlib import redirect_stderr
+from io import StringIO
 from typing import List, Type
 
 import pytest
 
 from lang.exceptions.misc import MainFunctionNotFound
+from lang.exceptions.runtime import CallStackOverflow
+from lang.runtime.backends import BACKENDS
+from lang.runtime.program import Program
 from tests.aaa import check_aaa_full_source
 
 
@@ -53,3 +58,28 @@ def test_function_call(
     code: str, expected_output: str, expected_exception_types: List[Type[Exception]]
 ) -> None:
     check_aaa_full_source(code, expected_output, expected_exception_types)
+
+
+def test_function_call_deep_recursion() -> None:
+    # Much deeper than Python's recursion limit
+    code = (
+        "fn main { 5000 count_down . }\n"
+        + "fn count_down args n as int return int {\n"
+        + "    if n 0 = { 0 } else { n 1 - count_down 1 + }\n"
+        + "}"
+    )
+    check_aaa_full_source(code, "5000", [])
+
+
+@pytest.mark.python_runtime_only
+def test_function_call_max_call_depth(backend: str) -> None:
+    program = Program.without_file("fn main { foo }\nfn foo { foo }")
+    assert not program.file_load_errors
+
+    with redirect_stderr(StringIO()):
+        with pytest.raises(CallStackOverflow) as e:
+            BACKENDS[backend](program, max_call_depth=100).run(raise_=True)
+
+    assert str(e.value) == (
+        "Call stack overflow: calling foo exceeds the maximum call depth of 100."
+    )
@@ -4,6 +4,8 @@ import pytest
 
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 DUMMY_UNIX_TIMESTAMP = 123456789
 
 
@@ -25,5 +27,5 @@ def test_chdir(code: str, expected_output: str) -> None:
         # We should never reach this
         raise NotImplementedError
 
-    with patch("lang.runtime.simulator.os.chdir", mock_chdir):
+    with patch("lang.runtime.stdlib.os.chdir", mock_chdir):
         check_aaa_main(code, expected_output, [])
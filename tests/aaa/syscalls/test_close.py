@@ -2,35 +2,39 @@ from contextlib import redirect_stdout
 from io import StringIO
 from unittest.mock import patch
 
+import pytest
+
+from lang.runtime.backends import BACKENDS
 from lang.runtime.program import Program
-from lang.runtime.simulator import Simulator
+
+pytestmark = pytest.mark.python_runtime_only
 
 TEST_FD = 1337
 
 
-def test_close_ok() -> None:
+def test_close_ok(backend: str) -> None:
     def mock_close(fd: int) -> None:
         pass
 
     program = Program.without_file("fn main { 2 close . }")
-    simulator = Simulator(program)
+    runtime = BACKENDS[backend](program)
 
-    with patch("lang.runtime.simulator.os.close", mock_close):
+    with patch("lang.runtime.stdlib.os.close", mock_close):
         with redirect_stdout(StringIO()) as stdout:
-            simulator.run()
+            runtime.run()
 
     assert stdout.getvalue() == "true"
 
 
-def test_close_fail() -> None:
+def test_close_fail(backend: str) -> None:
     def mock_close(fd: int) -> None:
         raise OSError
 
     program = Program.without_file("fn main { 3 close . }")
-    simulator = Simulator(program)
+    runtime = BACKENDS[backend](program)
 
-    with patch("lang.runtime.simulator.os.close", mock_close):
+    with patch("lang.runtime.stdlib.os.close", mock_close):
         with redirect_stdout(StringIO()) as stdout:
-            simulator.run()
+            runtime.run()
 
     assert stdout.getvalue() == "false"
@@ -1,14 +1,25 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 
 def test_execve() -> None:
+    calls: List[Tuple[str, List[str], Dict[str, str]]] = []
+
     def mock_execve(path: str, argv: List[str], environ: Dict[str, str]) -> None:
-        pass
+        calls.append((path, argv, environ))
 
-    with patch("lang.runtime.simulator.os.execve", mock_execve):
+    with patch("lang.runtime.stdlib.os.execve", mock_execve):
         check_aaa_main(
-            '"/bin/foo" vec[str] "/bin/foo" vec:push map[str, str] execve', "", []
+            '"/bin/foo" vec[str] "/bin/foo" vec:push\n'
+            + 'map[str, str] "HOME" "/home/foo" map:set execve',
+            "",
+            [],
         )
+
+    assert calls == [("/bin/foo", ["/bin/foo"], {"HOME": "/home/foo"})]
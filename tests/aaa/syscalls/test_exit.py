@@ -2,6 +2,9 @@ import pytest
 
 from tests.aaa import check_aaa_main
 
+# Native executables exiting with code 0 don't raise SystemExit
+pytestmark = pytest.mark.python_runtime_only
+
 
 @pytest.mark.parametrize(
     ["exit_code"], [pytest.param(i, id=f"exit-{i}") for i in range(3)]
@@ -1,7 +1,11 @@
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 TEST_PID = 1337
 
 
@@ -9,5 +13,5 @@ def test_fork() -> None:
     def mock_fork() -> int:
         return TEST_PID
 
-    with patch("lang.runtime.simulator.os.fork", mock_fork):
+    with patch("lang.runtime.stdlib.os.fork", mock_fork):
         check_aaa_main("fork .", f"{TEST_PID}", [])
@@ -1,7 +1,11 @@
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 TEST_PID = 1337
 
 
@@ -9,5 +13,5 @@ def test_getpid() -> None:
     def mock_getpid() -> int:
         return TEST_PID
 
-    with patch("lang.runtime.simulator.os.getpid", mock_getpid):
+    with patch("lang.runtime.stdlib.os.getpid", mock_getpid):
         check_aaa_main("getpid .", f"{TEST_PID}", [])
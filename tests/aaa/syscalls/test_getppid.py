@@ -1,7 +1,11 @@
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 TEST_PPID = 1337
 
 
@@ -9,5 +13,5 @@ def test_getppid() -> None:
     def mock_getppid() -> int:
         return TEST_PPID
 
-    with patch("lang.runtime.simulator.os.getppid", mock_getppid):
+    with patch("lang.runtime.stdlib.os.getppid", mock_getppid):
         check_aaa_main("getppid .", f"{TEST_PPID}", [])
@@ -1,7 +1,11 @@
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 TEST_INPUT = "some test input"
 
 
@@ -9,7 +13,7 @@ def test_read_ok() -> None:
     def mock_read(fd: int, length: int) -> bytes:
         return bytes(TEST_INPUT, encoding="utf-8")
 
-    with patch("lang.runtime.simulator.os.read", mock_read):
+    with patch("lang.runtime.stdlib.os.read", mock_read):
         check_aaa_main('0 1024 read . " " . .', f"true {TEST_INPUT}", [])
 
 
@@ -17,5 +21,5 @@ def test_read_fail() -> None:
     def mock_read(fd: int, length: int) -> bytes:
         raise OSError
 
-    with patch("lang.runtime.simulator.os.read", mock_read):
+    with patch("lang.runtime.stdlib.os.read", mock_read):
         check_aaa_main('5 1024 read . " " . .', f"false ", [])
@@ -1,7 +1,11 @@
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 DUMMY_UNIX_TIMESTAMP = 123456789
 
 
@@ -9,5 +13,5 @@ def test_time() -> None:
     def mock_time() -> int:
         return DUMMY_UNIX_TIMESTAMP
 
-    with patch("lang.runtime.simulator.time.time", mock_time):
+    with patch("lang.runtime.stdlib.time.time", mock_time):
         check_aaa_main("time .", f"{DUMMY_UNIX_TIMESTAMP}", [])
@@ -1,14 +1,18 @@
 from typing import Tuple
 from unittest.mock import patch
 
+import pytest
+
 from tests.aaa import check_aaa_main
 
+pytestmark = pytest.mark.python_runtime_only
+
 
 def test_waitpid_ok() -> None:
     def mock_waitpid(pid: int, options: int) -> Tuple[int, int]:
         return 0, 3 << 8
 
-    with patch("lang.runtime.simulator.os.waitpid", mock_waitpid):
+    with patch("lang.runtime.stdlib.os.waitpid", mock_waitpid):
         check_aaa_main("1337 0 waitpid . .", f"true3", [])
 
 
@@ -16,5 +20,5 @@ def test_waitpid_fail() -> None:
     def mock_waitpid(pid: int, options: int) -> Tuple[int, int]:
         raise OSError
 
-    with patch("lang.runtime.simulator.os.waitpid", mock_waitpid):
+    with patch("lang.runtime.stdlib.os.waitpid", mock_waitpid):
         check_aaa_main("1337 0 waitpid . .", f"false0", [])
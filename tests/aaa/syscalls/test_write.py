@@ -2,36 +2,40 @@ from contextlib import redirect_stdout
 from io import StringIO
 from unittest.mock import patch
 
+import pytest
+
+from lang.runtime.backends import BACKENDS
 from lang.runtime.program import Program
-from lang.runtime.simulator import Simulator
+
+pytestmark = pytest.mark.python_runtime_only
 
 TEST_FD = 1337
 
 
-def test_write_ok() -> None:
+def test_write_ok(backend: str) -> None:
     def mock_write(fd: int, data: bytes) -> int:
         print(data.decode("utf-8"), end="")
         return len(data)
 
     program = Program.without_file('fn main { 1 "hello world\\n" write . . }')
-    simulator = Simulator(program)
+    runtime = BACKENDS[backend](program)
 
-    with patch("lang.runtime.simulator.os.write", mock_write):
+    with patch("lang.runtime.stdlib.os.write", mock_write):
         with redirect_stdout(StringIO()) as stdout:
-            simulator.run()
+            runtime.run()
 
     assert stdout.getvalue() == "hello world\ntrue12"
 
 
-def test_write_fail() -> None:
+def test_write_fail(backend: str) -> None:
     def mock_write(fd: int, data: bytes) -> None:
         raise OSError
 
     program = Program.without_file('fn main { 4 "hello world\\n" write . . }')
-    simulator = Simulator(program)
+    runtime = BACKENDS[backend](program)
 
-    with patch("lang.runtime.simulator.os.write", mock_write):
+    with patch("lang.runtime.stdlib.os.write", mock_write):
         with redirect_stdout(StringIO()) as stdout:
-            simulator.run()
+            runtime.run()
 
     assert stdout.getvalue() == "false0"
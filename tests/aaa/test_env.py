@@ -5,8 +5,8 @@ from unittest.mock import patch
 
 import pytest
 
+from lang.runtime.backends import BACKENDS
 from lang.runtime.program import Program
-from lang.runtime.simulator import Simulator
 
 TEST_ENV_VARS = {
     "USER": "lk16",
@@ -14,12 +14,12 @@ TEST_ENV_VARS = {
 }
 
 
-def test_environ() -> None:
+def test_environ(backend: str) -> None:
     program = Program.without_file("fn main { environ . }")
 
-    with patch("lang.runtime.simulator.os.environ", TEST_ENV_VARS):
+    with patch("lang.runtime.stdlib.os.environ", TEST_ENV_VARS):
         with redirect_stdout(StringIO()) as stdout:
-            Simulator(program).run()
+            BACKENDS[backend](program).run()
 
     assert stdout.getvalue() in [
         '{"USER": "lk16", "HOME": "/home/lk16"}',
@@ -34,24 +34,25 @@ def test_environ() -> None:
         pytest.param('fn main { "FOO" getenv . " " . . }', "false ", id="missing"),
     ],
 )
-def test_getenv(code: str, expected_output: str) -> None:
+def test_getenv(code: str, expected_output: str, backend: str) -> None:
     program = Program.without_file(code)
 
-    with patch("lang.runtime.simulator.os.environ", TEST_ENV_VARS):
+    with patch("lang.runtime.stdlib.os.environ", TEST_ENV_VARS):
         with redirect_stdout(StringIO()) as stdout:
-            Simulator(program).run()
+            BACKENDS[backend](program).run()
 
     assert stdout.getvalue() == expected_output
 
 
-def test_setenv() -> None:
+@pytest.mark.python_runtime_only
+def test_setenv(backend: str) -> None:
     program = Program.without_file('fn main { "ENV_VAR_NAME" "ENV_VAR_VALUE" setenv }')
 
     env_vars = copy(TEST_ENV_VARS)
 
-    with patch("lang.runtime.simulator.os.environ", env_vars):
+    with patch("lang.runtime.stdlib.os.environ", env_vars):
         with redirect_stdout(StringIO()) as stdout:
-            Simulator(program).run()
+            BACKENDS[backend](program).run()
 
     assert stdout.getvalue() == ""
 
@@ -61,14 +62,15 @@ def test_setenv() -> None:
     }
 
 
-def test_unsetenv() -> None:
+@pytest.mark.python_runtime_only
+def test_unsetenv(backend: str) -> None:
     program = Program.without_file('fn main { "HOME" unsetenv }')
 
     env_vars = copy(TEST_ENV_VARS)
 
-    with patch("lang.runtime.simulator.os.environ", env_vars):
+    with patch("lang.runtime.stdlib.os.environ", env_vars):
         with redirect_stdout(StringIO()) as stdout:
-            Simulator(program).run()
+            BACKENDS[backend](program).run()
 
     assert stdout.getvalue() == ""
 
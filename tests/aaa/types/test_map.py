@@ -64,12 +64,39 @@ from tests.aaa import check_aaa_main
             [],
             id="copy",
         ),
+        pytest.param(
+            'map[str, int] "one" 1 map:set map:copy "two" 2 map:set map:size . drop\n'
+            + "map:size . drop",
+            "21",
+            [],
+            id="copy-set-copy",
+        ),
+        pytest.param(
+            'map[str, vec[int]] "one" vec[int] map:set map:copy "one" map:get\n'
+            + '5 vec:push drop . " " . .',
+            '{"one": [5]} {"one": []}',
+            [],
+            id="copy-nested",
+        ),
         pytest.param(
             'map[str, int] "one" 1 map:set dup map:clear map:size . drop map:size . drop',
             "00",
             [],
             id="dup",
         ),
+        pytest.param(
+            'map[bool, str] true "yes" map:set false "no" map:set\n'
+            + 'true map:get . " " . .',
+            'yes {true: "yes", false: "no"}',
+            [],
+            id="bool-keys",
+        ),
+        pytest.param(
+            "map[int, bool] 3 true map:set 3 map:has_key . 4 map:has_key . drop",
+            "truefalse",
+            [],
+            id="int-keys",
+        ),
         pytest.param(
             'map[str, int] "one" 1 map:set "one" map:pop . drop',
             "1",
@@ -60,6 +60,32 @@ from tests.aaa import check_aaa_main
             [],
             id="copy",
         ),
+        pytest.param(
+            'vec[int] 5 vec:push vec:copy 6 vec:push . " " . .',
+            "[5, 6] [5]",
+            [],
+            id="copy-push-copy",
+        ),
+        pytest.param(
+            'vec[int] 5 vec:push vec:copy swap 6 vec:push 0 7 vec:set . " " . .',
+            "[7, 6] [5]",
+            [],
+            id="copy-set-original",
+        ),
+        pytest.param(
+            "vec[vec[int]] vec[int] 5 vec:push vec:push\n"
+            + 'vec:copy 0 vec:get 7 vec:push drop . " " . .',
+            "[[5, 7]] [[5]]",
+            [],
+            id="copy-nested",
+        ),
+        pytest.param(
+            "vec[vec[int]] vec[int] 5 vec:push vec:push 0 vec:get\n"
+            + 'over vec:copy rot 7 vec:push drop . " " . . drop',
+            "[[5]] [[5, 7]]",
+            [],
+            id="copy-nested-reference",
+        ),
         pytest.param(
             "vec[int] 5 vec:push dup vec:clear vec:size . drop vec:size . drop",
             "00",
@@ -72,6 +98,33 @@ from tests.aaa import check_aaa_main
             [],
             id="nested-one-item",
         ),
+        pytest.param(
+            'vec[bool] true vec:push false vec:push 0 vec:get . " " . .',
+            "true [true, false]",
+            [],
+            id="bool-items",
+        ),
+        pytest.param(
+            'vec[bool] true vec:push 0 false vec:set vec:pop . " " . .',
+            "false []",
+            [],
+            id="bool-set-pop",
+        ),
+        pytest.param(
+            'vec[str] "a" vec:push "b" vec:push 1 vec:get . " " . .',
+            'b ["a", "b"]',
+            [],
+            id="str-items",
+        ),
+        pytest.param(
+            "vec[int] 5 vec:push 123456789012345678901234567890 vec:push\n"
+            + '0 123456789012345678901234567890 vec:set 1 vec:get . " " . .',
+            "123456789012345678901234567890 "
+            + "[123456789012345678901234567890, 123456789012345678901234567890]",
+            [],
+            id="int-overflow",
+            marks=pytest.mark.python_runtime_only,
+        ),
     ],
 )
 def test_vec(
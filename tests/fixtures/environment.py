@@ -7,9 +7,13 @@ import pytest
 
 
 @pytest.fixture(autouse=True, scope="session")
-def setup_test_environment() -> Generator[None, None, None]:
+def setup_test_environment(
+    tmp_path_factory: pytest.TempPathFactory,
+) -> Generator[None, None, None]:
+    # Compiled code isn't cached in the source tree, next to examples
     env_vars = {
         "AAA_STDLIB_PATH": str(Path.cwd() / "stdlib"),
+        "AAA_CACHE_DIR": str(tmp_path_factory.mktemp("aaacache")),
     }
 
     with patch.dict(os.environ, env_vars):
@@ -0,0 +1,186 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import List
+
+import pytest
+
+from lang.constant_calls import ConstantCallEvaluator
+from lang.exceptions.runtime import (
+    InstructionBudgetExceeded,
+    TimeBudgetExceeded,
+    ValueSizeLimitExceeded,
+)
+from lang.models.instructions import (
+    CallFunction,
+    Instruction,
+    Jump,
+    Print,
+    PushBool,
+    PushInt,
+    PushString,
+)
+from lang.runtime.program import Program
+from lang.runtime.simulator import Simulator
+
+CONFIG_CODE = (
+    "fn buffer_size return int { 64 1024 * }\n"
+    + "fn scaled args n as int return int { n buffer_size * }\n"
+    + 'fn name_and_flag return str, bool { "aaa" true }\n'
+)
+
+
+# Squares 2 thirty times, which takes too long and too much memory to evaluate
+EXPLODE_CODE = (
+    "fn explode return int { 2 0 while dup 31 < { swap dup * swap 1 + } drop }\n"
+)
+
+
+def get_instructions(
+    code: str, func_name: str = "main", fold_constant_calls: bool = True
+) -> List[Instruction]:
+    program = Program.without_file(code, fold_constant_calls=fold_constant_calls)
+    assert not program.file_load_errors
+    return program.get_instructions(program.entry_point_file, func_name)
+
+
+def run_program(code: str) -> str:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        Simulator(program).run()
+
+    return stdout.getvalue()
+
+
+def test_constant_calls_are_evaluated() -> None:
+    code = CONFIG_CODE + "fn main { buffer_size . 2 scaled . name_and_flag . . }"
+
+    assert get_instructions(code) == [
+        PushInt(value=65536),
+        Print(),
+        PushInt(value=131072),
+        Print(),
+        PushString(value="aaa"),
+        PushBool(value=True),
+        Print(),
+        Print(),
+    ]
+    assert run_program(code) == "65536131072trueaaa"
+
+
+def test_results_of_evaluated_calls_are_constant_arguments() -> None:
+    code = CONFIG_CODE + "fn main { buffer_size scaled . }"
+
+    assert get_instructions(code) == [PushInt(value=4294967296), Print()]
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        pytest.param(
+            CONFIG_CODE + "fn main { 3 foo }\nfn foo args n as int { n scaled . }",
+            id="argument-not-constant",
+        ),
+        pytest.param(
+            "fn main { 1 shout }\nfn shout args n as int { n . }",
+            id="impure",
+        ),
+        pytest.param(
+            "fn main { 1 checked . }\n"
+            + "fn checked args n as int return int { n 0 = assert n }",
+            id="failing-assertion",
+        ),
+        pytest.param(
+            "fn main { 1 forever . }\n"
+            + "fn forever args n as int return int { while true { nop } n }",
+            id="budget-exceeded",
+        ),
+        pytest.param(
+            "fn main { vec[int] size . }\n"
+            + "fn size args v as vec[int] return int { v vec:size swap drop }",
+            id="boxed-argument",
+        ),
+        pytest.param(
+            EXPLODE_CODE + "fn main { if false { explode . } }",
+            id="value-too-large",
+        ),
+    ],
+)
+def test_calls_not_evaluated(code: str) -> None:
+    assert any(
+        isinstance(instruction, CallFunction) for instruction in get_instructions(code)
+    )
+
+
+def test_jumps_are_remapped() -> None:
+    code = (
+        CONFIG_CODE
+        + "fn main { 0 while dup 2 < { buffer_size . 1 + } drop 7 scaled . }"
+    )
+
+    instructions = get_instructions(code)
+    assert not any(
+        isinstance(instruction, CallFunction) for instruction in instructions
+    )
+    assert instructions[-2:] == [PushInt(value=458752), Print()]
+    assert all(
+        instruction.instruction_offset <= len(instructions)
+        for instruction in instructions
+        if isinstance(instruction, Jump)
+    )
+    assert run_program(code) == "6553665536458752"
+
+
+def test_simulator_instruction_budget() -> None:
+    program = Program.without_file("fn main { while true { nop } }")
+    assert not program.file_load_errors
+
+    with pytest.raises(InstructionBudgetExceeded):
+        Simulator(program, instruction_budget=100).run(raise_=True)
+
+
+def test_time_budget() -> None:
+    program = Program.without_file(
+        CONFIG_CODE + "fn main { buffer_size . }", fold_constant_calls=False
+    )
+    assert not program.file_load_errors
+
+    ConstantCallEvaluator(program, time_budget=0).evaluate()
+    assert any(
+        isinstance(instruction, CallFunction)
+        for instruction in program.get_instructions(program.entry_point_file, "main")
+    )
+
+    ConstantCallEvaluator(program).evaluate()
+    assert program.get_instructions(program.entry_point_file, "main") == [
+        PushInt(value=65536),
+        Print(),
+    ]
+
+
+def test_fold_constant_calls_disabled() -> None:
+    code = CONFIG_CODE + "fn main { buffer_size . }"
+
+    call, print_ = get_instructions(code, fold_constant_calls=False)
+    assert isinstance(call, CallFunction)
+    assert call.func_name == "buffer_size"
+    assert print_ == Print()
+
+
+def test_simulator_time_budget() -> None:
+    program = Program.without_file("fn main { while true { nop } }")
+    assert not program.file_load_errors
+
+    with pytest.raises(TimeBudgetExceeded):
+        Simulator(program, instruction_budget=10_000_000, time_budget=0.01).run(
+            raise_=True
+        )
+
+
+def test_simulator_max_value_size() -> None:
+    program = Program.without_file(EXPLODE_CODE + "fn main { explode . }")
+    assert not program.file_load_errors
+
+    with pytest.raises(ValueSizeLimitExceeded):
+        Simulator(program, instruction_budget=1000, max_value_size=100).run(raise_=True)
@@ -0,0 +1,162 @@
+import subprocess
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from aaa import main
+from lang.linker import Linker, assemble
+from lang.models.code_image import CodeImage
+from lang.runtime.image_file import (
+    IMAGE_VERSION,
+    MAGIC,
+    ImageFileError,
+    load_image,
+    save_image,
+)
+from lang.runtime.image_vm import ImageVM
+from lang.runtime.program import Program
+
+CODE = (
+    "struct point {\n"
+    + "    x as int,\n"
+    + "    y as str,\n"
+    + "}\n"
+    + 'fn describe args p as point { p "x" ? . "y" ? . drop }\n'
+    + "fn main {\n"
+    + '    point "x" { 123456789012345678901234567890 } ! "y" { "é" } ! describe\n'
+    + "    vec[point] point vec:push vec:size . drop\n"
+    + '    map[str, vec[bool]] "k" vec[bool] true vec:push map:set\n'
+    + '    "k" map:get . drop\n'
+    + "    0 while dup 3 < { dup 1 = . 1 + } drop\n"
+    + "    7 2 / . . 7 0 / . .\n"
+    + "}\n"
+)
+
+
+def build(code: str, path: Path) -> CodeImage:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+
+    image = assemble(Linker(program).link())
+    save_image(image, path)
+    return image
+
+
+def run_image(image: CodeImage) -> str:
+    with redirect_stdout(StringIO()) as stdout:
+        ImageVM(image).run()
+
+    return stdout.getvalue()
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    image_path = tmp_path / "main.aaab"
+    image = build(CODE, image_path)
+    loaded = load_image(image_path)
+
+    assert loaded.opcodes == image.opcodes
+    assert [
+        (function.name, function.file, function.address, function.argument_names)
+        for function in loaded.functions
+    ] == [
+        (function.name, function.file, function.address, function.argument_names)
+        for function in image.functions
+    ]
+
+    assert run_image(loaded) == run_image(image)
+    assert run_image(loaded) == (
+        "123456789012345678901234567890é1[true]falsetruefalsetrue3false0"
+    )
+
+
+def test_build_and_exec_commands(tmp_path: Path) -> None:
+    source_path = tmp_path / "main.aaa"
+    source_path.write_text('fn main { "hello" . }\n')
+    image_path = tmp_path / "main.aaab"
+
+    with redirect_stdout(StringIO()) as stdout:
+        assert main(["./aaa.py", "build", str(source_path), "-o", str(image_path)]) == 0
+
+        # The image doesn't need the source file anymore
+        source_path.unlink()
+        assert main(["./aaa.py", "exec", str(image_path)]) == 0
+
+    assert stdout.getvalue() == "hello"
+
+
+def test_exec_does_not_import_parser(tmp_path: Path) -> None:
+    image_path = tmp_path / "main.aaab"
+    build('fn main { "hello" . }', image_path)
+
+    # Importing lark fails in the subprocess
+    code = (
+        "import sys\n"
+        + "sys.modules['lark'] = None\n"
+        + "from aaa import main\n"
+        + f"main(['./aaa.py', 'exec', {str(image_path)!r}])\n"
+    )
+    repo_root = Path(__file__).parent.parent
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=repo_root, capture_output=True, text=True
+    )
+
+    assert proc.stderr == ""
+    assert proc.stdout == "hello"
+
+
+@pytest.mark.parametrize(
+    ["data", "error"],
+    [
+        pytest.param(b"", "File is not an Aaa image.", id="empty"),
+        pytest.param(b"ABCD\x01\x00", "File is not an Aaa image.", id="magic"),
+        pytest.param(
+            MAGIC + (IMAGE_VERSION + 1).to_bytes(2, "little"),
+            f"Image has unsupported version {IMAGE_VERSION + 1}.",
+            id="version",
+        ),
+        pytest.param(
+            MAGIC + IMAGE_VERSION.to_bytes(2, "little") + b"\x05",
+            "Image is truncated or corrupted.",
+            id="truncated",
+        ),
+    ],
+)
+def test_load_invalid_image(data: bytes, error: str, tmp_path: Path) -> None:
+    image_path = tmp_path / "main.aaab"
+    image_path.write_bytes(data)
+
+    with pytest.raises(ImageFileError) as e:
+        load_image(image_path)
+
+    assert str(e.value) == error
+
+
+@pytest.mark.parametrize(
+    ["data", "error"],
+    [
+        pytest.param(None, "No such file or directory", id="missing"),
+        pytest.param(b"ABCD\x01\x00", "File is not an Aaa image.", id="corrupt"),
+        pytest.param(
+            MAGIC + (IMAGE_VERSION + 1).to_bytes(2, "little"),
+            f"Image has unsupported version {IMAGE_VERSION + 1}.",
+            id="version",
+        ),
+    ],
+)
+def test_exec_invalid_image(data: Optional[bytes], error: str, tmp_path: Path) -> None:
+    image_path = tmp_path / "main.aaab"
+    if data is not None:
+        image_path.write_bytes(data)
+
+    with redirect_stderr(StringIO()) as stderr:
+        with pytest.raises(SystemExit) as e:
+            main(["./aaa.py", "exec", str(image_path)])
+
+    assert e.value.code == 1
+    assert stderr.getvalue().startswith(f"Could not load image from {image_path}: ")
+    assert error in stderr.getvalue()
+    assert "Argument parsing failed" not in stderr.getvalue()
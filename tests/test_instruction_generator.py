@@ -0,0 +1,73 @@
+from typing import List
+
+from lang.instruction_generator import InstructionGenerator
+from lang.models.instructions import (
+    Instruction,
+    Jump,
+    JumpIfNot,
+    Nop,
+    Print,
+    PushBool,
+    PushInt,
+)
+from lang.models.parse import Function
+from lang.runtime.program import Program
+
+
+def generate_instructions(code: str) -> List[Instruction]:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+
+    function = program.get_identifier(program.entry_point_file, "main")
+    assert isinstance(function, Function)
+    return InstructionGenerator(
+        program.entry_point_file, function, program
+    ).generate_instructions()
+
+
+def test_branch_in_loop() -> None:
+    code = "fn main { while true { if false { 1 . } else { 2 . } } }"
+
+    assert generate_instructions(code) == [
+        Nop(),
+        PushBool(value=True),
+        JumpIfNot(instruction_offset=13),
+        PushBool(value=False),
+        JumpIfNot(instruction_offset=8),
+        PushInt(value=1),
+        Print(),
+        Jump(instruction_offset=11),
+        Nop(),
+        PushInt(value=2),
+        Print(),
+        Nop(),
+        Jump(instruction_offset=0),
+        Nop(),
+    ]
+
+
+def test_deeply_nested_jumps() -> None:
+    depth = 30
+    body = "nop"
+    for _ in range(depth):
+        body = f"while false {{ 1 drop if true {{ {body} }} }}"
+
+    instructions = generate_instructions(f"fn main {{ {body} }}")
+
+    # Every loop ends by jumping back to its start, which is a Nop
+    backward_jumps = [
+        instruction
+        for ip, instruction in enumerate(instructions)
+        if isinstance(instruction, Jump) and instruction.instruction_offset < ip
+    ]
+    assert len(backward_jumps) == depth
+    assert all(
+        instructions[jump.instruction_offset] == Nop() for jump in backward_jumps
+    )
+
+    # Conditional jumps go to the Nop after a loop or at the start of an else-branch
+    assert all(
+        instructions[instruction.instruction_offset] == Nop()
+        for instruction in instructions
+        if isinstance(instruction, JumpIfNot)
+    )
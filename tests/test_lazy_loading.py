@@ -0,0 +1,97 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from aaa import main
+from lang.exceptions.naming import UnknownArgumentType
+from lang.exceptions.typing import FunctionTypeError
+from lang.runtime.program import Program
+from lang.runtime.simulator import Simulator
+from lang.runtime.transpiler import TranspilerBackend
+
+LIBRARY = (
+    "fn five return int { 5 }\n"
+    + "fn double args x as int return int { x 2 * }\n"
+    + 'fn show args x as int { x double . "\\n" . }\n'
+    + 'fn broken return int { "not an int" }\n'
+    + "fn calls_broken { broken drop }\n"
+)
+
+MAIN = 'from "library" import five, show\n' + "fn main { 3 show five . }\n"
+
+
+def load(tmp_path: Path, lazy: bool, library: str = LIBRARY) -> Program:
+    (tmp_path / "library.aaa").write_text(library)
+    (tmp_path / "main.aaa").write_text(MAIN)
+    return Program(tmp_path / "main.aaa", lazy=lazy)
+
+
+def test_lazy_program_loads_reachable_functions(tmp_path: Path) -> None:
+    program = load(tmp_path, lazy=True)
+    assert not program.file_load_errors
+
+    library_file = tmp_path.resolve() / "library.aaa"
+    assert set(program.function_instructions[library_file]) == {
+        "double",
+        "five",
+        "show",
+    }
+
+    with redirect_stdout(StringIO()) as stdout:
+        Simulator(program).run()
+
+    assert stdout.getvalue() == "6\n5"
+
+
+def test_lazy_program_transpiles_folded_calls(tmp_path: Path) -> None:
+    # Calling five is folded to a constant, but the transpiler still calls it
+    program = load(tmp_path, lazy=True)
+
+    with redirect_stdout(StringIO()) as stdout:
+        TranspilerBackend(program).run()
+
+    assert stdout.getvalue() == "6\n5"
+
+
+def test_body_errors_of_unused_functions(tmp_path: Path) -> None:
+    assert not load(tmp_path, lazy=True).file_load_errors
+
+    errors = load(tmp_path, lazy=False).file_load_errors
+    assert len(errors) == 1
+    assert isinstance(errors[0], FunctionTypeError)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_signature_errors_of_unused_functions(tmp_path: Path, lazy: bool) -> None:
+    library = LIBRARY + "fn unused args x as nothing { nop }\n"
+    errors = load(tmp_path, lazy=lazy, library=library).file_load_errors
+
+    assert len(errors) == (1 if lazy else 2)
+    assert any(isinstance(error, UnknownArgumentType) for error in errors)
+
+
+def test_body_errors_of_reachable_functions(tmp_path: Path) -> None:
+    library = LIBRARY.replace('fn show args x as int { x double . "\\n" . }', "")
+    library += "fn show args x as int { x broken . . }\n"
+    errors = load(tmp_path, lazy=True, library=library).file_load_errors
+
+    assert len(errors) == 1
+    assert isinstance(errors[0], FunctionTypeError)
+
+
+def test_run_strict(tmp_path: Path) -> None:
+    load(tmp_path, lazy=True)
+    main_file = str(tmp_path / "main.aaa")
+
+    with redirect_stdout(StringIO()) as stdout:
+        assert main(["./aaa.py", "run", main_file]) == 0
+
+    assert stdout.getvalue() == "6\n5"
+
+    with redirect_stderr(StringIO()) as stderr:
+        with pytest.raises(SystemExit):
+            main(["./aaa.py", "run", main_file, "--strict"])
+
+    assert "Found 1 error." in stderr.getvalue()
@@ -0,0 +1,120 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from aaa import main
+from lang.exceptions.runtime import CallStackOverflow
+from lang.linker import Linker, assemble, disassemble
+from lang.models.image import CallAddress, LinkedImage, Return
+from lang.models.instructions import CountedLoop, Jump, JumpIfNot
+from lang.runtime.image_vm import ImageVM
+from lang.runtime.program import Program
+
+CODE = (
+    "fn double args x as int return int { x 2 * }\n"
+    + "fn unused { nop }\n"
+    + "fn is_even args x as int return bool { x 2 % drop 0 = }\n"
+    + "fn main {\n"
+    + "    0 while dup 5 < {\n"
+    + "        if dup is_even { dup double . } else { 0 . }\n"
+    + "        1 +\n"
+    + "    } drop\n"
+    + "}\n"
+)
+
+
+def link(code: str) -> LinkedImage:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+    return Linker(program).link()
+
+
+def test_link_reachable_functions() -> None:
+    image = link(CODE)
+
+    assert [entry.name for entry in image.functions] == ["main", "is_even", "double"]
+    assert [entry.argument_names for entry in image.functions] == [[], ["x"], ["x"]]
+    assert image.functions[0].address == 0
+
+    # Every function ends with a return right before the next one starts
+    for entry, next_entry in zip(image.functions, image.functions[1:]):
+        assert image.instructions[next_entry.address - 1] == Return()
+    assert image.instructions[-1] == Return()
+
+
+def test_link_absolute_addresses() -> None:
+    image = link(CODE)
+    main_end = image.functions[1].address
+
+    for address, instruction in enumerate(image.instructions):
+        if isinstance(instruction, CallAddress):
+            called = image.functions[instruction.function_index]
+            assert instruction.address == called.address
+            assert instruction.return_address == address + 1
+
+        # Jumps stay within main
+        if isinstance(instruction, (CountedLoop, Jump, JumpIfNot)):
+            assert 0 <= instruction.instruction_offset < main_end
+
+
+def test_image_vm_output() -> None:
+    with redirect_stdout(StringIO()) as stdout:
+        ImageVM(assemble(link(CODE))).run()
+
+    assert stdout.getvalue() == "00408"
+
+
+def test_image_vm_call_stack_overflow() -> None:
+    image = link("fn main { foo }\nfn foo { foo }")
+
+    with pytest.raises(CallStackOverflow) as e:
+        ImageVM(assemble(image), max_call_depth=10).run(raise_=True)
+
+    assert str(e.value) == (
+        "Call stack overflow: calling foo exceeds the maximum call depth of 10."
+    )
+
+
+def test_disassemble() -> None:
+    image = link("fn main { 3 show }\nfn show args x as int { x . }")
+
+    assert disassemble(image) == (
+        "<main>:\n"
+        + "     0  PushInt(3)\n"
+        + "     1  CallAddress(3)  ; show\n"
+        + "     2  Return()\n"
+        + "\n"
+        + "<show>:\n"
+        + "     3  PushArgument(0)\n"
+        + "     4  Print()\n"
+        + "     5  Return()\n"
+    )
+
+
+def test_disassemble_escapes_strings() -> None:
+    image = link('fn main { "a\\n\\tb" . }')
+    lines = disassemble(image).splitlines()
+
+    assert lines == [
+        "<main>:",
+        '     0  PushString("a\\n\\tb")',
+        "     1  Print()",
+        "     2  Return()",
+    ]
+
+
+def test_disassemble_command(tmp_path: Path) -> None:
+    source_file = tmp_path / "main.aaa"
+    source_file.write_text("fn main { 1 . }\n")
+
+    with redirect_stdout(StringIO()) as stdout:
+        assert main(["./aaa.py", "disassemble", str(source_file)]) == 0
+
+    assert stdout.getvalue() == (
+        "<main>:\n"
+        + "     0  PushInt(1)\n"
+        + "     1  Print()\n"
+        + "     2  Return()\n"
+    )
@@ -0,0 +1,151 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import List
+
+import pytest
+
+from lang.models.instructions import (
+    CountedLoop,
+    CountedLoopStep,
+    Drop,
+    Dup,
+    Instruction,
+    Jump,
+    JumpIfNot,
+    Print,
+    PushInt,
+)
+from lang.runtime.closure_backend import ClosureBackend
+from lang.runtime.program import Program
+from lang.runtime.register_vm import RegisterVM
+from lang.runtime.simulator import Simulator
+
+LOOP_CODE = [
+    pytest.param("fn main { 0 while dup 5 < { dup . 1 + } drop }", "01234", id="lt"),
+    pytest.param("fn main { 0 while dup 4 <= { dup . 2 + } drop }", "024", id="le"),
+    pytest.param("fn main { 5 while dup 0 != { dup . 1 - } drop }", "54321", id="ne"),
+    pytest.param("fn main { 5 while dup 2 > { 1 - dup . } drop }", "432", id="head"),
+    pytest.param(
+        "fn main { 3 count }\n"
+        + "fn count args n as int { 0 while dup n < { dup . 1 + } drop }",
+        "012",
+        id="argument-bound",
+    ),
+    pytest.param(
+        "fn main { 0 while dup 10 < { dup . 3 + 1 + } drop }",
+        "048",
+        id="body-modifies-counter",
+    ),
+    pytest.param(
+        "fn main { 0 while dup 10 < { 1 + if dup 4 = { 5 + } dup . } drop }",
+        "123910",
+        id="body-modifies-counter-in-branch",
+    ),
+    pytest.param(
+        "fn main { 0 while dup 3 < { 1 + } . while false { nop } }", "3", id="short"
+    ),
+    pytest.param(
+        "fn main { 0 while dup 3 < { 0 while dup 2 < { over . 1 + } drop 1 + } drop }",
+        "001122",
+        id="nested",
+    ),
+]
+
+
+def get_fused_instructions(code: str) -> List[Instruction]:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+    return program.get_instructions(program.entry_point_file, "main")
+
+
+def test_fuse_loop_with_step_at_end() -> None:
+    assert get_fused_instructions("fn main { 0 while dup 5 < { dup . 1 + } drop }") == [
+        PushInt(value=0),
+        CountedLoop(
+            comparison="<",
+            bound=5,
+            bound_arg_index=None,
+            increment=0,
+            instruction_offset=5,
+        ),
+        Dup(),
+        Print(),
+        CountedLoopStep(
+            comparison="<", bound=5, bound_arg_index=None, step=1, instruction_offset=2
+        ),
+        Drop(),
+    ]
+
+
+def test_fuse_loop_with_step_at_start() -> None:
+    assert get_fused_instructions("fn main { 5 while dup 2 > { 1 - dup . } drop }") == [
+        PushInt(value=5),
+        CountedLoop(
+            comparison=">",
+            bound=2,
+            bound_arg_index=None,
+            increment=-1,
+            instruction_offset=5,
+        ),
+        Dup(),
+        Print(),
+        Jump(instruction_offset=1),
+        Drop(),
+    ]
+
+
+def test_fuse_loop_with_argument_bound() -> None:
+    program = Program.without_file(
+        "fn main { 3 count }\n"
+        + "fn count args n as int { 0 while dup n != { dup . 1 + } drop }"
+    )
+    assert not program.file_load_errors
+
+    instructions = program.get_instructions(program.entry_point_file, "count")
+    assert instructions[1] == CountedLoop(
+        comparison="!=",
+        bound=0,
+        bound_arg_index=0,
+        increment=0,
+        instruction_offset=5,
+    )
+    assert instructions[4] == CountedLoopStep(
+        comparison="!=", bound=0, bound_arg_index=0, step=1, instruction_offset=2
+    )
+
+
+def test_step_in_branch_is_not_fused() -> None:
+    instructions = get_fused_instructions(
+        "fn main { 0 while dup 5 < { dup . 1 + if dup 3 = { 1 + } } drop }"
+    )
+
+    assert not any(
+        isinstance(instruction, CountedLoopStep) for instruction in instructions
+    )
+    assert any(isinstance(instruction, JumpIfNot) for instruction in instructions)
+
+
+def test_loop_shorter_than_header_is_not_fused() -> None:
+    instructions = get_fused_instructions("fn main { while false { nop } }")
+
+    assert not any(
+        isinstance(instruction, (CountedLoop, CountedLoopStep))
+        for instruction in instructions
+    )
+
+
+@pytest.mark.parametrize("code,expected_output", LOOP_CODE)
+@pytest.mark.parametrize("backend", ["simulator", "closure", "register"])
+def test_counted_loops_run(code: str, expected_output: str, backend: str) -> None:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        if backend == "simulator":
+            Simulator(program, hot_threshold=None).run()
+        elif backend == "closure":
+            ClosureBackend(program).run()
+        else:
+            RegisterVM(program).run()
+
+    assert stdout.getvalue() == expected_output
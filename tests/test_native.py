@@ -0,0 +1,97 @@
+import subprocess
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from aaa import main
+from lang.exceptions.runtime import AaaAssertionFailure
+from lang.runtime.native import NativeBackend, NativeRuntimeError, find_c_compiler
+from lang.runtime.program import Program
+from lang.runtime.simulator import Simulator
+
+pytestmark = pytest.mark.skipif(not find_c_compiler(), reason="no C compiler found")
+
+
+def test_build_native_command() -> None:
+    with TemporaryDirectory() as directory:
+        executable = Path(directory) / "fizzbuzz"
+
+        assert main(["./aaa.py", "build-native", "examples/fizzbuzz.aaa"]) == 1
+        assert (
+            main(
+                [
+                    "./aaa.py",
+                    "build-native",
+                    "examples/fizzbuzz.aaa",
+                    "-o",
+                    str(executable),
+                ]
+            )
+            == 0
+        )
+
+        proc = subprocess.run([executable], capture_output=True, text=True)
+
+    assert proc.returncode == 0
+    assert proc.stdout.splitlines()[:5] == ["1", "2", "fizz", "4", "buzz"]
+
+
+def test_native_deep_recursion() -> None:
+    program = Program.without_file(
+        "fn main { 50000 count_down . }\n"
+        + "fn count_down args n as int return int {\n"
+        + "    if n 0 = { 0 } else { n 1 - count_down 1 + }\n"
+        + "}"
+    )
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        NativeBackend(program).run(raise_=True)
+
+    assert stdout.getvalue() == "50000"
+
+
+def test_native_call_stack_overflow() -> None:
+    program = Program.without_file("fn main { foo }\nfn foo { foo }")
+    assert not program.file_load_errors
+
+    with redirect_stderr(StringIO()):
+        with pytest.raises(NativeRuntimeError) as e:
+            NativeBackend(program, max_call_depth=100).run(raise_=True)
+
+    assert str(e.value) == (
+        "Call stack overflow: calling foo exceeds the maximum call depth of 100."
+    )
+
+
+def test_native_assertion_failure_matches_simulator() -> None:
+    program = Program.without_file(
+        'fn main { 3 "x" vec[int] foo }\n'
+        + "fn foo args a as int, b as str, c as vec[int] { a 3 = not assert }"
+    )
+    assert not program.file_load_errors
+
+    with redirect_stderr(StringIO()):
+        with pytest.raises(AaaAssertionFailure) as expected:
+            Simulator(program).run(raise_=True)
+
+        with pytest.raises(NativeRuntimeError) as e:
+            NativeBackend(program).run(raise_=True)
+
+    assert str(e.value) == str(expected.value)
+
+
+def test_native_escapes_string_literals() -> None:
+    program = Program.without_file('fn main { "a\\"b\\\\c\\n??=\\td" . }')
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as expected:
+        Simulator(program).run()
+
+    with redirect_stdout(StringIO()) as stdout:
+        NativeBackend(program).run()
+
+    assert stdout.getvalue() == expected.getvalue()
@@ -0,0 +1,195 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from aaa import main
+from lang.models.instructions import (
+    ArgumentOperation,
+    CallFunction,
+    ConstantOperation,
+    Drop,
+    Instruction,
+    Jump,
+    JumpIfNot,
+    Print,
+    PushInt,
+)
+from lang.models.profile import Profile
+from lang.profile_guided import move_cold_blocks
+from lang.runtime.closure_backend import ClosureBackend
+from lang.runtime.program import Program
+from lang.runtime.register_vm import RegisterVM
+from lang.runtime.simulator import Simulator
+
+HOT_CODE = (
+    "fn scale args x as int return int { x 3 * 1 + }\n"
+    + "fn main {\n"
+    + "    0 0 while dup 50 < {\n"
+    + "        if dup 10 % drop 0 != { swap over scale + swap }\n"
+    + "        else { swap 1 - swap }\n"
+    + "        1 +\n"
+    + "    } drop .\n"
+    + "}\n"
+)
+
+NESTED_CODE = (
+    "fn main {\n"
+    + "    0 while dup 30 < {\n"
+    + "        if dup 3 % drop 0 != {\n"
+    + "            if dup 5 % drop 0 != { 1 . } else { 2 . }\n"
+    + "        } else { 3 . }\n"
+    + "        1 +\n"
+    + "    } drop\n"
+    + "}\n"
+)
+
+
+def record_profile(code: str, tmp_path: Path) -> Profile:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+
+    profile_path = tmp_path / "profile.json"
+    with redirect_stdout(StringIO()):
+        Simulator(program, profile_out=profile_path).run()
+
+    return Profile.parse_file(profile_path)
+
+
+def run_program(program: Program, backend: str) -> str:
+    with redirect_stdout(StringIO()) as stdout:
+        if backend == "simulator":
+            Simulator(program, hot_threshold=None).run()
+        elif backend == "closure":
+            ClosureBackend(program).run()
+        else:
+            RegisterVM(program).run()
+
+    return stdout.getvalue()
+
+
+def get_optimized_instructions(
+    code: str, profile: Profile, func_name: str = "main"
+) -> List[Instruction]:
+    program = Program.without_file(code).apply_profile(profile)
+    return program.get_instructions(program.entry_point_file, func_name)
+
+
+def test_profile_records_calls_branches_and_loops(tmp_path: Path) -> None:
+    profile = record_profile(HOT_CODE, tmp_path)
+
+    main_profile = profile.functions["main"]
+    assert main_profile.calls == 1
+    assert [(branch.taken, branch.not_taken) for branch in main_profile.branches] == [
+        (0, 1),
+        (5, 45),
+        (49, 1),
+    ]
+    assert [(loop.entries, loop.iterations) for loop in main_profile.loops] == [(1, 50)]
+
+    assert profile.functions["scale"].calls == 45
+    assert profile.pairs["PushInt Multiply"] == 45
+    assert profile.instruction_count > 0
+
+
+def test_profile_applies_inlining_superinstructions_and_layout(
+    tmp_path: Path,
+) -> None:
+    profile = record_profile(HOT_CODE, tmp_path)
+    instructions = get_optimized_instructions(HOT_CODE, profile)
+
+    assert not any(
+        isinstance(instruction, CallFunction) for instruction in instructions
+    )
+    assert ConstantOperation(operator="*", value=3) in instructions
+
+    # The else-branch is moved after the end of the function
+    jump_if_not = next(
+        instruction
+        for instruction in instructions
+        if isinstance(instruction, JumpIfNot)
+    )
+    assert instructions[jump_if_not.instruction_offset - 1] == Jump(
+        instruction_offset=len(instructions)
+    )
+
+
+def test_profile_of_other_program_changes_nothing(tmp_path: Path) -> None:
+    profile = record_profile("fn main { 1 if true { 2 } else { 3 } . drop }", tmp_path)
+
+    program = Program.without_file(HOT_CODE)
+    instructions = program.get_instructions(program.entry_point_file, "main")
+    program.apply_profile(profile)
+
+    assert program.get_instructions(program.entry_point_file, "main") == instructions
+
+
+def test_argument_superinstruction(tmp_path: Path) -> None:
+    code = (
+        "fn main { 0 while dup 40 < { dup add_one . 1 + } drop }\n"
+        + "fn add_one args n as int return int { if 0 n = { 0 } else { n 1 + } }\n"
+    )
+    profile = record_profile(code, tmp_path)
+
+    assert ArgumentOperation(operator="=", arg_index=0) in get_optimized_instructions(
+        code, profile, "add_one"
+    )
+
+
+@pytest.mark.parametrize("code", [HOT_CODE, NESTED_CODE], ids=["hot", "nested"])
+@pytest.mark.parametrize("backend", ["simulator", "closure", "register"])
+def test_optimized_program_output(code: str, backend: str, tmp_path: Path) -> None:
+    profile = record_profile(code, tmp_path)
+
+    expected = run_program(Program.without_file(code), backend)
+    assert run_program(Program.without_file(code).apply_profile(profile), backend) == (
+        expected
+    )
+
+
+def test_move_cold_blocks() -> None:
+    instructions: List[Instruction] = [
+        JumpIfNot(instruction_offset=4),
+        PushInt(value=1),
+        Print(),
+        Jump(instruction_offset=6),
+        PushInt(value=2),
+        Print(),
+        Drop(),
+    ]
+
+    assert move_cold_blocks(instructions, {0}) == [
+        JumpIfNot(instruction_offset=5),
+        PushInt(value=1),
+        Print(),
+        Drop(),
+        Jump(instruction_offset=8),
+        PushInt(value=2),
+        Print(),
+        Jump(instruction_offset=3),
+    ]
+
+
+def test_profile_options(tmp_path: Path) -> None:
+    profile_path = str(tmp_path / "profile.json")
+    argv = ["./aaa.py", "cmd-full", HOT_CODE]
+
+    with redirect_stdout(StringIO()) as stdout:
+        assert main(argv + ["--profile-out", profile_path]) == 0
+        assert main(argv + [f"--profile-in={profile_path}"]) == 0
+
+    assert stdout.getvalue() == "34153415"
+
+
+@pytest.mark.parametrize(
+    "flags",
+    [
+        pytest.param(["--profile-in", "/nonexistent/profile.json"], id="missing"),
+        pytest.param(["--profile-out=out.json", "--backend=closure"], id="backend"),
+    ],
+)
+def test_profile_options_fail(flags: List[str]) -> None:
+    with redirect_stderr(StringIO()):
+        assert main(["./aaa.py", "cmd-full", HOT_CODE, *flags]) == 1
@@ -8,9 +8,11 @@ from pytest import MonkeyPatch
 
 from lang.exceptions.import_ import FileReadError
 from lang.exceptions.misc import MissingEnvironmentVariable
+from lang.instruction_generator import OPERATOR_INSTRUCTIONS
 from lang.models.instructions import Instruction
 from lang.runtime.program import Program
 from lang.runtime.simulator import Simulator
+from lang.runtime.stdlib import SPECIALIZED_STDLIB_FUNCTIONS, STDLIB_FUNCTIONS
 
 pytestmark = pytest.mark.no_builtins_cache
 
@@ -62,3 +64,19 @@ def test_program_implements_all_instructions() -> None:
     simulator = Simulator(Program.without_file("fn main { nop }"))
     implemented_instructions = set(simulator.instruction_funcs.keys())
     assert instruction_types == implemented_instructions
+
+
+def test_program_implements_all_stdlib_functions() -> None:
+    program = Program.without_file("fn main { nop }")
+
+    stdlib_names = set(program._builtins.functions.keys()) - set(
+        OPERATOR_INSTRUCTIONS.keys()
+    )
+    generic_names = set(STDLIB_FUNCTIONS.keys()) - set(
+        SPECIALIZED_STDLIB_FUNCTIONS.keys()
+    )
+    assert stdlib_names == generic_names
+    assert set(SPECIALIZED_STDLIB_FUNCTIONS.values()) <= stdlib_names
+
+    simulator = Simulator(program)
+    assert set(simulator.stdlib_opcodes.keys()) == set(STDLIB_FUNCTIONS.keys())
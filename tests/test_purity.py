@@ -0,0 +1,107 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+from aaa import main
+from lang.models.parse import Function
+from lang.models.runtime import MemoCache
+from lang.purity import find_memoizable_functions, find_pure_functions
+from lang.runtime.program import Program
+from lang.runtime.simulator import Simulator
+
+PURITY_CODE = (
+    "fn main { 3 pure_add . 3 prints 3 calls_prints vec[int] pushes_arg drop }\n"
+    + "fn pure_add args n as int return int { n 1 + }\n"
+    + "fn prints args n as int { n . }\n"
+    + "fn calls_prints args n as int { n prints }\n"
+    + "fn pushes_arg args v as vec[int] return vec[int] { v 1 vec:push }\n"
+    + "fn pushes_local return int { vec[int] 1 vec:push vec:size swap drop }\n"
+    + "fn reads_arg args v as vec[int] return int { v vec:size swap drop }\n"
+    + "fn syscall return int { time }\n"
+    + "fn even args n as int return bool { if n 0 = { true } else { n 1 - odd } }\n"
+    + "fn odd args n as int return bool { if n 0 = { false } else { n 1 - even } }\n"
+)
+
+FIB_CODE = (
+    "fn fib args n as int return int {\n"
+    + "    if n 2 < { n } else { n 1 - fib n 2 - fib + }\n"
+    + "}\n"
+    + 'fn main { 25 fib . "\\n" . }\n'
+)
+
+
+def test_find_pure_functions() -> None:
+    program = Program.without_file(PURITY_CODE)
+    assert not program.file_load_errors
+
+    assert {func_name for _, func_name in find_pure_functions(program)} == {
+        "even",
+        "odd",
+        "pure_add",
+        "pushes_local",
+        "reads_arg",
+    }
+
+
+def test_find_memoizable_functions() -> None:
+    program = Program.without_file(PURITY_CODE)
+    assert not program.file_load_errors
+
+    assert {func_name for _, func_name in find_memoizable_functions(program)} == {
+        "even",
+        "odd",
+        "pure_add",
+        "pushes_local",
+    }
+
+
+def test_memo_cache_evicts_least_recently_used() -> None:
+    program = Program.without_file(FIB_CODE)
+    function = program.get_identifier(program.entry_point_file, "fib")
+    assert isinstance(function, Function)
+
+    memo_cache = MemoCache(function, max_size=2)
+    memo_cache.put((1,), [1])
+    memo_cache.put((2,), [1])
+
+    assert memo_cache.get((1,)) == [1]
+    memo_cache.put((3,), [2])
+
+    assert memo_cache.get((2,)) is None
+    assert memo_cache.get((3,)) == [2]
+    assert (memo_cache.hits, memo_cache.misses, memo_cache.evictions) == (2, 1, 1)
+
+
+def test_simulator_memoizes_pure_functions() -> None:
+    program = Program.without_file(FIB_CODE)
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        with redirect_stderr(StringIO()) as stderr:
+            Simulator(program, memoize=True).run()
+
+    assert stdout.getvalue() == "75025\n"
+    assert stderr.getvalue() == "MEMO | fib: 23 hits, 26 misses, 0 evictions\n"
+
+
+def test_simulator_memo_size() -> None:
+    program = Program.without_file(FIB_CODE)
+    assert not program.file_load_errors
+
+    simulator = Simulator(program, memoize=True, memo_size=2, hot_threshold=None)
+
+    with redirect_stdout(StringIO()) as stdout:
+        with redirect_stderr(StringIO()):
+            simulator.run()
+
+    assert stdout.getvalue() == "75025\n"
+
+    memo_cache = simulator.memo_caches[(program.entry_point_file, "fib")]
+    assert len(memo_cache.results) == 2
+    assert memo_cache.evictions > 0
+
+
+def test_memoize_requires_simulator() -> None:
+    with redirect_stderr(StringIO()) as stderr:
+        assert main(["./aaa.py", "cmd", "nop", "--memoize", "--backend=closure"])
+
+    assert "only supported by the simulator" in stderr.getvalue()
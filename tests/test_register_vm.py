@@ -0,0 +1,86 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+import pytest
+
+from aaa import main
+from lang.models.instructions import Swap
+from lang.models.register_instructions import (
+    RegisterBinaryOperation,
+    RegisterPrint,
+)
+from lang.runtime.program import Program
+from lang.runtime.register_vm import RegisterVM
+
+
+def test_register_vm_stack_shuffles_emit_no_instructions() -> None:
+    program = Program.without_file(
+        "fn main { 5 foo }\n"
+        + "fn foo args n as int { n 1 + dup n 2 + swap rot drop - . }"
+    )
+    assert not program.file_load_errors
+
+    register_vm = RegisterVM(program)
+    record = register_vm.get_function_record(program.entry_point_file, "foo")
+    instructions = program.get_instructions(program.entry_point_file, "foo")
+
+    assert Swap() in instructions
+    assert [type(instruction) for instruction in record.instructions] == [
+        RegisterBinaryOperation,
+        RegisterBinaryOperation,
+        RegisterBinaryOperation,
+        RegisterPrint,
+    ]
+    assert sum(record.stack_dispatch_counts) == len(instructions)
+
+    with redirect_stdout(StringIO()) as stdout:
+        register_vm.run()
+
+    assert stdout.getvalue() == "1"
+
+
+def test_register_vm_counts_dispatches() -> None:
+    program = Program.without_file(
+        "fn main { 0 while dup 3 < { dup . 1 + } drop }",
+    )
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        with redirect_stderr(StringIO()) as stderr:
+            RegisterVM(program, count_dispatches=True).run()
+
+    assert stdout.getvalue() == "012"
+    assert stderr.getvalue() == (
+        "DISPATCH | 12 stack instructions ran as 8 register instructions, "
+        + "4 dispatches (33.3%) eliminated\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "file", ["examples/fizzbuzz.aaa", "examples/function_demo.aaa"]
+)
+def test_register_vm_eliminates_dispatches(file: str) -> None:
+    with redirect_stdout(StringIO()):
+        with redirect_stderr(StringIO()) as stderr:
+            assert (
+                main(
+                    [
+                        "./aaa.py",
+                        "run",
+                        file,
+                        "--backend=register",
+                        "--count-dispatches",
+                    ]
+                )
+                == 0
+            )
+
+    eliminated = int(stderr.getvalue().split(", ")[1].split()[0])
+    assert eliminated > 0
+
+
+def test_count_dispatches_requires_register_backend() -> None:
+    with redirect_stderr(StringIO()) as stderr:
+        assert main(["./aaa.py", "run", "examples/fizzbuzz.aaa", "--count-dispatches"])
+
+    assert "only supported by the register backend" in stderr.getvalue()
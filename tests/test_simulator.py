@@ -0,0 +1,117 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+import pytest
+
+from aaa import main
+from lang.models.instructions import Plus, Print, PushBool, PushInt
+from lang.runtime.debug import make_checked_handler
+from lang.runtime.program import Program
+from lang.runtime.register_vm import ParanoidRegisterVM
+from lang.runtime.simulator import ParanoidSimulator, Simulator
+
+
+def test_simulator_promotes_hot_function() -> None:
+    program = Program.without_file(
+        "fn main { 0 while dup 5 < { dup foo 1 + } drop }\n"
+        + "fn foo args n as int { n . }"
+    )
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        with redirect_stderr(StringIO()) as stderr:
+            Simulator(program, hot_threshold=3, debug_tiers=True).run()
+
+    assert stdout.getvalue() == "01234"
+    assert stderr.getvalue() == (
+        "TIER | foo moves to the closure tier after 3 calls\n"
+        + "TIER | main moves to the closure tier after 3 loop iterations\n"
+    )
+
+
+def test_simulator_promotes_hot_loop() -> None:
+    program = Program.without_file(
+        'fn main { 0 while dup 10 < { dup . 1 + } drop "!" . }'
+    )
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        with redirect_stderr(StringIO()) as stderr:
+            Simulator(program, hot_threshold=4, debug_tiers=True).run()
+
+    assert stdout.getvalue() == "0123456789!"
+    assert stderr.getvalue() == (
+        "TIER | main moves to the closure tier after 4 loop iterations\n"
+    )
+
+
+def test_simulator_cold_code_is_not_compiled() -> None:
+    program = Program.without_file(
+        "fn main { 0 while dup 10 < { dup foo 1 + } drop }\n"
+        + "fn foo args n as int { n . }"
+    )
+    assert not program.file_load_errors
+
+    simulator = Simulator(program, debug_tiers=True)
+
+    with redirect_stdout(StringIO()) as stdout:
+        with redirect_stderr(StringIO()) as stderr:
+            simulator.run()
+
+    assert stdout.getvalue() == "0123456789"
+    assert stderr.getvalue() == ""
+    assert simulator.closure_backend is None
+
+
+def test_paranoid_backends_run_programs() -> None:
+    program = Program.without_file(
+        "fn main { 0 while dup 5 < { dup foo 1 + } drop }\n"
+        + "fn foo args n as int { if n 2 % drop 0 = { n . } }"
+    )
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        ParanoidSimulator(program, hot_threshold=2).run()
+        ParanoidRegisterVM(program).run()
+
+    assert stdout.getvalue() == "024024"
+
+
+def test_paranoid_simulator_checks_stack_types() -> None:
+    program = Program.without_file("fn main { nop }")
+    assert not program.file_load_errors
+
+    # Instructions that would not pass type checking
+    program.function_instructions[program.entry_point_file]["main"] = [
+        PushBool(value=True),
+        PushInt(value=1),
+        Plus(),
+        Print(),
+    ]
+
+    with redirect_stdout(StringIO()):
+        Simulator(program).run()
+
+        with pytest.raises(AssertionError):
+            ParanoidSimulator(program).run()
+
+
+def test_checked_handler() -> None:
+    handler = make_checked_handler(PushInt, lambda instruction: None)
+
+    assert handler(PushInt(value=1)) is None
+    with pytest.raises(AssertionError):
+        handler(PushBool(value=True))
+
+
+def test_paranoid_option() -> None:
+    code = "fn main { 3 4 + . }"
+
+    with redirect_stdout(StringIO()) as stdout:
+        assert main(["./aaa.py", "cmd-full", code, "--paranoid"]) == 0
+
+    assert stdout.getvalue() == "7"
+
+    with redirect_stderr(StringIO()):
+        argv = ["./aaa.py", "cmd-full", code, "--paranoid", "--backend=closure"]
+        assert main(argv) == 1
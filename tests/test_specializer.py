@@ -0,0 +1,153 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Any, List
+
+import pytest
+
+from aaa import main
+from lang.models.instructions import CallFunction, StandardLibraryCall
+from lang.models.typing.var import box, vec_items, vec_var
+from lang.models.typing.var_type import Int
+from lang.runtime.program import Program
+from lang.runtime.simulator import Simulator
+from lang.runtime.stdlib import STDLIB_FUNCTIONS
+
+GENERIC_CODE = (
+    "fn fill args v as vec[*a], a as *a, n as int return vec[*a] {\n"
+    + "    v 0 while dup n < { swap a vec:push swap 1 + } drop\n"
+    + "}\n"
+    + "fn main {\n"
+    + '    vec[int] 7 2 fill . vec[str] "x" 1 fill . vec[int] 8 1 fill .\n'
+    + "}\n"
+)
+
+
+def get_stdlib_calls(program: Program, func_name: str) -> List[str]:
+    return [
+        instruction.name
+        for instruction in program.get_instructions(program.entry_point_file, func_name)
+        if isinstance(instruction, StandardLibraryCall)
+    ]
+
+
+def run_program(program: Program) -> str:
+    with redirect_stdout(StringIO()) as stdout:
+        Simulator(program).run()
+
+    return stdout.getvalue()
+
+
+def test_specializer_specializes_container_calls() -> None:
+    program = Program.without_file(
+        "fn main {\n"
+        + "    vec[int] 5 vec:push 0 vec:get . drop\n"
+        + '    map[str, vec[bool]] "a" vec[bool] map:set "a" map:has_key . drop\n'
+        + "}"
+    )
+    assert not program.file_load_errors
+
+    assert get_stdlib_calls(program, "main") == [
+        "vec:push[int]",
+        "vec:get[int]",
+        "map:set",
+        "map:has_key",
+    ]
+    assert run_program(program) == "5true"
+
+
+def test_specializer_keeps_generic_calls_in_generic_functions() -> None:
+    program = Program.without_file(GENERIC_CODE)
+    assert not program.file_load_errors
+
+    assert get_stdlib_calls(program, "fill") == ["vec:push"]
+    assert run_program(program) == '[7, 7]["x"][8]'
+
+
+def test_monomorphize_clones_generic_functions() -> None:
+    program = Program.without_file(GENERIC_CODE)
+    assert not program.file_load_errors
+    program.monomorphize()
+
+    called = [
+        instruction.func_name
+        for instruction in program.get_instructions(program.entry_point_file, "main")
+        if isinstance(instruction, CallFunction)
+    ]
+    assert called == [
+        "fill[vec[int], int, int]",
+        "fill[vec[str], str, int]",
+        "fill[vec[int], int, int]",
+    ]
+
+    assert get_stdlib_calls(program, "fill[vec[int], int, int]") == ["vec:push[int]"]
+    assert get_stdlib_calls(program, "fill[vec[str], str, int]") == ["vec:push[str]"]
+    assert run_program(program) == '[7, 7]["x"][8]'
+
+
+def test_monomorphize_recursive_generic_function() -> None:
+    program = Program.without_file(
+        "fn repeat args a as *a, n as int {\n"
+        + "    if n 0 > { a . a n 1 - repeat }\n"
+        + "}\n"
+        + 'fn main { "x" 3 repeat true 1 repeat }\n'
+    )
+    assert not program.file_load_errors
+    program.monomorphize()
+
+    assert get_stdlib_calls(program, "main") == []
+    assert [
+        instruction
+        for instruction in program.get_instructions(
+            program.entry_point_file, "repeat[str, int]"
+        )
+        if isinstance(instruction, CallFunction)
+    ] == [CallFunction(func_name="repeat[str, int]", file=program.entry_point_file)]
+    assert run_program(program) == "xxxtrue"
+
+
+@pytest.mark.parametrize(
+    "item",
+    [pytest.param(item, id=repr(item)) for item in [3, True, "x", vec_var(Int, [])]],
+)
+def test_specialized_vec_functions_store_unboxed_items(item: Any) -> None:
+    kind = {int: "int", bool: "bool", str: "str"}.get(type(item), "var")
+    item_type = box(item).type
+
+    specialized_vec = vec_var(item_type, [])
+    STDLIB_FUNCTIONS[f"vec:push[{kind}]"](specialized_vec, item)
+
+    generic_vec = vec_var(item_type, [])
+    STDLIB_FUNCTIONS["vec:push"](generic_vec, item)
+
+    assert specialized_vec.value == generic_vec.value
+    assert list(vec_items(specialized_vec)) == [item]
+    assert STDLIB_FUNCTIONS[f"vec:get[{kind}]"](generic_vec, 0)[1] is item
+    assert STDLIB_FUNCTIONS[f"vec:pop[{kind}]"](specialized_vec)[1] is item
+
+
+def test_vec_from_generic_function() -> None:
+    # The vec has a placeholder item type, but specialized functions can use it
+    program = Program.without_file(
+        "fn wrap args a as *a return vec[*a] { vec[*a] a vec:push }\n"
+        + "fn main {\n"
+        + '    true wrap false vec:push 0 vec:get . " " . .\n'
+        + "    3 wrap 123456789012345678901234567890 vec:push .\n"
+        + "}\n"
+    )
+    assert not program.file_load_errors
+
+    assert get_stdlib_calls(program, "main") == [
+        "vec:push[bool]",
+        "vec:get[bool]",
+        "vec:push[int]",
+    ]
+    assert run_program(program) == (
+        "true [true, false][3, 123456789012345678901234567890]"
+    )
+
+
+def test_monomorphize_option() -> None:
+    with redirect_stdout(StringIO()) as stdout:
+        assert main(["./aaa.py", "cmd-full", GENERIC_CODE, "--monomorphize"]) == 0
+
+    assert stdout.getvalue() == '[7, 7]["x"][8]'
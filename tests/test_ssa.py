@@ -0,0 +1,169 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import List
+
+import pytest
+
+from lang.instruction_generator import InstructionGenerator
+from lang.models.instructions import (
+    Dup,
+    Instruction,
+    IntLessThan,
+    Jump,
+    JumpIfNot,
+    Multiply,
+    Plus,
+    Print,
+    PushArgument,
+    PushInt,
+    PushString,
+)
+from lang.models.parse import Function
+from lang.models.ssa import Value
+from lang.runtime.program import Program
+from lang.runtime.simulator import Simulator
+from lang.ssa import (
+    DROP,
+    OVER,
+    ROT,
+    SWAP,
+    SSABuilder,
+    find_shuffles,
+    optimize_instructions,
+    propagate_copies,
+)
+
+
+def check_optimized(
+    code: str, func_name: str, expected_instructions: List[Instruction], output: str
+) -> None:
+    program = Program.without_file(code)
+    assert not program.file_load_errors
+
+    # Compare before later passes like counted loop fusion
+    function = program.get_identifier(program.entry_point_file, func_name)
+    assert isinstance(function, Function)
+    instructions = InstructionGenerator(
+        program.entry_point_file, function, program
+    ).generate_instructions()
+    assert optimize_instructions(program, instructions) == expected_instructions
+
+    with redirect_stdout(StringIO()) as stdout:
+        Simulator(program).run()
+
+    assert stdout.getvalue() == output
+
+
+def test_ssa_eliminates_dead_values() -> None:
+    check_optimized(
+        'fn main { 1 2 + drop vec[int] drop "x" . }',
+        "main",
+        [PushString(value="x"), Print()],
+        "x",
+    )
+
+
+def test_ssa_eliminates_common_subexpressions() -> None:
+    check_optimized(
+        "fn main { 3 foo . }\n"
+        + "fn foo args n as int return int { n 1 + dup . n 1 + * }",
+        "foo",
+        [
+            PushArgument(arg_index=0),
+            PushInt(value=1),
+            Plus(),
+            Dup(),
+            Print(),
+            Dup(),
+            Multiply(),
+        ],
+        "416",
+    )
+
+
+def test_ssa_recomputes_values_that_are_gone() -> None:
+    check_optimized(
+        'fn main { 3 foo }\nfn foo args n as int { n 1 + . "," . n 1 + . }',
+        "foo",
+        [
+            PushArgument(arg_index=0),
+            PushInt(value=1),
+            Plus(),
+            Print(),
+            PushString(value=","),
+            Print(),
+            PushArgument(arg_index=0),
+            PushInt(value=1),
+            Plus(),
+            Print(),
+        ],
+        "4,4",
+    )
+
+
+def test_ssa_propagates_copies_out_of_loops() -> None:
+    check_optimized(
+        "fn main { 5 0 while dup 3 < { 1 + } drop . }",
+        "main",
+        [
+            PushInt(value=0),
+            Dup(),
+            PushInt(value=3),
+            IntLessThan(),
+            JumpIfNot(instruction_offset=8),
+            PushInt(value=1),
+            Plus(),
+            Jump(instruction_offset=1),
+            DROP,
+            PushInt(value=5),
+            Print(),
+        ],
+        "5",
+    )
+
+
+def test_ssa_builder_creates_block_params() -> None:
+    program = Program.without_file("fn main { 5 0 while dup 3 < { 1 + } drop . }")
+    assert not program.file_load_errors
+
+    function = program.get_identifier(program.entry_point_file, "main")
+    assert isinstance(function, Function)
+    instructions = InstructionGenerator(
+        program.entry_point_file, function, program
+    ).generate_instructions()
+
+    ssa = SSABuilder(program, instructions).build()
+    entry, header, body, end = ssa.blocks
+
+    assert header.predecessors == [entry, body]
+    assert len(header.params) == 2
+    assert end.predecessors == [header]
+
+    propagate_copies(ssa)
+    constant, counter = [param.resolve() for param in header.params]
+
+    assert constant.operation is not None
+    assert constant.operation.instruction == PushInt(value=5)
+    assert counter is header.params[1]
+
+
+@pytest.mark.parametrize(
+    ["current", "target", "expected_shuffles"],
+    [
+        pytest.param([1, 2], [1, 2], [], id="nothing"),
+        pytest.param([1, 2], [2, 1], [SWAP], id="swap"),
+        pytest.param([1, 2, 3], [2, 3, 1], [ROT], id="rot"),
+        pytest.param([1, 2], [2], [SWAP, DROP], id="nip"),
+        pytest.param([1, 2], [1, 2, 1], [OVER], id="over"),
+    ],
+)
+def test_find_shuffles(
+    current: List[int], target: List[int], expected_shuffles: List[Instruction]
+) -> None:
+    values = {number: Value(number) for number in [1, 2, 3]}
+
+    shuffles = find_shuffles(
+        [values[number] for number in current], [values[number] for number in target]
+    )
+
+    assert shuffles == expected_shuffles
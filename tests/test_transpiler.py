@@ -0,0 +1,71 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from lang.exceptions.runtime import CallStackOverflow
+from lang.runtime import transpiler
+from lang.runtime.program import Program
+from lang.runtime.transpiler import CACHE_DIR_NAME, Transpiler, TranspilerBackend
+
+
+def test_transpiler_uses_python_control_flow() -> None:
+    program = Program.without_file(
+        "fn main { 0 while dup 10 < { if dup 2 % drop 0 = { dup . } 1 + } drop }"
+    )
+    assert not program.file_load_errors
+
+    source = Transpiler(program).transpile()
+
+    assert "while True:" in source
+    assert "if s1:" in source
+    assert "s0 = s0 + s1" in source
+
+
+@pytest.mark.parametrize("cache_dir_set", [False, True])
+def test_transpiler_backend_caches_code(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, cache_dir_set: bool
+) -> None:
+    cache_dir = tmp_path / CACHE_DIR_NAME
+    if cache_dir_set:
+        cache_dir = tmp_path / "cache"
+        monkeypatch.setenv("AAA_CACHE_DIR", str(cache_dir))
+    else:
+        monkeypatch.delenv("AAA_CACHE_DIR")
+
+    main_path = tmp_path / "main.aaa"
+    main_path.write_text('fn main { "hello" . }')
+    program = Program(main_path)
+    assert not program.file_load_errors
+
+    with redirect_stdout(StringIO()) as stdout:
+        TranspilerBackend(program).run()
+
+    cache_files = list(cache_dir.iterdir())
+    assert len(cache_files) == 1
+    cache_file_mtime = cache_files[0].stat().st_mtime_ns
+
+    with redirect_stdout(StringIO()) as stdout:
+        TranspilerBackend(program).run()
+
+    assert stdout.getvalue() == "hello"
+    assert list(cache_dir.iterdir()) == cache_files
+    assert cache_files[0].stat().st_mtime_ns == cache_file_mtime
+
+
+def test_transpiler_backend_max_python_call_depth(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Before Python 3.11, deep recursion would crash the interpreter
+    monkeypatch.setattr(transpiler, "MAX_PYTHON_CALL_DEPTH", 100)
+    program = Program.without_file("fn main { foo }\nfn foo { foo }")
+    assert not program.file_load_errors
+
+    with redirect_stderr(StringIO()):
+        with pytest.raises(CallStackOverflow) as e:
+            TranspilerBackend(program).run(raise_=True)
+
+    assert str(e.value) == (
+        "Call stack overflow: calling foo exceeds the maximum call depth of 100."
+    )
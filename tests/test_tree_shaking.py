@@ -0,0 +1,119 @@
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from aaa import main
+from lang.linker import Linker
+from lang.runtime.program import Program
+from lang.runtime.transpiler import Transpiler
+from lang.tree_shaking import find_all, find_reachable
+
+HELPERS = (
+    "struct point { x as int, }\n"
+    + "struct unused_point { y as str, }\n"
+    + 'fn used { "used" . }\n'
+    + 'fn unused { unused_point "y" ? . drop helper }\n'
+    + 'fn helper { "helper" . }\n'
+)
+
+MAIN = (
+    'from "helpers" import used, unused\n'
+    + "struct pair { a as int, }\n"
+    + 'fn main { used pair "a" ? . drop }\n'
+)
+
+
+def load(tmp_path: Path) -> Program:
+    (tmp_path / "helpers.aaa").write_text(HELPERS)
+    (tmp_path / "main.aaa").write_text(MAIN)
+
+    program = Program(tmp_path / "main.aaa")
+    assert not program.file_load_errors
+    return program
+
+
+def test_find_reachable(tmp_path: Path) -> None:
+    program = load(tmp_path)
+    main_file = program.entry_point_file
+    helpers_file = main_file.parent / "helpers.aaa"
+
+    reachable = find_reachable(program)
+    assert reachable.functions == [(main_file, "main"), (helpers_file, "used")]
+    assert reachable.structs == [(main_file, "pair")]
+
+    everything = find_all(program)
+    assert everything.functions[0] == (main_file, "main")
+    assert set(everything.functions) == {
+        (main_file, "main"),
+        (helpers_file, "used"),
+        (helpers_file, "unused"),
+        (helpers_file, "helper"),
+    }
+    assert set(everything.structs) == {
+        (main_file, "pair"),
+        (helpers_file, "point"),
+        (helpers_file, "unused_point"),
+    }
+
+
+def test_link_without_tree_shaking(tmp_path: Path) -> None:
+    program = load(tmp_path)
+
+    image = Linker(program).link()
+    assert [entry.name for entry in image.functions] == ["main", "used"]
+
+    unshaken_image = Linker(program, tree_shake=False).link()
+    assert unshaken_image.functions[0].name == "main"
+    assert {entry.name for entry in unshaken_image.functions} == {
+        "main",
+        "used",
+        "unused",
+        "helper",
+    }
+
+
+def test_transpile_reachable_functions(tmp_path: Path) -> None:
+    source = Transpiler(load(tmp_path)).transpile()
+
+    assert "_used()" in source
+    assert "_unused" not in source
+    assert "_helper" not in source
+
+
+def test_build_report(tmp_path: Path) -> None:
+    program = load(tmp_path)
+    helpers_file = program.entry_point_file.parent / "helpers.aaa"
+    image_path = tmp_path / "main.aaab"
+
+    with redirect_stdout(StringIO()) as stdout:
+        assert (
+            main(
+                [
+                    "./aaa.py",
+                    "build",
+                    str(tmp_path / "main.aaa"),
+                    "-o",
+                    str(image_path),
+                    "--report",
+                ]
+            )
+            == 0
+        )
+
+    summary, *removed = stdout.getvalue().splitlines()
+
+    assert summary.startswith("Removed 2 of 4 functions and 2 of 3 structs, saving ")
+    assert removed == [
+        "Removed functions:",
+        f"  {helpers_file}: helper",
+        f"  {helpers_file}: unused",
+        "Removed structs:",
+        f"  {helpers_file}: point",
+        f"  {helpers_file}: unused_point",
+    ]
+
+    saved, total = map(
+        int, summary.split("saving ")[1].split(" bytes")[0].split(" of ")
+    )
+    assert 0 < saved < total
+    assert total - saved == image_path.stat().st_size